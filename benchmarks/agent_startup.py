@@ -0,0 +1,76 @@
+"""
+Benchmark agent import and startup cost
+
+Each measurement runs in a fresh interpreter, so import caches of earlier
+runs don't hide the cost. Compares importing all five agent modules up
+front (what AgentFactory used to do at import time) against importing the
+router with the lazy agent registry, and shows what the first request to a
+single agent pays when it is loaded on demand.
+
+Example:
+    python benchmarks/agent_startup.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+AGENT_MODULES = [
+    "src.agents.code_agent",
+    "src.agents.image_agent",
+    "src.agents.research_agent",
+    "src.agents.task_agent",
+    "src.agents.assistant_agent",
+]
+
+SCENARIOS = {
+    "eager imports": "import " + ", ".join(AGENT_MODULES) + "\nimport src.orchestration.router",
+    "lazy registry": "import src.orchestration.router",
+    "lazy + first code request": (
+        "import src.orchestration.router as router\n"
+        "router.AGENT_REGISTRY.get('code')"
+    ),
+}
+
+TEMPLATE = """
+import sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+heavy = [name for name in ("openai", "bs4", "apscheduler", "sqlalchemy") if name in sys.modules]
+print(f"{{elapsed}} {{len(sys.modules)}} {{','.join(heavy)}}")
+"""
+
+def measure(code: str) -> tuple:
+    """Run the code in a fresh interpreter and return (seconds, modules loaded, heavy packages)"""
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN=os.environ.get("TELEGRAM_BOT_TOKEN", "0:benchmark"),
+        OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark")
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", TEMPLATE.format(code=code)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    elapsed, modules, heavy = (output.split(" ") + [""])[:3]
+    return float(elapsed), int(modules), heavy
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, code in SCENARIOS.items():
+        results = [measure(code) for _ in range(args.runs)]
+        times = [result[0] * 1000 for result in results]
+        _, modules, heavy = results[-1]
+        print(
+            f"{name:>26}: median {statistics.median(times):7.1f} ms (min {min(times):7.1f}) | "
+            f"{modules:5d} modules | heavy packages: {heavy or 'none'}"
+        )
+
+if __name__ == "__main__":
+    main()
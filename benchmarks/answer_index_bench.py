@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for the inline answer index
+
+Fills the answer index with synthetic code and research queries and times
+prefix and word lookups of partially typed queries, as sent by Telegram
+while the user types an inline query.
+
+Example:
+    python benchmarks/answer_index_bench.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.orchestration.answer_index import AnswerIndex
+
+VERBS = ["write", "build", "parse", "sort", "merge", "compare", "summarize", "explain", "find", "convert"]
+OBJECTS = ["csv files", "json logs", "a linked list", "http headers", "stock prices", "solar panels",
+           "battery chemistry", "quantum computing", "rust async", "python decorators"]
+DETAILS = ["quickly", "with tests", "for beginners", "in 2024", "using numpy", "step by step",
+           "with examples", "without recursion", "for a report", "in detail"]
+
+def make_query(rng: random.Random, index: int) -> str:
+    return f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(DETAILS)} variant{index}"
+
+def typed_prefixes(query: str) -> list:
+    """The queries Telegram sends while a user types the query"""
+    return [query[:length] for length in range(4, len(query) + 1, 3)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rng = random.Random(3)
+        index = AnswerIndex(max_entries=size, max_bytes=size * 1024)
+        queries = [make_query(rng, position) for position in range(size)]
+
+        started = time.perf_counter()
+        for query in queries:
+            index.add("code", query, "def solution():\n    pass\n" * 10)
+        add_us = (time.perf_counter() - started) / size * 1e6
+
+        # Half the lookups reorder the words, so only the token index can find them
+        typed = []
+        for query in rng.sample(queries, min(args.lookups, size)):
+            words = query.split()
+            typed.extend(typed_prefixes(query if rng.random() < 0.5 else " ".join(reversed(words))))
+
+        index.stats.__init__()
+        for text in typed:
+            index.lookup(text, limit=10)
+        stats = index.stats.to_dict()
+        print(
+            f"{size:>7} entries ({index.bytes / 1024 / 1024:5.1f} MB): add {add_us:6.1f} us | "
+            f"{stats['lookups']} lookups avg {stats['avg_latency_us']:7.1f} us, max {stats['max_latency_us']:8.1f} us, "
+            f"hit rate {stats['hit_rate']:.0%}"
+        )
+
+if __name__ == "__main__":
+    main()
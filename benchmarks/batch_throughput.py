@@ -0,0 +1,74 @@
+"""
+Throughput benchmark for offline agent batches
+
+Runs a batch of code generation queries against the stub OpenAI server in
+live mode at several concurrency levels, and in provider mode, where the
+stub answers the whole JSONL file after --batch-delay seconds like a batch
+endpoint that is quick to get to it. Reports queries per second for each.
+
+Example:
+    python benchmarks/batch_throughput.py --queries 500 --concurrency 1 8 32 --latency 0.2
+    python benchmarks/batch_throughput.py --queries 200 --track
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Every query must reach the stub instead of a cache
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from stub_openai_server import StubServer, StubSettings, create_stub_app
+from src.agents.clients import create_openai_client
+from src.agents.code_agent import CodeGenerationAgent
+from src.agents.model_router import ModelOption, ModelRouter
+from src.agents.providers import OpenAIChatProvider
+from src.persistence.database import DatabaseManager
+
+async def measure(agent, queries: list, mode: str, concurrency: int, db_manager, poll_interval: float) -> str:
+    run = agent.process_batch(queries, mode=mode, concurrency=concurrency, db_manager=db_manager,
+                              poll_interval=poll_interval)
+    await run.collect()
+    label = f"{mode} x{concurrency}" if mode == "live" else mode
+    return (
+        f"{label:>12}: {run.stats.succeeded:5d} ok {run.stats.failed:4d} failed | "
+        f"{run.stats.elapsed:7.2f} s | {run.stats.items_per_second:8.1f} queries/s"
+    )
+
+async def run(args):
+    settings = StubSettings(first_token_delay=args.latency, token_delay=0.0, tokens=args.tokens,
+                            batch_delay=args.batch_delay)
+    async with StubServer(create_stub_app(settings), args.port) as stub:
+        client = create_openai_client("stub", stub.base_url)
+        agent = CodeGenerationAgent()
+        agent.model_router = ModelRouter({"openai": OpenAIChatProvider(client)},
+                                         [ModelOption("openai", "stub-model", 3, 0, 0)])
+        db_manager = DatabaseManager() if args.track else None
+        queries = [f"write function number {index}" for index in range(args.queries)]
+
+        for concurrency in args.concurrency:
+            print(await measure(agent, queries, "live", concurrency, db_manager, args.poll_interval))
+        print(await measure(agent, queries, "provider", 1, db_manager, args.poll_interval))
+        await client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8935)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the stub takes per live completion")
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="Seconds the stub takes per provider batch")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--track", action="store_true", help="Keep progress in task history, as resumable batches do")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Connection reuse and event loop responsiveness benchmark for model API clients
+
+Sends concurrent chat completions to the stub OpenAI server, which runs in
+its own thread, while a ticker on the event loop measures how late it wakes
+up. Compares three clients:
+
+- blocking: the synchronous OpenAI client called on the event loop, like the
+  module-level openai.chat.completions client; calls run one at a time and
+  stall everything else on the loop
+- per-request: a new AsyncOpenAI client for every call, so every call opens
+  a new connection, and building the client's TLS context stalls the loop
+- pooled: the AsyncOpenAI client agents share (src/agents/clients.py), whose
+  connection pool keeps connections alive between calls
+
+Reports throughput, latency, the connections the stub saw and loop lag.
+
+Example:
+    python benchmarks/client_pool.py --calls 400 --concurrency 50 --max-connections 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import openai
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from stub_openai_server import StubServer, StubSettings, create_stub_app
+from src.agents.clients import create_http_client, create_openai_client
+
+MODEL = "stub-model"
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+async def watch_loop(interval: float, lags: list):
+    """Record how much later than asked the loop wakes a sleeping task"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+async def measure(server: StubServer, app, mode: str, args) -> str:
+    if mode == "blocking":
+        client = openai.OpenAI(api_key="stub", base_url=server.base_url, max_retries=0)
+
+        async def call():
+            return client.chat.completions.create(model=MODEL, messages=MESSAGES)
+    elif mode == "per-request":
+        async def call():
+            async with openai.AsyncOpenAI(api_key="stub", base_url=server.base_url, max_retries=0) as client:
+                return await client.chat.completions.create(model=MODEL, messages=MESSAGES)
+    else:
+        client = create_openai_client("stub", server.base_url, create_http_client(
+            max_connections=args.max_connections, max_keepalive=args.max_connections
+        ))
+
+        async def call():
+            return await client.chat.completions.create(model=MODEL, messages=MESSAGES)
+
+    calls = args.calls if mode != "blocking" else min(args.calls, args.blocking_calls)
+    latencies = []
+    remaining = calls
+    connections = len(app.state.connections)
+
+    async def caller():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    lags = []
+    watcher = asyncio.create_task(watch_loop(args.tick, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    # Let the ticker record the tick a blocked loop held up
+    await asyncio.sleep(args.tick * 2)
+    watcher.cancel()
+    if mode == "pooled":
+        await client.close()
+
+    latencies.sort()
+    lags.sort()
+    return (
+        f"{mode:>11}: {calls:4d} calls | {calls / elapsed:7.1f} calls/s | "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms | "
+        f"{len(app.state.connections) - connections:4d} connections | "
+        f"loop lag p99 {lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000:7.1f} ms max {lags[-1] * 1000:7.1f} ms"
+    )
+
+async def run(server: StubServer, app, args):
+    for mode in ("blocking", "per-request", "pooled"):
+        print(await measure(server, app, mode, args))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8934)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--blocking-calls", type=int, default=40,
+                        help="Calls made with the blocking client, which runs them one at a time")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--max-connections", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub takes per completion")
+    parser.add_argument("--tick", type=float, default=0.01, help="Seconds between loop lag samples")
+    args = parser.parse_args()
+
+    app = create_stub_app(StubSettings(first_token_delay=args.latency, token_delay=0.0, tokens=20))
+    with StubServer(app, args.port) as server:
+        asyncio.run(run(server, app, args))
+
+if __name__ == "__main__":
+    main()
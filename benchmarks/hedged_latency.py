@@ -0,0 +1,111 @@
+"""
+Tail latency benchmark for hedged requests and request deadlines
+
+Sends completions to the stub OpenAI server with jittery latency, where a
+small share of the requests is much slower than the rest, the way a few
+requests to a real provider land on a busy replica. Compares three modes:
+
+- plain: every call waits for its one request
+- hedged: a duplicate request is sent once a call is slower than the p95
+  latency of earlier calls, and the slower request is cancelled
+- deadline: plain calls under a deadline, cut short when it passes
+
+Reports latency percentiles and the requests the stub received per call.
+
+Example:
+    python benchmarks/hedged_latency.py --calls 500 --slow-rate 0.05 --slow-delay 1.0
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import openai
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from stub_openai_server import StubServer, StubSettings, create_stub_app
+from src.orchestration.deadline import DeadlineExceeded, call_timeout, deadline_scope, within_deadline
+from src.orchestration.provider_guard import ProviderGuards
+
+MODEL = "stub-model"
+
+def percentile(latencies: list, share: float) -> float:
+    return latencies[min(len(latencies) - 1, int(len(latencies) * share))]
+
+async def measure(client, app, mode: str, args) -> str:
+    guard = ProviderGuards(initial_limit=64, max_limit=64).get("openai", MODEL)
+
+    async def call():
+        timeout = call_timeout()
+        return await guard.run(
+            lambda: client.chat.completions.create(
+                model=MODEL, messages=[{"role": "user", "content": "hi"}],
+                **({} if timeout is None else {"timeout": timeout})
+            ),
+            hedge=mode == "hedged"
+        )
+
+    # Warm up so the p95 the hedges wait for is known
+    for _ in range(args.warmup):
+        await call()
+
+    latencies = []
+    missed = 0
+    requests = app.state.requests
+    remaining = args.calls
+
+    async def caller():
+        nonlocal remaining, missed
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                if mode == "deadline":
+                    with deadline_scope(args.deadline):
+                        await within_deadline(call())
+                else:
+                    await call()
+            except (DeadlineExceeded, openai.APITimeoutError):
+                missed += 1
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(caller() for _ in range(args.concurrency)))
+    latencies.sort()
+    sent = (app.state.requests - requests) / args.calls
+    return (
+        f"{mode:>8}: p50 {statistics.median(latencies) * 1000:7.1f} ms | "
+        f"p95 {percentile(latencies, 0.95) * 1000:7.1f} ms | p99 {percentile(latencies, 0.99) * 1000:7.1f} ms | "
+        f"max {latencies[-1] * 1000:7.1f} ms | {sent:.3f} requests/call | "
+        f"{guard.stats.hedge_wins} hedges won of {guard.stats.hedged} | {missed} missed the deadline"
+    )
+
+async def run(args):
+    settings = StubSettings(args.latency, 0, 5, jitter=args.jitter, slow_rate=args.slow_rate,
+                            slow_delay=args.slow_delay)
+    app = create_stub_app(settings)
+    async with StubServer(app, args.port) as stub:
+        client = openai.AsyncOpenAI(api_key="stub", base_url=stub.base_url, max_retries=0)
+        for mode in ("plain", "hedged", "deadline"):
+            print(await measure(client, app, mode, args))
+        await client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8902)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds the stub takes at least")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Most seconds added at random")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Share of much slower requests")
+    parser.add_argument("--slow-delay", type=float, default=1.0, help="Seconds slow requests take longer")
+    parser.add_argument("--deadline", type=float, default=0.5, help="Seconds calls may take in deadline mode")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Micro-benchmark for intent classification
+
+Compares the compiled intent classifiers against the chained
+`"keyword" in text.lower()` checks they replaced, on a corpus of
+real-length chat messages, for the bot, assistant and task call sites.
+
+Example:
+    python benchmarks/intent_bench.py --messages 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.intents import ASSISTANT_INTENTS, BOT_INTENTS, TASK_INTENTS, IntentClassifier, IntentRule
+
+OPENERS = [
+    "Hey, could you help me with something?",
+    "Quick question before my meeting.",
+    "I've been stuck on this all afternoon.",
+    "Following up on what we discussed yesterday,",
+    "",
+]
+REQUESTS = [
+    "write a python script that renames every file in a folder by its creation date",
+    "draw a picture of a lighthouse on a cliff during a thunderstorm at night",
+    "research the latest developments in solid state batteries and summarize them",
+    "schedule an appointment with the dentist next tuesday afternoon",
+    "draft an email to the team about the release being delayed by a week",
+    "find the quarterly report file I was editing last week",
+    "show me the list of reminders I have for tomorrow",
+    "cancel the reminder with id 42, I don't need it anymore",
+    "what's the weather going to be like for the weekend trip",
+    "summarize this article about remote work productivity for me",
+]
+DETAILS = [
+    "It should handle errors gracefully and log what it does.",
+    "Please keep it short, I only need the key points.",
+    "Make sure to include the sources so I can double check them later.",
+    "The deadline is Friday so there's no rush, but sooner is better.",
+    "Use a warm, friendly tone and avoid jargon where possible.",
+]
+
+def build_corpus(size: int, seed: int = 7) -> list:
+    """Build chat messages of realistic lengths (roughly 40 to 600 characters)"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        parts = [rng.choice(OPENERS), rng.choice(REQUESTS)]
+        parts.extend(rng.choice(DETAILS) for _ in range(rng.randint(0, 5)))
+        corpus.append(" ".join(part for part in parts if part))
+    return corpus
+
+def legacy_bot(text: str):
+    if "code" in text.lower() or "program" in text.lower() or "script" in text.lower():
+        return "code"
+    elif "image" in text.lower() or "picture" in text.lower() or "draw" in text.lower():
+        return "image"
+    elif "research" in text.lower() or "find" in text.lower() or "search" in text.lower():
+        return "research"
+    return None
+
+def legacy_assistant(text: str):
+    if "calendar" in text.lower() or "schedule" in text.lower() or "appointment" in text.lower():
+        return "calendar"
+    elif "email" in text.lower() or "draft" in text.lower() or "write" in text.lower():
+        return "email"
+    elif "file" in text.lower() or "search" in text.lower() or "find" in text.lower():
+        return "file"
+    elif "summarize" in text.lower() or "summary" in text.lower():
+        return "summary"
+    return None
+
+def legacy_task(text: str):
+    if "schedule" in text.lower() or "remind" in text.lower():
+        return "schedule"
+    elif "list" in text.lower() or "show" in text.lower():
+        return "list"
+    elif "cancel" in text.lower() or "delete" in text.lower():
+        return "cancel"
+    return None
+
+def scaled_table(intents: int, keywords_per_intent: int) -> list:
+    """Build a larger synthetic rule table to show how both approaches scale"""
+    rng = random.Random(11)
+    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    return [
+        (f"intent{index}", ["".join(rng.choice(alphabet) for _ in range(rng.randint(5, 9)))
+                            for _ in range(keywords_per_intent)])
+        for index in range(intents)
+    ]
+
+def time_per_message(classify, corpus: list, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            classify(text)
+    return (time.perf_counter() - started) / (repeat * len(corpus)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages)
+    average_length = sum(len(text) for text in corpus) / len(corpus)
+    print(f"{len(corpus)} messages, average length {average_length:.0f} characters")
+
+    sites = [
+        ("bot", legacy_bot, BOT_INTENTS.classify),
+        ("assistant", legacy_assistant, ASSISTANT_INTENTS.classify),
+        ("task", legacy_task, TASK_INTENTS.classify),
+    ]
+    for name, legacy, compiled in sites:
+        legacy_us = time_per_message(legacy, corpus, args.repeat)
+        compiled_us = time_per_message(compiled, corpus, args.repeat)
+        agreement = sum(legacy(text) == compiled(text) for text in corpus) / len(corpus)
+        print(
+            f"{name:>10}: chained checks {legacy_us:6.2f} us/msg | compiled {compiled_us:6.2f} us/msg | "
+            f"same intent on {agreement:.1%} of messages"
+        )
+
+    for intents, keywords_per_intent in ((10, 6), (30, 10)):
+        table = scaled_table(intents, keywords_per_intent)
+        lowered_tables = [(intent, [keyword.lower() for keyword in keywords]) for intent, keywords in table]
+
+        def chained(text, tables=lowered_tables):
+            for intent, keywords in tables:
+                for keyword in keywords:
+                    if keyword in text.lower():
+                        return intent
+            return None
+
+        classifier = IntentClassifier([IntentRule(intent, keywords=keywords) for intent, keywords in table])
+        legacy_us = time_per_message(chained, corpus, args.repeat)
+        compiled_us = time_per_message(classifier.classify, corpus, args.repeat)
+        print(
+            f"{intents * keywords_per_intent:>4} keywords: chained checks {legacy_us:6.2f} us/msg | "
+            f"compiled {compiled_us:6.2f} us/msg"
+        )
+
+if __name__ == "__main__":
+    main()
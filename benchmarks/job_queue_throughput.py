@@ -0,0 +1,127 @@
+"""
+Throughput benchmark for the Redis job queue
+
+Enqueues jobs for an agent that sleeps for a fixed time, standing in for the
+time an LLM call takes, and measures completed jobs per second as the number
+of workers grows. With --redis-host every worker is a separate process
+talking to that Redis server; without it the workers run in this process
+against an in-memory fakeredis server, which shows the queue's own overhead.
+
+Example:
+    python benchmarks/job_queue_throughput.py --workers 1 2 4 8 --jobs 400
+    python benchmarks/job_queue_throughput.py --redis-host localhost --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.orchestration.job_queue import JobQueueClient, JobWorker, connect_redis
+
+class SleepAgent:
+    """Agent answering after a fixed delay"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def process(self, query: str) -> str:
+        await asyncio.sleep(self.latency)
+        return query
+
+class SleepRegistry:
+    """Registry holding only the sleep agent"""
+
+    names = ["sleep"]
+
+    def __init__(self, latency: float):
+        self.agent = SleepAgent(latency)
+
+    def get(self, name: str):
+        return self.agent
+
+def run_process_worker(host: str, port: int, prefix: str, latency: float, concurrency: int):
+    """Run a worker in a separate process until it is terminated"""
+    worker = JobWorker(connect_redis(host, port), registry=SleepRegistry(latency), prefix=prefix,
+                       concurrency=concurrency)
+    asyncio.run(worker.run())
+
+async def measure(make_redis, start_workers, jobs: int, prefix: str) -> float:
+    """Enqueue all jobs at once and return completed jobs per second"""
+    client = JobQueueClient(make_redis(), prefix=prefix, result_timeout=600)
+    stop_workers = await start_workers()
+    # Warm up so group creation and connections are not measured
+    await client.call("sleep", "warm up")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client.call("sleep", f"job {number}") for number in range(jobs)))
+    elapsed = time.perf_counter() - started
+
+    await stop_workers()
+    await client.close()
+    return jobs / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--jobs", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each job takes")
+    parser.add_argument("--concurrency", type=int, default=1, help="Jobs each worker runs at the same time")
+    parser.add_argument("--redis-host", default=None)
+    parser.add_argument("--redis-port", type=int, default=6379)
+    args = parser.parse_args()
+
+    for count in args.workers:
+        prefix = f"bench_{uuid.uuid4().hex[:8]}"
+        if args.redis_host:
+            def make_redis():
+                return connect_redis(args.redis_host, args.redis_port)
+
+            async def start_workers():
+                processes = [
+                    multiprocessing.Process(
+                        target=run_process_worker,
+                        args=(args.redis_host, args.redis_port, prefix, args.latency, args.concurrency)
+                    )
+                    for _ in range(count)
+                ]
+                for process in processes:
+                    process.start()
+
+                async def stop_workers():
+                    for process in processes:
+                        process.terminate()
+                        process.join()
+                return stop_workers
+        else:
+            import fakeredis
+            server = fakeredis.FakeServer()
+
+            def make_redis():
+                return fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+            async def start_workers():
+                workers = [
+                    JobWorker(make_redis(), registry=SleepRegistry(args.latency), name=f"worker-{number}",
+                              prefix=prefix, concurrency=args.concurrency)
+                    for number in range(count)
+                ]
+                tasks = [asyncio.create_task(worker.run()) for worker in workers]
+
+                async def stop_workers():
+                    for worker in workers:
+                        worker.stop()
+                    await asyncio.gather(*tasks)
+                return stop_workers
+
+        throughput = asyncio.run(measure(make_redis, start_workers, args.jobs, prefix))
+        ideal = count * args.concurrency / args.latency
+        print(f"{count:>3} workers: {throughput:8.1f} jobs/s ({throughput / ideal:5.0%} of {ideal:.0f} jobs/s ideal)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Prompt prefix caching benchmark
+
+Sends the same requests through the model router to the stub OpenAI server
+in two prompt layouts: variable first, where the date and query lead the
+system message the way prompts were built before templates, and templated,
+where the long static instructions come first and the variable parts last.
+The stub caches prompt prefixes like the providers do and adds
+--prefill-delay seconds per 1000 tokens it has to prefill, so only the
+templated layout gets its instructions served from cache. Reports the share
+of prompt tokens cached and the mean latency to the first token with and
+without a cache hit.
+
+Example:
+    python benchmarks/prompt_cache.py --requests 50 --instructions 4000 --prefill-delay 0.05
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import date, timedelta
+
+# Every request must reach the stub instead of a cache
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from stub_openai_server import StubServer, StubSettings, create_stub_app
+from src.agents.clients import create_openai_client
+from src.agents.model_router import ModelOption, ModelRouter
+from src.agents.prompts import PromptTemplate
+from src.agents.providers import OpenAIChatProvider
+
+def variable_first(instructions: str, query: str, today: str) -> list:
+    return [
+        {"role": "system", "content": f"Today is {today}. The user asks: {query}\n\n{instructions}"},
+        {"role": "user", "content": query}
+    ]
+
+def templated(instructions: str, query: str, today: str) -> list:
+    return PromptTemplate(instructions, "{query}\n\nCurrent date: {date}").messages(query=query, date=today)
+
+async def measure(router: ModelRouter, layout, instructions: str, requests: int, stream: bool) -> str:
+    name = f"{layout.__name__}{' stream' if stream else ''}"
+    for index in range(requests):
+        today = (date(2024, 1, 1) + timedelta(days=index % 7)).isoformat()
+        messages = layout(instructions, f"{name}: schedule meeting number {index}", today)
+        if stream:
+            async for _ in router.stream(name, messages, max_tokens=50):
+                pass
+        else:
+            await router.complete(name, messages, max_tokens=50)
+    stats = router.stats.prompt_cache_dict()[name]
+    latency = lambda key: f"{stats[key] * 1000:7.1f} ms" if stats[key] is not None else "      - ms"
+    return (
+        f"{name:>22}: {stats['cached_share']:6.1%} of {stats['prompt_tokens']:7d} prompt tokens cached | "
+        f"{stats['cached_requests']:4d}/{stats['requests']} requests hit | "
+        f"latency cached {latency('cached_latency_s')} uncached {latency('uncached_latency_s')}"
+    )
+
+async def run(args):
+    settings = StubSettings(first_token_delay=args.latency, token_delay=0.0, tokens=args.tokens,
+                            prefill_delay=args.prefill_delay, cache_min_tokens=args.cache_min_tokens)
+    # Static instructions of about --instructions tokens
+    instructions = " ".join(f"Rule {index}: keep answers short and cite the calendar entry."
+                            for index in range(args.instructions // 12))
+    async with StubServer(create_stub_app(settings), args.port) as stub:
+        client = create_openai_client("stub", stub.base_url)
+        router = ModelRouter({"openai": OpenAIChatProvider(client)},
+                             [ModelOption("openai", "stub-model", 3, 0, 0, 128000)])
+        for stream in (False, True):
+            for layout in (variable_first, templated):
+                print(await measure(router, layout, instructions, args.requests, stream))
+        await client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8936)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--instructions", type=int, default=4000, help="Tokens of the static instructions")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub takes to the first token")
+    parser.add_argument("--prefill-delay", type=float, default=0.05,
+                        help="Seconds the stub takes per 1000 prompt tokens not served from cache")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024)
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Overload and outage benchmark for the provider call guards
+
+Runs many concurrent callers against the stub OpenAI server, which rejects
+requests beyond its concurrency cap with 429, first without any limit and
+then through the adaptive limiter. Callers retry rejected requests after a
+short pause. Reports the requests the stub had to handle, the share that was
+rejected, completions per second, and the limit the limiter settled on.
+
+Then the stub fails every request for a while and recovers, showing the
+requests that still reached it during the outage and how fast callers got
+their error with and without the circuit breaker.
+
+Example:
+    python benchmarks/provider_overload.py --callers 48 --completions 600 --capacity 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import openai
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from stub_openai_server import StubServer, StubSettings, create_stub_app
+from src.orchestration.provider_guard import ProviderGuards, ProviderUnavailable
+
+MODEL = "stub-model"
+
+async def complete(client, guard):
+    """Request one completion, through the guard if one is given"""
+    params = dict(model=MODEL, messages=[{"role": "user", "content": "hi"}])
+    if guard is None:
+        return await client.chat.completions.create(**params)
+    async with guard.slot():
+        return await client.chat.completions.create(**params)
+
+async def overload(client, app, guard, callers: int, completions: int) -> dict:
+    """Have the callers share the completions, retrying 429s, and measure the load on the stub"""
+    remaining = completions
+    requests, errors = app.state.requests, app.state.errors
+
+    async def caller():
+        nonlocal remaining
+        while remaining > 0:
+            try:
+                await complete(client, guard)
+                remaining -= 1
+            except (openai.RateLimitError, ProviderUnavailable):
+                await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(callers)))
+    elapsed = time.perf_counter() - started
+    sent = app.state.requests - requests
+    return {
+        "sent": sent,
+        "rejected": (app.state.errors - errors) / sent,
+        "throughput": completions / elapsed,
+        "limit": guard.limiter.limit if guard else None
+    }
+
+async def outage(client, app, settings, guard, callers: int, seconds: float) -> dict:
+    """Have the callers call a stub failing every request and measure how it is spared"""
+    settings.error_rate, settings.error_status = 1.0, 503
+    requests = app.state.requests
+    failures = []
+    deadline = time.perf_counter() + seconds
+
+    async def caller():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await complete(client, guard)
+            except (openai.APIStatusError, ProviderUnavailable):
+                failures.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+    await asyncio.gather(*(caller() for _ in range(callers)))
+    settings.error_rate = 0.0
+    return {
+        "reached_stub": app.state.requests - requests,
+        "failures": len(failures),
+        "avg_failure_ms": sum(failures) / len(failures) * 1000
+    }
+
+async def run(args):
+    settings = StubSettings(args.latency, 0, 5, max_concurrency=args.capacity)
+    app = create_stub_app(settings)
+    async with StubServer(app, args.port) as stub:
+        client = openai.AsyncOpenAI(api_key="stub", base_url=stub.base_url, max_retries=0)
+        for label, guard in (
+            ("unguarded", None),
+            ("guarded", ProviderGuards(initial_limit=args.callers, max_limit=args.callers,
+                                       open_seconds=args.open_seconds).get("openai", MODEL)),
+        ):
+            result = await overload(client, app, guard, args.callers, args.completions)
+            limit = f" | limit settled at {result['limit']:.1f}" if guard else ""
+            print(f"overload {label:>9}: {result['sent']:5} requests for {args.completions} completions, "
+                  f"{result['rejected']:5.1%} rejected with 429 | {result['throughput']:6.1f} completions/s{limit}")
+
+            result = await outage(client, app, settings, guard, args.callers, args.outage)
+            print(f"outage   {label:>9}: {result['reached_stub']:5} requests reached the failing stub in "
+                  f"{args.outage:g}s | {result['failures']} failures, {result['avg_failure_ms']:6.2f} ms on average")
+        await client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--callers", type=int, default=48)
+    parser.add_argument("--completions", type=int, default=600)
+    parser.add_argument("--capacity", type=int, default=8, help="Requests the stub handles at once")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds the stub takes per completion")
+    parser.add_argument("--outage", type=float, default=3.0, help="Seconds the stub fails every request")
+    parser.add_argument("--open-seconds", type=float, default=1.0, help="Seconds the circuit stays open")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Lookup latency benchmark for the semantic cache
+
+Fills a memory-mapped semantic index with random unit vectors and times
+similarity searches, which are one matrix-vector product over the whole
+index. Also times appending the entries, and removing a quarter of them,
+which ends in a compaction. 1M entries at 256 dimensions take 1 GB of disk.
+
+Example:
+    python benchmarks/semantic_cache_bench.py --sizes 10000 100000 1000000 --dim 256
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.persistence.semantic_cache import SemanticIndex
+
+def random_unit_vectors(rng: np.random.Generator, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=10000, help="Entries appended per call while filling")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            index = SemanticIndex(args.dim, os.path.join(directory, "bench"), max_entries=size)
+
+            started = time.perf_counter()
+            for start in range(0, size, args.batch):
+                count = min(args.batch, size - start)
+                index.add_many(
+                    random_unit_vectors(rng, count, args.dim),
+                    [{"query": f"query {start + offset}", "answer": "x" * 200, "expires_at": 0}
+                     for offset in range(count)]
+                )
+            fill_s = time.perf_counter() - started
+
+            # Queries near stored vectors, as a paraphrase would be
+            rows = rng.integers(0, size, args.lookups)
+            queries = np.array(index.matrix[rows]) + 0.1 * random_unit_vectors(rng, args.lookups, args.dim)
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+            index.search(queries[0])
+
+            latencies = []
+            found = 0
+            for row, query in zip(rows, queries):
+                started = time.perf_counter()
+                best, _ = index.search(query)
+                latencies.append((time.perf_counter() - started) * 1000)
+                found += best == row
+            latencies.sort()
+
+            # Removing a quarter of the entries triggers a compaction
+            started = time.perf_counter()
+            for row in range(0, size, 4):
+                index.remove(row)
+            remove_s = time.perf_counter() - started
+            assert index.compactions == 1
+            index.close()
+
+            print(
+                f"{size:>8} entries x {args.dim} dims ({size * args.dim * 4 / 1024 / 1024:7.1f} MB): "
+                f"fill {fill_s:6.2f} s | lookup median {statistics.median(latencies):7.2f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms | "
+                f"recall {found / args.lookups:.0%} | remove 25% and compact {remove_s:6.2f} s"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark time to first visible token for streamed Telegram replies
+
+Runs the code generation path against the local stub OpenAI server twice:
+once buffered (the reply appears when generation completes) and once
+streamed into a message that is edited on the throttled cadence. Telegram
+is replaced by a message object that records when each edit lands.
+
+Example:
+    python benchmarks/streaming_latency.py --tokens 400 --token-delay 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Point the agents at the stub before the config module is imported
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+# Every run sends the same prompt, which must reach the stub instead of the response cache
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from stub_openai_server import StubServer, StubSettings, create_stub_app
+
+class RecordingMessage:
+    """Stands in for a Telegram message and records edit times"""
+
+    def __init__(self, edit_latency: float):
+        self.edit_latency = edit_latency
+        self.edits = []
+
+    async def edit_text(self, text, **kwargs):
+        await asyncio.sleep(self.edit_latency)
+        self.edits.append((time.perf_counter(), len(text)))
+
+async def run(args):
+    settings = StubSettings(args.first_token_delay, args.token_delay, args.tokens)
+    async with StubServer(create_stub_app(settings), args.port) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        from src.agents.code_agent import CodeGenerationAgent
+        from src.interface.streaming import StreamingReply
+
+        agent = CodeGenerationAgent()
+        query = "create a function to calculate fibonacci numbers"
+
+        # Buffered: nothing is visible until the whole completion has arrived
+        message = RecordingMessage(args.edit_latency)
+        started = time.perf_counter()
+        result = await agent.process(query)
+        await message.edit_text(result)
+        buffered_first_visible = message.edits[0][0] - started
+
+        # Streamed: deltas are pushed into a throttled progressive edit
+        message = RecordingMessage(args.edit_latency)
+        started = time.perf_counter()
+        async with StreamingReply(message, min_interval=args.edit_interval) as stream:
+            async for chunk in agent.process_stream(query):
+                stream.push(chunk.text)
+        await message.edit_text(stream.text)
+        streamed_first_visible = message.edits[0][0] - started
+        streamed_total = message.edits[-1][0] - started
+
+        return {
+            "buffered_time_to_first_visible_s": buffered_first_visible,
+            "streamed_time_to_first_visible_s": streamed_first_visible,
+            "streamed_total_s": streamed_total,
+            "streamed_edits": len(message.edits),
+            "max_edit_rate_per_s": _max_rate(message.edits)
+        }
+
+def _max_rate(edits: list) -> float:
+    """Highest edit rate between two consecutive edits"""
+    gaps = [later[0] - earlier[0] for earlier, later in zip(edits, edits[1:])]
+    return 1 / min(gaps) if gaps and min(gaps) > 0 else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--edit-latency", type=float, default=0.05, help="Simulated Telegram edit round trip")
+    parser.add_argument("--edit-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    for key, value in asyncio.run(run(args)).items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
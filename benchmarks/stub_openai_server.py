@@ -0,0 +1,430 @@
+"""
+Stub OpenAI- and Anthropic-compatible server for local benchmarks
+
+Serves /v1/chat/completions and Anthropic's /v1/messages with configurable
+latency, both as a single JSON response and as a server-sent event stream, so
+agent call paths can be measured without calling the real APIs. OpenAI's file
+and batch endpoints answer an uploaded JSONL file of chat completion requests
+after a delay. Prompt prefixes are cached like the providers' prompt caching:
+the longest prefix a prompt shares with earlier ones, in blocks of about 128
+tokens, is reported as cached tokens and skips the simulated prefill time. Errors can
+be injected: a share of the requests fails with a given status, and requests
+beyond a concurrency cap are rejected with 429 like a rate-limited provider. Latency can jitter,
+with a share of the requests much slower than the rest, to give a tail. The connections requests arrived
+on are counted, to show whether clients reuse them.
+
+Example:
+    python benchmarks/stub_openai_server.py --port 8900 --first-token-delay 0.3 --token-delay 0.02
+    python benchmarks/stub_openai_server.py --port 8900 --error-rate 0.2 --error-status 503 --max-concurrency 8
+    python benchmarks/stub_openai_server.py --port 8900 --jitter 0.05 --slow-rate 0.05 --slow-delay 1.0
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=stub python main.py
+    CLAUDE_BASE_URL=http://127.0.0.1:8901 CLAUDE_API_KEY=stub python main.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Characters per block of a cached prompt prefix, about 128 tokens
+CACHE_BLOCK = 512
+
+class StubSettings:
+    """Behaviour of the stub server"""
+
+    def __init__(self, first_token_delay: float = 0.3, token_delay: float = 0.02, tokens: int = 200,
+                 error_rate: float = 0.0, error_status: int = 503, max_concurrency: int = 0,
+                 jitter: float = 0.0, slow_rate: float = 0.0, slow_delay: float = 0.0,
+                 batch_delay: float = 1.0, prefill_delay: float = 0.0, cache_min_tokens: int = 1024):
+        """
+        Initialize the settings
+
+        Args:
+            first_token_delay: Seconds before the first token is produced
+            token_delay: Seconds between subsequent tokens
+            tokens: Number of tokens in every completion
+            error_rate: Share of the requests answered with error_status
+            error_status: HTTP status of injected errors
+            max_concurrency: Requests handled at once before more are rejected with 429; 0 for no cap
+            jitter: Most seconds added at random before the first token
+            slow_rate: Share of the requests delayed by slow_delay on top
+            slow_delay: Seconds slow requests are delayed before the first token
+            batch_delay: Seconds a batch takes to complete; each of its requests fails at error_rate
+            prefill_delay: Seconds added before the first token per 1000 prompt tokens not served from cache
+            cache_min_tokens: Fewest tokens of a cached prefix that are served from cache
+        """
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.batch_delay = batch_delay
+        self.prefill_delay = prefill_delay
+        self.cache_min_tokens = cache_min_tokens
+
+    def first_token_latency(self) -> float:
+        """Draw the seconds before the first token of a request"""
+        latency = self.first_token_delay + random.uniform(0, self.jitter)
+        if random.random() < self.slow_rate:
+            latency += self.slow_delay
+        return latency
+
+def _completion_tokens(settings: StubSettings) -> list:
+    """Build the tokens of a synthetic completion"""
+    return [f"token{index} " if index % 12 else f"token{index}\n" for index in range(settings.tokens)]
+
+def create_stub_app(settings: StubSettings = None) -> FastAPI:
+    """
+    Create the stub OpenAI- and Anthropic-compatible app
+
+    Args:
+        settings: Behaviour of the stub server
+
+    Returns:
+        The FastAPI application
+    """
+    settings = settings or StubSettings()
+    app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+    app.state.settings = settings
+    app.state.requests = 0
+    app.state.errors = 0
+    app.state.in_flight = 0
+    # Client (host, port) pairs requests came from, one per connection the clients opened
+    app.state.connections = set()
+    # Uploaded and generated files by ID, and batches by ID
+    app.state.files = {}
+    app.state.batches = {}
+    # Digests of the prompt prefixes seen, one per CACHE_BLOCK, and the body of the last chat request
+    app.state.prefixes = set()
+    app.state.last_body = None
+
+    def error(status: int, message: str) -> JSONResponse:
+        app.state.errors += 1
+        return JSONResponse({"error": {"message": message, "type": "stub_error", "code": status}},
+                            status_code=status)
+
+    def rejection(request: Request) -> JSONResponse:
+        # Counts the request and its connection and picks the error it is answered with, if any
+        app.state.requests += 1
+        if request.client is not None:
+            app.state.connections.add((request.client.host, request.client.port))
+        if settings.max_concurrency and app.state.in_flight >= settings.max_concurrency:
+            return error(429, "Rate limit reached")
+        if random.random() < settings.error_rate:
+            return error(settings.error_status, "Injected error")
+        return None
+
+    def prompt_usage(text: str) -> tuple:
+        # Prompt tokens, the leading ones of them served from cache, and the prefill delay of the others
+        digest = hashlib.blake2b()
+        cached_blocks, cached = 0, True
+        for start in range(0, len(text) - CACHE_BLOCK + 1, CACHE_BLOCK):
+            digest.update(text[start:start + CACHE_BLOCK].encode())
+            prefix = digest.copy().digest()
+            if cached and prefix in app.state.prefixes:
+                cached_blocks += 1
+            else:
+                cached = False
+                app.state.prefixes.add(prefix)
+        prompt_tokens = len(text) // 4
+        cached_tokens = cached_blocks * CACHE_BLOCK // 4
+        if cached_tokens < settings.cache_min_tokens:
+            cached_tokens = 0
+        return prompt_tokens, cached_tokens, settings.prefill_delay * (prompt_tokens - cached_tokens) / 1000
+
+    def prompt_text(system, messages: list) -> str:
+        # The prompt as the text its prefixes are cached by; Anthropic system prompts may be lists of blocks
+        if isinstance(system, list):
+            system = "".join(block.get("text", "") for block in system)
+        parts = [f"system:{system}\n"] if system else []
+        parts += [f"{message.get('role')}:{message.get('content')}\n" for message in messages]
+        return "".join(parts)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.last_body = body
+        model = body.get("model", "stub")
+        tokens = _completion_tokens(settings)
+
+        rejected = rejection(request)
+        if rejected is not None:
+            return rejected
+
+        prompt_tokens, cached_tokens, prefill = prompt_usage(prompt_text(None, body.get("messages", [])))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+
+        if not body.get("stream"):
+            app.state.in_flight += 1
+            try:
+                await asyncio.sleep(
+                    prefill + settings.first_token_latency() + settings.token_delay * (len(tokens) - 1)
+                )
+            finally:
+                app.state.in_flight -= 1
+            return JSONResponse({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+
+        async def events():
+            app.state.in_flight += 1
+            try:
+                await asyncio.sleep(prefill + settings.first_token_latency())
+                for index, token in enumerate(tokens):
+                    if index:
+                        await asyncio.sleep(settings.token_delay)
+                    chunk = {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [], "usage": usage}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                app.state.in_flight -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        app.state.last_body = body
+        model = body.get("model", "stub")
+        tokens = _completion_tokens(settings)
+
+        rejected = rejection(request)
+        if rejected is not None:
+            return rejected
+
+        prompt_tokens, cached_tokens, prefill = prompt_usage(prompt_text(body.get("system"), body.get("messages", [])))
+        # Anthropic counts the cached tokens apart from the input tokens
+        usage = {"input_tokens": prompt_tokens - cached_tokens, "cache_read_input_tokens": cached_tokens,
+                 "cache_creation_input_tokens": 0}
+
+        if not body.get("stream"):
+            app.state.in_flight += 1
+            try:
+                await asyncio.sleep(
+                    prefill + settings.first_token_latency() + settings.token_delay * (len(tokens) - 1)
+                )
+            finally:
+                app.state.in_flight -= 1
+            return JSONResponse({
+                "id": "msg_stub",
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": "".join(tokens)}],
+                "stop_reason": "end_turn",
+                "usage": {**usage, "output_tokens": len(tokens)}
+            })
+
+        def event(name: str, data: dict) -> str:
+            return f"event: {name}\ndata: {json.dumps({'type': name, **data})}\n\n"
+
+        async def events():
+            app.state.in_flight += 1
+            try:
+                yield event("message_start", {"message": {"id": "msg_stub", "type": "message", "role": "assistant",
+                                                          "model": model, "content": [],
+                                                          "usage": {**usage, "output_tokens": 1}}})
+                await asyncio.sleep(prefill + settings.first_token_latency())
+                yield event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+                for index, token in enumerate(tokens):
+                    if index:
+                        await asyncio.sleep(settings.token_delay)
+                    yield event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": token}})
+                yield event("content_block_stop", {"index": 0})
+                yield event("message_delta", {"delta": {"stop_reason": "end_turn"},
+                                              "usage": {"output_tokens": len(tokens)}})
+                yield event("message_stop", {})
+            finally:
+                app.state.in_flight -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    def _multipart_file(body: bytes, content_type: str) -> bytes:
+        # The content of the "file" field of a multipart/form-data body
+        boundary = content_type.split("boundary=")[1].strip('"').encode()
+        for part in body.split(b"--" + boundary):
+            headers, _, content = part.partition(b"\r\n\r\n")
+            if b'name="file"' in headers:
+                return content[:-2] if content.endswith(b"\r\n") else content
+        return b""
+
+    @app.post("/v1/files")
+    async def create_file(request: Request):
+        file_id = f"file-stub{len(app.state.files)}"
+        app.state.files[file_id] = _multipart_file(await request.body(), request.headers["content-type"])
+        return JSONResponse({"id": file_id, "object": "file", "bytes": len(app.state.files[file_id]),
+                             "created_at": int(time.time()), "filename": "batch.jsonl", "purpose": "batch"})
+
+    @app.get("/v1/files/{file_id}/content")
+    async def file_content(file_id: str):
+        if file_id not in app.state.files:
+            return error(404, f"No file {file_id}")
+        return Response(app.state.files[file_id], media_type="application/jsonl")
+
+    async def run_batch(batch: dict):
+        await asyncio.sleep(settings.batch_delay)
+        output, errors = [], []
+        for line in app.state.files[batch["input_file_id"]].decode().splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            if random.random() < settings.error_rate:
+                errors.append({"id": "batch_req_stub", "custom_id": request["custom_id"], "response": {
+                    "status_code": settings.error_status,
+                    "body": {"error": {"message": "Injected error", "type": "stub_error"}}
+                }, "error": None})
+                continue
+            output.append({"id": "batch_req_stub", "custom_id": request["custom_id"], "response": {
+                "status_code": 200,
+                "body": {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "model": request["body"].get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(_completion_tokens(settings))},
+                        "finish_reason": "stop"
+                    }]
+                }
+            }, "error": None})
+        for key, lines in (("output_file_id", output), ("error_file_id", errors)):
+            if lines:
+                file_id = f"file-stub{len(app.state.files)}"
+                app.state.files[file_id] = "".join(json.dumps(line) + "\n" for line in lines).encode()
+                batch[key] = file_id
+        batch["request_counts"] = {"total": len(output) + len(errors), "completed": len(output),
+                                   "failed": len(errors)}
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    @app.post("/v1/batches")
+    async def create_batch(request: Request):
+        body = await request.json()
+        if body.get("input_file_id") not in app.state.files:
+            return error(400, "Unknown input file")
+        batch_id = f"batch_stub{len(app.state.batches)}"
+        batch = app.state.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body.get("endpoint"),
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window"),
+            "status": "in_progress",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0}
+        }
+        # Kept referenced in the batch so the task is not garbage collected
+        batch["_task"] = asyncio.create_task(run_batch(batch))
+        return JSONResponse({key: value for key, value in batch.items() if not key.startswith("_")})
+
+    @app.get("/v1/batches/{batch_id}")
+    async def get_batch(batch_id: str):
+        if batch_id not in app.state.batches:
+            return error(404, f"No batch {batch_id}")
+        return JSONResponse({key: value for key, value in app.state.batches[batch_id].items()
+                             if not key.startswith("_")})
+
+    return app
+
+class StubServer:
+    """Runs the stub app on a local port inside the current event loop, or in a thread when used with `with`"""
+
+    def __init__(self, app: FastAPI, port: int):
+        """
+        Initialize the server
+
+        Args:
+            app: The stub app to serve
+            port: Local port to listen on
+        """
+        # OpenAI clients take the URL with its /v1 path, Anthropic clients without
+        self.root_url = f"http://127.0.0.1:{port}"
+        self.base_url = f"{self.root_url}/v1"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port,
+                                                    log_level="warning", lifespan="off"))
+        self._task = None
+        self._thread = None
+
+    async def __aenter__(self) -> "StubServer":
+        self._task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.server.should_exit = True
+        await self._task
+
+    def __enter__(self) -> "StubServer":
+        # Serves from a thread with its own event loop, so calls blocking the caller's loop still get answers
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.should_exit = True
+        self._thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--max-concurrency", type=int, default=0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-delay", type=float, default=0.0)
+    parser.add_argument("--batch-delay", type=float, default=1.0)
+    parser.add_argument("--prefill-delay", type=float, default=0.0)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024)
+    args = parser.parse_args()
+
+    settings = StubSettings(args.first_token_delay, args.token_delay, args.tokens,
+                            args.error_rate, args.error_status, args.max_concurrency,
+                            args.jitter, args.slow_rate, args.slow_delay, args.batch_delay,
+                            args.prefill_delay, args.cache_min_tokens)
+    uvicorn.run(create_stub_app(settings), host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Load generator for the Telegram webhook endpoint
+
+POSTs synthetic Telegram updates to a webhook and reports accepted updates
+per second and request latency percentiles. Point it at a bot running in
+webhook mode, or use --in-process to serve the webhook app locally with a
+queue consumer in place of the bot so the ingestion path can be measured
+without Telegram credentials.
+
+Example:
+    python benchmarks/webhook_load.py --in-process --updates 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import uvicorn
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.interface.webhook import SECRET_TOKEN_HEADER, create_webhook_app
+
+def synthetic_update(update_id: int, chat_count: int, text: str) -> dict:
+    """Build a minimal private-chat message update"""
+    chat_id = 100000 + update_id % chat_count
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "text": text
+        }
+    }
+
+def percentile(values: list, fraction: float) -> float:
+    """Return the given percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def generate_load(url: str, secret: str, updates: int, concurrency: int,
+                        chat_count: int, text: str) -> dict:
+    """POST synthetic updates with bounded concurrency and collect timings"""
+    latencies = []
+    statuses = {}
+    counter = iter(range(1, updates + 1))
+    headers = {SECRET_TOKEN_HEADER: secret}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+        async def worker():
+            for update_id in counter:
+                payload = synthetic_update(update_id, chat_count, text)
+                started = time.perf_counter()
+                response = await client.post(url, json=payload, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "updates": updates,
+        "elapsed_s": elapsed,
+        "updates_per_second": updates / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "statuses": statuses
+    }
+
+async def run_in_process(args) -> dict:
+    """Serve the webhook app locally and load it"""
+    queue = asyncio.Queue()
+    path = "/telegram/webhook"
+    app = create_webhook_app(queue, secret_token=args.secret, path=path)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port,
+                                           log_level="warning", lifespan="off"))
+    consumed = 0
+
+    async def consume():
+        nonlocal consumed
+        while True:
+            await queue.get()
+            consumed += 1
+            queue.task_done()
+
+    server_task = asyncio.create_task(server.serve())
+    consumer_task = asyncio.create_task(consume())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    try:
+        result = await generate_load(f"http://127.0.0.1:{args.port}{path}", args.secret,
+                                     args.updates, args.concurrency, args.chats, args.text)
+        await queue.join()
+        result["consumed"] = consumed
+        return result
+    finally:
+        consumer_task.cancel()
+        server.should_exit = True
+        await server_task
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Webhook URL of a running bot")
+    parser.add_argument("--secret", default=os.getenv("TELEGRAM_WEBHOOK_SECRET", "load-test-secret"))
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--chats", type=int, default=100, help="Number of distinct synthetic chats")
+    parser.add_argument("--text", default="/start")
+    parser.add_argument("--in-process", action="store_true", help="Serve the webhook app locally")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.in_process:
+        result = asyncio.run(run_in_process(args))
+    elif args.url:
+        result = asyncio.run(generate_load(args.url, args.secret, args.updates,
+                                           args.concurrency, args.chats, args.text))
+    else:
+        parser.error("either --url or --in-process is required")
+
+    for key, value in result.items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,40 @@ Personal Assistant Agent for Multi-Skill Super-Agent
 This module implements the Personal Assistant Agent that handles calendar management,
 email drafting, file search, and summary creation.
 """
-import openai
 from datetime import datetime
+from typing import AsyncIterator
 from loguru import logger
 
 from .base_agent import Agent
-from ..utils.config import OPENAI_API_KEY
+from .chunks import Chunk, TextDelta
+from .prompts import PromptTemplate
+from ..utils.intents import ASSISTANT_INTENTS
+
+# Today's date goes after the request, so the calendar instructions stay the same every day
+CALENDAR_PROMPT = PromptTemplate(
+    "You are a helpful calendar assistant. "
+    "Parse the user's request and respond as if you have added the event to their calendar. "
+    "Include details like date, time, title, and any other relevant information. "
+    "The current date follows the request.",
+    "{query}\n\nCurrent date: {date}"
+)
+EMAIL_PROMPT = PromptTemplate(
+    "You are a helpful email assistant. "
+    "Draft an email based on the user's request. "
+    "Include a subject line, greeting, body, and closing. "
+    "Format the email professionally and appropriately for the context."
+)
+SUMMARY_PROMPT = PromptTemplate(
+    "You are a helpful summarization assistant. "
+    "The user will provide content they want summarized. "
+    "Create a concise but comprehensive summary of the key points. "
+    "Format the summary in a clear and readable way."
+)
+GENERAL_PROMPT = PromptTemplate(
+    "You are a helpful personal assistant. "
+    "Respond to the user's request in a helpful and informative way. "
+    "If you can't fulfill the request directly, suggest alternatives or next steps."
+)
 
 class PersonalAssistantAgent(Agent):
     """Agent for personal assistant tasks"""
@@ -17,197 +45,137 @@ class PersonalAssistantAgent(Agent):
     def __init__(self):
         """Initialize the personal assistant agent"""
         super().__init__("PersonalAssistant")
-        openai.api_key = OPENAI_API_KEY
     
-    async def process(self, query: str) -> str:
+    async def process_stream(self, query: str) -> AsyncIterator[Chunk]:
         """
         Process a personal assistant query
         
         Args:
             query: The personal assistant query
             
-        Returns:
-            The response to the query
+        Yields:
+            Text deltas of the response to the query
         """
-        try:
-            # Pre-process the query
-            processed_query = await self._pre_process(query)
-            
-            # Determine the type of request
-            if "calendar" in processed_query.lower() or "schedule" in processed_query.lower() or "appointment" in processed_query.lower():
-                result = await self._handle_calendar_request(processed_query)
-            elif "email" in processed_query.lower() or "draft" in processed_query.lower() or "write" in processed_query.lower():
-                result = await self._handle_email_request(processed_query)
-            elif "file" in processed_query.lower() or "search" in processed_query.lower() or "find" in processed_query.lower():
-                result = await self._handle_file_request(processed_query)
-            elif "summarize" in processed_query.lower() or "summary" in processed_query.lower():
-                result = await self._handle_summary_request(processed_query)
-            else:
-                result = await self._handle_general_request(processed_query)
-            
-            # Post-process the response
-            return await self._post_process(result)
-        
-        except Exception as e:
-            logger.error(f"Error in personal assistant: {str(e)}")
-            return f"Error in personal assistant: {str(e)}"
+        # Pre-process the query
+        processed_query = await self._pre_process(query)
+        
+        # Determine the type of request
+        handlers = {
+            "calendar": self._handle_calendar_request,
+            "email": self._handle_email_request,
+            "file": self._handle_file_request,
+            "summary": self._handle_summary_request,
+        }
+        intent = ASSISTANT_INTENTS.classify(processed_query)
+        handler = handlers.get(intent, self._handle_general_request)
+        async for delta in handler(processed_query):
+            yield TextDelta(delta)
+    
+    def _error_response(self, error: Exception) -> str:
+        """Message telling the user the request failed"""
+        return f"Error in personal assistant: {str(error)}"
     
-    async def _handle_calendar_request(self, query: str) -> str:
+    async def _handle_calendar_request(self, query: str) -> AsyncIterator[str]:
         """
         Handle a calendar-related request
         
         Args:
             query: The calendar request
             
-        Returns:
-            The response to the request
+        Yields:
+            Text deltas of the response to the request
         """
         # This is a simplified implementation
         # In a real implementation, this would integrate with a calendar API
         logger.info(f"Handling calendar request: {query}")
         
-        # Create a system message for calendar handling
-        system_message = (
-            "You are a helpful calendar assistant. "
-            "Parse the user's request and respond as if you have added the event to their calendar. "
-            "Include details like date, time, title, and any other relevant information. "
-            "Current date: " + datetime.now().strftime("%Y-%m-%d")
-        )
-        
-        # Call OpenAI API to generate response
-        response = await openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": query}
-            ],
+        # Ask the model to generate a response
+        async for delta in self._complete_stream(
+            messages=CALENDAR_PROMPT.messages(query=query, date=datetime.now().strftime("%Y-%m-%d")),
             temperature=0.7,
             max_tokens=500
-        )
-        
-        # Extract the response
-        return response.choices[0].message.content
+        ):
+            yield delta
     
-    async def _handle_email_request(self, query: str) -> str:
+    async def _handle_email_request(self, query: str) -> AsyncIterator[str]:
         """
         Handle an email-related request
         
         Args:
             query: The email request
             
-        Returns:
-            The response to the request
+        Yields:
+            Text deltas of the response to the request
         """
         # This is a simplified implementation
         # In a real implementation, this would integrate with an email API
         logger.info(f"Handling email request: {query}")
         
-        # Create a system message for email drafting
-        system_message = (
-            "You are a helpful email assistant. "
-            "Draft an email based on the user's request. "
-            "Include a subject line, greeting, body, and closing. "
-            "Format the email professionally and appropriately for the context."
-        )
-        
-        # Call OpenAI API to generate response
-        response = await openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": query}
-            ],
+        # Ask the model to generate a response
+        async for delta in self._complete_stream(
+            messages=EMAIL_PROMPT.messages(query=query),
             temperature=0.7,
             max_tokens=1000
-        )
-        
-        # Extract the response
-        return response.choices[0].message.content
+        ):
+            yield delta
     
-    async def _handle_file_request(self, query: str) -> str:
+    async def _handle_file_request(self, query: str) -> AsyncIterator[str]:
         """
         Handle a file-related request
         
         Args:
             query: The file request
             
-        Returns:
-            The response to the request
+        Yields:
+            Text deltas of the response to the request
         """
         # This is a simplified implementation
         # In a real implementation, this would search files on the system
         logger.info(f"Handling file request: {query}")
         
-        return (
+        yield (
             "File search functionality will be implemented in a future version. "
             "This would typically search your files based on keywords and return relevant results."
         )
     
-    async def _handle_summary_request(self, query: str) -> str:
+    async def _handle_summary_request(self, query: str) -> AsyncIterator[str]:
         """
         Handle a summary-related request
         
         Args:
             query: The summary request
             
-        Returns:
-            The response to the request
+        Yields:
+            Text deltas of the response to the request
         """
         # This is a simplified implementation
         # In a real implementation, this would extract text from the provided content
         logger.info(f"Handling summary request: {query}")
         
-        # Create a system message for summarization
-        system_message = (
-            "You are a helpful summarization assistant. "
-            "The user will provide content they want summarized. "
-            "Create a concise but comprehensive summary of the key points. "
-            "Format the summary in a clear and readable way."
-        )
-        
-        # Call OpenAI API to generate response
-        response = await openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": query}
-            ],
+        # Ask the model to generate a response; content over the prompt budget is truncated by _complete_stream
+        async for delta in self._complete_stream(
+            messages=SUMMARY_PROMPT.messages(query=query),
             temperature=0.3,
             max_tokens=800
-        )
-        
-        # Extract the response
-        return response.choices[0].message.content
+        ):
+            yield delta
     
-    async def _handle_general_request(self, query: str) -> str:
+    async def _handle_general_request(self, query: str) -> AsyncIterator[str]:
         """
         Handle a general personal assistant request
         
         Args:
             query: The general request
             
-        Returns:
-            The response to the request
+        Yields:
+            Text deltas of the response to the request
         """
         logger.info(f"Handling general request: {query}")
         
-        # Create a system message for general assistance
-        system_message = (
-            "You are a helpful personal assistant. "
-            "Respond to the user's request in a helpful and informative way. "
-            "If you can't fulfill the request directly, suggest alternatives or next steps."
-        )
-        
-        # Call OpenAI API to generate response
-        response = await openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": query}
-            ],
+        # Ask the model to generate a response
+        async for delta in self._complete_stream(
+            messages=GENERAL_PROMPT.messages(query=query),
             temperature=0.7,
             max_tokens=800
-        )
-        
-        # Extract the response
-        return response.choices[0].message.content
+        ):
+            yield delta
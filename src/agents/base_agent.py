@@ -4,33 +4,321 @@ Base Agent class for Multi-Skill Super-Agent
 This module defines the base Agent class that all specific agent implementations will inherit from.
 """
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Iterable, Optional
+
+import openai
 from loguru import logger
 
+from .batch import BatchRun
+from .chunks import Chunk, collect_text
+from .clients import get_openai_client
+from .context_budget import ContextBudget
+from .model_router import get_model_router
+from ..orchestration.deadline import call_timeout
+from ..orchestration.provider_guard import ProviderUnavailable, get_provider_guards
+from ..persistence.database import DatabaseManager
+from ..persistence.response_cache import get_response_cache, request_key
+from ..utils.config import BATCH_CONCURRENCY, BATCH_POLL_INTERVAL, HEDGED_AGENTS, PROVIDER_DEGRADED_SIMILARITY
+
+# Starts answers taken from a looser match while the model provider is unavailable
+DEGRADED_NOTICE = "The model provider is unavailable right now, so this is the answer to a similar earlier request."
+
 class Agent(ABC):
     """Base class for all agent implementations"""
     
-    def __init__(self, name: str):
+    def __init__(self, name: str, client: Optional[openai.AsyncOpenAI] = None):
         """
         Initialize the agent
         
         Args:
             name: The name of the agent
+            client: OpenAI client for the agent's direct API calls, the shared pooled one if not given
         """
         self.name = name
+        self._client = client
+        # Chat completions go to the provider and model the router picks for the agent
+        self.model_router = get_model_router()
+        # Other calls to model providers are limited and failed fast through these guards
+        self.provider_guards = get_provider_guards()
+        # Completions of latency-critical agents are duplicated when slow, see ProviderGuard.run
+        self.hedge = name in [agent.strip() for agent in HEDGED_AGENTS.split(",")]
+        # Chat completions requested through _complete and _complete_stream are cached here
+        self.response_cache = get_response_cache()
+        # Agents whose answers suit paraphrased queries set this to get_semantic_cache()
+        self.semantic_cache = None
         logger.info(f"{name} agent initialized")
     
     @abstractmethod
+    def process_stream(self, query: str) -> AsyncIterator[Chunk]:
+        """
+        Process a query, yielding the response as it is produced
+        
+        Args:
+            query: The query to process
+            
+        Yields:
+            Text deltas, progress notes and artifacts of the response
+            
+        Raises:
+            Exception: If the query could not be answered; the response may be partly yielded by then
+        """
+        pass
+    
     async def process(self, query: str) -> str:
         """
-        Process a query and return a response
+        Process a query and return the whole response
         
         Args:
             query: The query to process
             
         Returns:
-            The response to the query
+            The text of the response, or the agent's error response if processing failed
         """
-        pass
+        try:
+            return await collect_text(self.process_stream(query))
+        except Exception as e:
+            logger.error(f"Error in {self.name} agent: {str(e)}")
+            return self._error_response(e)
+    
+    def _error_response(self, error: Exception) -> str:
+        """
+        Response to a query that failed
+        
+        Args:
+            error: Why it failed
+            
+        Returns:
+            The response telling the user
+        """
+        return f"Error processing request: {str(error)}"
+    
+    def process_batch(self, queries: Iterable[str], mode: str = "live", concurrency: int = BATCH_CONCURRENCY,
+                      batch_id: Optional[int] = None, db_manager: Optional[DatabaseManager] = None,
+                      poll_interval: float = BATCH_POLL_INTERVAL) -> BatchRun:
+        """
+        Process many queries offline, e.g. `async for result in agent.process_batch(queries)`
+        
+        Args:
+            queries: The queries, read as they are needed
+            mode: "live" to process them through the live API, concurrency at a time, or "provider"
+                to submit them to the provider's batch endpoint, for agents with a _completion_request
+            concurrency: Queries processed at once in live mode
+            batch_id: ID of an earlier run to resume, given the same queries; its queries that succeeded are skipped
+            db_manager: Database manager progress is kept with in task history; None to keep none
+            poll_interval: Seconds between checks of a provider batch
+        
+        Returns:
+            The batch, whose results are yielded as they finish when iterated over; its ID and throughput
+            are in batch_id and stats
+        """
+        return BatchRun(
+            self, queries, mode=mode, concurrency=concurrency, batch_id=batch_id, db_manager=db_manager,
+            poll_interval=poll_interval
+        )
+    
+    async def _completion_request(self, query: str) -> Optional[dict]:
+        """
+        The single chat completion request answering a query, for provider batches
+        
+        Args:
+            query: The query
+        
+        Returns:
+            messages, temperature and max_tokens of the request, or None if the agent answers otherwise
+        """
+        return None
+    
+    @property
+    def model_params(self) -> dict:
+        """
+        Model settings the response depends on besides the query
+        
+        Returns:
+            Dictionary of setting name to value
+        """
+        return {}
+    
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """OpenAI client for direct API calls; by default the one whose connection pool all agents share"""
+        if self._client is None:
+            self._client = get_openai_client()
+        return self._client
+    
+    @property
+    def model_tier(self) -> int:
+        """Lowest tier of model the agent's chat completions are routed to"""
+        return self.model_router.tier(self.name)
+    
+    async def _complete(self, **params) -> str:
+        """
+        Request a chat completion through the model router, answering from the response cache when possible
+        
+        Args:
+            **params: messages, temperature and max_tokens of the chat completion request
+            
+        Returns:
+            The text of the completion
+        """
+        params = self._fit_request(params)
+        key = self._cache_key(params)
+        if key is not None:
+            cached = await self.response_cache.get(key)
+            if cached is not None:
+                return cached
+        
+        try:
+            content = await self.model_router.complete(self.name, hedge=self.hedge, **params)
+        except ProviderUnavailable:
+            stale = await self._stale_response(key)
+            if stale is None:
+                raise
+            return stale
+        if key is not None:
+            await self.response_cache.put(self.name, key, content)
+        return content
+    
+    async def _complete_stream(self, **params) -> AsyncIterator[str]:
+        """
+        Stream a chat completion through the model router, answering from the response cache when possible
+        
+        Args:
+            **params: messages, temperature and max_tokens of the chat completion request
+            
+        Yields:
+            Text deltas of the completion; a cached completion is yielded at once
+        """
+        if self.hedge:
+            # Hedging races whole completions, so hedged agents get theirs in one piece
+            yield await self._complete(**params)
+            return
+        
+        params = self._fit_request(params)
+        key = self._cache_key(params)
+        if key is not None:
+            cached = await self.response_cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        
+        parts = []
+        try:
+            async for delta in self.model_router.stream(self.name, **params):
+                parts.append(delta)
+                yield delta
+        except ProviderUnavailable:
+            # Raised before the first delta, so the stale response is the whole answer
+            stale = await self._stale_response(key)
+            if stale is None:
+                raise
+            yield stale
+            return
+        # Only reached when the stream was read to the end
+        if key is not None:
+            await self.response_cache.put(self.name, key, "".join(parts))
+    
+    def _context_budget(self, max_tokens: int) -> ContextBudget:
+        """
+        Budget for the parts of a prompt, to fill in priority order when building it
+        
+        Args:
+            max_tokens: Most tokens of the completion the prompt is for
+            
+        Returns:
+            Budget of the tokens the prompt may take with any model the agent may be routed to
+        """
+        return ContextBudget(self.name, self.model_router.prompt_budget(self.name, max_tokens))
+    
+    def _fit_request(self, params: dict) -> dict:
+        """
+        Fit the messages of a completion request to the agent's prompt budget
+        
+        Args:
+            params: messages, temperature and max_tokens of the request
+            
+        Returns:
+            The request, with the last messages truncated if the prompt was over budget
+            
+        Raises:
+            PromptTooLarge: The budget can't hold part of every message
+        """
+        budget = self._context_budget(params.get('max_tokens', 1000))
+        return {**params, 'messages': budget.fit_messages(params['messages'])}
+    
+    async def _stale_response(self, key: Optional[str]) -> Optional[str]:
+        """
+        Find an expired cached response to the request while no model is available
+        
+        Args:
+            key: Cache key of the request
+            
+        Returns:
+            The expired response or None
+        """
+        if key is None:
+            return None
+        stale = await self.response_cache.get(key, allow_expired=True)
+        if stale is not None:
+            self.model_router.stats.stale_answers += 1
+            logger.warning(f"No model is available, answering {self.name} from an expired cached response")
+        return stale
+    
+    async def _degraded_answer(self, query: str) -> Optional[str]:
+        """
+        Find the answer to a loosely similar earlier query while the provider is unavailable
+        
+        Args:
+            query: The query
+            
+        Returns:
+            The earlier answer, to be shown with DEGRADED_NOTICE, or None
+        """
+        if self.semantic_cache is None:
+            return None
+        answer = await self.semantic_cache.lookup(
+            self.name, query, threshold=PROVIDER_DEGRADED_SIMILARITY, allow_expired=True
+        )
+        if answer is not None:
+            logger.warning(f"Model provider unavailable, answering {self.name} from a similar earlier query")
+        return answer
+    
+    async def _semantic_lookup(self, query: str) -> Optional[str]:
+        """
+        Find the answer to a similar earlier query in the semantic cache
+        
+        Args:
+            query: The query
+            
+        Returns:
+            The earlier answer or None
+        """
+        if self.semantic_cache is None:
+            return None
+        return await self.semantic_cache.lookup(self.name, query)
+    
+    async def _semantic_store(self, query: str, answer: str):
+        """
+        Make an answer available to similar later queries
+        
+        Args:
+            query: The query
+            answer: The answer to it
+        """
+        if self.semantic_cache is not None:
+            await self.semantic_cache.store(self.name, query, answer)
+    
+    @staticmethod
+    def _request_options() -> dict:
+        """Options of a provider request: its timeout is the budget left until the request deadline, if any"""
+        timeout = call_timeout()
+        return {} if timeout is None else {'timeout': timeout}
+    
+    def _cache_key(self, params: dict) -> Optional[str]:
+        """Cache key of a completion request, None if its response is not cached"""
+        if self.response_cache is None or not self.response_cache.cacheable(self.name, params):
+            return None
+        # Any model of the agent's tier may answer, so the tier stands in for the model
+        return request_key({**params, 'tier': self.model_tier})
     
     async def _pre_process(self, query: str) -> str:
         """
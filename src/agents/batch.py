@@ -0,0 +1,387 @@
+"""
+Batch Processing for Multi-Skill Super-Agent
+
+This module runs an agent over many queries for offline workloads, such as
+pre-generating code snippets or nightly summaries, in one of two modes:
+
+- live: queries take the agent's usual path against the live API, a bounded
+  number at a time
+- provider: the agent's completion requests are written to a JSONL file and
+  submitted to the provider's asynchronous batch endpoint, which costs less
+  but may take hours; its JSONL output is read back line by line
+
+Queries are taken from the iterable as they are needed and results are
+yielded as they finish, so responses are never all held in memory. Progress
+is kept in task history: the batch has a task record and each finished query
+one under it. Running a batch again with its ID skips the queries that
+succeeded and picks up a provider batch that was already submitted.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from .chunks import collect_text
+from .context_budget import PromptTooLarge
+from .model_router import estimate_tokens
+from ..persistence.database import DatabaseManager
+
+BATCH_MODES = ("live", "provider")
+# Statuses of a provider batch that has ended
+BATCH_ENDED = ("completed", "failed", "expired", "cancelled")
+
+class BatchFailed(Exception):
+    """Raised when a provider batch ended without completing"""
+
+class BatchResult:
+    """Outcome of one query of a batch"""
+
+    __slots__ = ("index", "query", "result", "error")
+
+    def __init__(self, index: int, query: str, result: Optional[str] = None, error: Optional[str] = None):
+        """
+        Initialize the outcome
+
+        Args:
+            index: Position of the query in the batch
+            query: The query
+            result: Text of the response, if the query succeeded
+            error: Why the query failed, if it did
+        """
+        self.index = index
+        self.query = query
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        """Whether the query succeeded"""
+        return self.error is None
+
+class BatchStats:
+    """Counters and throughput of one run of a batch"""
+
+    def __init__(self, mode: str):
+        """Initialize the counters"""
+        self.mode = mode
+        self.succeeded = 0
+        self.failed = 0
+        self.resumed = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def items(self) -> int:
+        """Queries finished in this run"""
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds the run took, or has taken so far"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def items_per_second(self) -> float:
+        """Queries finished per second"""
+        return self.items / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'mode': self.mode,
+            'items': self.items,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'resumed': self.resumed,
+            'elapsed_s': self.elapsed,
+            'items_per_second': self.items_per_second
+        }
+
+class BatchRun:
+    """A batch of queries for an agent; iterating over it runs the batch and yields results as they finish"""
+
+    def __init__(self, agent, queries: Iterable[str], mode: str = "live", concurrency: int = 8,
+                 batch_id: Optional[int] = None, db_manager: Optional[DatabaseManager] = None,
+                 poll_interval: float = 30.0, checkpoint_items: int = 50):
+        """
+        Initialize the batch
+
+        Args:
+            agent: The agent answering the queries
+            queries: The queries; when resuming, the same queries in the same order
+            mode: "live" or "provider"
+            concurrency: Queries processed at once in live mode
+            batch_id: ID of the task record of an earlier run to resume
+            db_manager: Database manager progress is kept with; None to keep none
+            poll_interval: Seconds between checks of a provider batch
+            checkpoint_items: Finished queries written to task history at a time
+        """
+        if mode not in BATCH_MODES:
+            raise ValueError(f"Unknown batch mode: {mode}")
+        self.agent = agent
+        self.queries = queries
+        self.mode = mode
+        self.concurrency = max(concurrency, 1)
+        self.batch_id = batch_id
+        self.db_manager = db_manager
+        self.poll_interval = poll_interval
+        self.checkpoint_items = checkpoint_items
+        self.stats = BatchStats(mode)
+        self._context = {}
+        self._finished: List[dict] = []
+
+    async def __aiter__(self) -> AsyncIterator[BatchResult]:
+        done = await self._start()
+        self.stats.resumed = len(done)
+        self.stats.started = time.monotonic()
+        pending = ((index, query) for index, query in enumerate(self.queries) if index not in done)
+        results = self._run_live(pending) if self.mode == "live" else self._run_provider(pending)
+        try:
+            async for result in results:
+                await self._record(result)
+                yield result
+        except (Exception, asyncio.CancelledError) as e:
+            # Otherwise the task record would show the batch running forever; a consumer that stops
+            # iterating early leaves it running, to be resumed
+            await self._finish("error", str(e) or type(e).__name__)
+            raise
+        finally:
+            await results.aclose()
+            self.stats.finished = time.monotonic()
+            await self._checkpoint()
+        await self._finish("success")
+
+    async def collect(self) -> List[BatchResult]:
+        """
+        Run the batch to its end
+
+        Returns:
+            The results of the queries run, in the order of the queries
+        """
+        return sorted([result async for result in self], key=lambda result: result.index)
+
+    async def _start(self) -> Set[int]:
+        """
+        Create the task record of the batch, or load the progress of an earlier run
+
+        Returns:
+            Positions of the queries that succeeded before
+        """
+        if self.db_manager is None:
+            return set()
+        if self.batch_id is None:
+            self._context = {'agent': self.agent.name, 'mode': self.mode}
+            record = await asyncio.to_thread(
+                self.db_manager.add_task_record, "batch", f"{self.agent.name} batch", status='running',
+                context=self._context
+            )
+            self.batch_id = record['id']
+            return set()
+
+        record = await asyncio.to_thread(self.db_manager.get_task_record, self.batch_id)
+        if record is None:
+            raise ValueError(f"No batch with ID {self.batch_id}")
+        self._context = {**(record['context'] or {}), 'mode': self.mode}
+        await asyncio.to_thread(
+            self.db_manager.update_task_record, self.batch_id, status='running', context=self._context
+        )
+        # Queries that failed are tried again
+        items = await asyncio.to_thread(self.db_manager.get_child_tasks, self.batch_id, 'success')
+        logger.info(f"Resuming batch {self.batch_id} of {self.agent.name}: {len(items)} queries already done")
+        return {item['context']['index'] for item in items}
+
+    async def _record(self, result: BatchResult):
+        """Count a finished query and keep it for the next checkpoint"""
+        if result.ok:
+            self.stats.succeeded += 1
+        else:
+            self.stats.failed += 1
+        if self.db_manager is None:
+            return
+        self._finished.append({
+            'task_type': "batch_item",
+            'query': result.query,
+            'result': result.result if result.ok else result.error,
+            'status': 'success' if result.ok else 'error',
+            'context': {'index': result.index},
+            'parent_id': self.batch_id,
+            'completed_at': datetime.utcnow()
+        })
+        if len(self._finished) >= self.checkpoint_items:
+            await self._checkpoint()
+
+    async def _checkpoint(self):
+        """Write the queries finished since the last checkpoint to task history"""
+        if self.db_manager is None or not self._finished:
+            return
+        records, self._finished = self._finished, []
+        try:
+            await asyncio.to_thread(self.db_manager.add_task_records, records)
+        except Exception as e:
+            # Kept for the next checkpoint; if none comes, the queries run again on resume
+            logger.error(f"Error saving progress of batch {self.batch_id}: {str(e)}")
+            self._finished[:0] = records
+
+    async def _save_context(self):
+        """Save what resuming the batch needs, such as the ID of a submitted provider batch"""
+        if self.db_manager is not None:
+            await asyncio.to_thread(self.db_manager.update_task_record, self.batch_id, context=self._context)
+
+    async def _finish(self, status: str, error: Optional[str] = None):
+        """Record the end of the run with its throughput"""
+        stats = self.stats.to_dict()
+        name = f"Batch {self.batch_id}" if self.batch_id is not None else "Batch"
+        logger.info(
+            f"{name} of {self.agent.name} ({self.mode}) ended {status}: {self.stats.succeeded} "
+            f"succeeded, {self.stats.failed} failed in {stats['elapsed_s']:.1f}s "
+            f"({stats['items_per_second']:.2f} queries/s)"
+        )
+        if self.db_manager is not None:
+            await asyncio.to_thread(
+                self.db_manager.update_task_record, self.batch_id, result=error or json.dumps(stats), status=status
+            )
+
+    async def _run_live(self, pending: Iterator[Tuple[int, str]]) -> AsyncIterator[BatchResult]:
+        """Process the queries through the agent, a bounded number at a time"""
+        # Bounded, so workers wait while the consumer is behind
+        results = asyncio.Queue(self.concurrency)
+
+        async def work():
+            # Workers share the iterator, so queries are read only as a worker is free
+            for index, query in pending:
+                await results.put(await self._process(index, query))
+
+        async def close_when_done():
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                await results.put(None)
+
+        workers = [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        closer = asyncio.create_task(close_when_done())
+        try:
+            while True:
+                result = await results.get()
+                if result is None:
+                    break
+                yield result
+            await closer
+        finally:
+            for task in (*workers, closer):
+                task.cancel()
+            await asyncio.gather(*workers, closer, return_exceptions=True)
+
+    async def _process(self, index: int, query: str) -> BatchResult:
+        """Process one query, turning its failure into a failed result"""
+        try:
+            return BatchResult(index, query, await collect_text(self.agent.process_stream(query)))
+        except Exception as e:
+            logger.error(f"Error in query {index} of batch {self.batch_id}: {str(e)}")
+            return BatchResult(index, query, error=str(e))
+
+    async def _run_provider(self, pending: Iterator[Tuple[int, str]]) -> AsyncIterator[BatchResult]:
+        """Submit the queries to the provider's batch endpoint and read its results once it ended"""
+        router = self.agent.model_router
+        submitted = self._context.get('provider_batch')
+        if submitted is None:
+            queries, rejected = {}, []
+            path, option = await self._write_requests(pending, queries, rejected)
+            for result in rejected:
+                yield result
+            if not queries:
+                return
+            provider = router.providers[option.provider]
+            try:
+                provider_batch_id = await provider.submit_batch(path)
+            finally:
+                os.remove(path)
+            self._context['provider_batch'] = {'id': provider_batch_id, 'provider': option.provider}
+            await self._save_context()
+            logger.info(
+                f"Submitted {len(queries)} queries of {self.agent.name} to {option.name} as batch {provider_batch_id}"
+            )
+        else:
+            # The submitted batch holds the queries that had not succeeded when it was submitted
+            queries = dict(pending)
+            provider = router.providers[submitted['provider']]
+            provider_batch_id = submitted['id']
+
+        batch = await self._wait(provider, provider_batch_id)
+        async for custom_id, text, error in provider.batch_results(batch):
+            query = queries.pop(int(custom_id), None)
+            if query is not None:
+                yield BatchResult(int(custom_id), query, text, error)
+
+        # Queries without a result are submitted again when the batch is run again
+        del self._context['provider_batch']
+        await self._save_context()
+        if batch['status'] != "completed":
+            raise BatchFailed(
+                f"Provider batch {provider_batch_id} ended {batch['status']} with {len(queries)} queries unanswered"
+            )
+        for index, query in queries.items():
+            yield BatchResult(index, query, error="No result in the provider's batch output")
+
+    async def _write_requests(self, pending: Iterator[Tuple[int, str]], queries: dict,
+                              rejected: List[BatchResult]) -> Tuple[str, Optional[object]]:
+        """
+        Write the completion requests of the queries to a JSONL file
+
+        Args:
+            pending: The queries to request, with their positions
+            queries: Filled with the queries written, by position
+            rejected: Filled with failed results of the queries whose prompt doesn't fit the budget
+
+        Returns:
+            Path of the file and the model the requests are for
+        """
+        router = self.agent.model_router
+        option = None
+        file = tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8")
+        try:
+            with file:
+                for index, query in pending:
+                    request = await self.agent._completion_request(query)
+                    if request is None:
+                        raise ValueError(f"The {self.agent.name} agent can't be run through a provider batch")
+                    try:
+                        request = self.agent._fit_request(request)
+                    except PromptTooLarge as e:
+                        # Fails on its own, as it would in live mode
+                        rejected.append(BatchResult(index, query, error=str(e)))
+                        continue
+                    if option is None:
+                        option = router.batch_option(
+                            self.agent.name, estimate_tokens(request['messages']), request['max_tokens']
+                        )
+                        if option is None:
+                            raise ValueError(f"No model of {self.agent.name}'s tier has a batch endpoint")
+                    line = router.providers[option.provider].batch_request(str(index), option.model, **request)
+                    file.write(json.dumps(line) + "\n")
+                    queries[index] = query
+        except BaseException:
+            os.remove(file.name)
+            raise
+        if not queries:
+            os.remove(file.name)
+        return file.name, option
+
+    async def _wait(self, provider, provider_batch_id: str) -> dict:
+        """Check a provider batch every poll interval until it ended"""
+        while True:
+            batch = await provider.get_batch(provider_batch_id)
+            if batch['status'] in BATCH_ENDED:
+                return batch
+            counts = batch.get('request_counts') or {}
+            logger.debug(
+                f"Provider batch {provider_batch_id} {batch['status']}: "
+                f"{counts.get('completed', 0)} of {counts.get('total', '?')} requests done"
+            )
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,80 @@
+"""
+Response Chunks for Multi-Skill Super-Agent
+
+Agents stream their responses as typed chunks, so interfaces and queues can
+forward each part as it is produced instead of waiting for the whole
+response: text deltas of the answer, notes on the agent's progress, and
+artifacts such as a generated image. The text of a response is the text of
+its chunks in order; progress notes add none.
+"""
+from typing import AsyncIterable, Optional
+
+class Chunk:
+    """Part of a streamed agent response"""
+
+    __slots__ = ()
+    kind = "chunk"
+
+    @property
+    def text(self) -> str:
+        """What the chunk adds to the text of the response"""
+        return ""
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+class TextDelta(Chunk):
+    """The next piece of the response text"""
+
+    __slots__ = ("delta",)
+    kind = "text"
+
+    def __init__(self, delta: str):
+        self.delta = delta
+
+    @property
+    def text(self) -> str:
+        return self.delta
+
+class Progress(Chunk):
+    """What the agent is doing before its answer is ready, e.g. searching the web"""
+
+    __slots__ = ("message",)
+    kind = "progress"
+
+    def __init__(self, message: str):
+        self.message = message
+
+class Artifact(Chunk):
+    """A result that is not text, such as a generated image, referenced by URL"""
+
+    __slots__ = ("url", "media_type", "caption")
+    kind = "artifact"
+
+    def __init__(self, url: str, media_type: str, caption: Optional[str] = None):
+        self.url = url
+        self.media_type = media_type
+        self.caption = caption
+
+    @property
+    def text(self) -> str:
+        # Text-only consumers get the URL, as agents returned before they streamed
+        return self.url
+
+async def collect_text(chunks: AsyncIterable[Chunk]) -> str:
+    """
+    Read a chunk stream to its end
+
+    Args:
+        chunks: The stream
+
+    Returns:
+        The text of the response
+    """
+    return "".join([chunk.text async for chunk in chunks])
@@ -0,0 +1,107 @@
+"""
+Model API Clients for Multi-Skill Super-Agent
+
+This module creates the HTTP clients model providers are called through.
+Each provider API gets one async client whose connection pool is shared by
+every agent, so requests reuse warm keep-alive connections instead of paying
+for a TCP and TLS handshake each, and the pool bounds the connections opened
+to a provider. HTTP/2 multiplexes concurrent requests over one connection
+when enabled and the h2 package is installed.
+"""
+from typing import Dict, Optional
+
+import httpx
+import openai
+from loguru import logger
+
+from ..utils.config import (
+    MODEL_HTTP_MAX_CONNECTIONS,
+    MODEL_HTTP_MAX_KEEPALIVE,
+    MODEL_HTTP_KEEPALIVE_EXPIRY,
+    MODEL_HTTP_CONNECT_TIMEOUT,
+    MODEL_HTTP_READ_TIMEOUT,
+    MODEL_HTTP2,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+)
+
+def http2_available() -> bool:
+    """Check whether the h2 package HTTP/2 needs is installed"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def client_timeout() -> httpx.Timeout:
+    """
+    Get the timeouts of model API requests
+
+    Returns:
+        Timeout allowing MODEL_HTTP_CONNECT_TIMEOUT seconds to connect and MODEL_HTTP_READ_TIMEOUT to respond
+    """
+    return httpx.Timeout(MODEL_HTTP_READ_TIMEOUT, connect=MODEL_HTTP_CONNECT_TIMEOUT)
+
+def create_http_client(max_connections: int = MODEL_HTTP_MAX_CONNECTIONS,
+                       max_keepalive: int = MODEL_HTTP_MAX_KEEPALIVE,
+                       keepalive_expiry: float = MODEL_HTTP_KEEPALIVE_EXPIRY,
+                       http2: bool = MODEL_HTTP2) -> httpx.AsyncClient:
+    """
+    Create an async HTTP client with a connection pool tuned for model APIs
+
+    Args:
+        max_connections: Most connections open at once; further requests wait for one
+        max_keepalive: Most idle connections kept open for reuse
+        keepalive_expiry: Seconds an idle connection is kept open
+        http2: Whether to negotiate HTTP/2, used only if the h2 package is installed
+
+    Returns:
+        The client
+    """
+    if http2 and not http2_available():
+        logger.warning("HTTP/2 needs the h2 package (pip install httpx[http2]), using HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=client_timeout(),
+        http2=http2
+    )
+
+def create_openai_client(api_key: Optional[str], base_url: Optional[str] = None,
+                         http_client: Optional[httpx.AsyncClient] = None) -> openai.AsyncOpenAI:
+    """
+    Create an AsyncOpenAI client on a tuned connection pool
+
+    Args:
+        api_key: API key of the OpenAI or OpenAI-compatible API
+        base_url: Base URL of the API, None for OpenAI's
+        http_client: Client whose pool to use, a new one if not given
+
+    Returns:
+        The client
+    """
+    # The OpenAI client applies its own timeout to every request, overriding the HTTP client's
+    return openai.AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=client_timeout(),
+        http_client=http_client or create_http_client()
+    )
+
+_shared_clients: Dict[str, openai.AsyncOpenAI] = {}
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """
+    Get the OpenAI client shared by all agents, creating it on first use
+
+    Returns:
+        The shared client
+    """
+    client = _shared_clients.get("openai")
+    if client is None:
+        client = _shared_clients["openai"] = create_openai_client(OPENAI_API_KEY, OPENAI_BASE_URL)
+    return client
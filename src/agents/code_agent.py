@@ -2,83 +2,92 @@
 Code Generation Agent for Multi-Skill Super-Agent
 
 This module implements the Code Generation Agent that generates Python code
-based on user requests using the OpenAI API.
+based on user requests using the chat model the model router picks.
 """
-import openai
-from loguru import logger
+from typing import AsyncIterator
 
-from .base_agent import Agent
-from ..utils.config import OPENAI_API_KEY
+from .base_agent import DEGRADED_NOTICE, Agent
+from .chunks import Chunk, TextDelta
+from .prompts import PromptTemplate
+from ..orchestration.provider_guard import ProviderUnavailable
+from ..persistence.semantic_cache import get_semantic_cache
+
+# The requirements are part of the static instructions, so the user message is just the request
+CODE_PROMPT = PromptTemplate(
+    "You are an expert Python programmer. "
+    "Generate clean, efficient, and well-documented Python code "
+    "based on the user's request. Include comments explaining key parts "
+    "of the code. Only respond with code, no explanations outside of code comments.\n\n"
+    "Requirements:\n"
+    "- Include proper error handling\n"
+    "- Use type hints\n"
+    "- Follow PEP 8 style guidelines\n"
+    "- Include docstrings for functions and classes\n"
+    "- Make the code modular and reusable"
+)
 
 class CodeGenerationAgent(Agent):
-    """Agent for generating code using OpenAI API"""
+    """Agent for generating code using a chat model"""
     
     def __init__(self):
         """Initialize the code generation agent"""
         super().__init__("CodeGeneration")
-        openai.api_key = OPENAI_API_KEY
+        # Lower temperature for more deterministic code generation
+        self.temperature = 0.2
+        self.max_tokens = 2000
+        self.semantic_cache = get_semantic_cache()
+    
+    @property
+    def model_params(self) -> dict:
+        """Model settings the generated code depends on"""
+        return {'tier': self.model_tier, 'temperature': self.temperature, 'max_tokens': self.max_tokens}
     
-    async def process(self, query: str) -> str:
+    async def process_stream(self, query: str) -> AsyncIterator[Chunk]:
         """
-        Process a code generation query and return generated code
+        Process a code generation query, yielding the code as it is generated
         
         Args:
             query: The code generation query
             
-        Returns:
-            The generated code
+        Yields:
+            Text deltas of the generated code
         """
-        try:
-            # Pre-process the query
-            processed_query = await self._pre_process(query)
-            
-            # Create a system message for code generation
-            system_message = (
-                "You are an expert Python programmer. "
-                "Generate clean, efficient, and well-documented Python code "
-                "based on the user's request. Include comments explaining key parts "
-                "of the code. Only respond with code, no explanations outside of code comments."
-            )
-            
-            # Call OpenAI API to generate code
-            response = await openai.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": processed_query}
-                ],
-                temperature=0.2,  # Lower temperature for more deterministic code generation
-                max_tokens=2000
-            )
-            
-            # Extract the generated code
-            generated_code = response.choices[0].message.content
-            
-            # Post-process the response
-            return await self._post_process(generated_code)
+        # Answer paraphrases of earlier queries with the earlier code
+        cached = await self._semantic_lookup(query)
+        if cached is not None:
+            yield TextDelta(cached)
+            return
         
-        except Exception as e:
-            logger.error(f"Error in code generation: {str(e)}")
-            return f"# Error generating code: {str(e)}"
+        # Ask the model to generate code
+        parts = []
+        try:
+            async for delta in self._complete_stream(**await self._completion_request(query)):
+                parts.append(delta)
+                yield TextDelta(delta)
+        except ProviderUnavailable:
+            answer = await self._degraded_answer(query)
+            if answer is None:
+                raise
+            yield TextDelta(f"# {DEGRADED_NOTICE}\n{answer}")
+            return
+        await self._semantic_store(query, "".join(parts))
     
-    async def _pre_process(self, query: str) -> str:
+    async def _completion_request(self, query: str) -> dict:
         """
-        Pre-process a code generation query
+        The chat completion request generating the code for a query
         
         Args:
-            query: The query to pre-process
+            query: The code generation query
             
         Returns:
-            The pre-processed query
+            messages, temperature and max_tokens of the request
         """
-        # Add specific instructions to improve code generation
-        enhanced_query = (
-            f"Generate Python code for the following request: {query}\n\n"
-            f"Requirements:\n"
-            f"- Include proper error handling\n"
-            f"- Use type hints\n"
-            f"- Follow PEP 8 style guidelines\n"
-            f"- Include docstrings for functions and classes\n"
-            f"- Make the code modular and reusable"
-        )
-        return enhanced_query
+        return {
+            'messages': CODE_PROMPT.messages(query=await self._pre_process(query)),
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens
+        }
+    
+    def _error_response(self, error: Exception) -> str:
+        """Code comment telling the user generation failed"""
+        return f"# Error generating code: {str(error)}"
@@ -0,0 +1,306 @@
+"""
+Prompt Context Budgeting for Multi-Skill Super-Agent
+
+Prompts are built from parts of any size, such as scraped pages or text a
+user wants summarized. This module fits them into a token budget: the
+smallest context window of the models an agent may be routed to, minus the
+max_tokens of its completion, or the agent's own lower ceiling. Parts are
+kept in priority order; the first that does not fit whole is truncated and
+the rest are dropped. Every completion request agents make is fitted this
+way, and the tokens trimmed are counted per agent. The last message, which
+holds the query, always keeps part of the budget, and a prompt that would
+have a message emptied is refused rather than sent.
+
+Tokens are counted with tiktoken's cl100k_base encoding when it is installed
+and loads (exact for OpenAI's models, close for other providers'), else
+estimated at four characters per token. Counts are cached by text, so a part is
+tokenized once however often prompts built from it are checked.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+TOKENIZER_ENCODING = "cl100k_base"
+# Characters per token where no tokenizer is installed
+CHARACTERS_PER_TOKEN = 4
+# Tokens each message adds to a prompt besides its content
+MESSAGE_OVERHEAD = 4
+# Ends text that was cut to fit a budget, so the model knows there was more
+TRUNCATION_MARKER = "\n[truncated]"
+# Tokens kept for the last message of a prompt, which holds the query, however long the messages before it
+MIN_LAST_MESSAGE_TOKENS = 256
+
+class PromptTooLarge(ValueError):
+    """Raised when a prompt can't be fitted to its budget without emptying one of its messages"""
+
+def load_encoding():
+    """
+    Load the tokenizer, if the tiktoken package is installed and its encoding can be loaded
+
+    Returns:
+        The tiktoken encoding or None
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("Token counts are estimated, install tiktoken to count them exactly")
+        return None
+    try:
+        # Downloads the encoding on first use, which fails on hosts without access to it
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.error(f"Token counts are estimated, the {TOKENIZER_ENCODING} encoding failed to load: {str(e)}")
+        return None
+
+class TokenCounter:
+    """Counts and truncates text by tokens, caching the counts of recent texts"""
+
+    def __init__(self, max_entries: int = 4096, encoding=None):
+        """
+        Initialize the counter
+
+        Args:
+            max_entries: Most counts kept, the least recently used dropped first
+            encoding: tiktoken encoding; None to estimate counts from characters
+        """
+        self.max_entries = max_entries
+        self.encoding = encoding
+        # Keyed by a digest of the text, so the cache doesn't keep large texts alive
+        self._counts: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens of a text
+
+        Args:
+            text: The text
+
+        Returns:
+            Number of tokens
+        """
+        # Short texts cost less to count than to hash
+        if len(text) < 64:
+            return self._count(text)
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        tokens = self._counts.get(key)
+        if tokens is not None:
+            self.hits += 1
+            self._counts.move_to_end(key)
+            return tokens
+        self.misses += 1
+        tokens = self._counts[key] = self._count(text)
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return tokens
+
+    def truncate(self, text: str, tokens: int) -> str:
+        """
+        Cut a text to about a number of tokens, marking where it was cut
+
+        Args:
+            text: The text
+            tokens: Most tokens of the result, marker included
+
+        Returns:
+            The text, its beginning followed by TRUNCATION_MARKER, or "" if not even the marker fits
+        """
+        if self.count(text) <= tokens:
+            return text
+        tokens -= self._count(TRUNCATION_MARKER)
+        if tokens <= 0:
+            return ""
+        if self.encoding is None:
+            return text[:tokens * CHARACTERS_PER_TOKEN] + TRUNCATION_MARKER
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:tokens]) + TRUNCATION_MARKER
+
+    def message_tokens(self, messages: List[dict]) -> int:
+        """
+        Count the tokens of a prompt
+
+        Args:
+            messages: OpenAI-style messages of the prompt
+
+        Returns:
+            Number of tokens
+        """
+        return sum(self.count(message['content']) + MESSAGE_OVERHEAD for message in messages)
+
+    def _count(self, text: str) -> int:
+        if self.encoding is None:
+            return len(text) // CHARACTERS_PER_TOKEN
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+class ContextBudgetStats:
+    """Counters for the prompts fitted to their budgets"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.prompts = 0
+        self.truncated = 0
+        self.tokens_trimmed = 0
+        self.agents: Dict[str, dict] = {}
+
+    def record(self, agent: str, trimmed: int):
+        """Count a part of a prompt that was cut or dropped to fit"""
+        self.truncated += 1
+        self.tokens_trimmed += trimmed
+        counts = self.agents.setdefault(agent, {'truncated': 0, 'tokens_trimmed': 0})
+        counts['truncated'] += 1
+        counts['tokens_trimmed'] += trimmed
+
+    def to_dict(self):
+        """Convert the counters, with those of the shared token counter, to a dictionary"""
+        counter = get_token_counter()
+        return {
+            'prompts': self.prompts,
+            'truncated': self.truncated,
+            'tokens_trimmed': self.tokens_trimmed,
+            'agents': self.agents,
+            'tokenizer': TOKENIZER_ENCODING if counter.encoding is not None else "estimate",
+            'count_cache_hits': counter.hits,
+            'count_cache_misses': counter.misses
+        }
+
+class ContextBudget:
+    """Tokens left for the parts of one prompt, handed out in the order the parts are added"""
+
+    def __init__(self, agent: str, tokens: int, counter: Optional[TokenCounter] = None,
+                 stats: Optional[ContextBudgetStats] = None):
+        """
+        Initialize the budget
+
+        Args:
+            agent: Name of the agent the prompt is for
+            tokens: Tokens the prompt may take
+            counter: Token counter, the shared one if not given
+            stats: Statistics the trimmed tokens are counted in, the shared ones if not given
+        """
+        self.agent = agent
+        self.tokens = tokens
+        self.remaining = tokens
+        self.trimmed = 0
+        self.counter = counter or get_token_counter()
+        self.stats = stats or _stats
+
+    def reserve(self, tokens: int):
+        """Take tokens for something outside the parts, such as the overhead of a message"""
+        self.remaining -= tokens
+
+    def fit(self, text: str) -> str:
+        """
+        Take the tokens of the next part of the prompt, truncating it to the tokens left
+
+        Args:
+            text: The part
+
+        Returns:
+            The part, truncated, or "" if no tokens are left for it
+        """
+        tokens = self.counter.count(text)
+        if tokens <= self.remaining:
+            self.remaining -= tokens
+            return text
+        fitted = self.counter.truncate(text, self.remaining)
+        kept = self.counter.count(fitted)
+        self.remaining -= kept
+        trimmed = tokens - kept
+        self.trimmed += trimmed
+        self.stats.record(self.agent, trimmed)
+        logger.info(f"Trimmed {trimmed} of {tokens} tokens from a {self.agent} prompt part to fit {self.tokens}")
+        return fitted
+
+    def fit_all(self, texts: List[str]) -> List[str]:
+        """
+        Fit parts in priority order: those that fit are kept whole, the next truncated and the rest dropped
+
+        Args:
+            texts: The parts, most important first
+
+        Returns:
+            The parts kept
+        """
+        kept = []
+        for text in texts:
+            # Joined to what comes before, a part may tokenize to one token more at the seam
+            self.reserve(1)
+            fitted = self.fit(text)
+            if fitted:
+                kept.append(fitted)
+            else:
+                self.reserve(-1)
+        return kept
+
+    def fit_messages(self, messages: List[dict]) -> List[dict]:
+        """
+        Fit the messages of a prompt, earlier ones such as the system message first
+
+        The last message keeps up to MIN_LAST_MESSAGE_TOKENS of its content however long the earlier ones are,
+        as an empty query means nothing to a model and some providers reject empty messages.
+
+        Args:
+            messages: OpenAI-style messages
+
+        Returns:
+            The messages, with the contents of later ones truncated if needed
+
+        Raises:
+            PromptTooLarge: The budget can't hold part of every message
+        """
+        self.stats.prompts += 1
+        # Held back, with the message's overhead, while the earlier messages are fitted
+        kept_for_last = 0
+        if messages:
+            kept_for_last = MESSAGE_OVERHEAD + min(self.counter.count(messages[-1]['content']), MIN_LAST_MESSAGE_TOKENS)
+        self.reserve(kept_for_last)
+        fitted = []
+        for position, message in enumerate(messages):
+            if position == len(messages) - 1:
+                self.reserve(-kept_for_last)
+            self.reserve(MESSAGE_OVERHEAD)
+            content = self.fit(message['content'])
+            if message['content'] and not content:
+                raise PromptTooLarge(
+                    f"The {self.agent} prompt doesn't fit its budget of {self.tokens} tokens, even truncated"
+                )
+            fitted.append(message if content is message['content'] else {**message, 'content': content})
+        return fitted
+
+_counter: Optional[TokenCounter] = None
+_stats = ContextBudgetStats()
+
+def get_token_counter() -> TokenCounter:
+    """
+    Get the token counter shared by all agents, loading the tokenizer on first use
+
+    Returns:
+        The shared counter
+    """
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter(encoding=load_encoding())
+    return _counter
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with the shared counter
+
+    Args:
+        text: The text
+
+    Returns:
+        Number of tokens
+    """
+    return get_token_counter().count(text)
+
+def context_budget_stats() -> Optional[dict]:
+    """
+    Get the statistics of the prompts fitted to their budgets
+
+    Returns:
+        Dictionary of statistics, or None if no tokens have been counted yet
+    """
+    return _stats.to_dict() if _counter is not None else None
@@ -4,52 +4,67 @@ Image Generation Agent for Multi-Skill Super-Agent
 This module implements the Image Generation Agent that generates images
 based on user requests using the OpenAI DALL-E API.
 """
+from typing import AsyncIterator, Optional
+
 import openai
-from loguru import logger
 
 from .base_agent import Agent
-from ..utils.config import OPENAI_API_KEY
+from .chunks import Artifact, Chunk, Progress
 
 class ImageGenerationAgent(Agent):
     """Agent for generating images using OpenAI DALL-E API"""
     
-    def __init__(self):
-        """Initialize the image generation agent"""
-        super().__init__("ImageGeneration")
-        openai.api_key = OPENAI_API_KEY
+    def __init__(self, client: Optional[openai.AsyncOpenAI] = None):
+        """
+        Initialize the image generation agent
+        
+        Args:
+            client: OpenAI client images are generated with, the shared pooled one if not given
+        """
+        super().__init__("ImageGeneration", client)
+        # Images are generated by OpenAI's image models, outside the routing of chat models
+        self.provider = "openai"
+        self.model = "dall-e-3"
+        self.size = "1024x1024"
+        self.quality = "standard"
+    
+    @property
+    def model_params(self) -> dict:
+        """Model settings the image depends on"""
+        return {'model': self.model, 'size': self.size, 'quality': self.quality}
     
-    async def process(self, query: str) -> str:
+    async def process_stream(self, query: str) -> AsyncIterator[Chunk]:
         """
-        Process an image generation query and return image URL
+        Process an image generation query, yielding the image once it is generated
         
         Args:
             query: The image generation query
             
-        Returns:
-            The URL of the generated image
+        Yields:
+            Progress while the image is generated, then the image
         """
-        try:
-            # Pre-process the query
-            processed_query = await self._pre_process(query)
-            
-            # Call OpenAI API to generate image
-            response = await openai.images.generate(
-                model="dall-e-3",
+        # Pre-process the query
+        processed_query = await self._pre_process(query)
+        
+        # Call OpenAI API to generate image; it returns the whole image, so there is nothing to stream before
+        yield Progress("Generating image")
+        async with self.provider_guards.get(self.provider, self.model).slot():
+            response = await self.client.images.generate(
+                model=self.model,
                 prompt=processed_query,
-                size="1024x1024",
-                quality="standard",
-                n=1
+                size=self.size,
+                quality=self.quality,
+                n=1,
+                **self._request_options()
             )
-            
-            # Extract the image URL
-            image_url = response.data[0].url
-            
-            # Post-process the response
-            return await self._post_process(image_url)
         
-        except Exception as e:
-            logger.error(f"Error in image generation: {str(e)}")
-            return f"Error generating image: {str(e)}"
+        # Extract the image URL
+        image_url = await self._post_process(response.data[0].url)
+        yield Artifact(image_url, "image", caption=response.data[0].revised_prompt)
+    
+    def _error_response(self, error: Exception) -> str:
+        """Message telling the user the image could not be generated"""
+        return f"Error generating image: {str(error)}"
     
     async def _pre_process(self, query: str) -> str:
         """
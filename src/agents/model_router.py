@@ -0,0 +1,552 @@
+"""
+Model Routing for Multi-Skill Super-Agent
+
+This module picks the provider and model of every chat completion an agent
+requests. The eligible models are the catalog models of at least the agent's
+quality tier whose expected cost at catalog prices stays under the agent's
+cost ceiling. They are ranked by the moving averages of their latency and
+error rate kept by their provider guards, plus a cost term, and a small share
+of requests goes to another eligible model so every model's averages stay
+current. Models whose circuit is open are ranked last, where they fail fast,
+and a failed request falls back to the next model in the ranking; streams
+fall back until their first delta arrives. Once every model failed for being
+down or saturated, ProviderUnavailable lets agents answer in degraded mode.
+The router also sets the token budget of an agent's prompts, so they fit the
+context window of any model they may be routed to.
+"""
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from loguru import logger
+
+from .clients import create_http_client, create_openai_client, get_openai_client
+from .context_budget import get_token_counter
+from .providers import AnthropicChatProvider, ChatProvider, OpenAIChatProvider, TokenUsage
+from ..orchestration.deadline import DeadlineExceeded, call_timeout
+from ..orchestration.provider_guard import (
+    FIRST_CHUNK,
+    CircuitBreaker,
+    ProviderGuards,
+    ProviderUnavailable,
+    get_provider_guards,
+    is_overload,
+)
+from ..orchestration.usage import record_usage
+from ..utils.config import (
+    AGENT_COST_CEILINGS,
+    AGENT_MODEL_TIERS,
+    AGENT_PROMPT_BUDGETS,
+    CLAUDE_API_KEY,
+    CLAUDE_BASE_URL,
+    DEEPSEEK_API_KEY,
+    DEEPSEEK_BASE_URL,
+    MODEL_CATALOG,
+    MODEL_COST_WEIGHT,
+    MODEL_EXPLORE_RATE,
+    MODEL_HTTP_READ_TIMEOUT,
+    OPENAI_API_KEY,
+)
+
+# Seconds a model's rank is pushed down per unit of its moving error rate, so a model failing
+# half its calls ranks like one answering 5 seconds slower
+ERROR_PENALTY = 10.0
+# Context window of catalog models that don't give one, small enough for any current chat model
+DEFAULT_CONTEXT_WINDOW = 8192
+
+class ModelOption:
+    """A model of a provider in the catalog"""
+
+    def __init__(self, provider: str, model: str, tier: int, input_cost: float, output_cost: float,
+                 context_window: int = DEFAULT_CONTEXT_WINDOW):
+        """
+        Initialize the catalog entry
+
+        Args:
+            provider: Name of the provider, e.g. "anthropic"
+            model: Name of the model at the provider
+            tier: Quality tier, higher is more capable
+            input_cost: USD per million prompt tokens
+            output_cost: USD per million completion tokens
+            context_window: Most tokens of a prompt and its completion together
+        """
+        self.provider = provider
+        self.model = model
+        self.tier = tier
+        self.input_cost = input_cost
+        self.output_cost = output_cost
+        self.context_window = context_window
+
+    @property
+    def name(self) -> str:
+        """"provider/model" name, as used by the provider guards"""
+        return f"{self.provider}/{self.model}"
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        """
+        Get the cost of a request
+
+        Args:
+            prompt_tokens: Tokens of the prompt
+            completion_tokens: Tokens of the completion
+
+        Returns:
+            Cost in USD at catalog prices
+        """
+        return (prompt_tokens * self.input_cost + completion_tokens * self.output_cost) / 1_000_000
+
+def parse_catalog(spec: str) -> List[ModelOption]:
+    """
+    Parse a model catalog of the form "openai/gpt-4o=3:2.5:10:128000,deepseek/deepseek-chat=2:0.27:1.1"
+
+    Args:
+        spec: Comma separated provider/model=tier:input_cost:output_cost[:context_window] entries
+
+    Returns:
+        List of catalog entries
+    """
+    catalog = []
+    for item in spec.split(","):
+        if item.strip():
+            name, _, prices = item.partition("=")
+            provider, _, model = name.strip().partition("/")
+            tier, input_cost, output_cost, *context_window = prices.split(":")
+            catalog.append(ModelOption(
+                provider, model, int(tier), float(input_cost), float(output_cost),
+                int(context_window[0]) if context_window else DEFAULT_CONTEXT_WINDOW
+            ))
+    return catalog
+
+def parse_agent_settings(spec: str) -> Dict[str, float]:
+    """
+    Parse settings per agent of the form "CodeGeneration=3,WebResearch=2"
+
+    Args:
+        spec: Comma separated agent=value pairs
+
+    Returns:
+        Dictionary of agent name to value
+    """
+    settings = {}
+    for item in spec.split(","):
+        if item.strip():
+            agent, _, value = item.partition("=")
+            settings[agent.strip()] = float(value)
+    return settings
+
+def estimate_tokens(messages: List[dict]) -> int:
+    """
+    Estimate the tokens of a prompt with the shared token counter, whose cached counts make this cheap
+    for prompts already fitted to their budget
+
+    Args:
+        messages: Messages of the prompt
+
+    Returns:
+        Estimated number of tokens
+    """
+    return get_token_counter().message_tokens(messages)
+
+class ModelRouterStats:
+    """Counters for the routing of chat completions"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.requests = 0
+        self.fallbacks = 0
+        self.explored = 0
+        self.failed = 0
+        self.stale_answers = 0
+        self.over_ceiling = 0
+        self.models: Dict[str, dict] = {}
+        self.prompt_cache: Dict[str, dict] = {}
+
+    def record(self, option: ModelOption, cost: float):
+        """Count a request answered by a model and its estimated cost"""
+        model = self.models.setdefault(option.name, {'requests': 0, 'cost_usd': 0.0})
+        model['requests'] += 1
+        model['cost_usd'] += cost
+
+    def record_prompt_cache(self, agent: str, usage: TokenUsage, latency: float):
+        """
+        Count the prompt tokens of a call the provider's prompt cache served
+
+        Args:
+            agent: Name of the agent that made the call
+            usage: Tokens of the call as the provider reported them
+            latency: Seconds until the completion, or its first delta, arrived
+        """
+        counts = self.prompt_cache.setdefault(agent, {
+            'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0,
+            'cached_requests': 0, 'cached_latency_s': 0.0, 'uncached_latency_s': 0.0
+        })
+        counts['requests'] += 1
+        counts['prompt_tokens'] += usage.prompt_tokens
+        counts['cached_tokens'] += usage.cached_tokens
+        if usage.cached_tokens:
+            counts['cached_requests'] += 1
+            counts['cached_latency_s'] += latency
+        else:
+            counts['uncached_latency_s'] += latency
+
+    def prompt_cache_dict(self) -> Dict[str, dict]:
+        """Per agent, the share of prompt tokens served from cache and the mean latency with and without"""
+        summary = {}
+        for agent, counts in self.prompt_cache.items():
+            uncached_requests = counts['requests'] - counts['cached_requests']
+            summary[agent] = {
+                'requests': counts['requests'],
+                'prompt_tokens': counts['prompt_tokens'],
+                'cached_tokens': counts['cached_tokens'],
+                'cached_share': counts['cached_tokens'] / counts['prompt_tokens'] if counts['prompt_tokens'] else 0.0,
+                'cached_requests': counts['cached_requests'],
+                'cached_latency_s': (
+                    counts['cached_latency_s'] / counts['cached_requests'] if counts['cached_requests'] else None
+                ),
+                'uncached_latency_s': (
+                    counts['uncached_latency_s'] / uncached_requests if uncached_requests else None
+                )
+            }
+        return summary
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'requests': self.requests,
+            'fallbacks': self.fallbacks,
+            'explored': self.explored,
+            'failed': self.failed,
+            'stale_answers': self.stale_answers,
+            'over_ceiling': self.over_ceiling,
+            'cost_usd': round(sum(model['cost_usd'] for model in self.models.values()), 6),
+            'models': {
+                name: {'requests': model['requests'], 'cost_usd': round(model['cost_usd'], 6)}
+                for name, model in self.models.items()
+            },
+            'prompt_cache': self.prompt_cache_dict()
+        }
+
+class ModelRouter:
+    """Routes the chat completions of agents to catalog models, falling back on failure"""
+
+    def __init__(self, providers: Dict[str, ChatProvider], catalog: List[ModelOption],
+                 guards: Optional[ProviderGuards] = None, tiers: Optional[Dict[str, float]] = None,
+                 cost_ceilings: Optional[Dict[str, float]] = None, cost_weight: float = 1.0,
+                 explore_rate: float = 0.05, prompt_budgets: Optional[Dict[str, float]] = None):
+        """
+        Initialize the router
+
+        Args:
+            providers: Providers by name; catalog models of other providers are left out
+            catalog: Models requests can be routed to
+            guards: Guards limiting the calls to each model and tracking their latency and errors
+            tiers: Lowest tier accepted per agent name, 1 for agents not listed
+            cost_ceilings: Most USD one request may cost per agent name, no limit for agents not listed
+            cost_weight: Seconds of latency one cent of expected cost weighs in the ranking
+            explore_rate: Share of requests sent to another eligible model than the best ranked one
+            prompt_budgets: Most tokens one prompt may take per agent name, besides the context window
+        """
+        self.providers = providers
+        self.catalog = [option for option in catalog if option.provider in providers]
+        self.guards = guards or ProviderGuards()
+        self.tiers = tiers or {}
+        self.cost_ceilings = cost_ceilings or {}
+        self.cost_weight = cost_weight
+        self.explore_rate = explore_rate
+        self.prompt_budgets = prompt_budgets or {}
+        self.stats = ModelRouterStats()
+
+    def tier(self, agent: str) -> int:
+        """
+        Get the lowest tier of model an agent accepts
+
+        Args:
+            agent: Name of the agent
+
+        Returns:
+            The tier
+        """
+        return int(self.tiers.get(agent, 1))
+
+    def prompt_budget(self, agent: str, max_tokens: int) -> int:
+        """
+        Get the tokens a prompt of an agent may take
+
+        Args:
+            agent: Name of the agent
+            max_tokens: Most tokens of the completion
+
+        Returns:
+            The smallest context window of the models of the agent's tier less max_tokens, or the agent's
+            prompt budget if lower
+        """
+        windows = [option.context_window for option in self.catalog if option.tier >= self.tier(agent)]
+        budget = min(windows, default=DEFAULT_CONTEXT_WINDOW) - max_tokens
+        ceiling = self.prompt_budgets.get(agent)
+        return int(min(budget, ceiling)) if ceiling is not None else budget
+
+    def candidates(self, agent: str, prompt_tokens: int, max_tokens: int) -> List[ModelOption]:
+        """
+        Rank the models a request of an agent may be routed to
+
+        Args:
+            agent: Name of the agent
+            prompt_tokens: Estimated tokens of the prompt
+            max_tokens: Most tokens of the completion
+
+        Returns:
+            Eligible models, best first
+        """
+        eligible = [option for option in self.catalog if option.tier >= self.tier(agent)]
+        ceiling = self.cost_ceilings.get(agent)
+        if ceiling is not None:
+            affordable = [option for option in eligible if option.cost(prompt_tokens, max_tokens) <= ceiling]
+            if not affordable and eligible:
+                # Better an answer at a cost over the ceiling than none at all
+                self.stats.over_ceiling += 1
+                cheapest = min(eligible, key=lambda option: option.cost(prompt_tokens, max_tokens))
+                logger.warning(f"No model of {agent}'s tier is under its cost ceiling, using {cheapest.name}")
+                affordable = [cheapest]
+            eligible = affordable
+
+        def score(option: ModelOption) -> float:
+            guard = self.guards.get(option.provider, option.model)
+            # Models without calls yet rank as instant, so each gets tried
+            latency = guard.latency_ewma or 0.0
+            cents = option.cost(prompt_tokens, max_tokens) * 100
+            return latency + ERROR_PENALTY * guard.error_ewma + self.cost_weight * cents
+
+        def circuit_open(option: ModelOption) -> bool:
+            breaker = self.guards.get(option.provider, option.model).breaker
+            return breaker.state == CircuitBreaker.OPEN and breaker.retry_after > 0
+
+        # Models whose circuit is open come last, where they fail fast unless their probe call is due
+        ranked = sorted(eligible, key=lambda option: (circuit_open(option), score(option)))
+        available = sum(not circuit_open(option) for option in ranked)
+        if available > 1 and random.random() < self.explore_rate:
+            self.stats.explored += 1
+            ranked.insert(0, ranked.pop(random.randrange(1, available)))
+        return ranked
+
+    def batch_option(self, agent: str, prompt_tokens: int, max_tokens: int) -> Optional[ModelOption]:
+        """
+        Pick the model an offline batch of an agent's requests is submitted to
+
+        Latency doesn't matter offline, so this is the cheapest model of the agent's tier whose
+        provider has a batch endpoint.
+
+        Args:
+            agent: Name of the agent
+            prompt_tokens: Estimated tokens of a prompt
+            max_tokens: Most tokens of a completion
+
+        Returns:
+            The model, or None if no provider of the agent's tier has a batch endpoint
+        """
+        eligible = [
+            option for option in self.catalog
+            if option.tier >= self.tier(agent) and self.providers[option.provider].supports_batch
+        ]
+        return min(eligible, key=lambda option: option.cost(prompt_tokens, max_tokens), default=None)
+
+    async def complete(self, agent: str, messages: List[dict], temperature: float = 1.0,
+                       max_tokens: int = 1000, hedge: bool = False) -> str:
+        """
+        Request a chat completion from the best available model
+
+        Args:
+            agent: Name of the agent making the request
+            messages: OpenAI-style messages of the request
+            temperature: Sampling temperature
+            max_tokens: Most tokens of the completion
+            hedge: Whether slow calls are hedged, see ProviderGuard.run
+
+        Returns:
+            The text of the completion
+
+        Raises:
+            ProviderUnavailable: If every eligible model is down, saturated or has its circuit open
+        """
+        self.stats.requests += 1
+        prompt_tokens = estimate_tokens(messages)
+        errors = []
+        for option in self.candidates(agent, prompt_tokens, max_tokens):
+            if errors:
+                self.stats.fallbacks += 1
+            provider = self.providers[option.provider]
+            guard = self.guards.get(option.provider, option.model)
+
+            async def call():
+                # Each call of a hedged request has its own usage, and the one that answers is recorded
+                usage = TokenUsage()
+                started = time.monotonic()
+                content = await provider.complete(
+                    option.model, messages, temperature, max_tokens, call_timeout(),
+                    **self._usage_option(provider, usage)
+                )
+                return content, usage, time.monotonic() - started
+
+            try:
+                content, usage, latency = await guard.run(call, hedge=hedge)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                logger.warning(f"{option.name} failed for {agent}: {str(e)}")
+                errors.append(e)
+                continue
+            self._record(agent, option, prompt_tokens, len(content) // 4, usage, latency)
+            return content
+        raise self._failure(agent, errors)
+
+    async def stream(self, agent: str, messages: List[dict], temperature: float = 1.0,
+                     max_tokens: int = 1000) -> AsyncIterator[str]:
+        """
+        Stream a chat completion from the best available model
+
+        Args:
+            agent: Name of the agent making the request
+            messages: OpenAI-style messages of the request
+            temperature: Sampling temperature
+            max_tokens: Most tokens of the completion
+
+        Yields:
+            Text deltas of the completion
+
+        Raises:
+            ProviderUnavailable: If every eligible model is down, saturated or has its circuit open
+        """
+        self.stats.requests += 1
+        prompt_tokens = estimate_tokens(messages)
+        errors = []
+        for option in self.candidates(agent, prompt_tokens, max_tokens):
+            if errors:
+                self.stats.fallbacks += 1
+            provider = self.providers[option.provider]
+            guard = self.guards.get(option.provider, option.model)
+            characters = 0
+            usage = TokenUsage()
+            started = time.monotonic()
+            latency = None
+            finished = False
+            try:
+                # The slot is held until the stream ends, but the call is timed to its first delta
+                async with guard.slot(FIRST_CHUNK) as call:
+                    async for delta in provider.stream(
+                        option.model, messages, temperature, max_tokens, call_timeout(),
+                        **self._usage_option(provider, usage)
+                    ):
+                        call.responded()
+                        if latency is None:
+                            latency = time.monotonic() - started
+                        characters += len(delta)
+                        yield delta
+                finished = True
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                # Deltas already sent cannot be taken back, so only a stream that never started falls back
+                if characters:
+                    raise
+                logger.warning(f"{option.name} failed for {agent}: {str(e)}")
+                errors.append(e)
+                continue
+            finally:
+                # A stream cut short by an error, a cancellation or its reader still used the tokens sent so far
+                if finished or characters:
+                    self._record(agent, option, prompt_tokens, characters // 4, usage, latency or 0.0)
+            return
+        raise self._failure(agent, errors)
+
+    @staticmethod
+    def _usage_option(provider: ChatProvider, usage: TokenUsage) -> dict:
+        """Keyword argument asking a provider for the usage of a call, if it reports it"""
+        return {'usage': usage} if provider.reports_usage else {}
+
+    def _record(self, agent: str, option: ModelOption, prompt_tokens: int, completion_tokens: int,
+                usage: TokenUsage, latency: float):
+        """Count a completion in the statistics and in the usage of the current request"""
+        # The provider's own counts replace the estimates when it reported them
+        if usage.prompt_tokens is not None:
+            prompt_tokens = usage.prompt_tokens
+            self.stats.record_prompt_cache(agent, usage, latency)
+        if usage.completion_tokens is not None:
+            completion_tokens = usage.completion_tokens
+        cost = option.cost(prompt_tokens, completion_tokens)
+        self.stats.record(option, cost)
+        record_usage(agent, option.name, prompt_tokens, completion_tokens, cost)
+
+    def _failure(self, agent: str, errors: List[Exception]) -> Exception:
+        """
+        Get the error to raise when no model answered a request
+
+        Args:
+            agent: Name of the agent making the request
+            errors: Errors of the models tried, in order
+
+        Returns:
+            The first error that is the request's own fault, else ProviderUnavailable
+        """
+        self.stats.failed += 1
+        for error in errors:
+            if not isinstance(error, ProviderUnavailable) and not is_overload(error):
+                return error
+        retry_after = min((getattr(error, "retry_after", 0.0) for error in errors), default=0.0)
+        return ProviderUnavailable(f"No model available for {agent} (tried {len(errors)})", retry_after)
+
+    def to_dict(self):
+        """Convert the routing statistics to a dictionary"""
+        return self.stats.to_dict()
+
+def create_providers() -> Dict[str, ChatProvider]:
+    """
+    Create the providers an API key is configured for, each on its own pooled HTTP client
+
+    Returns:
+        Providers by name
+    """
+    providers = {}
+    if OPENAI_API_KEY:
+        providers["openai"] = OpenAIChatProvider(get_openai_client())
+    if CLAUDE_API_KEY:
+        providers["anthropic"] = AnthropicChatProvider(
+            CLAUDE_API_KEY, CLAUDE_BASE_URL, timeout=MODEL_HTTP_READ_TIMEOUT, http_client=create_http_client()
+        )
+    if DEEPSEEK_API_KEY:
+        providers["deepseek"] = OpenAIChatProvider(
+            create_openai_client(DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL), name="deepseek", batch_api=False
+        )
+    return providers
+
+_shared_router = None
+
+def get_model_router() -> ModelRouter:
+    """
+    Get the model router shared by all agents, creating it on first use
+
+    Returns:
+        The shared router
+    """
+    global _shared_router
+    if _shared_router is None:
+        _shared_router = ModelRouter(
+            create_providers(),
+            parse_catalog(MODEL_CATALOG),
+            guards=get_provider_guards(),
+            tiers=parse_agent_settings(AGENT_MODEL_TIERS),
+            cost_ceilings=parse_agent_settings(AGENT_COST_CEILINGS),
+            cost_weight=MODEL_COST_WEIGHT,
+            explore_rate=MODEL_EXPLORE_RATE,
+            prompt_budgets=parse_agent_settings(AGENT_PROMPT_BUDGETS)
+        )
+        if not _shared_router.catalog:
+            logger.warning("No chat model is available: no catalog model has a provider with an API key")
+    return _shared_router
+
+def model_router_stats() -> Optional[dict]:
+    """
+    Get the statistics of the shared router
+
+    Returns:
+        Dictionary of routing statistics, or None if no agent has been created yet
+    """
+    return _shared_router.to_dict() if _shared_router is not None else None
@@ -0,0 +1,40 @@
+"""
+Prompt Templates for Multi-Skill Super-Agent
+
+Model providers cache the longest prefix a prompt shares with recent ones,
+billing those tokens at a discount and skipping their prefill, but only as
+far as the prompts are byte-identical. A template therefore keeps an agent's
+static instructions in the system message, which is never formatted and so
+is the same for every request, and moves everything that varies, such as the
+query or today's date, into the user message at the end.
+"""
+from typing import List
+
+class PromptTemplate:
+    """Chat prompt of a static system message followed by a user message holding the variable parts"""
+
+    def __init__(self, system: str, user: str = "{query}"):
+        """
+        Initialize the template
+
+        Args:
+            system: Instructions shared by every request, used as they are
+            user: Format string of the user message, with a field per variable part
+        """
+        self.system = system
+        self.user = user
+
+    def messages(self, **variables) -> List[dict]:
+        """
+        Build the messages of a request
+
+        Args:
+            **variables: Values of the fields of the user message
+
+        Returns:
+            OpenAI-style messages, the system message first
+        """
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user.format(**variables)}
+        ]
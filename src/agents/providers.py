@@ -0,0 +1,362 @@
+"""
+Chat Model Providers for Multi-Skill Super-Agent
+
+This module gives agents one interface to the chat APIs of different model
+providers: OpenAI and OpenAI-compatible APIs such as DeepSeek through the
+OpenAI client, and Anthropic's Messages API over HTTP. Each provider turns
+the OpenAI-style messages agents build into its own request format and
+yields text deltas when streaming. Providers with an asynchronous batch
+endpoint also take whole files of requests for offline batches. Providers
+report the tokens of each call, including the prompt tokens their prompt
+cache served, which cost less and skip prefill.
+"""
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+import openai
+
+class ProviderError(Exception):
+    """Error response of a provider, carrying its HTTP status like the OpenAI client's errors"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+class ProviderConnectionError(ConnectionError):
+    """Raised when a provider could not be reached or did not answer in time"""
+
+class TokenUsage:
+    """Tokens of one call as the provider counted them"""
+
+    def __init__(self):
+        """Initialize the counts, None until the provider reported them"""
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        # Prompt tokens read from the provider's prompt cache instead of being processed again
+        self.cached_tokens = 0
+
+def _field(value, name: str):
+    """Read a field of a response object, or of a dictionary the client left unparsed"""
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+class ChatProvider:
+    """Interface of a chat completion provider"""
+
+    name = "provider"
+    # Whether the provider has an asynchronous batch endpoint, see submit_batch
+    supports_batch = False
+    # Whether complete and stream take a TokenUsage to fill in
+    reports_usage = False
+
+    async def complete(self, model: str, messages: List[dict], temperature: float = 1.0,
+                       max_tokens: int = 1000, timeout: Optional[float] = None,
+                       usage: Optional[TokenUsage] = None) -> str:
+        """
+        Request a chat completion
+
+        Args:
+            model: The model of the provider
+            messages: OpenAI-style messages, the first of which may be a system message
+            temperature: Sampling temperature
+            max_tokens: Maximum number of completion tokens
+            timeout: Seconds the request may take, or None for the provider's default
+            usage: Filled in with the tokens of the call, if the provider reports_usage
+
+        Returns:
+            The text of the completion
+        """
+        raise NotImplementedError
+
+    def stream(self, model: str, messages: List[dict], temperature: float = 1.0,
+               max_tokens: int = 1000, timeout: Optional[float] = None,
+               usage: Optional[TokenUsage] = None) -> AsyncIterator[str]:
+        """
+        Stream a chat completion
+
+        Args:
+            model: The model of the provider
+            messages: OpenAI-style messages, the first of which may be a system message
+            temperature: Sampling temperature
+            max_tokens: Maximum number of completion tokens
+            timeout: Seconds the request may take, or None for the provider's default
+            usage: Filled in with the tokens of the call once the stream ended, if the provider reports_usage
+
+        Returns:
+            Async iterator of the text deltas of the completion
+        """
+        raise NotImplementedError
+
+    def batch_request(self, custom_id: str, model: str, messages: List[dict], temperature: float = 1.0,
+                      max_tokens: int = 1000) -> dict:
+        """
+        Build the line of a batch input file requesting a chat completion
+
+        Args:
+            custom_id: ID the result of the request is returned under
+            model: The model of the provider
+            messages: OpenAI-style messages, the first of which may be a system message
+            temperature: Sampling temperature
+            max_tokens: Maximum number of completion tokens
+
+        Returns:
+            The line, to be written as JSON
+        """
+        raise NotImplementedError
+
+    async def submit_batch(self, requests_path: str) -> str:
+        """
+        Upload a JSONL file of batch_request lines and start a batch over it
+
+        Args:
+            requests_path: Path of the file
+
+        Returns:
+            ID of the batch
+        """
+        raise NotImplementedError
+
+    async def get_batch(self, batch_id: str) -> dict:
+        """
+        Get the state of a batch
+
+        Args:
+            batch_id: ID of the batch
+
+        Returns:
+            The batch, whose status is "completed", "failed", "expired" or "cancelled" once it ended
+        """
+        raise NotImplementedError
+
+    def batch_results(self, batch: dict) -> AsyncIterator[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        Read the results of an ended batch, line by line
+
+        Args:
+            batch: The batch, as returned by get_batch
+
+        Returns:
+            Async iterator of (custom_id, completion text, error) per request; one of the last two is None
+        """
+        raise NotImplementedError
+
+class OpenAIChatProvider(ChatProvider):
+    """Provider for the OpenAI API and OpenAI-compatible APIs"""
+
+    reports_usage = True
+
+    def __init__(self, client: openai.AsyncOpenAI, name: str = "openai", batch_api: bool = True):
+        """
+        Initialize the provider
+
+        Args:
+            client: AsyncOpenAI client, pointed at the compatible API's base URL if needed
+            name: Name of the provider in the model catalog
+            batch_api: Whether the API has OpenAI's batch endpoint
+        """
+        self.client = client
+        self.name = name
+        self.supports_batch = batch_api
+
+    async def complete(self, model: str, messages: List[dict], temperature: float = 1.0,
+                       max_tokens: int = 1000, timeout: Optional[float] = None,
+                       usage: Optional[TokenUsage] = None) -> str:
+        options = {} if timeout is None else {'timeout': timeout}
+        response = await self.client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens, **options
+        )
+        self._read_usage(getattr(response, "usage", None), usage)
+        return response.choices[0].message.content
+
+    async def stream(self, model: str, messages: List[dict], temperature: float = 1.0,
+                     max_tokens: int = 1000, timeout: Optional[float] = None,
+                     usage: Optional[TokenUsage] = None) -> AsyncIterator[str]:
+        options = {} if timeout is None else {'timeout': timeout}
+        if usage is not None:
+            # The usage then arrives in a last chunk without choices; this client version has no parameter for it
+            options['extra_body'] = {'stream_options': {'include_usage': True}}
+        stream = await self.client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+            stream=True, **options
+        )
+        # Closing the stream aborts the upstream request if the consumer stops early
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                self._read_usage(getattr(chunk, "usage", None), usage)
+
+    @staticmethod
+    def _read_usage(reported, usage: Optional[TokenUsage]):
+        """Copy the usage of a response into usage; cached tokens are under OpenAI's or DeepSeek's field"""
+        if reported is None or usage is None:
+            return
+        usage.prompt_tokens = _field(reported, "prompt_tokens")
+        usage.completion_tokens = _field(reported, "completion_tokens")
+        details = _field(reported, "prompt_tokens_details")
+        cached = _field(details, "cached_tokens") if details is not None else None
+        usage.cached_tokens = cached or _field(reported, "prompt_cache_hit_tokens") or 0
+
+    def batch_request(self, custom_id: str, model: str, messages: List[dict], temperature: float = 1.0,
+                      max_tokens: int = 1000) -> dict:
+        return {
+            'custom_id': custom_id,
+            'method': "POST",
+            'url': "/v1/chat/completions",
+            'body': {'model': model, 'messages': messages, 'temperature': temperature, 'max_tokens': max_tokens}
+        }
+
+    async def submit_batch(self, requests_path: str) -> str:
+        # The file is streamed from disk rather than read into memory
+        with open(requests_path, "rb") as file:
+            uploaded = await self.client.files.create(file=file, purpose="batch")
+        # This version of the client has no batches resource, so the endpoint is called directly
+        batch = await self.client.post("/batches", cast_to=object, body={
+            'input_file_id': uploaded.id,
+            'endpoint': "/v1/chat/completions",
+            'completion_window': "24h"
+        })
+        return batch['id']
+
+    async def get_batch(self, batch_id: str) -> dict:
+        return await self.client.get(f"/batches/{batch_id}", cast_to=object)
+
+    async def batch_results(self, batch: dict) -> AsyncIterator[Tuple[str, Optional[str], Optional[str]]]:
+        for file_id in (batch.get('output_file_id'), batch.get('error_file_id')):
+            if not file_id:
+                continue
+            async with self.client.files.with_streaming_response.content(file_id) as response:
+                async for line in response.iter_lines():
+                    if not line.strip():
+                        continue
+                    result = json.loads(line)
+                    response_body = (result.get('response') or {}).get('body') or {}
+                    if result.get('error') or 'error' in response_body or not response_body.get('choices'):
+                        error = result.get('error') or response_body.get('error') or {}
+                        yield result['custom_id'], None, error.get('message') or "The request failed"
+                    else:
+                        yield result['custom_id'], response_body['choices'][0]['message']['content'], None
+
+class AnthropicChatProvider(ChatProvider):
+    """Provider for Anthropic's Messages API"""
+
+    API_VERSION = "2023-06-01"
+    reports_usage = True
+
+    def __init__(self, api_key: str, base_url: str = "https://api.anthropic.com", name: str = "anthropic",
+                 timeout: float = 600.0, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Initialize the provider
+
+        Args:
+            api_key: Anthropic API key
+            base_url: Base URL of the API, without the /v1 path
+            name: Name of the provider in the model catalog
+            timeout: Default seconds a request may take
+            http_client: Client whose connection pool to use, a new one if not given
+        """
+        self.name = name
+        self.timeout = timeout
+        self.url = f"{base_url.rstrip('/')}/v1/messages"
+        self.headers = {'x-api-key': api_key, 'anthropic-version': self.API_VERSION}
+        self.client = http_client or httpx.AsyncClient(timeout=httpx.Timeout(timeout, connect=5.0))
+
+    @staticmethod
+    def _request(model: str, messages: List[dict], temperature: float, max_tokens: int, stream: bool) -> dict:
+        """
+        Build a Messages API request; system messages become its system prompt
+
+        Anthropic only caches prompt prefixes up to a cache breakpoint, so the system prompt, which agents keep
+        identical across requests, ends with one.
+        """
+        system = "\n\n".join(message['content'] for message in messages if message['role'] == "system")
+        request = {
+            'model': model,
+            'messages': [
+                {'role': message['role'], 'content': message['content']}
+                for message in messages if message['role'] != "system"
+            ],
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'stream': stream
+        }
+        if system:
+            request['system'] = [{'type': "text", 'text': system, 'cache_control': {'type': "ephemeral"}}]
+        return request
+
+    @staticmethod
+    def _read_usage(reported: Optional[dict], usage: Optional[TokenUsage]):
+        """Add the usage of a response or stream event into usage; input_tokens leaves out cached tokens"""
+        if not reported or usage is None:
+            return
+        if 'input_tokens' in reported:
+            usage.cached_tokens = reported.get('cache_read_input_tokens') or 0
+            usage.prompt_tokens = (
+                reported['input_tokens'] + usage.cached_tokens + (reported.get('cache_creation_input_tokens') or 0)
+            )
+        if 'output_tokens' in reported:
+            usage.completion_tokens = reported['output_tokens']
+
+    def _timeout(self, timeout: Optional[float]) -> httpx.Timeout:
+        return httpx.Timeout(timeout or self.timeout, connect=min(5.0, timeout or 5.0))
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response, body: bytes):
+        """Raise ProviderError for an error response"""
+        if response.status_code < 400:
+            return
+        try:
+            message = json.loads(body)['error']['message']
+        except (ValueError, KeyError, TypeError):
+            message = body.decode("utf-8", "replace")[:200]
+        raise ProviderError(f"Anthropic API error {response.status_code}: {message}", response.status_code)
+
+    async def complete(self, model: str, messages: List[dict], temperature: float = 1.0,
+                       max_tokens: int = 1000, timeout: Optional[float] = None,
+                       usage: Optional[TokenUsage] = None) -> str:
+        try:
+            response = await self.client.post(
+                self.url, headers=self.headers,
+                json=self._request(model, messages, temperature, max_tokens, False),
+                timeout=self._timeout(timeout)
+            )
+        except httpx.TransportError as e:
+            raise ProviderConnectionError(f"Anthropic API unreachable: {str(e)}") from e
+        self._raise_for_status(response, response.content)
+        body = response.json()
+        self._read_usage(body.get('usage'), usage)
+        return "".join(block.get('text', "") for block in body['content'] if block['type'] == "text")
+
+    async def stream(self, model: str, messages: List[dict], temperature: float = 1.0,
+                     max_tokens: int = 1000, timeout: Optional[float] = None,
+                     usage: Optional[TokenUsage] = None) -> AsyncIterator[str]:
+        try:
+            async with self.client.stream(
+                "POST", self.url, headers=self.headers,
+                json=self._request(model, messages, temperature, max_tokens, True),
+                timeout=self._timeout(timeout)
+            ) as response:
+                if response.status_code >= 400:
+                    self._raise_for_status(response, await response.aread())
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[5:])
+                    if event['type'] == "content_block_delta" and event['delta'].get('text'):
+                        yield event['delta']['text']
+                    elif event['type'] == "message_start":
+                        self._read_usage(event['message'].get('usage'), usage)
+                    elif event['type'] == "message_delta":
+                        self._read_usage(event.get('usage'), usage)
+                    elif event['type'] == "error":
+                        raise ProviderError(f"Anthropic API error: {event['error']['message']}", 500)
+                    elif event['type'] == "message_stop":
+                        return
+        except httpx.TransportError as e:
+            raise ProviderConnectionError(f"Anthropic API unreachable: {str(e)}") from e
+
+    async def close(self):
+        """Close the HTTP client"""
+        await self.client.aclose()
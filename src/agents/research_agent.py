@@ -4,13 +4,25 @@ Web Research Agent for Multi-Skill Super-Agent
 This module implements the Web Research Agent that searches the web,
 scrapes content, and summarizes information based on user queries.
 """
+from typing import AsyncIterator
+
 import requests
 from bs4 import BeautifulSoup
-import openai
 from loguru import logger
 
-from .base_agent import Agent
-from ..utils.config import OPENAI_API_KEY
+from .base_agent import DEGRADED_NOTICE, Agent
+from .chunks import Chunk, Progress, TextDelta
+from .prompts import PromptTemplate
+from ..orchestration.provider_guard import ProviderUnavailable
+from ..persistence.semantic_cache import get_semantic_cache
+
+SUMMARY_PROMPT = PromptTemplate(
+    "You are a research assistant. "
+    "Summarize the provided content to answer the user's query. "
+    "Be concise but comprehensive, focusing on the most relevant information. "
+    "Include key facts and cite sources when possible.",
+    "Query: {query}\n\nContent to summarize: {content}"
+)
 
 class WebResearchAgent(Agent):
     """Agent for web research and summarization"""
@@ -18,40 +30,99 @@ class WebResearchAgent(Agent):
     def __init__(self):
         """Initialize the web research agent"""
         super().__init__("WebResearch")
-        openai.api_key = OPENAI_API_KEY
+        self.temperature = 0.3
+        self.max_tokens = 1000
+        self.semantic_cache = get_semantic_cache()
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
     
-    async def process(self, query: str) -> str:
+    @property
+    def model_params(self) -> dict:
+        """Model settings the summary depends on"""
+        return {'tier': self.model_tier, 'temperature': self.temperature, 'max_tokens': self.max_tokens}
+    
+    async def process_stream(self, query: str) -> AsyncIterator[Chunk]:
         """
-        Process a research query and return summarized information
+        Process a research query, yielding progress and then the summary as it is generated
         
         Args:
             query: The research query
             
-        Returns:
-            The summarized research results
+        Yields:
+            Progress of the search, then text deltas of the research summary
         """
+        # Answer paraphrases of earlier queries without searching again
+        cached = await self._semantic_lookup(query)
+        if cached is not None:
+            yield TextDelta(cached)
+            return
+        
+        # Pre-process the query
+        processed_query = await self._pre_process(query)
+        
+        # Perform web search (simplified implementation)
+        yield Progress("Searching the web")
+        search_results = await self._search_web(processed_query)
+        
+        # Scrape content from top results
+        yield Progress(f"Reading {len(search_results[:3])} sources")
+        sources = await self._scrape_content(search_results[:3])
+        
+        # Summarize the content
+        parts = []
         try:
-            # Pre-process the query
-            processed_query = await self._pre_process(query)
-            
-            # Perform web search (simplified implementation)
-            search_results = await self._search_web(processed_query)
-            
-            # Scrape content from top results
-            content = await self._scrape_content(search_results[:3])
-            
-            # Summarize the content
-            summary = await self._summarize_content(content, processed_query)
+            async for delta in self._complete_stream(**self._summary_request(processed_query, sources)):
+                parts.append(delta)
+                yield TextDelta(delta)
+        except ProviderUnavailable:
+            answer = await self._degraded_answer(query)
+            if answer is None:
+                raise
+            yield TextDelta(f"{DEGRADED_NOTICE}\n\n{answer}")
+            return
+        await self._semantic_store(query, "".join(parts))
+    
+    async def _completion_request(self, query: str) -> dict:
+        """
+        Search the web for a query and build the chat completion request summarizing what was found
+        
+        Args:
+            query: The research query
             
-            # Post-process the response
-            return await self._post_process(summary)
+        Returns:
+            messages, temperature and max_tokens of the request
+        """
+        processed_query = await self._pre_process(query)
+        search_results = await self._search_web(processed_query)
+        sources = await self._scrape_content(search_results[:3])
+        return self._summary_request(processed_query, sources)
+    
+    def _summary_request(self, query: str, sources: list) -> dict:
+        """
+        Build the chat completion request summarizing scraped content to answer a query
         
-        except Exception as e:
-            logger.error(f"Error in web research: {str(e)}")
-            return f"Error performing research: {str(e)}"
+        Args:
+            query: The research query
+            sources: Content of each source, best search result first
+            
+        Returns:
+            messages, temperature and max_tokens of the request, with as much of the sources as fits the prompt
+            budget: lower-ranked sources are truncated or left out first
+        """
+        budget = self._context_budget(self.max_tokens)
+        budget.reserve(budget.counter.message_tokens(SUMMARY_PROMPT.messages(query="", content="")))
+        query = budget.fit(query)
+        content = "".join(budget.fit_all(sources))
+        return {
+            'messages': SUMMARY_PROMPT.messages(query=query, content=content),
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens
+        }
+    
+    def _error_response(self, error: Exception) -> str:
+        """Message telling the user the research failed"""
+        return f"Error performing research: {str(error)}"
     
     async def _search_web(self, query: str) -> list:
         """
@@ -77,7 +148,7 @@ class WebResearchAgent(Agent):
         
         return search_results
     
-    async def _scrape_content(self, urls: list) -> str:
+    async def _scrape_content(self, urls: list) -> list:
         """
         Scrape content from a list of URLs
         
@@ -85,13 +156,13 @@ class WebResearchAgent(Agent):
             urls: The list of URLs to scrape
             
         Returns:
-            The combined content from all URLs
+            The content of each URL that could be scraped, in the order of the URLs
         """
         # This is a simplified implementation
         # In a real implementation, this would actually scrape the content
         logger.info(f"Scraping content from {len(urls)} URLs")
         
-        combined_content = ""
+        sources = []
         
         # In a real implementation, this would loop through the URLs and scrape content
         for url in urls:
@@ -99,48 +170,8 @@ class WebResearchAgent(Agent):
                 # Placeholder for scraped content
                 # In a real implementation, this would be the actual scraped content
                 content = f"Placeholder content from {url}\n"
-                combined_content += content
+                sources.append(content)
             except Exception as e:
                 logger.error(f"Error scraping {url}: {str(e)}")
         
-        return combined_content
-    
-    async def _summarize_content(self, content: str, query: str) -> str:
-        """
-        Summarize content based on the original query
-        
-        Args:
-            content: The content to summarize
-            query: The original query
-            
-        Returns:
-            The summarized content
-        """
-        try:
-            # Create a system message for summarization
-            system_message = (
-                "You are a research assistant. "
-                "Summarize the provided content to answer the user's query. "
-                "Be concise but comprehensive, focusing on the most relevant information. "
-                "Include key facts and cite sources when possible."
-            )
-            
-            # Call OpenAI API to summarize content
-            response = await openai.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": f"Query: {query}\n\nContent to summarize: {content}"}
-                ],
-                temperature=0.3,
-                max_tokens=1000
-            )
-            
-            # Extract the summary
-            summary = response.choices[0].message.content
-            
-            return summary
-        
-        except Exception as e:
-            logger.error(f"Error in summarization: {str(e)}")
-            return f"Error summarizing content: {str(e)}"
+        return sources
@@ -6,11 +6,14 @@ reminders, and system triggers.
 """
 from datetime import datetime, timedelta
 import asyncio
+from typing import AsyncIterator
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from loguru import logger
 
 from .base_agent import Agent
+from .chunks import Chunk, TextDelta
 from ..persistence.database import DatabaseManager
+from ..utils.intents import TASK_INTENTS
 
 class TaskAutomationAgent(Agent):
     """Agent for task automation and scheduling"""
@@ -23,36 +26,36 @@ class TaskAutomationAgent(Agent):
         self.scheduler.start()
         logger.info("Task automation agent initialized with scheduler")
     
-    async def process(self, query: str) -> str:
+    async def process_stream(self, query: str) -> AsyncIterator[Chunk]:
         """
         Process a task automation query and schedule or manage tasks
         
         Args:
             query: The task automation query
             
-        Returns:
-            The result of the task automation request
+        Yields:
+            The result of the task automation request, in one piece
         """
-        try:
-            # Pre-process the query
-            processed_query = await self._pre_process(query)
-            
-            # Parse the query to determine the task type
-            if "schedule" in processed_query.lower() or "remind" in processed_query.lower():
-                result = await self._schedule_task(processed_query)
-            elif "list" in processed_query.lower() or "show" in processed_query.lower():
-                result = await self._list_tasks()
-            elif "cancel" in processed_query.lower() or "delete" in processed_query.lower():
-                result = await self._cancel_task(processed_query)
-            else:
-                result = "I'm not sure what task automation action to perform. Try asking to schedule, list, or cancel tasks."
-            
-            # Post-process the response
-            return await self._post_process(result)
-        
-        except Exception as e:
-            logger.error(f"Error in task automation: {str(e)}")
-            return f"Error in task automation: {str(e)}"
+        # Pre-process the query
+        processed_query = await self._pre_process(query)
+        
+        # Parse the query to determine the task type
+        intent = TASK_INTENTS.classify(processed_query)
+        if intent == "schedule":
+            result = await self._schedule_task(processed_query)
+        elif intent == "list":
+            result = await self._list_tasks()
+        elif intent == "cancel":
+            result = await self._cancel_task(processed_query)
+        else:
+            result = "I'm not sure what task automation action to perform. Try asking to schedule, list, or cancel tasks."
+        
+        # Post-process the response
+        yield TextDelta(await self._post_process(result))
+    
+    def _error_response(self, error: Exception) -> str:
+        """Message telling the user the task request failed"""
+        return f"Error in task automation: {str(error)}"
     
     async def _schedule_task(self, query: str) -> str:
         """
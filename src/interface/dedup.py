@@ -0,0 +1,261 @@
+"""
+Update De-duplication for the Telegram Bot Interface
+
+Telegram redelivers updates when a webhook delivery times out or when the
+bot restarts before acknowledging them. This module remembers handled
+updates by update ID and by (chat ID, message ID), together with the replies
+sent for them, so a redelivered update replays those replies instead of
+running the agent again.
+"""
+import asyncio
+import base64
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Optional
+
+from telegram import Update
+from loguru import logger
+
+# Completed updates are purged from the database after this many new ones
+PURGE_INTERVAL = 1000
+
+class DedupStats:
+    """Counters for update de-duplication"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.in_progress = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'persistent_hits': self.persistent_hits,
+            'misses': self.misses,
+            'in_progress_duplicates': self.in_progress,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+class HandledUpdate:
+    """An update being or having been handled, and the replies sent for it"""
+
+    __slots__ = ("update_id", "message_key", "replies", "slots", "size", "replayable",
+                 "completed", "expires_at")
+
+    def __init__(self, update_id: int, message_key: Optional[tuple], expires_at: float):
+        self.update_id = update_id
+        self.message_key = message_key
+        self.replies = []
+        self.slots = {}
+        self.size = 0
+        self.replayable = True
+        self.completed = False
+        self.expires_at = expires_at
+
+# The update handled by the current task, so outbound messages can be attributed to it
+_current_update: ContextVar[Optional[HandledUpdate]] = ContextVar("current_handled_update", default=None)
+
+class UpdateDeduplicator:
+    """Bounded TTL store of handled updates with an optional database backing"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400, db_manager=None,
+                 max_reply_bytes: int = 65536):
+        """
+        Initialize the store
+
+        Args:
+            max_entries: Maximum number of updates kept in memory
+            ttl: Seconds a handled update is remembered
+            db_manager: Optional DatabaseManager to persist handled updates across restarts
+            max_reply_bytes: Replies larger than this are not kept; a redelivered
+                update with such replies is dropped without replaying them
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_manager = db_manager
+        self.max_reply_bytes = max_reply_bytes
+        self.stats = DedupStats()
+        self._entries = OrderedDict()
+        self._by_message = {}
+        self._completed_since_purge = 0
+
+    @staticmethod
+    def _message_key(update: Update) -> Optional[tuple]:
+        """Key of a new message, which stays the same if the update is redelivered"""
+        if update.message is not None:
+            return (update.message.chat_id, update.message.message_id)
+        return None
+
+    def _lookup(self, update_id: int, message_key: Optional[tuple]) -> Optional[HandledUpdate]:
+        """Find an unexpired in-memory entry by either key"""
+        entry = self._entries.get(update_id)
+        if entry is None and message_key is not None:
+            entry = self._entries.get(self._by_message.get(message_key))
+        if entry is not None and entry.completed and entry.expires_at <= time.monotonic():
+            self.stats.expired += 1
+            self._remove(entry)
+            return None
+        return entry
+
+    def _insert(self, entry: HandledUpdate):
+        """Add an entry, evicting the oldest ones beyond the size bound"""
+        self._entries[entry.update_id] = entry
+        if entry.message_key is not None:
+            self._by_message[entry.message_key] = entry.update_id
+        while len(self._entries) > self.max_entries:
+            _, oldest = self._entries.popitem(last=False)
+            if oldest.message_key is not None:
+                self._by_message.pop(oldest.message_key, None)
+            self.stats.evictions += 1
+
+    def _remove(self, entry: HandledUpdate):
+        """Remove an entry by both keys"""
+        self._entries.pop(entry.update_id, None)
+        if entry.message_key is not None:
+            self._by_message.pop(entry.message_key, None)
+
+    async def check(self, update: Update) -> Optional[HandledUpdate]:
+        """
+        Check whether an update was already handled
+
+        A new update is registered as in progress and becomes the current
+        update, so replies sent while handling it are recorded.
+
+        Args:
+            update: The incoming update
+
+        Returns:
+            None for a new update, otherwise the earlier entry; its replies
+            should be replayed if it is completed
+        """
+        _current_update.set(None)
+        message_key = self._message_key(update)
+        entry = self._lookup(update.update_id, message_key)
+
+        if entry is None and self.db_manager is not None:
+            chat_id, message_id = message_key if message_key else (None, None)
+            try:
+                record = await asyncio.to_thread(
+                    self.db_manager.get_processed_update, update.update_id, chat_id, message_id
+                )
+            except Exception as e:
+                logger.error(f"Could not look up handled update {update.update_id}: {str(e)}")
+                record = None
+            if record is not None:
+                self.stats.persistent_hits += 1
+                entry = HandledUpdate(update.update_id, message_key, time.monotonic() + self.ttl)
+                entry.replies = record['replies']
+                entry.completed = True
+                self._insert(entry)
+
+        if entry is not None:
+            if entry.completed:
+                self.stats.hits += 1
+            else:
+                self.stats.in_progress += 1
+            return entry
+
+        self.stats.misses += 1
+        entry = HandledUpdate(update.update_id, message_key, float("inf"))
+        self._insert(entry)
+        _current_update.set(entry)
+        return None
+
+    def record(self, action: str, target, result, payload, kwargs: dict):
+        """
+        Record a message sent while handling the current update
+
+        Used as an OutboundScheduler listener. Edits replace the recorded text
+        of the message they edit, so only the final state is replayed.
+        """
+        entry = _current_update.get()
+        if entry is None or not entry.replayable:
+            return
+
+        if action == "reply_document":
+            data = payload.getvalue() if hasattr(payload, "getvalue") else bytes(payload)
+            reply = {'kind': 'document', 'filename': kwargs.get('filename'),
+                     'data': base64.b64encode(data).decode("ascii")}
+            size = len(reply['data'])
+        else:
+            reply = {'kind': 'text', 'text': payload, 'parse_mode': kwargs.get('parse_mode')}
+            size = len(payload)
+
+        if action == "edit_text":
+            slot_key = (getattr(target, "chat_id", None), getattr(target, "message_id", None))
+        else:
+            slot_key = (getattr(result, "chat_id", None), getattr(result, "message_id", None))
+
+        index = entry.slots.get(slot_key) if action == "edit_text" else None
+        if index is None:
+            entry.slots[slot_key] = len(entry.replies)
+            entry.replies.append(reply)
+        else:
+            entry.replies[index] = reply
+
+        entry.size += size
+        if entry.size > self.max_reply_bytes:
+            entry.replayable = False
+            entry.replies = []
+            entry.slots = {}
+
+    async def complete(self, update: Update):
+        """
+        Mark the current update as handled and persist its replies
+
+        Args:
+            update: The handled update
+        """
+        entry = self._entries.get(update.update_id)
+        if entry is None or entry.completed:
+            return
+        if _current_update.get() is entry:
+            _current_update.set(None)
+        entry.completed = True
+        entry.expires_at = time.monotonic() + self.ttl
+        entry.slots = {}
+
+        if self.db_manager is None:
+            return
+        chat_id, message_id = entry.message_key if entry.message_key else (None, None)
+        try:
+            await asyncio.to_thread(
+                self.db_manager.save_processed_update,
+                entry.update_id,
+                entry.replies,
+                datetime.utcnow() + timedelta(seconds=self.ttl),
+                chat_id,
+                message_id
+            )
+            self._completed_since_purge += 1
+            if self._completed_since_purge >= PURGE_INTERVAL:
+                self._completed_since_purge = 0
+                await asyncio.to_thread(self.db_manager.purge_processed_updates)
+        except Exception as e:
+            logger.error(f"Could not persist handled update {entry.update_id}: {str(e)}")
+
+    async def replay(self, entry: HandledUpdate, message, scheduler):
+        """
+        Send the recorded replies of a handled update again
+
+        Args:
+            entry: The completed entry
+            message: The message to reply to
+            scheduler: The OutboundScheduler to send through
+        """
+        for reply in entry.replies:
+            if reply['kind'] == 'document':
+                document = base64.b64decode(reply['data'])
+                await scheduler.reply_document(message, document, filename=reply['filename'])
+            else:
+                await scheduler.reply_text(message, reply['text'], parse_mode=reply['parse_mode'])
@@ -0,0 +1,199 @@
+"""
+Result Delivery for the Telegram Bot Interface
+
+This module delivers agent results of any size. Results that fit in a
+message are sent as-is, longer ones are split on line boundaries without
+breaking code fences or Markdown entities, and results past a size
+threshold are uploaded as a document from an in-memory buffer.
+"""
+import io
+from typing import Iterator, List, Optional
+
+from telegram.error import BadRequest
+from loguru import logger
+
+from .streaming import MAX_MESSAGE_LENGTH
+
+FENCE = "```"
+# Longest language tag kept when a code block is reopened in the next chunk
+MAX_LANGUAGE_LENGTH = 32
+
+class DeliveryStats:
+    """Counters for delivered results"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.results = 0
+        self.messages = 0
+        self.split_results = 0
+        self.documents = 0
+        self.document_bytes = 0
+        self.markdown_fallbacks = 0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'results': self.results,
+            'messages': self.messages,
+            'split_results': self.split_results,
+            'documents': self.documents,
+            'document_bytes': self.document_bytes,
+            'markdown_fallbacks': self.markdown_fallbacks
+        }
+
+def _is_safe_cut(prefix: str) -> bool:
+    """Check that cutting after prefix does not split a Markdown entity"""
+    spans = prefix.split("`")
+    if len(spans) % 2 == 0:
+        return False
+    # Markdown characters inside inline code are literal
+    text = "".join(spans[::2])
+    return (
+        text.count("*") % 2 == 0
+        and text.count("_") % 2 == 0
+        and text.count("[") == text.count("]")
+        and text.rfind("](") <= text.rfind(")")
+    )
+
+def _split_long_line(line: str, width: int, in_code: bool = False) -> Iterator[str]:
+    """
+    Split a line that does not fit in a message
+
+    Cuts at the last space before the width where no inline entity is open,
+    falling back to a hard cut when there is none. A line inside a code block
+    has no entities, so it is cut at the last space.
+    """
+    while len(line) > width:
+        cut = line.rfind(" ", 0, width)
+        while cut > 0 and not in_code and not _is_safe_cut(line[:cut]):
+            cut = line.rfind(" ", 0, cut)
+        if cut <= 0:
+            cut = width
+        yield line[:cut]
+        line = line[cut:].lstrip(" ") if line[cut:cut + 1] == " " else line[cut:]
+    yield line
+
+def _opening_fence(line: str) -> str:
+    """Fence reopening the code block opened by a line, with its language tag"""
+    info = line.strip()[len(FENCE):].split()
+    return FENCE + (info[0][:MAX_LANGUAGE_LENGTH] if info else "")
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    Split text into chunks that each fit in a Telegram message
+
+    Splits happen between lines. A code block that spans a split is closed
+    at the end of one chunk and reopened, with its language tag, at the start
+    of the next, so every chunk renders on its own and stays within the limit.
+
+    Args:
+        text: The text to split
+        limit: Maximum length of a chunk
+
+    Returns:
+        The list of chunks
+    """
+    if len(text) <= limit:
+        return [text]
+
+    chunks = []
+    lines = []
+    length = 0
+    open_fence = None
+    # Leave room for reopening and closing a fence around a split line
+    width = max(limit - 64, limit // 2)
+
+    for line in text.split("\n"):
+        # Only whole lines are fences, never the pieces of a split one
+        is_fence = line.strip().startswith(FENCE)
+        fence_after = (None if open_fence else _opening_fence(line)) if is_fence else open_fence
+        for piece in _split_long_line(line, width, open_fence is not None and not is_fence):
+            needed = length + len(piece) + (1 if lines else 0) + (len(FENCE) + 1 if fence_after else 0)
+
+            if needed > limit and lines:
+                chunks.append("\n".join(lines) + ("\n" + FENCE if open_fence else ""))
+                lines = [open_fence] if open_fence else []
+                length = len(open_fence) if open_fence else 0
+
+            length += len(piece) + (1 if lines else 0)
+            lines.append(piece)
+            # A fence line opens or closes its block with its first piece
+            open_fence = fence_after
+
+    if lines:
+        chunks.append("\n".join(lines))
+    return chunks
+
+class ResultDelivery:
+    """Delivers agent results as a message, several messages or a document"""
+
+    def __init__(self, scheduler, document_threshold: int = 12000):
+        """
+        Initialize the result delivery
+
+        Args:
+            scheduler: The OutboundScheduler all requests are sent through
+            document_threshold: Results longer than this many characters are
+                uploaded as a document instead of being split into messages
+        """
+        self.scheduler = scheduler
+        self.document_threshold = document_threshold
+        self.stats = DeliveryStats()
+
+    async def deliver(self, message, result: str, language: Optional[str] = None,
+                      filename: str = "result.txt", status_message=None):
+        """
+        Deliver a result in reply to a message
+
+        Args:
+            message: The message that requested the result
+            result: The result text
+            language: Language tag to render the result as a code block, if any
+            filename: File name used if the result is sent as a document
+            status_message: Optional placeholder message to replace with the
+                (first part of the) result
+        """
+        self.stats.results += 1
+
+        if len(result) > self.document_threshold:
+            await self._deliver_document(message, result, filename, status_message)
+            return
+
+        if language is not None:
+            text, parse_mode = f"{FENCE}{language}\n{result}\n{FENCE}", "Markdown"
+        else:
+            text, parse_mode = result, None
+
+        chunks = split_message(text)
+        if len(chunks) > 1:
+            self.stats.split_results += 1
+
+        for index, chunk in enumerate(chunks):
+            if index == 0 and status_message is not None:
+                await self._send(self.scheduler.edit_text, status_message, chunk, parse_mode)
+            else:
+                await self._send(self.scheduler.reply_text, message, chunk, parse_mode)
+
+    async def _send(self, send, target, text: str, parse_mode: Optional[str]):
+        """Send one chunk, retrying without formatting if Telegram cannot parse it"""
+        try:
+            await send(target, text, parse_mode=parse_mode)
+        except BadRequest as e:
+            if parse_mode is None or "parse" not in str(e).lower():
+                raise
+            logger.warning(f"Resending chunk without {parse_mode} formatting: {str(e)}")
+            self.stats.markdown_fallbacks += 1
+            await send(target, text)
+        self.stats.messages += 1
+
+    async def _deliver_document(self, message, result: str, filename: str, status_message=None):
+        """Upload the result as a document built in memory"""
+        data = result.encode("utf-8")
+        caption = f"Result attached as {filename} ({len(data) / 1024:.1f} KB)"
+
+        if status_message is not None:
+            await self.scheduler.edit_text(status_message, caption)
+        await self.scheduler.reply_document(message, io.BytesIO(data), filename=filename)
+
+        self.stats.documents += 1
+        self.stats.document_bytes += len(data)
@@ -0,0 +1,167 @@
+"""
+Update Dispatcher for the Telegram Bot Interface
+
+This module provides an update processor that handles updates from different
+chats concurrently while keeping updates from the same chat in order, and
+caps the number of updates being handled at once.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Upper bounds (in seconds) of the queue wait histogram buckets
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+class DispatchStats:
+    """Counters for update dispatching and queue wait times"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.dispatched = 0
+        self.completed = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def record_wait(self, wait: float):
+        """
+        Record how long an update waited before being handled
+
+        Args:
+            wait: Wait time in seconds
+        """
+        self.dispatched += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        for index, bound in enumerate(WAIT_BUCKETS):
+            if wait <= bound:
+                self.wait_buckets[index] += 1
+                return
+        self.wait_buckets[-1] += 1
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        labels = [f"<={bound}s" for bound in WAIT_BUCKETS] + [f">{WAIT_BUCKETS[-1]}s"]
+        return {
+            'dispatched': self.dispatched,
+            'completed': self.completed,
+            'waiting': self.waiting,
+            'in_flight': self.in_flight,
+            'avg_wait': self.total_wait / self.dispatched if self.dispatched else 0.0,
+            'max_wait': self.max_wait,
+            'wait_histogram': dict(zip(labels, self.wait_buckets))
+        }
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates concurrently across chats and sequentially within a chat
+
+    The semaphore of the base class only bounds how many updates may be pending
+    in the processor. The in-flight cap is applied after the per-chat lock is
+    taken, so a burst from one chat cannot occupy slots other chats could use.
+    """
+
+    def __init__(self, max_in_flight: int, max_pending: int = 10000,
+                 is_urgent: Optional[Callable[[object], bool]] = None):
+        """
+        Initialize the update processor
+
+        Args:
+            max_in_flight: Maximum number of updates handled at the same time
+            max_pending: Maximum number of updates accepted by the processor,
+                including those waiting for their chat or an in-flight slot
+            is_urgent: Optional predicate for updates that are handled right away,
+                without waiting for their chat or an in-flight slot (e.g. /cancel)
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be a positive integer")
+        super().__init__(max(max_pending, max_in_flight))
+        self.max_in_flight = max_in_flight
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._chat_locks = {}
+        self.is_urgent = is_urgent
+        self.stats = DispatchStats()
+
+    @staticmethod
+    def ordering_key(update: object) -> Optional[int]:
+        """
+        Determine the key updates are ordered by
+
+        Args:
+            update: The incoming update
+
+        Returns:
+            The chat ID, the user ID for chat-less updates, or None if unordered
+        """
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        """
+        Wait for the update's chat and an in-flight slot, then handle the update
+
+        Args:
+            update: The update to be processed
+            coroutine: The coroutine that handles the update
+        """
+        key = self.ordering_key(update)
+        queued_at = time.monotonic()
+        self.stats.waiting += 1
+        started = False
+
+        try:
+            if self.is_urgent is not None and self.is_urgent(update):
+                started = True
+                await self._run(coroutine, queued_at)
+            elif key is None:
+                async with self._in_flight:
+                    started = True
+                    await self._run(coroutine, queued_at)
+            else:
+                lock, holders = self._chat_locks.get(key, (None, 0))
+                if lock is None:
+                    lock = asyncio.Lock()
+                self._chat_locks[key] = (lock, holders + 1)
+                try:
+                    async with lock:
+                        async with self._in_flight:
+                            started = True
+                            await self._run(coroutine, queued_at)
+                finally:
+                    lock, holders = self._chat_locks[key]
+                    if holders == 1:
+                        del self._chat_locks[key]
+                    else:
+                        self._chat_locks[key] = (lock, holders - 1)
+        finally:
+            if not started:
+                self.stats.waiting -= 1
+                # Avoid "coroutine was never awaited" warnings when cancelled while queued
+                if hasattr(coroutine, "close"):
+                    coroutine.close()
+
+    async def _run(self, coroutine: "Awaitable[Any]", queued_at: float):
+        """Record the queue wait and run the update's coroutine"""
+        self.stats.waiting -= 1
+        self.stats.record_wait(time.monotonic() - queued_at)
+        self.stats.in_flight += 1
+        try:
+            await coroutine
+        finally:
+            self.stats.in_flight -= 1
+            self.stats.completed += 1
+
+    async def initialize(self) -> None:
+        """Nothing to allocate"""
+
+    async def shutdown(self) -> None:
+        """Nothing to release"""
@@ -0,0 +1,200 @@
+"""
+In-flight Agent Work for the Telegram Bot Interface
+
+This module runs agent calls as tasks tracked per chat, so a chat can cancel
+its running work with /cancel. Each call is recorded in the task history and
+its row is marked success, error or cancelled when it ends. Work interrupted
+by a shutdown is marked pending together with the context needed to resume it.
+"""
+import asyncio
+from typing import Any, Awaitable, Hashable, Optional
+
+from loguru import logger
+
+class WorkCancelled(Exception):
+    """Raised to the handler awaiting agent work that was cancelled on request"""
+
+class WorkSuspended(WorkCancelled):
+    """Raised to the handler awaiting agent work that was stopped by a shutdown and saved for later"""
+
+class InFlightStats:
+    """Counters for tracked agent work"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.started = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.cancel_requests = 0
+        self.suspended = 0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'started': self.started,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'cancel_requests': self.cancel_requests,
+            'suspended': self.suspended
+        }
+
+class InFlightWork:
+    """Tracks running agent work by chat"""
+
+    def __init__(self, db_manager=None):
+        """
+        Initialize the tracker
+
+        Args:
+            db_manager: Optional DatabaseManager the work is recorded in
+        """
+        self.db_manager = db_manager
+        self.stats = InFlightStats()
+        self._tasks = {}
+        self._cancel_requested = set()
+        self._suspend_requested = set()
+        self.accepting = True
+
+    def running(self, chat_id: Optional[Hashable] = None) -> int:
+        """
+        Get the number of running tasks
+
+        Args:
+            chat_id: The chat ID, or None to count the tasks of all chats
+
+        Returns:
+            The number of running tasks
+        """
+        if chat_id is None:
+            return sum(len(tasks) for tasks in self._tasks.values())
+        return len(self._tasks.get(chat_id, ()))
+
+    async def run(self, chat_id: Hashable, task_type: str, query: str, work: Awaitable[Any],
+                  context: Optional[dict] = None, record_id: Optional[int] = None) -> Any:
+        """
+        Run agent work as a task that the chat can cancel
+
+        Args:
+            chat_id: The chat the work belongs to
+            task_type: Type of task recorded in the task history (code, research, etc.)
+            query: The query recorded in the task history
+            work: The awaitable doing the work
+            context: Context saved with the task so it can be resumed after a restart
+            record_id: Task history row to reuse when resuming saved work
+
+        Returns:
+            The result of the work
+
+        Raises:
+            WorkSuspended: If the work was stopped by suspend_all() or arrived after it
+            WorkCancelled: If the work was cancelled with cancel()
+        """
+        if record_id is None:
+            record_id = await self._record("add_task_record", task_type, query, status='running', context=context)
+        else:
+            await self._update(record_id, status='running')
+
+        if not self.accepting:
+            if hasattr(work, "close"):
+                work.close()
+            self.stats.suspended += 1
+            await self._update(record_id, status='pending')
+            raise WorkSuspended(f"{task_type} task was saved for after the restart")
+
+        task = asyncio.ensure_future(work)
+        self._tasks.setdefault(chat_id, set()).add(task)
+        self.stats.started += 1
+
+        try:
+            # If the handler itself is cancelled, awaiting the task cancels it as well
+            result = await task
+        except asyncio.CancelledError:
+            if task in self._suspend_requested:
+                self.stats.suspended += 1
+                await self._update(record_id, status='pending')
+                raise WorkSuspended(f"{task_type} task was saved for after the restart")
+            self.stats.cancelled += 1
+            await self._update(record_id, status='cancelled')
+            if task in self._cancel_requested:
+                raise WorkCancelled(f"{task_type} task was cancelled")
+            raise
+        except Exception as e:
+            self.stats.failed += 1
+            await self._update(record_id, result=str(e), status='error')
+            raise
+        finally:
+            self._cancel_requested.discard(task)
+            self._suspend_requested.discard(task)
+            tasks = self._tasks.get(chat_id)
+            if tasks is not None:
+                tasks.discard(task)
+                if not tasks:
+                    del self._tasks[chat_id]
+
+        self.stats.succeeded += 1
+        await self._update(record_id, result=result, status='success')
+        return result
+
+    def cancel(self, chat_id: Hashable) -> int:
+        """
+        Cancel all running work of a chat
+
+        Args:
+            chat_id: The chat ID
+
+        Returns:
+            The number of tasks cancelled
+        """
+        self.stats.cancel_requests += 1
+        tasks = [task for task in self._tasks.get(chat_id, ()) if not task.done()]
+        for task in tasks:
+            self._cancel_requested.add(task)
+            task.cancel()
+        return len(tasks)
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """
+        Wait for the running work to finish
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if no work is running anymore
+        """
+        tasks = [task for tasks in self._tasks.values() for task in tasks]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        return all(task.done() for task in tasks)
+
+    def suspend_all(self) -> int:
+        """
+        Stop accepting work and stop the running work, saving it as pending
+
+        Returns:
+            The number of tasks stopped
+        """
+        self.accepting = False
+        tasks = [task for tasks in self._tasks.values() for task in tasks if not task.done()]
+        for task in tasks:
+            self._suspend_requested.add(task)
+            task.cancel()
+        return len(tasks)
+
+    async def _update(self, record_id, **fields):
+        """Update the task history row of the work, if it was recorded"""
+        if record_id is not None:
+            await self._record("update_task_record", record_id, **fields)
+
+    async def _record(self, method: str, *args, **kwargs):
+        """Call a DatabaseManager method off the event loop, logging failures"""
+        if self.db_manager is None:
+            return None
+        try:
+            record = await asyncio.to_thread(getattr(self.db_manager, method), *args, **kwargs)
+            return record['id'] if record else None
+        except Exception as e:
+            logger.error(f"Could not record in-flight work: {str(e)}")
+            return None
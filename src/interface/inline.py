@@ -0,0 +1,181 @@
+"""
+Inline Mode for the Telegram Bot Interface
+
+This module answers inline queries (`@bot query` typed in any chat) from the
+answer index, since Telegram only waits a few seconds for an inline answer
+and agents take much longer. When nothing matches, the answer is generated
+in the background once the user pauses typing, so it can be served the next
+time the query is sent.
+"""
+import asyncio
+from contextlib import nullcontext
+from typing import Optional
+
+from telegram import (
+    InlineQueryResultArticle,
+    InlineQueryResultsButton,
+    InputTextMessageContent,
+    Update,
+)
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+from loguru import logger
+
+from ..orchestration.answer_index import AnswerIndex, normalize_query
+from ..orchestration.task_queue import PRIORITY_LOW
+from ..utils.intents import BOT_INTENTS
+from .streaming import MAX_MESSAGE_LENGTH
+from .user_limits import UserRateLimiter
+
+# Telegram limits
+MAX_INLINE_RESULTS = 50
+MAX_TITLE_LENGTH = 64
+
+class InlineStats:
+    """Counters for inline queries"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.queries = 0
+        self.answered = 0
+        self.generations = 0
+        self.generation_failures = 0
+        self.debounced = 0
+        self.limited = 0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'queries': self.queries,
+            'answered': self.answered,
+            'generations': self.generations,
+            'generation_failures': self.generation_failures,
+            'debounced': self.debounced,
+            'limited': self.limited
+        }
+
+class InlineAnswers:
+    """Answers inline queries from the answer index and fills it on misses"""
+
+    def __init__(self, router, index: Optional[AnswerIndex] = None, generation_delay: float = 1.5,
+                 min_query_length: int = 8, max_generations: int = 4,
+                 user_limits: Optional[UserRateLimiter] = None):
+        """
+        Initialize inline answering
+
+        Args:
+            router: The AgentRouter used to generate missing answers
+            index: The answer index, a new one if not given
+            generation_delay: Seconds a query must stay unchanged before its
+                answer is generated, so every keystroke doesn't start an agent call
+            min_query_length: Shorter queries are never generated
+            max_generations: Maximum number of answers generated at once
+            user_limits: Per-user rate limits generations count against, none if not given
+        """
+        self.router = router
+        self.index = index if index is not None else AnswerIndex()
+        self.generation_delay = generation_delay
+        self.min_query_length = min_query_length
+        self.stats = InlineStats()
+        self._pending = {}
+        self._generating = set()
+        self._generation_slots = asyncio.Semaphore(max_generations)
+        self.user_limits = user_limits
+
+    def remember(self, kind: str, query: str, answer: str):
+        """
+        Make a generated answer available to inline queries
+
+        Args:
+            kind: Kind of answer (code, research)
+            query: The query that was answered
+            answer: The generated answer
+        """
+        self.index.add(kind, query, answer)
+
+    async def handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle an inline query"""
+        inline_query = update.inline_query
+        query = inline_query.query.strip()
+        self.stats.queries += 1
+
+        entries = self.index.lookup(query, limit=MAX_INLINE_RESULTS) if query else []
+        results = [
+            InlineQueryResultArticle(
+                id=entry.id,
+                title=f"{entry.kind.capitalize()}: {entry.query}"[:MAX_TITLE_LENGTH],
+                description=entry.answer[:100],
+                input_message_content=InputTextMessageContent(entry.answer[:MAX_MESSAGE_LENGTH])
+            )
+            for entry in entries
+        ]
+
+        button = None
+        if not entries and self._schedule_generation(inline_query.from_user.id, query):
+            button = InlineQueryResultsButton(text="Working on it, try again in a moment", start_parameter="inline")
+
+        try:
+            # Misses are not cached by Telegram so the generated answer shows up on the next try
+            await inline_query.answer(results, cache_time=300 if entries else 0, button=button)
+            self.stats.answered += 1
+        except TelegramError as e:
+            # The user typed on and the query expired
+            logger.debug(f"Could not answer inline query: {str(e)}")
+
+    def _schedule_generation(self, user_id: int, query: str) -> bool:
+        """
+        Generate the answer to a query once the user stops typing
+
+        Returns:
+            True if a generation is scheduled or running for the query
+        """
+        key = normalize_query(query)
+        if len(key) < self.min_query_length:
+            return False
+        if key in self._generating:
+            return True
+
+        previous = self._pending.pop(user_id, None)
+        if previous is not None and not previous.done():
+            previous.cancel()
+            self.stats.debounced += 1
+        self._pending[user_id] = asyncio.create_task(self._generate(user_id, query, key))
+        return True
+
+    async def _generate(self, user_id: int, query: str, key: str):
+        """Wait for the user to stop typing, then generate and index the answer"""
+        await asyncio.sleep(self.generation_delay)
+        if self._pending.get(user_id) is asyncio.current_task():
+            del self._pending[user_id]
+        if key in self._generating:
+            return
+        if self.user_limits is not None and self.user_limits.check(user_id) > 0:
+            # Speculative answers are the first thing a user over their limit goes without
+            self.stats.limited += 1
+            return
+
+        self._generating.add(key)
+        metered = self.user_limits.metered(user_id) if self.user_limits is not None else nullcontext()
+        try:
+            with metered:
+                async with self._generation_slots:
+                    self.stats.generations += 1
+                    kind = BOT_INTENTS.classify(query, default="research")
+                    # The streaming path raises on failure instead of returning an error text;
+                    # speculative answers queue behind the requests users are waiting for
+                    if kind == "code":
+                        answer = await self.router.route_to_code_agent(
+                            query, on_delta=lambda delta: None, priority=PRIORITY_LOW
+                        )
+                    else:
+                        kind = "research"
+                        answer = await self.router.route_to_research_agent(
+                            query, on_delta=lambda delta: None, priority=PRIORITY_LOW
+                        )
+            if answer:
+                self.remember(kind, query, answer)
+        except Exception as e:
+            self.stats.generation_failures += 1
+            logger.error(f"Error generating inline answer: {str(e)}")
+        finally:
+            self._generating.discard(key)
@@ -0,0 +1,98 @@
+"""
+Lifecycle Management for the Telegram Bot Interface
+
+This module drains in-flight agent work when the bot shuts down and resumes
+the work that did not finish in time after the next startup. Unfinished work
+is kept in the task history as pending, together with the chat and message it
+answers, so its reply can still be delivered.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+class LifecycleStats:
+    """Counters for shutdown drains and resumed work"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.drained = 0
+        self.suspended = 0
+        self.resumed = 0
+        self.resume_failures = 0
+        self.last_drain_seconds = 0.0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'drained': self.drained,
+            'suspended': self.suspended,
+            'resumed': self.resumed,
+            'resume_failures': self.resume_failures,
+            'last_drain_seconds': self.last_drain_seconds
+        }
+
+class LifecycleManager:
+    """Drains in-flight work on shutdown and resumes saved work on startup"""
+
+    def __init__(self, inflight, db_manager=None, drain_timeout: float = 25.0):
+        """
+        Initialize the lifecycle manager
+
+        Args:
+            inflight: The InFlightWork tracker of the running agent calls
+            db_manager: Optional DatabaseManager pending work is loaded from
+            drain_timeout: Seconds in-flight work may take to finish on shutdown
+        """
+        self.inflight = inflight
+        self.db_manager = db_manager
+        self.drain_timeout = drain_timeout
+        self.stats = LifecycleStats()
+
+    async def drain(self):
+        """
+        Let in-flight work finish until the deadline, then save the rest as pending
+
+        Call this after the bot stopped accepting updates and before the
+        application is stopped.
+        """
+        started = time.monotonic()
+        running = self.inflight.running()
+        if running:
+            logger.info(f"Draining {running} in-flight tasks for up to {self.drain_timeout}s")
+            await self.inflight.wait_idle(self.drain_timeout)
+
+        suspended = self.inflight.suspend_all()
+        if suspended:
+            logger.warning(f"Saved {suspended} unfinished tasks to resume after the restart")
+
+        self.stats.drained += running - suspended
+        self.stats.suspended += suspended
+        self.stats.last_drain_seconds = time.monotonic() - started
+
+    async def resume_pending(self, resume: Callable[[dict], Awaitable[Any]]):
+        """
+        Resume the work saved by a previous shutdown
+
+        Args:
+            resume: Coroutine function running one saved task history record
+        """
+        if self.db_manager is None:
+            return
+        try:
+            records = await asyncio.to_thread(self.db_manager.get_pending_tasks)
+        except Exception as e:
+            logger.error(f"Could not load pending tasks: {str(e)}")
+            return
+        if not records:
+            return
+
+        logger.info(f"Resuming {len(records)} tasks saved before the last shutdown")
+        results = await asyncio.gather(*(resume(record) for record in records), return_exceptions=True)
+        for record, result in zip(records, results):
+            if isinstance(result, BaseException):
+                self.stats.resume_failures += 1
+                logger.error(f"Could not resume task {record['id']}: {str(result)}")
+            else:
+                self.stats.resumed += 1
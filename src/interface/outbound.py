@@ -0,0 +1,287 @@
+"""
+Outbound Message Scheduler for the Telegram Bot Interface
+
+This module paces every message the bot sends through token buckets at the
+global and per-chat level, retries requests rejected by Telegram's flood
+control after the advertised delay, and drops progress edits that were
+superseded by a newer edit of the same message before they were sent.
+"""
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from telegram.error import RetryAfter
+from loguru import logger
+
+# Idle chat lanes are pruned once this many are tracked
+MAX_IDLE_LANES = 1024
+
+class TokenBucket:
+    """Token bucket rate limiter"""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize the bucket
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        """Add the tokens accrued since the last refill"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """
+        Get the time until a token is available
+
+        Returns:
+            Seconds to wait, 0 if a token is available now
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        """Check whether the bucket is idle, i.e. full and not blocked"""
+        return self.delay() == 0.0 and self.tokens >= self.capacity
+
+    def block(self, seconds: float):
+        """
+        Stop handing out tokens for a while, e.g. after a flood control error
+
+        Args:
+            seconds: How long to block the bucket
+        """
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> float:
+        """
+        Wait for and take a token
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            delay = self.delay()
+            if delay <= 0:
+                self.tokens -= 1
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+class OutboundStats:
+    """Counters for outbound requests"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.sent = 0
+        self.retried = 0
+        self.superseded = 0
+        self.failed = 0
+        self.total_delay = 0.0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'sent': self.sent,
+            'retried': self.retried,
+            'superseded': self.superseded,
+            'failed': self.failed,
+            'avg_delay': self.total_delay / self.sent if self.sent else 0.0
+        }
+
+class _ChatLane:
+    """Per-chat ordering lock and rate limiter"""
+
+    __slots__ = ("lock", "bucket", "users")
+
+    def __init__(self, rate: float, capacity: float):
+        self.lock = asyncio.Lock()
+        self.bucket = TokenBucket(rate, capacity)
+        self.users = 0
+
+class OutboundScheduler:
+    """
+    Central scheduler for all requests that send or edit Telegram messages
+
+    Requests for one chat are sent in submission order. Each request takes a
+    token from its chat's bucket and then from the global bucket. Requests
+    rejected with RetryAfter block the chat's bucket for the advertised time
+    and are retried.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0,
+                 chat_burst: float = 3.0, max_retries: int = 3):
+        """
+        Initialize the scheduler
+
+        Args:
+            global_rate: Messages per second across all chats
+            chat_rate: Messages per second within one chat
+            chat_burst: Messages a chat may send in a burst before being paced
+            max_retries: Retries of a request rejected by flood control
+        """
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1.0))
+        self._global_lock = asyncio.Lock()
+        self.chat_rate = chat_rate
+        self.chat_burst = max(chat_burst, 1.0)
+        self.max_retries = max_retries
+        self.stats = OutboundStats()
+        self._lanes = {}
+        self._latest_versions = {}
+        self._versions = itertools.count()
+        # Callables notified of every delivered message as (action, target, result, payload, kwargs)
+        self.listeners = []
+
+    async def submit(self, chat_id: Hashable, call: Callable[[], Awaitable[Any]],
+                     coalesce_key: Optional[Hashable] = None, supersedable: bool = False) -> Any:
+        """
+        Send a request once the rate limits allow it
+
+        Args:
+            chat_id: The chat the request targets
+            call: Function returning the coroutine that performs the request
+            coalesce_key: Key identifying requests that replace each other,
+                e.g. edits of the same message
+            supersedable: Whether the request may be dropped if a newer request
+                with the same coalesce key is submitted before it is sent
+
+        Returns:
+            The result of the request, or None if it was superseded
+        """
+        version = next(self._versions)
+        if coalesce_key is not None:
+            self._latest_versions[coalesce_key] = version
+
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            if len(self._lanes) >= MAX_IDLE_LANES:
+                self._prune_idle_lanes()
+            lane = self._lanes[chat_id] = _ChatLane(self.chat_rate, self.chat_burst)
+        lane.users += 1
+        queued_at = time.monotonic()
+
+        try:
+            async with lane.lock:
+                for attempt in range(self.max_retries + 1):
+                    if supersedable and self._latest_versions.get(coalesce_key) != version:
+                        self.stats.superseded += 1
+                        return None
+
+                    await lane.bucket.acquire()
+                    async with self._global_lock:
+                        await self.global_bucket.acquire()
+
+                    try:
+                        result = await call()
+                    except RetryAfter as e:
+                        if attempt == self.max_retries:
+                            self.stats.failed += 1
+                            raise
+                        logger.warning(f"Flood control for chat {chat_id}, retrying in {e.retry_after}s")
+                        self.stats.retried += 1
+                        lane.bucket.block(e.retry_after)
+                        continue
+                    except Exception:
+                        self.stats.failed += 1
+                        raise
+
+                    self.stats.sent += 1
+                    self.stats.total_delay += time.monotonic() - queued_at
+                    return result
+        finally:
+            lane.users -= 1
+            if lane.users == 0 and lane.bucket.is_full():
+                del self._lanes[chat_id]
+            if coalesce_key is not None and self._latest_versions.get(coalesce_key) == version:
+                del self._latest_versions[coalesce_key]
+
+    def _prune_idle_lanes(self):
+        """Forget chats with no pending requests whose rate limit has fully recovered"""
+        for chat_id in [chat_id for chat_id, lane in self._lanes.items()
+                        if lane.users == 0 and lane.bucket.is_full()]:
+            del self._lanes[chat_id]
+
+    async def reply_text(self, message, text: str, **kwargs):
+        """
+        Reply to a message
+
+        Args:
+            message: The message to reply to
+            text: The text of the reply
+            **kwargs: Further arguments for Message.reply_text
+
+        Returns:
+            The sent message
+        """
+        result = await self.submit(message.chat_id, lambda: message.reply_text(text, **kwargs))
+        self._notify("reply_text", message, result, text, kwargs)
+        return result
+
+    async def edit_text(self, message, text: str, progress: bool = False, **kwargs):
+        """
+        Edit the text of a message
+
+        Args:
+            message: The message to edit
+            text: The new text
+            progress: Whether this is an intermediate state that may be skipped
+                if a newer edit of the same message is waiting behind it
+            **kwargs: Further arguments for Message.edit_text
+
+        Returns:
+            The edited message, or None if the edit was superseded
+        """
+        result = await self.submit(
+            message.chat_id,
+            lambda: message.edit_text(text, **kwargs),
+            coalesce_key=(message.chat_id, message.message_id),
+            supersedable=progress
+        )
+        if not progress:
+            self._notify("edit_text", message, result, text, kwargs)
+        return result
+
+    async def reply_document(self, message, document, **kwargs):
+        """
+        Reply to a message with a document
+
+        Args:
+            message: The message to reply to
+            document: The document to upload, e.g. an in-memory file object
+            **kwargs: Further arguments for Message.reply_document
+
+        Returns:
+            The sent message
+        """
+        def call():
+            # The upload consumes the buffer, so rewind it in case of a retry
+            if hasattr(document, "seek"):
+                document.seek(0)
+            return message.reply_document(document, **kwargs)
+
+        result = await self.submit(message.chat_id, call)
+        self._notify("reply_document", message, result, document, kwargs)
+        return result
+
+    def _notify(self, action: str, target, result, payload, kwargs: dict):
+        """Tell the listeners about a delivered message"""
+        for listener in self.listeners:
+            try:
+                listener(action, target, result, payload, kwargs)
+            except Exception as e:
+                logger.error(f"Outbound listener failed: {str(e)}")
@@ -0,0 +1,162 @@
+"""
+Streaming Replies for the Telegram Bot Interface
+
+This module progressively edits a single Telegram message as text is
+generated, throttled so edits stay within Telegram's rate limits.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from loguru import logger
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+# Shown after the partial text while generation is still running
+CURSOR = " ▌"
+
+class StreamingStats:
+    """Counters for streamed replies"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.streams = 0
+        self.edits = 0
+        self.throttled_retries = 0
+        self.total_first_visible = 0.0
+        self.max_first_visible = 0.0
+        self.first_visible_count = 0
+
+    def record_first_visible(self, delay: float):
+        """
+        Record the time until the first generated text was visible to the user
+
+        Args:
+            delay: Seconds since the request started
+        """
+        self.first_visible_count += 1
+        self.total_first_visible += delay
+        self.max_first_visible = max(self.max_first_visible, delay)
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'streams': self.streams,
+            'edits': self.edits,
+            'throttled_retries': self.throttled_retries,
+            'avg_time_to_first_visible': (
+                self.total_first_visible / self.first_visible_count if self.first_visible_count else 0.0
+            ),
+            'max_time_to_first_visible': self.max_first_visible
+        }
+
+class StreamingReply:
+    """
+    Accumulates generated text and edits a placeholder message with it
+
+    The first delta is shown as soon as it arrives; later edits are spaced at
+    least ``min_interval`` seconds apart and intermediate states are skipped.
+    Progress edits are sent as plain text because partial Markdown usually
+    fails to parse; the caller performs the final, formatted edit.
+
+    Usage:
+        async with StreamingReply(message) as stream:
+            result = await router.route_to_code_agent(query, on_delta=stream.push)
+    """
+
+    def __init__(self, message, min_interval: float = 1.0, stats: Optional[StreamingStats] = None,
+                 scheduler=None):
+        """
+        Initialize the streaming reply
+
+        Args:
+            message: The Telegram message to edit
+            min_interval: Minimum seconds between two edits
+            stats: Optional counters to record into
+            scheduler: Optional OutboundScheduler to send the edits through
+        """
+        self.message = message
+        self.scheduler = scheduler
+        self.min_interval = min_interval
+        self.stats = stats or StreamingStats()
+        self.started_at = time.monotonic()
+        self._parts = []
+        self._last_text = None
+        self._first_visible = False
+        self._dirty = asyncio.Event()
+        self._flusher = None
+
+    @property
+    def text(self) -> str:
+        """The text received so far"""
+        return "".join(self._parts)
+
+    def push(self, delta: str):
+        """
+        Append a delta of generated text
+
+        Args:
+            delta: The newly generated text
+        """
+        self._parts.append(delta)
+        self._dirty.set()
+
+    async def __aenter__(self) -> "StreamingReply":
+        self.stats.streams += 1
+        self._flusher = asyncio.create_task(self._flush_loop())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._flusher.cancel()
+        try:
+            await self._flusher
+        except asyncio.CancelledError:
+            pass
+
+    async def _flush_loop(self):
+        """Edit the message whenever new text arrived, at most once per interval"""
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            await self._edit(self._progress_text())
+            await asyncio.sleep(self.min_interval)
+
+    def _progress_text(self) -> str:
+        """Render the partial text, truncated to fit a single message"""
+        text = self.text
+        limit = MAX_MESSAGE_LENGTH - len(CURSOR) - 1
+        if len(text) > limit:
+            return text[:limit] + "…"
+        return text + CURSOR
+
+    async def _edit(self, text: str):
+        """Edit the message, waiting out flood control if Telegram asks for it"""
+        if not text.strip() or text == self._last_text:
+            return
+        while True:
+            try:
+                if self.scheduler is not None:
+                    # The scheduler paces the edit, retries flood control errors and
+                    # drops it if a newer edit of the message is already waiting
+                    if await self.scheduler.edit_text(self.message, text, progress=True) is None:
+                        return
+                else:
+                    await self.message.edit_text(text)
+                break
+            except RetryAfter as e:
+                self.stats.throttled_retries += 1
+                await asyncio.sleep(e.retry_after)
+            except BadRequest as e:
+                # "Message is not modified" and similar are harmless for progress edits
+                logger.debug(f"Skipping streaming edit: {str(e)}")
+                return
+            except TelegramError as e:
+                logger.warning(f"Streaming edit failed: {str(e)}")
+                return
+
+        self._last_text = text
+        self.stats.edits += 1
+        if not self._first_visible:
+            self._first_visible = True
+            self.stats.record_first_visible(time.monotonic() - self.started_at)
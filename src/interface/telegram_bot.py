@@ -5,37 +5,166 @@ This module handles the Telegram bot interface for the multi-skill agent,
 including command handling and message routing.
 """
 import asyncio
-from telegram import Update
+import math
+import signal
+from datetime import datetime, timezone
+from telegram import Chat, Message, Update
 from telegram.ext import (
     Application,
+    ApplicationHandlerStop,
     CommandHandler,
+    InlineQueryHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
 from loguru import logger
 
-from ..utils.config import TELEGRAM_BOT_TOKEN
+from ..utils.config import (
+    TELEGRAM_BOT_TOKEN,
+    TELEGRAM_WEBHOOK_URL,
+    TELEGRAM_WEBHOOK_PATH,
+    TELEGRAM_WEBHOOK_SECRET,
+    TELEGRAM_MAX_CONCURRENT_UPDATES,
+    TELEGRAM_STREAM_EDIT_INTERVAL,
+    TELEGRAM_GLOBAL_SEND_RATE,
+    TELEGRAM_CHAT_SEND_RATE,
+    TELEGRAM_CHAT_SEND_BURST,
+    TELEGRAM_DOCUMENT_THRESHOLD,
+    TELEGRAM_REQUEST_TIMEOUT,
+    TELEGRAM_DEDUP_MAX_ENTRIES,
+    TELEGRAM_DEDUP_TTL,
+    TELEGRAM_DEDUP_PERSIST,
+    INLINE_CACHE_MAX_ENTRIES,
+    INLINE_CACHE_MAX_BYTES,
+    INLINE_GENERATION_DELAY,
+    SHUTDOWN_DRAIN_TIMEOUT,
+    USER_REQUESTS_PER_MINUTE,
+    USER_REQUEST_BURST,
+    USER_TOKENS_PER_HOUR,
+    USER_TOKEN_BURST,
+    USAGE_LEDGER_FLUSH_INTERVAL,
+    AGENT_POOL_SIZES,
+    AGENT_QUEUE_DEPTH,
+    AGENT_TIMEOUTS,
+    AGENT_EXECUTION,
+    JOB_QUEUE_PREFIX,
+    JOB_RESULT_TIMEOUT,
+    REDIS_HOST,
+    REDIS_PORT,
+    REDIS_PASSWORD,
+    DASHBOARD_PORT,
+)
+from ..utils.intents import BOT_INTENTS
+from ..agents.context_budget import context_budget_stats
+from ..agents.model_router import model_router_stats
+from ..orchestration.answer_index import AnswerIndex
+from ..orchestration.deadline import deadline_scope, parse_timeouts
+from ..orchestration.provider_guard import provider_guard_stats
 from ..orchestration.router import AgentRouter
+from ..orchestration.task_queue import TaskQueue, parse_pool_sizes
+from ..persistence.database import DatabaseManager
+from ..persistence.response_cache import response_cache_stats
+from ..persistence.usage_ledger import UsageLedger
+from .dedup import UpdateDeduplicator
+from .dispatcher import ChatOrderedUpdateProcessor
+from .inline import InlineAnswers
+from .inflight import InFlightWork, WorkCancelled, WorkSuspended
+from .lifecycle import LifecycleManager
+from .outbound import OutboundScheduler
+from .delivery import ResultDelivery
+from .streaming import MAX_MESSAGE_LENGTH, StreamingReply, StreamingStats
+from .user_limits import UserRateLimiter
 
 class TelegramInterface:
     """Telegram Bot Interface for the Multi-Skill Super-Agent"""
     
     def __init__(self):
         """Initialize the Telegram bot interface"""
-        self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-        self.router = AgentRouter()
+        # /cancel skips the per-chat queue, which is held by the work it cancels
+        self.update_processor = ChatOrderedUpdateProcessor(
+            TELEGRAM_MAX_CONCURRENT_UPDATES, is_urgent=self._is_cancel_command
+        )
+        builder = Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(self.update_processor)
+        if TELEGRAM_WEBHOOK_URL:
+            # Updates are pushed into the update queue by the webhook server
+            builder = builder.updater(None)
+        self.application = builder.build()
+        # Each agent has its own workers, so slow image jobs don't hold up code jobs
+        self.router = AgentRouter(
+            task_queue=TaskQueue(parse_pool_sizes(AGENT_POOL_SIZES), max_depth=AGENT_QUEUE_DEPTH),
+            job_queue=self._create_job_queue(),
+            timeouts=parse_timeouts(AGENT_TIMEOUTS)
+        )
+        self.db_manager = DatabaseManager()
+        # Agent calls run as tasks tracked per chat so /cancel can stop them
+        self.inflight = InFlightWork(self.db_manager)
+        # Drains the calls on shutdown and resumes the unfinished ones after the next startup
+        self.lifecycle = LifecycleManager(self.inflight, self.db_manager, drain_timeout=SHUTDOWN_DRAIN_TIMEOUT)
+        # Requests are admitted per user before they are routed, and their model calls charged afterwards
+        self.user_limits = UserRateLimiter(
+            requests_per_minute=USER_REQUESTS_PER_MINUTE,
+            request_burst=USER_REQUEST_BURST,
+            tokens_per_hour=USER_TOKENS_PER_HOUR,
+            token_burst=USER_TOKEN_BURST,
+            ledger=UsageLedger(self.db_manager, flush_interval=USAGE_LEDGER_FLUSH_INTERVAL)
+        )
+        self.streaming_stats = StreamingStats()
+        # Every message the bot sends goes through the outbound scheduler
+        self.outbound = OutboundScheduler(
+            global_rate=TELEGRAM_GLOBAL_SEND_RATE,
+            chat_rate=TELEGRAM_CHAT_SEND_RATE,
+            chat_burst=TELEGRAM_CHAT_SEND_BURST
+        )
+        self.delivery = ResultDelivery(self.outbound, document_threshold=TELEGRAM_DOCUMENT_THRESHOLD)
+        # Redelivered updates replay the replies recorded for the first delivery
+        self.dedup = UpdateDeduplicator(
+            max_entries=TELEGRAM_DEDUP_MAX_ENTRIES,
+            ttl=TELEGRAM_DEDUP_TTL,
+            db_manager=self.db_manager if TELEGRAM_DEDUP_PERSIST else None
+        )
+        self.outbound.listeners.append(self.dedup.record)
+        # Inline queries are answered from the answers generated so far
+        self.inline = InlineAnswers(
+            self.router,
+            AnswerIndex(max_entries=INLINE_CACHE_MAX_ENTRIES, max_bytes=INLINE_CACHE_MAX_BYTES),
+            generation_delay=INLINE_GENERATION_DELAY,
+            user_limits=self.user_limits
+        )
         self._register_handlers()
         logger.info("Telegram bot interface initialized")
     
+    @staticmethod
+    def _create_job_queue():
+        """Job queue client when agents run in worker processes (python worker.py), otherwise None"""
+        if AGENT_EXECUTION != "redis":
+            return None
+        # Imported here so in-process deployments don't need Redis
+        from ..orchestration.job_queue import JobQueueClient, connect_redis
+        
+        return JobQueueClient(
+            connect_redis(REDIS_HOST, REDIS_PORT, REDIS_PASSWORD),
+            prefix=JOB_QUEUE_PREFIX,
+            result_timeout=JOB_RESULT_TIMEOUT
+        )
+    
     def _register_handlers(self):
         """Register command and message handlers"""
+        # De-duplication runs before and after all other handlers
+        self.application.add_handler(TypeHandler(Update, self._deduplicate_update), group=-1)
+        self.application.add_handler(TypeHandler(Update, self._complete_update), group=1)
+        
         # Command handlers
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("help", self.help_command))
         self.application.add_handler(CommandHandler("code", self.code_command))
         self.application.add_handler(CommandHandler("image", self.image_command))
         self.application.add_handler(CommandHandler("research", self.research_command))
+        self.application.add_handler(CommandHandler("cancel", self.cancel_command))
+        
+        # Inline queries (@bot query)
+        self.application.add_handler(InlineQueryHandler(self.inline.handle))
         
         # Message handler for non-command messages
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
@@ -43,6 +172,23 @@ class TelegramInterface:
         # Error handler
         self.application.add_error_handler(self.error_handler)
     
+    async def _deduplicate_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Replay or drop updates that were already delivered"""
+        entry = await self.dedup.check(update)
+        if entry is None:
+            return
+        
+        if entry.completed and update.effective_message:
+            logger.info(f"Replaying {len(entry.replies)} replies for redelivered update {update.update_id}")
+            await self.dedup.replay(entry, update.effective_message, self.outbound)
+        else:
+            logger.info(f"Dropping redelivered update {update.update_id}")
+        raise ApplicationHandlerStop
+    
+    async def _complete_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Record that an update has been handled"""
+        await self.dedup.complete(update)
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /start command"""
         user = update.effective_user
@@ -53,10 +199,11 @@ class TelegramInterface:
             f"• /help - Show available commands and usage\n"
             f"• /code - Generate Python code\n"
             f"• /image - Generate images\n"
-            f"• /research - Research topics on the web\n\n"
+            f"• /research - Research topics on the web\n"
+            f"• /cancel - Stop the request I'm working on\n\n"
             f"You can also just send me a message, and I'll try to help!"
         )
-        await update.message.reply_text(welcome_message)
+        await self.outbound.reply_text(update.message, welcome_message)
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /help command"""
@@ -72,86 +219,273 @@ class TelegramInterface:
             "*/research* <topic>\n"
             "Research a topic on the web and provide a summary.\n"
             "Example: `/research latest developments in quantum computing`\n\n"
+            "*/cancel*\n"
+            "Stop the requests I'm still working on for this chat.\n\n"
             "*General Usage:*\n"
             "You can also send me any message, and I'll try to understand and help you with your request."
         )
-        await update.message.reply_text(help_message, parse_mode="Markdown")
+        await self.outbound.reply_text(update.message, help_message, parse_mode="Markdown")
     
     async def code_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /code command"""
         if not context.args:
-            await update.message.reply_text(
+            await self.outbound.reply_text(
+                update.message,
                 "Please provide a description of the code you want me to generate.\n"
                 "Example: `/code create a function to calculate fibonacci numbers`"
             )
             return
         
-        query = " ".join(context.args)
-        await update.message.reply_text(f"Generating code for: {query}\nThis may take a moment...")
+        await self._generate_code(update.message, " ".join(context.args))
+    
+    async def _generate_code(self, message, query: str, record_id=None):
+        """
+        Generate code and deliver it in reply to a message
+        
+        Args:
+            message: The message requesting the code
+            query: The code generation query
+            record_id: Task history row when resuming work saved before a restart
+        """
+        if record_id is None and not await self._admit(message):
+            return
+        status_message = await self.outbound.reply_text(message, f"Generating code for: {query}\nThis may take a moment...")
         
         try:
-            # Route to code generation agent
-            result = await self.router.route_to_code_agent(query)
-            await update.message.reply_text(f"```python\n{result}\n```", parse_mode="Markdown")
+            # Route to code generation agent, streaming the code into the status message
+            async with self._stream_into(status_message) as stream:
+                # The deadline of the request follows the call through the router into the agent,
+                # and the model calls made for it are charged to the user
+                with deadline_scope(TELEGRAM_REQUEST_TIMEOUT), self.user_limits.metered(self._user_id(message)):
+                    result = await self.inflight.run(
+                        message.chat_id, "code", query,
+                        self.router.route_to_code_agent(query, on_delta=stream.push),
+                        context=self._resume_context(message), record_id=record_id
+                    )
+            await self.delivery.deliver(
+                message, result, language="python", filename="code.py", status_message=status_message
+            )
+            self.inline.remember("code", query, result)
+        except WorkSuspended:
+            await self._report_suspended(status_message)
+        except WorkCancelled:
+            await self._report_cancelled(status_message, stream.text)
         except Exception as e:
             logger.error(f"Error in code generation: {str(e)}")
-            await update.message.reply_text(f"Sorry, I encountered an error while generating code: {str(e)}")
+            await self.outbound.reply_text(message, f"Sorry, I encountered an error while generating code: {str(e)}")
     
     async def image_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /image command"""
         if not context.args:
-            await update.message.reply_text(
+            await self.outbound.reply_text(
+                update.message,
                 "Please provide a description of the image you want me to generate.\n"
                 "Example: `/image a futuristic city with flying cars`"
             )
             return
         
-        query = " ".join(context.args)
-        await update.message.reply_text(f"Generating image for: {query}\nThis may take a moment...")
+        await self._generate_image(update.message, " ".join(context.args))
+    
+    async def _generate_image(self, message, query: str, record_id=None):
+        """
+        Generate an image and deliver it in reply to a message
+        
+        Args:
+            message: The message requesting the image
+            query: The image generation query
+            record_id: Task history row when resuming work saved before a restart
+        """
+        if record_id is None and not await self._admit(message):
+            return
+        status_message = await self.outbound.reply_text(message, f"Generating image for: {query}\nThis may take a moment...")
         
         try:
             # Route to image generation agent
-            result = await self.router.route_to_image_agent(query)
+            with deadline_scope(TELEGRAM_REQUEST_TIMEOUT), self.user_limits.metered(self._user_id(message)):
+                result = await self.inflight.run(
+                    message.chat_id, "image", query, self.router.route_to_image_agent(query),
+                    context=self._resume_context(message), record_id=record_id
+                )
             # In a real implementation, this would return an image URL or file
-            await update.message.reply_text(f"Image generation result: {result}")
+            await self.outbound.reply_text(message, f"Image generation result: {result}")
+        except WorkSuspended:
+            await self._report_suspended(status_message)
+        except WorkCancelled:
+            await self._report_cancelled(status_message)
         except Exception as e:
             logger.error(f"Error in image generation: {str(e)}")
-            await update.message.reply_text(f"Sorry, I encountered an error while generating the image: {str(e)}")
+            await self.outbound.reply_text(message, f"Sorry, I encountered an error while generating the image: {str(e)}")
     
     async def research_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /research command"""
         if not context.args:
-            await update.message.reply_text(
+            await self.outbound.reply_text(
+                update.message,
                 "Please provide a topic you want me to research.\n"
                 "Example: `/research latest developments in quantum computing`"
             )
             return
         
-        query = " ".join(context.args)
-        await update.message.reply_text(f"Researching: {query}\nThis may take a moment...")
+        await self._research(update.message, " ".join(context.args))
+    
+    async def _research(self, message, query: str, record_id=None):
+        """
+        Research a topic and deliver the summary in reply to a message
+        
+        Args:
+            message: The message requesting the research
+            query: The research query
+            record_id: Task history row when resuming work saved before a restart
+        """
+        if record_id is None and not await self._admit(message):
+            return
+        status_message = await self.outbound.reply_text(message, f"Researching: {query}\nThis may take a moment...")
         
         try:
-            # Route to research agent
-            result = await self.router.route_to_research_agent(query)
-            await update.message.reply_text(result)
+            # Route to research agent, streaming the summary into the status message
+            async with self._stream_into(status_message) as stream:
+                with deadline_scope(TELEGRAM_REQUEST_TIMEOUT), self.user_limits.metered(self._user_id(message)):
+                    result = await self.inflight.run(
+                        message.chat_id, "research", query,
+                        self.router.route_to_research_agent(query, on_delta=stream.push),
+                        context=self._resume_context(message), record_id=record_id
+                    )
+            await self.delivery.deliver(
+                message, result, filename="research.md", status_message=status_message
+            )
+            self.inline.remember("research", query, result)
+        except WorkSuspended:
+            await self._report_suspended(status_message)
+        except WorkCancelled:
+            await self._report_cancelled(status_message, stream.text)
         except Exception as e:
             logger.error(f"Error in research: {str(e)}")
-            await update.message.reply_text(f"Sorry, I encountered an error while researching: {str(e)}")
+            await self.outbound.reply_text(message, f"Sorry, I encountered an error while researching: {str(e)}")
+    
+    async def _admit(self, message) -> bool:
+        """
+        Check the rate limits of the user sending a message, telling them when to come back if they are reached
+        
+        Args:
+            message: The message making a request
+            
+        Returns:
+            True if the request may be routed to an agent
+        """
+        delay = self.user_limits.check(self._user_id(message))
+        if delay <= 0:
+            return True
+        await self.outbound.reply_text(
+            message,
+            f"You're sending requests faster than I can handle them. Please try again in {math.ceil(delay)} seconds."
+        )
+        return False
+    
+    @staticmethod
+    def _user_id(message) -> int:
+        """User a message's request is charged to; messages rebuilt for resumed work only know their private chat"""
+        return message.from_user.id if message.from_user else message.chat_id
+    
+    @staticmethod
+    def _resume_context(message) -> dict:
+        """Context saved with a task so its reply can be delivered after a restart"""
+        return {'chat_id': message.chat_id, 'message_id': message.message_id}
+    
+    async def _resume_task(self, record: dict):
+        """
+        Run a task saved before the last shutdown and deliver its reply
+        
+        Args:
+            record: The pending task history record
+        """
+        runners = {
+            "code": self._generate_code,
+            "image": self._generate_image,
+            "research": self._research,
+        }
+        runner = runners.get(record['task_type'])
+        if runner is None:
+            logger.warning(f"Cannot resume task {record['id']} of type {record['task_type']}")
+            return
+        
+        context = record['context']
+        # Rebuilt as a private chat message so replies don't quote a message that may be gone
+        message = Message(
+            message_id=context['message_id'],
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=context['chat_id'], type=Chat.PRIVATE)
+        )
+        message.set_bot(self.application.bot)
+        await runner(message, record['query'], record_id=record['id'])
+    
+    async def cancel_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /cancel command"""
+        cancelled = self.inflight.cancel(update.effective_chat.id)
+        if not cancelled:
+            await self.outbound.reply_text(update.message, "There is nothing to cancel.")
+    
+    @staticmethod
+    def _is_cancel_command(update: object) -> bool:
+        """Check whether an update is a /cancel command"""
+        if not isinstance(update, Update) or not update.message or not update.message.text:
+            return False
+        command = update.message.text.split(maxsplit=1)[0] if update.message.text.strip() else ""
+        return command.split("@", 1)[0] == "/cancel"
+    
+    async def _report_cancelled(self, status_message, partial_text: str = ""):
+        """
+        Replace a status message with a cancellation notice
+        
+        Args:
+            status_message: The status message of the cancelled request
+            partial_text: Text generated before the request was cancelled
+        """
+        notice = "⏹ Cancelled."
+        if partial_text:
+            notice = f"{partial_text[:MAX_MESSAGE_LENGTH - 32]}\n\n{notice}"
+        await self.outbound.edit_text(status_message, notice)
+    
+    async def _report_suspended(self, status_message):
+        """Tell the user a request will be finished after the bot restarts"""
+        await self.outbound.edit_text(
+            status_message, "⏸ I'm restarting. I'll send the result when I'm back."
+        )
+    
+    def _stream_into(self, message) -> StreamingReply:
+        """
+        Create a streaming reply that progressively edits a message
+        
+        Args:
+            message: The message to edit as text is generated
+            
+        Returns:
+            The streaming reply, to be used as an async context manager
+        """
+        return StreamingReply(
+            message,
+            min_interval=TELEGRAM_STREAM_EDIT_INTERVAL,
+            stats=self.streaming_stats,
+            scheduler=self.outbound
+        )
     
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle non-command messages"""
         message_text = update.message.text
         
-        # Simple intent detection
-        if "code" in message_text.lower() or "program" in message_text.lower() or "script" in message_text.lower():
-            await self.code_command(update, context.args=[message_text])
-        elif "image" in message_text.lower() or "picture" in message_text.lower() or "draw" in message_text.lower():
-            await self.image_command(update, context.args=[message_text])
-        elif "research" in message_text.lower() or "find" in message_text.lower() or "search" in message_text.lower():
-            await self.research_command(update, context.args=[message_text])
+        # Intent detection
+        handlers = {
+            "code": self.code_command,
+            "image": self.image_command,
+            "research": self.research_command,
+        }
+        intent = BOT_INTENTS.classify(message_text)
+        if intent in handlers:
+            context.args = [message_text]
+            await handlers[intent](update, context)
         else:
             # General message handling
-            await update.message.reply_text(
+            await self.outbound.reply_text(
+                update.message,
                 "I'm not sure how to help with that specific request. "
                 "Try using one of my commands: /help, /code, /image, or /research."
             )
@@ -160,11 +494,93 @@ class TelegramInterface:
         """Handle errors in the telegram bot"""
         logger.error(f"Exception while handling an update: {context.error}")
         if update and isinstance(update, Update) and update.effective_message:
-            await update.effective_message.reply_text(
+            await self.outbound.reply_text(
+                update.effective_message,
                 "Sorry, I encountered an error while processing your request. Please try again later."
             )
     
+    def get_stats(self) -> dict:
+        """
+        Get runtime statistics for the bot interface
+        
+        Returns:
+            Dictionary of statistics by component
+        """
+        # Imported here so starting the bot does not load NumPy
+        from ..persistence.semantic_cache import semantic_cache_stats
+        
+        return {
+            'dispatcher': self.update_processor.stats.to_dict(),
+            'streaming': self.streaming_stats.to_dict(),
+            'outbound': self.outbound.stats.to_dict(),
+            'delivery': self.delivery.stats.to_dict(),
+            'inflight': self.inflight.stats.to_dict(),
+            'lifecycle': self.lifecycle.stats.to_dict(),
+            'inline': {**self.inline.stats.to_dict(), 'index': self.inline.index.stats.to_dict()},
+            'user_limits': self.user_limits.to_dict(),
+            'cancellation': self.router.cancellation_stats.to_dict(),
+            'task_queue': self.router.task_queue.get_stats(),
+            'single_flight': self.router.single_flight.stats.to_dict(),
+            # Only filled in when agents run in this process
+            'response_cache': response_cache_stats(),
+            'semantic_cache': semantic_cache_stats(),
+            'providers': provider_guard_stats(),
+            'model_routing': model_router_stats(),
+            'context_budget': context_budget_stats(),
+            'job_queue': self.router.job_queue.stats.to_dict() if self.router.job_queue else None,
+            'dedup': self.dedup.stats.to_dict()
+        }
+    
     def run(self):
-        """Run the Telegram bot"""
-        logger.info("Starting Telegram bot")
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        """Run the Telegram bot in webhook mode if configured, otherwise with long polling"""
+        if TELEGRAM_WEBHOOK_URL:
+            logger.info("Starting Telegram bot in webhook mode")
+            asyncio.run(self._run_webhook())
+        else:
+            logger.info("Starting Telegram bot in polling mode")
+            asyncio.run(self._run_polling())
+    
+    async def _run_polling(self):
+        """Poll for updates until SIGINT or SIGTERM, then drain in-flight work"""
+        stop_requested = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_requested.set)
+        
+        async with self.application:
+            await self.application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            await self.application.start()
+            await self._on_started()
+            
+            await stop_requested.wait()
+            logger.info("Shutting down, no longer accepting updates")
+            await self.application.updater.stop()
+            await self._on_stopping()
+            await self.application.stop()
+    
+    async def _run_webhook(self):
+        """Serve webhook deliveries on the dashboard port"""
+        # Imported here so polling deployments don't pay for the ASGI stack
+        from .webhook import WebhookServer
+        
+        server = WebhookServer(
+            self.application,
+            webhook_url=TELEGRAM_WEBHOOK_URL,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            path=TELEGRAM_WEBHOOK_PATH,
+            port=DASHBOARD_PORT,
+            allowed_updates=Update.ALL_TYPES,
+            on_started=self._on_started,
+            on_stopping=self._on_stopping
+        )
+        await server.serve()
+    
+    async def _on_started(self):
+        """Resume the work saved by the previous shutdown in the background"""
+        self.application.create_task(self.lifecycle.resume_pending(self._resume_task))
+    
+    async def _on_stopping(self):
+        """Drain in-flight work once no more updates are accepted"""
+        await self.lifecycle.drain()
+        await self.router.close()
+        await self.user_limits.ledger.close()
@@ -0,0 +1,161 @@
+"""
+Per-User Rate Limits for the Telegram Bot Interface
+
+This module keeps one heavy user from using up the model quota shared by
+everyone. Each Telegram user has two token buckets: one for requests and one
+for the model tokens their requests consume. A request is admitted only if a
+request token is available and the user's model tokens are not overdrawn;
+both checks are constant-time arithmetic on buckets in memory. The model
+tokens of a request are known once it finished, so they are charged then,
+and the request's model calls are recorded in the usage ledger.
+"""
+from contextlib import contextmanager
+from typing import Hashable, Iterator, Optional
+
+from .outbound import TokenBucket
+from ..orchestration.usage import RequestUsage, usage_scope
+from ..persistence.usage_ledger import UsageLedger
+
+# Users whose buckets are full are forgotten once this many are tracked
+MAX_IDLE_USERS = 10000
+
+class UserLimitStats:
+    """Counters for the per-user rate limits"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.admitted = 0
+        self.request_limited = 0
+        self.token_limited = 0
+        self.tokens_charged = 0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'admitted': self.admitted,
+            'request_limited': self.request_limited,
+            'token_limited': self.token_limited,
+            'tokens_charged': self.tokens_charged
+        }
+
+class _UserBuckets:
+    """Request and model token buckets of one user"""
+
+    __slots__ = ("requests", "tokens")
+
+    def __init__(self, limits: "UserRateLimiter"):
+        self.requests = TokenBucket(limits.request_rate, limits.request_burst) if limits.request_rate else None
+        self.tokens = TokenBucket(limits.token_rate, limits.token_burst) if limits.token_rate else None
+
+    def is_full(self) -> bool:
+        return all(bucket is None or bucket.is_full() for bucket in (self.requests, self.tokens))
+
+class UserRateLimiter:
+    """Token buckets per user for requests and model tokens, backed by the usage ledger"""
+
+    def __init__(self, requests_per_minute: float = 20.0, request_burst: float = 5.0,
+                 tokens_per_hour: float = 200000.0, token_burst: float = 50000.0,
+                 ledger: Optional[UsageLedger] = None):
+        """
+        Initialize the limiter
+
+        Args:
+            requests_per_minute: Requests a user may make per minute; 0 for no limit
+            request_burst: Requests a user may make in a burst
+            tokens_per_hour: Model tokens a user may consume per hour; 0 for no limit
+            token_burst: Model tokens a user may consume in a burst
+            ledger: Ledger the model calls of admitted requests are recorded in
+        """
+        self.request_rate = requests_per_minute / 60
+        self.request_burst = max(request_burst, 1.0)
+        self.token_rate = tokens_per_hour / 3600
+        self.token_burst = max(token_burst, 1.0)
+        self.ledger = ledger
+        self.stats = UserLimitStats()
+        self._users = {}
+
+    def _buckets(self, user_id: Hashable) -> _UserBuckets:
+        """Get the buckets of a user, creating full ones for a new user"""
+        buckets = self._users.get(user_id)
+        if buckets is None:
+            if len(self._users) >= MAX_IDLE_USERS:
+                self._prune_idle_users()
+            buckets = self._users[user_id] = _UserBuckets(self)
+        return buckets
+
+    def _prune_idle_users(self):
+        """Forget users whose buckets have fully recovered"""
+        for user_id in [user_id for user_id, buckets in self._users.items() if buckets.is_full()]:
+            del self._users[user_id]
+
+    def check(self, user_id: Hashable) -> float:
+        """
+        Admit a request of a user, taking a request token, unless a limit is reached
+
+        Args:
+            user_id: Telegram user making the request
+
+        Returns:
+            0 if the request is admitted, otherwise seconds until the user may try again
+        """
+        buckets = self._buckets(user_id)
+        # Tokens are charged after the fact, so a user in debt waits until it is paid off
+        if buckets.tokens is not None:
+            delay = buckets.tokens.delay()
+            if delay > 0:
+                self.stats.token_limited += 1
+                return delay
+        if buckets.requests is not None:
+            delay = buckets.requests.delay()
+            if delay > 0:
+                self.stats.request_limited += 1
+                return delay
+            buckets.requests.tokens -= 1
+        self.stats.admitted += 1
+        return 0.0
+
+    def charge(self, user_id: Hashable, usage: RequestUsage):
+        """
+        Charge the model tokens of a finished request and record its calls in the ledger
+
+        Args:
+            user_id: Telegram user who made the request
+            usage: Tally of the request's model calls
+        """
+        if not usage.calls:
+            return
+        buckets = self._buckets(user_id)
+        if buckets.tokens is not None:
+            buckets.tokens.delay()  # refills the bucket up to now before the debit
+            buckets.tokens.tokens -= usage.tokens
+        self.stats.tokens_charged += usage.tokens
+        if self.ledger is not None:
+            self.ledger.record(user_id, usage)
+
+    @contextmanager
+    def metered(self, user_id: Hashable) -> Iterator[RequestUsage]:
+        """
+        Tally the model calls made in the scope and charge them to a user when it is left
+
+        The scope is charged however it is left, so a request that fails or is cancelled
+        still pays for the calls made and the tokens streamed before it stopped.
+
+        Args:
+            user_id: Telegram user the calls are made for
+
+        Yields:
+            The tally of the calls
+        """
+        with usage_scope() as usage:
+            try:
+                yield usage
+            finally:
+                self.charge(user_id, usage)
+
+    def to_dict(self):
+        """Convert the counters and the number of tracked users to a dictionary"""
+        return {
+            **self.stats.to_dict(),
+            'users': len(self._users),
+            'ledger': self.ledger.stats.to_dict() if self.ledger is not None else None
+        }
@@ -0,0 +1,148 @@
+"""
+Webhook Ingestion for the Telegram Bot Interface
+
+This module serves Telegram webhook deliveries from an ASGI app and feeds
+the updates straight into the update queue of the python-telegram-bot
+Application, replacing the long-polling round trip.
+"""
+import asyncio
+import hmac
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from telegram import Update
+from loguru import logger
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookStats:
+    """Counters for webhook deliveries"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.accepted = 0
+        self.rejected = 0
+        self.malformed = 0
+        self.started_at = time.monotonic()
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'malformed': self.malformed,
+            'updates_per_second': self.accepted / elapsed
+        }
+
+def create_webhook_app(update_queue: asyncio.Queue, bot=None, secret_token: str = "",
+                       path: str = "/telegram/webhook", stats: WebhookStats = None) -> FastAPI:
+    """
+    Create the ASGI app that receives Telegram webhook deliveries
+
+    Args:
+        update_queue: The Application update queue to feed
+        bot: The bot the decoded updates are bound to
+        secret_token: Expected value of the secret token header
+        path: URL path Telegram posts updates to
+        stats: Optional counters to record deliveries into
+
+    Returns:
+        The FastAPI application
+
+    Raises:
+        ValueError: If no secret token is given, as anyone finding the URL could then post updates
+    """
+    if not secret_token:
+        raise ValueError("A webhook needs a secret token; set TELEGRAM_WEBHOOK_SECRET")
+    app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+    app.state.stats = stats or WebhookStats()
+    expected_token = secret_token.encode()
+
+    @app.post(path)
+    async def telegram_webhook(request: Request) -> Response:
+        """Validate and enqueue a single webhook delivery"""
+        received_token = request.headers.get(SECRET_TOKEN_HEADER, "").encode()
+        if not hmac.compare_digest(received_token, expected_token):
+            app.state.stats.rejected += 1
+            return Response(status_code=403)
+
+        try:
+            update = Update.de_json(await request.json(), bot)
+        except Exception as e:
+            # Telegram retries on non-2xx responses, so malformed payloads are acknowledged
+            logger.error(f"Dropping malformed webhook update: {str(e)}")
+            app.state.stats.malformed += 1
+            return Response(status_code=200)
+
+        await update_queue.put(update)
+        app.state.stats.accepted += 1
+        return Response(status_code=200)
+
+    @app.get("/healthz")
+    async def healthz() -> dict:
+        """Report liveness and webhook counters"""
+        return {'status': 'ok', 'webhook': app.state.stats.to_dict()}
+
+    return app
+
+class WebhookServer:
+    """Runs a python-telegram-bot Application behind a uvicorn webhook server"""
+
+    def __init__(self, application, webhook_url: str, secret_token: str,
+                 path: str = "/telegram/webhook", port: int = 8000,
+                 allowed_updates=None, on_started=None, on_stopping=None):
+        """
+        Initialize the webhook server
+
+        Args:
+            application: The python-telegram-bot Application (built without an updater)
+            webhook_url: Public base URL Telegram should deliver to
+            secret_token: Secret token Telegram echoes back in every delivery
+            path: URL path of the webhook endpoint
+            port: Port the ASGI server listens on
+            allowed_updates: Update types to subscribe to
+            on_started: Optional coroutine function awaited once the application runs
+            on_stopping: Optional coroutine function awaited after the server stopped
+                accepting deliveries and before the application is stopped
+        """
+        self.application = application
+        self.webhook_url = webhook_url.rstrip("/") + path
+        self.secret_token = secret_token
+        self.allowed_updates = allowed_updates
+        self.on_started = on_started
+        self.on_stopping = on_stopping
+        self.app = create_webhook_app(
+            application.update_queue,
+            bot=application.bot,
+            secret_token=secret_token,
+            path=path
+        )
+        self.server = uvicorn.Server(uvicorn.Config(
+            self.app,
+            host="0.0.0.0",
+            port=port,
+            log_level="warning",
+            lifespan="off"
+        ))
+
+    async def serve(self):
+        """Register the webhook with Telegram and serve until the server exits"""
+        async with self.application:
+            await self.application.bot.set_webhook(
+                url=self.webhook_url,
+                secret_token=self.secret_token,
+                allowed_updates=self.allowed_updates
+            )
+            await self.application.start()
+            logger.info(f"Webhook server listening for {self.webhook_url} on port {self.server.config.port}")
+            try:
+                if self.on_started is not None:
+                    await self.on_started()
+                # Returns once a shutdown signal stopped the server from accepting deliveries
+                await self.server.serve()
+            finally:
+                if self.on_stopping is not None:
+                    await self.on_stopping()
+                await self.application.stop()
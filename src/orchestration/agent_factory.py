@@ -1,20 +1,29 @@
 """
 Agent Factory for Multi-Skill Super-Agent
 
-This module provides a factory for creating agent instances.
+This module provides a factory for creating agent instances. Agents are
+resolved through the agent registry, so each agent module is only imported
+when the agent is first requested.
 """
-from loguru import logger
-
-from ..agents.code_agent import CodeGenerationAgent
-from ..agents.image_agent import ImageGenerationAgent
-from ..agents.research_agent import WebResearchAgent
-from ..agents.task_agent import TaskAutomationAgent
-from ..agents.assistant_agent import PersonalAssistantAgent
+from .registry import AGENT_REGISTRY
 
 class AgentFactory:
     """Factory for creating agent instances"""
     
-    _instances = {}
+    registry = AGENT_REGISTRY
+    
+    @classmethod
+    def get_agent(cls, name: str):
+        """
+        Get or create an agent by name
+        
+        Args:
+            name: The agent name (code, image, research, task, assistant)
+            
+        Returns:
+            The agent instance
+        """
+        return cls.registry.get(name)
     
     @classmethod
     def get_code_agent(cls):
@@ -24,10 +33,7 @@ class AgentFactory:
         Returns:
             CodeGenerationAgent instance
         """
-        if "code" not in cls._instances:
-            cls._instances["code"] = CodeGenerationAgent()
-            logger.info("Created new CodeGenerationAgent instance")
-        return cls._instances["code"]
+        return cls.registry.get("code")
     
     @classmethod
     def get_image_agent(cls):
@@ -37,10 +43,7 @@ class AgentFactory:
         Returns:
             ImageGenerationAgent instance
         """
-        if "image" not in cls._instances:
-            cls._instances["image"] = ImageGenerationAgent()
-            logger.info("Created new ImageGenerationAgent instance")
-        return cls._instances["image"]
+        return cls.registry.get("image")
     
     @classmethod
     def get_research_agent(cls):
@@ -50,10 +53,7 @@ class AgentFactory:
         Returns:
             WebResearchAgent instance
         """
-        if "research" not in cls._instances:
-            cls._instances["research"] = WebResearchAgent()
-            logger.info("Created new WebResearchAgent instance")
-        return cls._instances["research"]
+        return cls.registry.get("research")
     
     @classmethod
     def get_task_agent(cls):
@@ -63,10 +63,7 @@ class AgentFactory:
         Returns:
             TaskAutomationAgent instance
         """
-        if "task" not in cls._instances:
-            cls._instances["task"] = TaskAutomationAgent()
-            logger.info("Created new TaskAutomationAgent instance")
-        return cls._instances["task"]
+        return cls.registry.get("task")
     
     @classmethod
     def get_assistant_agent(cls):
@@ -76,7 +73,4 @@ class AgentFactory:
         Returns:
             PersonalAssistantAgent instance
         """
-        if "assistant" not in cls._instances:
-            cls._instances["assistant"] = PersonalAssistantAgent()
-            logger.info("Created new PersonalAssistantAgent instance")
-        return cls._instances["assistant"]
+        return cls.registry.get("assistant")
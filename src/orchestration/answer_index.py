@@ -0,0 +1,244 @@
+"""
+Answer Index for Multi-Skill Super-Agent
+
+This module keeps previously generated code snippets and research summaries
+in memory so they can be served again without calling an agent, e.g. for
+Telegram inline queries that must be answered within a few hundred
+milliseconds. Answers are found by query prefix (binary search over the
+sorted normalized queries) and by the words of the query (an inverted token
+index, the last word matching as a prefix while the user is still typing).
+Memory is bounded by entry count and answer bytes with least recently used
+eviction.
+"""
+import bisect
+import heapq
+import itertools
+import re
+import time
+from collections import OrderedDict
+from typing import List
+
+_WORD = re.compile(r"\w+")
+
+# Maximum number of indexed words a partially typed last word is expanded to
+MAX_PARTIAL_EXPANSION = 256
+
+# Upper bounds (in microseconds) of the lookup latency histogram buckets
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 5000)
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a query for indexing
+
+    Args:
+        text: The query text
+
+    Returns:
+        The lowercased words of the query separated by single spaces
+    """
+    return " ".join(_WORD.findall(text.lower()))
+
+class IndexedAnswer:
+    """A generated answer and the query it answers"""
+
+    __slots__ = ("id", "kind", "query", "key", "answer", "tokens", "size", "used")
+
+    def __init__(self, answer_id: str, kind: str, query: str, key: str, answer: str):
+        self.id = answer_id
+        self.kind = kind
+        self.query = query
+        self.key = key
+        self.answer = answer
+        self.tokens = frozenset(key.split())
+        self.size = len(answer.encode("utf-8")) + len(key)
+        self.used = 0
+
+class AnswerIndexStats:
+    """Counters for answer lookups and their latency"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record_lookup(self, latency: float, hit: bool):
+        """
+        Record one lookup
+
+        Args:
+            latency: Lookup time in seconds
+            hit: Whether any answer was found
+        """
+        self.lookups += 1
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        micros = latency * 1e6
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if micros <= bound:
+                self.latency_buckets[index] += 1
+                return
+        self.latency_buckets[-1] += 1
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        labels = [f"<={bound}us" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}us"]
+        return {
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+            'evictions': self.evictions,
+            'avg_latency_us': self.total_latency / self.lookups * 1e6 if self.lookups else 0.0,
+            'max_latency_us': self.max_latency * 1e6,
+            'latency_histogram': dict(zip(labels, self.latency_buckets))
+        }
+
+class AnswerIndex:
+    """Bounded LRU index of generated answers searchable by prefix and words"""
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 8 * 1024 * 1024):
+        """
+        Initialize the index
+
+        Args:
+            max_entries: Maximum number of answers kept
+            max_bytes: Maximum total size of the kept answers
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = AnswerIndexStats()
+        self.bytes = 0
+        self._ids = itertools.count(1)
+        self._clock = itertools.count(1)
+        # Normalized query -> answer, least recently used first
+        self._entries = OrderedDict()
+        self._sorted_keys = []
+        self._postings = {}
+        self._sorted_tokens = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, kind: str, query: str, answer: str) -> IndexedAnswer:
+        """
+        Add or replace the answer to a query
+
+        Args:
+            kind: Kind of answer (code, research)
+            query: The query that was answered
+            answer: The generated answer
+
+        Returns:
+            The indexed answer
+        """
+        key = normalize_query(query)
+        if key in self._entries:
+            self._remove(self._entries[key])
+
+        entry = IndexedAnswer(str(next(self._ids)), kind, query, key, answer)
+        entry.used = next(self._clock)
+        self._entries[key] = entry
+        self.bytes += entry.size
+        bisect.insort(self._sorted_keys, key)
+        for token in entry.tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                bisect.insort(self._sorted_tokens, token)
+            postings.add(key)
+
+        while len(self._entries) > self.max_entries or (self.bytes > self.max_bytes and len(self._entries) > 1):
+            self._remove(next(iter(self._entries.values())))
+            self.stats.evictions += 1
+        return entry
+
+    def _remove(self, entry: IndexedAnswer):
+        """Remove an answer from all index structures"""
+        del self._entries[entry.key]
+        self.bytes -= entry.size
+        index = bisect.bisect_left(self._sorted_keys, entry.key)
+        del self._sorted_keys[index]
+        for token in entry.tokens:
+            postings = self._postings[token]
+            postings.discard(entry.key)
+            if not postings:
+                del self._postings[token]
+                del self._sorted_tokens[bisect.bisect_left(self._sorted_tokens, token)]
+
+    def _prefixed(self, sorted_items: list, prefix: str):
+        """Iterate over the items of a sorted list that start with a prefix"""
+        for index in range(bisect.bisect_left(sorted_items, prefix), len(sorted_items)):
+            item = sorted_items[index]
+            if not item.startswith(prefix):
+                return
+            yield item
+
+    def lookup(self, query: str, limit: int = 10) -> List[IndexedAnswer]:
+        """
+        Find answers for a (possibly partially typed) query
+
+        Answers whose query starts with the given text come first, followed by
+        answers whose query contains all of its words, most recently used first.
+
+        Args:
+            query: The query text
+            limit: Maximum number of answers returned
+
+        Returns:
+            The matching answers
+        """
+        started = time.perf_counter()
+        key = normalize_query(query)
+        results = []
+
+        if key:
+            results = list(itertools.islice(self._prefixed(self._sorted_keys, key), limit))
+            if len(results) < limit:
+                results.extend(self._token_matches(key.split(), set(results), limit - len(results)))
+            entries = [self._entries[result] for result in results]
+            for entry in entries:
+                entry.used = next(self._clock)
+                self._entries.move_to_end(entry.key)
+        else:
+            entries = []
+
+        self.stats.record_lookup(time.perf_counter() - started, bool(entries))
+        return entries
+
+    def _token_matches(self, tokens: List[str], exclude: set, limit: int) -> List[str]:
+        """Find keys containing all complete words and a word starting with the last one"""
+        *complete, partial = tokens
+        candidates = None
+        if complete:
+            # Intersect starting from the shortest posting list
+            postings = sorted((self._postings.get(token, set()) for token in complete), key=len)
+            candidates = postings[0].intersection(*postings[1:])
+            if not candidates:
+                return []
+
+        start = bisect.bisect_left(self._sorted_tokens, partial)
+        end = bisect.bisect_left(self._sorted_tokens, partial + "\uffff", start)
+        if candidates is not None and len(candidates) <= end - start:
+            # Fewer candidates than words completing the partial one: check the candidates
+            matches = {key for key in candidates
+                       if any(token.startswith(partial) for token in self._entries[key].tokens)}
+        else:
+            matches = set()
+            # Bound the work for very short partial words that complete to many words
+            for token in self._sorted_tokens[start:min(end, start + MAX_PARTIAL_EXPANSION)]:
+                postings = self._postings[token]
+                matches.update(postings if candidates is None else candidates & postings)
+        matches -= exclude
+        if not matches:
+            return []
+
+        return heapq.nlargest(limit, matches, key=lambda key: self._entries[key].used)
@@ -0,0 +1,134 @@
+"""
+Request Deadlines for Multi-Skill Super-Agent
+
+This module carries the absolute deadline of the request being handled in a
+context variable, so it follows the request from the Telegram handler
+through the router, the task queue and the agents down to every provider
+call without being passed along explicitly. Nested scopes can only move the
+deadline earlier. Each call derives its timeout from the budget left, and
+the router cancels calls that are still running when the deadline passes.
+
+Deadlines are wall-clock timestamps, so they stay meaningful in the worker
+processes of the job queue.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """Raised when the deadline of the request passed before its work finished"""
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """
+    Parse timeouts of the form "code=180,assistant=60"
+
+    Args:
+        spec: Comma separated name=seconds pairs
+
+    Returns:
+        Dictionary of name to seconds
+    """
+    timeouts = {}
+    for item in spec.split(","):
+        if item.strip():
+            name, _, seconds = item.partition("=")
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+def get_deadline() -> Optional[float]:
+    """
+    Get the deadline of the current request
+
+    Returns:
+        Wall-clock timestamp of the deadline, or None without one
+    """
+    return _deadline.get()
+
+def remaining() -> Optional[float]:
+    """
+    Get the budget left until the deadline of the current request
+
+    Returns:
+        Seconds left, at most 0 once the deadline passed, or None without a deadline
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+def expired() -> bool:
+    """Whether the current request has a deadline that passed"""
+    budget = remaining()
+    return budget is not None and budget <= 0
+
+def call_timeout(default: Optional[float] = None) -> Optional[float]:
+    """
+    Get the timeout of a call made now on behalf of the current request
+
+    Args:
+        default: Timeout used without a deadline, and the most a deadline allows
+
+    Returns:
+        Seconds the call may take, or default
+
+    Raises:
+        DeadlineExceeded: If the deadline already passed
+    """
+    budget = remaining()
+    if budget is None:
+        return default
+    if budget <= 0:
+        raise DeadlineExceeded("The request deadline passed")
+    return budget if default is None else min(budget, default)
+
+@contextmanager
+def deadline_scope(seconds: Optional[float] = None, at: Optional[float] = None) -> Iterator[Optional[float]]:
+    """
+    Set the deadline of the work done in the scope, unless the current one is earlier
+
+    Args:
+        seconds: Budget from now; None or 0 for no budget of its own
+        at: Wall-clock timestamp of the deadline, e.g. one received from another process
+
+    Yields:
+        The deadline in effect inside the scope
+    """
+    deadline = _deadline.get()
+    for candidate in (time.time() + seconds if seconds else None, at):
+        if candidate is not None and (deadline is None or candidate < deadline):
+            deadline = candidate
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+async def within_deadline(awaitable: Awaitable[Any]) -> Any:
+    """
+    Await work, cancelling it if the deadline of the current request passes first
+
+    Args:
+        awaitable: The work
+
+    Returns:
+        The result of the work
+
+    Raises:
+        DeadlineExceeded: If the deadline passed before the work finished
+    """
+    budget = remaining()
+    if budget is None:
+        return await awaitable
+    if budget <= 0:
+        if hasattr(awaitable, "close"):
+            awaitable.close()
+        raise DeadlineExceeded("The request deadline passed before the work started")
+    try:
+        return await asyncio.wait_for(awaitable, budget)
+    except asyncio.TimeoutError:
+        # A timeout of the work itself, raised before the deadline, is passed on as it is
+        if expired():
+            raise DeadlineExceeded(f"The request did not finish within its {budget:.1f}s budget") from None
+        raise
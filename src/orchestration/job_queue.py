@@ -0,0 +1,467 @@
+"""
+Job Queue for Multi-Skill Super-Agent
+
+This module moves agent calls out of the bot process. The bot enqueues each
+call as a job on the Redis stream of its agent, and worker processes on any
+host read the streams through a consumer group, run the agent and push the
+result onto the result stream of the bot that enqueued the job.
+
+Delivery is at least once: a job stays pending in the consumer group until
+its worker acknowledges it after publishing the result. While a job runs its
+worker keeps renewing its claim; a job whose claim was not renewed for the
+visibility timeout, because its worker died, is claimed by another worker.
+Jobs claimed more than the maximum number of attempts are answered with an
+error instead of being run again. Jobs carry the deadline of their request;
+workers skip jobs whose deadline passed and give the others what is left.
+The model calls made for a job go back with its result, so they count
+towards the usage of the request in the bot process. Callers that stream get
+the text of the response while it is generated: the worker pushes it onto
+the result stream in batches, ahead of the result.
+"""
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Callable, Dict, Iterable, Optional
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, ResponseError
+
+from .deadline import DeadlineExceeded, deadline_scope, get_deadline, within_deadline
+from .registry import AGENT_REGISTRY
+from .usage import current_usage, usage_scope
+
+# Consumer group shared by all workers
+WORKER_GROUP = "agent_workers"
+
+def _jobs_key(prefix: str, agent_name: str) -> str:
+    """Stream holding the jobs of an agent"""
+    return f"{prefix}:jobs:{agent_name}"
+
+def _results_key(prefix: str, client_id: str) -> str:
+    """Stream holding the results for one bot process"""
+    return f"{prefix}:results:{client_id}"
+
+def _cancelled_key(prefix: str, job_id: str) -> str:
+    """Marker telling workers to skip a job nobody waits for anymore"""
+    return f"{prefix}:cancelled:{job_id}"
+
+def connect_redis(host: str, port: int, password: str = "") -> Redis:
+    """
+    Create a Redis client for the job queue
+
+    Args:
+        host: Redis host
+        port: Redis port
+        password: Redis password, if any
+
+    Returns:
+        The Redis client
+    """
+    return Redis(host=host, port=port, password=password or None, decode_responses=True)
+
+class JobFailed(Exception):
+    """Raised when a job failed in its worker or was not answered in time"""
+
+class JobQueueStats:
+    """Counters for jobs enqueued by the bot"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.abandoned = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record_result(self, latency: float, failed: bool):
+        """Record a job answered after the given seconds"""
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        answered = self.completed + self.failed
+        return {
+            'enqueued': self.enqueued,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'abandoned': self.abandoned,
+            'avg_latency': self.total_latency / answered if answered else 0.0,
+            'max_latency': self.max_latency
+        }
+
+class JobQueueClient:
+    """Enqueues agent calls for the workers and waits for their results"""
+
+    def __init__(self, redis: Redis, client_id: Optional[str] = None, prefix: str = "agent_jobs",
+                 result_timeout: float = 900.0):
+        """
+        Initialize the client
+
+        Args:
+            redis: Redis client created with decode_responses=True
+            client_id: Name of the result stream of this process (default: host and process id)
+            prefix: Prefix of all job queue keys
+            result_timeout: Seconds to wait for a result before giving up on a job
+        """
+        self.redis = redis
+        self.client_id = client_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.prefix = prefix
+        self.result_timeout = result_timeout
+        self.results_key = _results_key(prefix, self.client_id)
+        self.stats = JobQueueStats()
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._listeners: Dict[str, Callable[[str, int], None]] = {}
+        self._reader = None
+        self._loop = None
+
+    def _ensure_started(self):
+        """Start reading results on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and not self._reader.done():
+            return
+        self._loop = loop
+        self._futures = {}
+        self._listeners = {}
+        self._reader = loop.create_task(self._read_results())
+
+    async def call(self, agent_name: str, query: str, on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Run an agent call on a worker and wait for its result
+
+        Cancelling the caller tells the workers to skip the job if it has not started.
+
+        Args:
+            agent_name: The agent to run
+            query: The query to process
+            on_delta: Optional callback receiving the text of the response as it is generated
+
+        Returns:
+            The agent's response
+
+        Raises:
+            JobFailed: If the worker failed or no result arrived in time
+        """
+        self._ensure_started()
+        job_id = uuid.uuid4().hex
+        future = self._loop.create_future()
+        self._futures[job_id] = future
+        started = time.monotonic()
+
+        fields = {'id': job_id, 'query': query, 'reply_to': self.results_key}
+        streamed = 0
+        if on_delta is not None:
+            def listener(delta: str, offset: int):
+                # A job run again after its worker died streams its text again from the start
+                nonlocal streamed
+                if offset + len(delta) > streamed:
+                    delta = delta[streamed - offset:]
+                    streamed += len(delta)
+                    on_delta(delta)
+            fields['stream'] = "1"
+            self._listeners[job_id] = listener
+        if get_deadline() is not None:
+            fields['deadline'] = repr(get_deadline())
+
+        try:
+            await self.redis.xadd(_jobs_key(self.prefix, agent_name), fields)
+            self.stats.enqueued += 1
+            fields = await asyncio.wait_for(asyncio.shield(future), self.result_timeout)
+        except asyncio.TimeoutError:
+            self.stats.timed_out += 1
+            await self._abandon(job_id)
+            raise JobFailed(f"The {agent_name} agent did not answer within {self.result_timeout:.0f} seconds")
+        except asyncio.CancelledError:
+            await self._abandon(job_id)
+            raise
+        finally:
+            self._futures.pop(job_id, None)
+            self._listeners.pop(job_id, None)
+            if future.done() and not future.cancelled():
+                self.stats.record_result(time.monotonic() - started, 'error' in future.result())
+
+        # The model calls the worker made count towards the usage of this process's request
+        usage = current_usage()
+        if usage is not None:
+            usage.merge(fields.get('usage'))
+        if 'error' in fields:
+            raise JobFailed(fields['error'])
+        result = fields.get('result', "")
+        if on_delta is not None and len(result) > streamed:
+            # The text the worker had not sent yet
+            on_delta(result[streamed:])
+        return result
+
+    async def _abandon(self, job_id: str):
+        """Tell the workers nobody waits for a job anymore"""
+        self.stats.abandoned += 1
+        try:
+            await self.redis.set(_cancelled_key(self.prefix, job_id), 1, ex=int(self.result_timeout) + 60)
+        except RedisError as e:
+            logger.error(f"Error abandoning job {job_id}: {str(e)}")
+
+    async def _read_results(self):
+        """Resolve the waiting calls as their results arrive"""
+        last_id = "0"
+        while True:
+            try:
+                response = await self.redis.xread({self.results_key: last_id}, count=100, block=1000)
+                for _, entries in response or []:
+                    for entry_id, fields in entries:
+                        last_id = entry_id
+                        self._resolve(fields)
+                    await self.redis.xdel(self.results_key, *[entry_id for entry_id, _ in entries])
+            except RedisError as e:
+                logger.error(f"Error reading job results: {str(e)}")
+                await asyncio.sleep(1)
+
+    def _resolve(self, fields: dict):
+        """Hand a result, or text streamed ahead of it, to the call waiting for it"""
+        if 'delta' in fields:
+            listener = self._listeners.get(fields.get('id'))
+            if listener is not None:
+                listener(fields['delta'], int(fields.get('offset', 0)))
+            return
+        future = self._futures.get(fields.get('id'))
+        if future is None or future.done():
+            # A duplicate delivery, or a call that already gave up
+            return
+        future.set_result(fields)
+
+    async def close(self):
+        """Stop reading results"""
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+            self._loop = None
+
+class WorkerStats:
+    """Counters for jobs run by a worker"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.processed = 0
+        self.failed = 0
+        self.reclaimed = 0
+        self.dead_lettered = 0
+        self.skipped = 0
+        self.expired = 0
+        self.deltas_sent = 0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'processed': self.processed,
+            'failed': self.failed,
+            'reclaimed': self.reclaimed,
+            'dead_lettered': self.dead_lettered,
+            'skipped': self.skipped,
+            'expired': self.expired,
+            'deltas_sent': self.deltas_sent
+        }
+
+class JobWorker:
+    """Runs the jobs of some agents until stopped"""
+
+    def __init__(self, redis: Redis, agents: Optional[Iterable[str]] = None, registry=None,
+                 name: Optional[str] = None, prefix: str = "agent_jobs", visibility_timeout: float = 300.0,
+                 max_attempts: int = 3, concurrency: int = 1, result_ttl: int = 86400,
+                 delta_interval: float = 0.1):
+        """
+        Initialize the worker
+
+        Args:
+            redis: Redis client created with decode_responses=True
+            agents: Names of the agents whose jobs to run (default: all registered agents)
+            registry: The registry agents are resolved from (default: AGENT_REGISTRY)
+            name: Consumer name of the worker (default: host and process id)
+            prefix: Prefix of all job queue keys
+            visibility_timeout: Seconds a job may go without its claim being renewed
+                before other workers consider its worker dead and run it again
+            max_attempts: Number of times a job is run before it is answered with an error
+            concurrency: Number of jobs run at the same time per agent
+            result_ttl: Seconds the result stream of a bot is kept after its last result
+            delta_interval: Seconds the text of a streaming job is gathered before it is sent
+        """
+        self.redis = redis
+        self.registry = registry if registry is not None else AGENT_REGISTRY
+        self.agents = list(agents) if agents is not None else list(self.registry.names)
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.prefix = prefix
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+        self.result_ttl = result_ttl
+        self.delta_interval = delta_interval
+        self.stats = WorkerStats()
+        self._stopping = False
+
+    async def run(self):
+        """Run jobs until stop() is called"""
+        self._stopping = False
+        for agent_name in self.agents:
+            try:
+                await self.redis.xgroup_create(_jobs_key(self.prefix, agent_name), WORKER_GROUP, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+        logger.info(f"Worker {self.name} serving {', '.join(self.agents)}")
+        await asyncio.gather(*(
+            self._serve(agent_name) for agent_name in self.agents for _ in range(self.concurrency)
+        ))
+
+    def stop(self):
+        """Stop taking jobs; jobs already running are finished"""
+        self._stopping = True
+
+    async def _serve(self, agent_name: str):
+        """Take and run the jobs of one agent"""
+        stream = _jobs_key(self.prefix, agent_name)
+        next_reclaim = 0.0
+        while not self._stopping:
+            try:
+                job = None
+                if time.monotonic() >= next_reclaim:
+                    next_reclaim = time.monotonic() + min(self.visibility_timeout / 2, 5.0)
+                    job = await self._reclaim(stream)
+                if job is None:
+                    job = await self._read(stream)
+                if job is not None:
+                    await self._process(agent_name, stream, *job)
+            except RedisError as e:
+                logger.error(f"Error serving {agent_name} jobs: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _read(self, stream: str):
+        """Take a new job, waiting up to a second for one"""
+        response = await self.redis.xreadgroup(WORKER_GROUP, self.name, {stream: ">"}, count=1, block=1000)
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                return entry_id, fields, 1
+        return None
+
+    async def _reclaim(self, stream: str):
+        """Take over a job whose worker stopped renewing its claim"""
+        response = await self.redis.xautoclaim(
+            stream, WORKER_GROUP, self.name,
+            min_idle_time=int(self.visibility_timeout * 1000), start_id="0-0", count=1
+        )
+        for entry_id, fields in response[1]:
+            if not fields:
+                continue
+            pending = await self.redis.xpending_range(stream, WORKER_GROUP, entry_id, entry_id, 1)
+            attempts = pending[0]['times_delivered'] if pending else 1
+            self.stats.reclaimed += 1
+            logger.warning(f"Reclaimed job {fields.get('id')} from {stream} (attempt {attempts})")
+            return entry_id, fields, attempts
+        return None
+
+    async def _process(self, agent_name: str, stream: str, entry_id: str, fields: dict, attempts: int):
+        """Run a job, publish its result and acknowledge it"""
+        job_id = fields.get('id', entry_id)
+        if await self.redis.exists(_cancelled_key(self.prefix, job_id)):
+            self.stats.skipped += 1
+            await self._acknowledge(stream, entry_id)
+            return
+        deadline = float(fields['deadline']) if fields.get('deadline') else None
+        if deadline is not None and deadline <= time.time():
+            # Nobody waits for the answer anymore
+            self.stats.expired += 1
+            await self._acknowledge(stream, entry_id)
+            return
+
+        if attempts > self.max_attempts:
+            self.stats.dead_lettered += 1
+            logger.error(f"Giving up on job {job_id} after {attempts - 1} attempts")
+            payload = {'id': job_id, 'error': f"The {agent_name} agent failed {attempts - 1} times"}
+        else:
+            heartbeat = asyncio.create_task(self._heartbeat(stream, entry_id))
+            # Opened first, so a job failing before its agent runs, e.g. to load it, still has a tally
+            with usage_scope() as usage:
+                try:
+                    agent = self.registry.get(agent_name)
+                    query = fields.get('query', "")
+                    with deadline_scope(at=deadline):
+                        if fields.get('stream') and fields.get('reply_to'):
+                            result = await within_deadline(self._stream(agent, query, job_id, fields['reply_to']))
+                        else:
+                            result = await within_deadline(agent.process(query))
+                    payload = {'id': job_id, 'result': result}
+                    self.stats.processed += 1
+                except DeadlineExceeded as e:
+                    payload = {'id': job_id, 'error': str(e)}
+                    self.stats.expired += 1
+                except Exception as e:
+                    # The agent failed on its own; running it again would fail the same way
+                    logger.error(f"Error running job {job_id}: {str(e)}")
+                    payload = {'id': job_id, 'error': str(e)}
+                    self.stats.failed += 1
+                finally:
+                    heartbeat.cancel()
+            if usage.calls:
+                payload['usage'] = usage.to_json()
+
+        reply_to = fields.get('reply_to')
+        if reply_to:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.xadd(reply_to, payload, maxlen=10000, approximate=True)
+                pipe.expire(reply_to, self.result_ttl)
+                await pipe.execute()
+        # Acknowledged only once the result is out, so a crash in between runs the job again
+        await self._acknowledge(stream, entry_id)
+
+    async def _stream(self, agent, query: str, job_id: str, reply_to: str) -> str:
+        """
+        Run a job's agent streaming, sending the text of its response in batches as it is generated
+
+        Returns:
+            The text of the response
+        """
+        parts = []
+        pending = []
+        sent = 0
+        sent_at = time.monotonic()
+        async for chunk in agent.process_stream(query):
+            if not chunk.text:
+                continue
+            parts.append(chunk.text)
+            pending.append(chunk.text)
+            # One entry per token would cost a Redis round trip each
+            if time.monotonic() - sent_at >= self.delta_interval:
+                delta = "".join(pending)
+                await self.redis.xadd(reply_to, {'id': job_id, 'delta': delta, 'offset': sent},
+                                      maxlen=10000, approximate=True)
+                self.stats.deltas_sent += 1
+                sent += len(delta)
+                pending = []
+                sent_at = time.monotonic()
+        # Text not sent yet reaches the caller with the result
+        return "".join(parts)
+
+    async def _acknowledge(self, stream: str, entry_id: str):
+        """Remove a finished job from the pending list and the stream"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(stream, WORKER_GROUP, entry_id)
+            pipe.xdel(stream, entry_id)
+            await pipe.execute()
+
+    async def _heartbeat(self, stream: str, entry_id: str):
+        """Renew the claim on a running job so other workers don't take it over"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await self.redis.xclaim(stream, WORKER_GROUP, self.name, 0, [entry_id], justid=True)
+            except RedisError as e:
+                logger.error(f"Error renewing claim on {entry_id}: {str(e)}")
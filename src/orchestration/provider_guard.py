@@ -0,0 +1,556 @@
+"""
+Provider Call Guards for Multi-Skill Super-Agent
+
+This module limits the calls made to each model of each provider. The number
+of concurrent calls allowed adapts to what the provider reports: it grows by
+one per limit's worth of fast successful calls and shrinks multiplicatively
+on 429 and 5xx responses, timeouts, or calls much slower than the fastest
+recently seen of their kind (AIMD). A circuit breaker next to the limiter opens when too
+many recent calls failed, so calls fail fast with ProviderUnavailable for a
+while instead of piling onto a provider that is down; one probe call is then
+let through, and its outcome closes the circuit or keeps it open for longer.
+
+Calls of latency-critical agents can be hedged: once a call has taken longer
+than the model's p95 latency, a duplicate is sent, the first answer is used
+and the other call is cancelled. Streams are timed to their first chunk and
+other calls to their end, so the latencies of the two kinds of call are kept
+apart and a completion is only compared with other completions.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import openai
+from loguru import logger
+
+from .deadline import DeadlineExceeded, call_timeout, expired
+from ..utils.config import (
+    PROVIDER_INITIAL_CONCURRENCY,
+    PROVIDER_MIN_CONCURRENCY,
+    PROVIDER_MAX_CONCURRENCY,
+    PROVIDER_LATENCY_TOLERANCE,
+    PROVIDER_MAX_WAIT,
+    PROVIDER_BREAKER_FAILURE_RATE,
+    PROVIDER_BREAKER_MIN_CALLS,
+    PROVIDER_BREAKER_WINDOW,
+    PROVIDER_BREAKER_OPEN_SECONDS,
+)
+
+# Kinds of call, by what their latency measures: the first chunk of a stream or the end of a whole completion
+FIRST_CHUNK = "first_chunk"
+COMPLETION = "completion"
+# Successful calls of each kind whose latency the hedging delay is taken from, and the share of them it waits for
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 0.95
+# Weight of the latest call in the moving averages of latency and errors models are ranked by
+EWMA_ALPHA = 0.2
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider that is failing or saturated"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def is_overload(error: BaseException) -> bool:
+    """
+    Check whether an error means the provider is overloaded or down
+
+    Args:
+        error: Error raised by a provider call
+
+    Returns:
+        True for 429 and 5xx responses, timeouts and connection errors
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError, ConnectionError))
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted by additive increase and multiplicative decrease"""
+
+    def __init__(self, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 latency_tolerance: float = 2.0, backoff: float = 0.5, max_wait: float = 30.0):
+        """
+        Initialize the limiter
+
+        Args:
+            initial_limit: Concurrent calls allowed at first
+            min_limit: Lowest the limit goes
+            max_limit: Highest the limit goes
+            latency_tolerance: Calls slower than this multiple of the baseline latency shrink the limit
+            backoff: Factor the limit is multiplied by on an overload error
+            max_wait: Seconds a call waits for a slot before ProviderUnavailable is raised
+        """
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.in_flight = 0
+        # Fastest recent latency of each kind of call, drifting up slowly so a model that got slower for good
+        # is followed; a completion is only compared with other completions, a first chunk with first chunks
+        self.baselines: Dict[str, float] = {}
+        self.increases = 0
+        self.decreases = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+
+    @property
+    def waiting(self) -> int:
+        """Number of calls waiting for a slot"""
+        return len(self._waiters)
+
+    async def acquire(self):
+        """Wait for a slot, raising ProviderUnavailable after max_wait seconds or DeadlineExceeded before"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        timeout = call_timeout(self.max_wait)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            if expired():
+                raise DeadlineExceeded("The request deadline passed while waiting for a call slot") from None
+            raise ProviderUnavailable(f"No call slot became free within {self.max_wait:g}s", self.max_wait)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as the caller went away
+                self.release()
+            raise
+        finally:
+            if not future.done() or future.cancelled():
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+
+    def release(self):
+        """Give a slot back and hand it to the next waiting call"""
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self, latency: float, kind: str = COMPLETION):
+        """
+        Adjust the limit after a successful call
+
+        Args:
+            latency: Seconds until the provider responded
+            kind: FIRST_CHUNK if the latency is that of a stream's first chunk, else COMPLETION
+        """
+        baseline = self.baselines.get(kind)
+        if baseline is None or latency < baseline:
+            baseline = latency
+        else:
+            baseline += (latency - baseline) * 0.01
+        self.baselines[kind] = baseline
+        if latency > baseline * self.latency_tolerance:
+            # Queueing at the provider shows as latency before it shows as errors
+            self._decrease(0.9)
+        elif self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.increases += 1
+            self._wake()
+
+    def on_overload(self):
+        """Shrink the limit after a 429, 5xx or timeout"""
+        self._decrease(self.backoff)
+
+    def _decrease(self, factor: float):
+        """Shrink the limit at most once per baseline latency, so one burst of errors counts once"""
+        now = time.monotonic()
+        if now - self._last_decrease < max(min(self.baselines.values(), default=0.0), 0.1):
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+        self.decreases += 1
+
+    def _wake(self):
+        """Grant free slots to waiting calls in arrival order"""
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+class CircuitBreaker:
+    """Fails calls fast while too many recent calls to a provider failed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_rate: float = 0.5, min_calls: int = 10, window: int = 20,
+                 open_seconds: float = 30.0, max_open_seconds: float = 300.0):
+        """
+        Initialize the breaker
+
+        Args:
+            failure_rate: Share of failed calls in the window that opens the circuit
+            min_calls: Calls the window needs before the circuit can open
+            window: Number of recent calls considered
+            open_seconds: Seconds the circuit stays open before a probe call is let through
+            max_open_seconds: Upper bound of the open time, which doubles on every failed probe
+        """
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = self.CLOSED
+        self.opened = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._open_for = open_seconds
+        self._probing = False
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next probe call is let through"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self._open_for - time.monotonic())
+
+    def allow(self):
+        """Raise ProviderUnavailable unless a call may be made now"""
+        if self.state == self.OPEN:
+            if self.retry_after > 0:
+                raise ProviderUnavailable(
+                    f"Circuit open, retrying in {self.retry_after:.0f}s", self.retry_after
+                )
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise ProviderUnavailable("Circuit half open, waiting for the probe call", 1.0)
+            self._probing = True
+
+    def record(self, succeeded: Optional[bool]):
+        """
+        Record the outcome of an allowed call
+
+        Args:
+            succeeded: True or False, or None for calls that tell nothing about the provider
+        """
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+            if succeeded:
+                logger.info("Circuit closed after a successful probe call")
+                self.state = self.CLOSED
+                self._outcomes.clear()
+                self._open_for = self.open_seconds
+            elif succeeded is False:
+                self._open(min(self._open_for * 2, self.max_open_seconds))
+            return
+        if succeeded is None or self.state != self.CLOSED:
+            return
+        self._outcomes.append(succeeded)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+            self._open(self.open_seconds)
+
+    def _open(self, seconds: float):
+        """Open the circuit for the given number of seconds"""
+        logger.warning(f"Circuit opened for {seconds:.0f}s")
+        self.state = self.OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._open_for = seconds
+        self._outcomes.clear()
+
+class ProviderCallStats:
+    """Counters for the calls to one model of a provider"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.calls = 0
+        self.succeeded = 0
+        self.overloaded = 0
+        self.failed = 0
+        self.rejected = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.total_latency = 0.0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'calls': self.calls,
+            'succeeded': self.succeeded,
+            'overloaded': self.overloaded,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'avg_latency_s': self.total_latency / self.succeeded if self.succeeded else 0.0
+        }
+
+class ProviderCall:
+    """Handle of a call holding a slot, used to mark when the provider responded"""
+
+    __slots__ = ("kind", "started", "responded_at")
+
+    def __init__(self, kind: str = COMPLETION):
+        self.kind = kind
+        self.started = time.monotonic()
+        self.responded_at = None
+
+    def responded(self):
+        """Mark the first byte of the response, so streams are timed to their first chunk"""
+        if self.responded_at is None:
+            self.responded_at = time.monotonic()
+
+    @property
+    def latency(self) -> float:
+        """Seconds until the provider responded, or until now if it was never marked"""
+        return (self.responded_at or time.monotonic()) - self.started
+
+class ProviderGuard:
+    """Limiter and circuit breaker of one model of a provider"""
+
+    def __init__(self, name: str, limiter: AdaptiveLimiter, breaker: CircuitBreaker):
+        """
+        Initialize the guard
+
+        Args:
+            name: "provider/model" name used in logs and statistics
+            limiter: Limiter of the concurrent calls
+            breaker: Breaker failing calls fast while the provider is down
+        """
+        self.name = name
+        self.limiter = limiter
+        self.breaker = breaker
+        self.stats = ProviderCallStats()
+        # Moving averages of the latency of successful calls and of the share of failed calls
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self._latencies = {FIRST_CHUNK: deque(maxlen=LATENCY_WINDOW), COMPLETION: deque(maxlen=LATENCY_WINDOW)}
+
+    def _observe(self, latency: Optional[float]):
+        """
+        Update the moving averages with the outcome of a call
+
+        Args:
+            latency: Seconds until the provider responded, or None for a failed call
+        """
+        failed = latency is None
+        self.error_ewma += EWMA_ALPHA * (failed - self.error_ewma)
+        if not failed:
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += EWMA_ALPHA * (latency - self.latency_ewma)
+
+    def hedge_delay(self, kind: str = COMPLETION) -> Optional[float]:
+        """
+        Get the time after which a call is hedged
+
+        Args:
+            kind: Kind of the call, COMPLETION for the whole completions run() hedges
+
+        Returns:
+            The p95 latency of recent successful calls of the kind, or None until enough of them were seen
+        """
+        if len(self._latencies[kind]) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies[kind])
+        return latencies[min(len(latencies) - 1, int(len(latencies) * HEDGE_PERCENTILE))]
+
+    async def run(self, factory: Callable[[], Awaitable[Any]], hedge: bool = False) -> Any:
+        """
+        Make a call holding a slot, optionally hedged
+
+        Args:
+            factory: Function creating the awaitable of the call
+            hedge: Whether to send a duplicate once the call is slower than the p95 latency;
+                the first answer is used and the other call is cancelled
+
+        Returns:
+            The result of the call
+        """
+        async def attempt():
+            async with self.slot():
+                return await factory()
+
+        delay = self.hedge_delay() if hedge else None
+        if delay is None:
+            return await attempt()
+
+        tasks = [asyncio.ensure_future(attempt())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            # A failing provider is not sent duplicates
+            if not done and self.breaker.state == CircuitBreaker.CLOSED:
+                self.stats.hedged += 1
+                tasks.append(asyncio.ensure_future(attempt()))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.stats.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark errors of calls that lost the race as retrieved
+                    task.exception()
+
+    @asynccontextmanager
+    async def slot(self, kind: str = COMPLETION) -> AsyncIterator[ProviderCall]:
+        """
+        Hold a call slot for the duration of a provider call
+
+        Args:
+            kind: FIRST_CHUNK for streams, which mark when their first chunk arrived, else COMPLETION
+
+        Yields:
+            Handle of the call
+
+        Raises:
+            ProviderUnavailable: The circuit is open or no slot became free in time
+        """
+        self.stats.calls += 1
+        try:
+            self.breaker.allow()
+            try:
+                await self.limiter.acquire()
+            except BaseException:
+                self.breaker.record(None)
+                raise
+        except ProviderUnavailable:
+            self.stats.rejected += 1
+            raise
+
+        call = ProviderCall(kind)
+        succeeded = None
+        try:
+            yield call
+            succeeded = True
+            self.stats.succeeded += 1
+            self.stats.total_latency += call.latency
+            self._latencies[kind].append(call.latency)
+            self._observe(call.latency)
+            self.limiter.on_success(call.latency, kind)
+        except BaseException as e:
+            # A call cut short by the request deadline says nothing about the provider
+            if is_overload(e) and not expired():
+                succeeded = False
+                self.stats.overloaded += 1
+                self._observe(None)
+                self.limiter.on_overload()
+            elif not isinstance(e, (asyncio.CancelledError, GeneratorExit, DeadlineExceeded)):
+                self.stats.failed += 1
+                self._observe(None)
+            raise
+        finally:
+            self.limiter.release()
+            self.breaker.record(succeeded)
+
+    def to_dict(self):
+        """Convert the state and counters of the guard to a dictionary"""
+        return {
+            **self.stats.to_dict(),
+            'limit': round(self.limiter.limit, 2),
+            'in_flight': self.limiter.in_flight,
+            'waiting': self.limiter.waiting,
+            'baseline_latency_s': dict(self.limiter.baselines),
+            'p95_latency_s': {kind: self.hedge_delay(kind) or 0.0 for kind in self._latencies},
+            'latency_ewma_s': self.latency_ewma or 0.0,
+            'error_ewma': round(self.error_ewma, 3),
+            'circuit': self.breaker.state,
+            'circuit_opened': self.breaker.opened
+        }
+
+class ProviderGuards:
+    """The guards of every provider and model, created on first use"""
+
+    def __init__(self, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 latency_tolerance: float = 2.0, max_wait: float = 30.0, failure_rate: float = 0.5,
+                 min_calls: int = 10, window: int = 20, open_seconds: float = 30.0):
+        """
+        Initialize the guards
+
+        Args:
+            initial_limit: Concurrent calls allowed per model at first
+            min_limit: Lowest a limit goes
+            max_limit: Highest a limit goes
+            latency_tolerance: Calls slower than this multiple of the baseline latency shrink the limit
+            max_wait: Seconds a call waits for a slot
+            failure_rate: Share of failed recent calls that opens a circuit
+            min_calls: Calls needed before a circuit can open
+            window: Number of recent calls considered by a circuit
+            open_seconds: Seconds a circuit stays open before a probe call
+        """
+        self._limiter_settings = dict(initial_limit=initial_limit, min_limit=min_limit, max_limit=max_limit,
+                                      latency_tolerance=latency_tolerance, max_wait=max_wait)
+        self._breaker_settings = dict(failure_rate=failure_rate, min_calls=min_calls, window=window,
+                                      open_seconds=open_seconds)
+        self._guards: Dict[str, ProviderGuard] = {}
+
+    def get(self, provider: str, model: str) -> ProviderGuard:
+        """
+        Get the guard of a model
+
+        Args:
+            provider: Name of the provider, e.g. "openai"
+            model: Name of the model
+
+        Returns:
+            The guard of the model
+        """
+        name = f"{provider}/{model}"
+        guard = self._guards.get(name)
+        if guard is None:
+            guard = self._guards[name] = ProviderGuard(
+                name, AdaptiveLimiter(**self._limiter_settings), CircuitBreaker(**self._breaker_settings)
+            )
+        return guard
+
+    def to_dict(self):
+        """Convert the guards to a dictionary keyed by "provider/model" """
+        return {name: guard.to_dict() for name, guard in self._guards.items()}
+
+_shared_guards = None
+
+def get_provider_guards() -> ProviderGuards:
+    """
+    Get the guards shared by all agents, creating them on first use
+
+    Returns:
+        The shared guards
+    """
+    global _shared_guards
+    if _shared_guards is None:
+        _shared_guards = ProviderGuards(
+            initial_limit=PROVIDER_INITIAL_CONCURRENCY,
+            min_limit=PROVIDER_MIN_CONCURRENCY,
+            max_limit=PROVIDER_MAX_CONCURRENCY,
+            latency_tolerance=PROVIDER_LATENCY_TOLERANCE,
+            max_wait=PROVIDER_MAX_WAIT,
+            failure_rate=PROVIDER_BREAKER_FAILURE_RATE,
+            min_calls=PROVIDER_BREAKER_MIN_CALLS,
+            window=PROVIDER_BREAKER_WINDOW,
+            open_seconds=PROVIDER_BREAKER_OPEN_SECONDS
+        )
+    return _shared_guards
+
+def provider_guard_stats() -> Optional[dict]:
+    """
+    Get the statistics of the shared guards
+
+    Returns:
+        Dictionary of statistics per "provider/model", or None if no agent has called a provider yet
+    """
+    return _shared_guards.to_dict() if _shared_guards is not None else None
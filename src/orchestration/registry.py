@@ -0,0 +1,126 @@
+"""
+Agent Registry for Multi-Skill Super-Agent
+
+This module declares the available agents by name, module path and class
+name. An agent's module is imported, and the agent constructed, the first
+time the agent is requested, so a deployment only pays the import cost
+(openai, bs4, apscheduler, SQLAlchemy) of the agents it actually uses.
+Resolved agents are cached in a dictionary, making later lookups O(1).
+"""
+import importlib
+import time
+from typing import Dict, Iterable, List, Optional
+
+from loguru import logger
+
+class AgentSpec:
+    """Declaration of an agent that can be loaded on demand"""
+
+    __slots__ = ("name", "module", "class_name")
+
+    def __init__(self, name: str, module: str, class_name: str):
+        """
+        Initialize the declaration
+
+        Args:
+            name: The name the agent is requested by
+            module: Module path of the agent, relative to this package or absolute
+            class_name: Name of the agent class in the module
+        """
+        self.name = name
+        self.module = module
+        self.class_name = class_name
+
+class AgentRegistry:
+    """Registry of agents imported and constructed on first use"""
+
+    def __init__(self, specs: Iterable[AgentSpec] = ()):
+        """
+        Initialize the registry
+
+        Args:
+            specs: The agent declarations
+        """
+        self._specs: Dict[str, AgentSpec] = {}
+        self._instances = {}
+        self.load_times: Dict[str, float] = {}
+        for spec in specs:
+            self.register(spec)
+
+    def register(self, spec: AgentSpec):
+        """
+        Declare an agent, replacing any agent of the same name
+
+        Args:
+            spec: The agent declaration
+        """
+        self._specs[spec.name] = spec
+        self._instances.pop(spec.name, None)
+
+    @property
+    def names(self) -> List[str]:
+        """Names of the declared agents"""
+        return list(self._specs)
+
+    def is_loaded(self, name: str) -> bool:
+        """
+        Check whether an agent has been constructed
+
+        Args:
+            name: The agent name
+
+        Returns:
+            True if the agent was already loaded
+        """
+        return name in self._instances
+
+    def get(self, name: str):
+        """
+        Get an agent, loading it on first use
+
+        Args:
+            name: The agent name
+
+        Returns:
+            The agent instance
+
+        Raises:
+            KeyError: If no agent of that name is declared
+        """
+        agent = self._instances.get(name)
+        if agent is None:
+            agent = self._load(name)
+        return agent
+
+    def preload(self, names: Optional[Iterable[str]] = None):
+        """
+        Load agents ahead of their first use
+
+        Args:
+            names: The agents to load, all declared agents if not given
+        """
+        for name in (self.names if names is None else names):
+            self.get(name)
+
+    def _load(self, name: str):
+        """Import the module of an agent and construct it"""
+        spec = self._specs.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown agent: {name}")
+
+        started = time.perf_counter()
+        module = importlib.import_module(spec.module, package=__package__)
+        agent = getattr(module, spec.class_name)()
+        self.load_times[name] = time.perf_counter() - started
+        self._instances[name] = agent
+        logger.info(f"Loaded {spec.class_name} in {self.load_times[name] * 1000:.0f} ms")
+        return agent
+
+# Agents available to the router
+AGENT_REGISTRY = AgentRegistry([
+    AgentSpec("code", "..agents.code_agent", "CodeGenerationAgent"),
+    AgentSpec("image", "..agents.image_agent", "ImageGenerationAgent"),
+    AgentSpec("research", "..agents.research_agent", "WebResearchAgent"),
+    AgentSpec("task", "..agents.task_agent", "TaskAutomationAgent"),
+    AgentSpec("assistant", "..agents.assistant_agent", "PersonalAssistantAgent"),
+])
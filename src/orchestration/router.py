@@ -2,29 +2,144 @@
 Agent Router for Multi-Skill Super-Agent
 
 This module handles routing requests to the appropriate agent modules.
+Identical calls made at the same time are coalesced into one. Agent calls
+are queued on the agent's worker pool in the task queue, and run either in
+this process or, with a job queue, in separate worker processes. Every call
+gets a deadline, the earlier of the request's and the agent's timeout, and
+is cancelled if it is still running when the deadline passes.
 """
+import asyncio
+from typing import Callable, Dict, Optional
+
 from loguru import logger
 
+from .answer_index import normalize_query
+from .deadline import deadline_scope, within_deadline
+from .registry import AGENT_REGISTRY, AgentRegistry
+from .single_flight import SingleFlight
+from .task_queue import PRIORITY_NORMAL, TaskQueue
+
+class CancellationStats:
+    """Counters for agent calls cancelled before they finished"""
+    
+    def __init__(self):
+        """Initialize the counters"""
+        self.cancelled_calls = 0
+        self.tokens_generated = 0
+        self.tokens_saved = 0
+    
+    def record(self, max_tokens: int, generated: int):
+        """
+        Record a cancelled call
+        
+        Args:
+            max_tokens: The completion token limit of the call
+            generated: Completion tokens received before it was cancelled
+        """
+        self.cancelled_calls += 1
+        self.tokens_generated += generated
+        self.tokens_saved += max(max_tokens - generated, 0)
+    
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'cancelled_calls': self.cancelled_calls,
+            'tokens_generated': self.tokens_generated,
+            'tokens_saved': self.tokens_saved
+        }
+
 class AgentRouter:
     """Router for directing requests to appropriate agent modules"""
     
-    def __init__(self):
-        """Initialize the agent router"""
+    def __init__(self, registry: Optional[AgentRegistry] = None, task_queue: Optional[TaskQueue] = None,
+                 job_queue=None, timeouts: Optional[Dict[str, float]] = None):
+        """
+        Initialize the agent router
+        
+        Args:
+            registry: The registry agents are resolved from (default: AGENT_REGISTRY)
+            task_queue: The queue agent calls run on (default: 4 workers per agent)
+            job_queue: Optional JobQueueClient running agent calls in worker processes;
+                agents are then never loaded in this process
+            timeouts: Seconds a call may take per agent name; agents without one only
+                get the deadline of the request
+        """
+        self.registry = registry if registry is not None else AGENT_REGISTRY
+        self.task_queue = task_queue if task_queue is not None else TaskQueue()
+        self.job_queue = job_queue
+        self.timeouts = dict(timeouts or {})
+        self.single_flight = SingleFlight()
+        self.cancellation_stats = CancellationStats()
         logger.info("Agent router initialized")
     
-    async def route_to_code_agent(self, query: str) -> str:
+    async def route(self, agent_name: str, query: str, on_delta: Optional[Callable[[str], None]] = None,
+                    priority: int = PRIORITY_NORMAL) -> str:
+        """
+        Route a request to an agent by name
+        
+        An identical call already running is joined instead of started again. The call runs
+        in the context of the caller that started it, so its model usage is charged to that
+        caller alone, and calls it makes after that caller has gone are charged to nobody.
+        
+        Args:
+            agent_name: The registered agent name
+            query: The query to process
+            on_delta: Optional callback receiving text deltas as they are generated
+            priority: Queue priority of the call, lower runs first
+            
+        Returns:
+            The agent's response
+            
+        Raises:
+            QueueFull: If the agent's queue is full
+            DeadlineExceeded: If the call did not finish before the deadline
+        """
+        if self.job_queue is not None:
+            if agent_name not in self.registry.names:
+                raise KeyError(f"Unknown agent: {agent_name}")
+            # Workers use their own agents, whose settings are not known here
+            agent = None
+            model_params = {}
+        else:
+            agent = self.registry.get(agent_name)
+            model_params = getattr(agent, "model_params", {})
+        
+        # Callers of an identical running call share its result, and its deltas when it streams;
+        # the call runs under the deadline of the caller that started it
+        key = (agent_name, normalize_query(query), tuple(sorted(model_params.items())))
+        with deadline_scope(self.timeouts.get(agent_name)):
+            return await within_deadline(self.single_flight.do(
+                key,
+                lambda publish: self._dispatch(agent_name, agent, query, publish if on_delta else None, priority),
+                on_publish=on_delta
+            ))
+    
+    async def _dispatch(self, agent_name: str, agent, query: str, on_delta: Optional[Callable[[str], None]],
+                        priority: int) -> str:
+        """Queue an agent call on the agent's worker pool"""
+        if agent is None:
+            return await self.task_queue.submit(
+                agent_name, lambda: self.job_queue.call(agent_name, query, on_delta), priority
+            )
+        return await self.task_queue.submit(
+            agent_name, lambda: self._run_agent(agent, query, on_delta), priority
+        )
+    
+    async def route_to_code_agent(self, query: str, on_delta: Optional[Callable[[str], None]] = None,
+                                  priority: int = PRIORITY_NORMAL) -> str:
         """
         Route a request to the code generation agent
         
         Args:
             query: The code generation query
+            on_delta: Optional callback receiving the code as it is generated
+            priority: Queue priority of the call, lower runs first
             
         Returns:
             The generated code or error message
         """
-        # This is a placeholder - will be implemented when the code agent is developed
         logger.info(f"Routing to code agent: {query}")
-        return "# Code generation will be implemented in the next phase\n\ndef example():\n    print('Hello, World!')\n\n# The actual implementation will use OpenAI API"
+        return await self.route("code", query, on_delta, priority)
     
     async def route_to_image_agent(self, query: str) -> str:
         """
@@ -36,23 +151,24 @@ class AgentRouter:
         Returns:
             The URL or path to the generated image
         """
-        # This is a placeholder - will be implemented when the image agent is developed
         logger.info(f"Routing to image agent: {query}")
-        return "Image generation will be implemented in the next phase"
+        return await self.route("image", query)
     
-    async def route_to_research_agent(self, query: str) -> str:
+    async def route_to_research_agent(self, query: str, on_delta: Optional[Callable[[str], None]] = None,
+                                      priority: int = PRIORITY_NORMAL) -> str:
         """
         Route a request to the web research agent
         
         Args:
             query: The research query
+            on_delta: Optional callback receiving the summary as it is generated
+            priority: Queue priority of the call, lower runs first
             
         Returns:
             The research results summary
         """
-        # This is a placeholder - will be implemented when the research agent is developed
         logger.info(f"Routing to research agent: {query}")
-        return "Web research will be implemented in the next phase"
+        return await self.route("research", query, on_delta, priority)
     
     async def route_to_task_agent(self, query: str) -> str:
         """
@@ -64,9 +180,8 @@ class AgentRouter:
         Returns:
             The task automation result
         """
-        # This is a placeholder - will be implemented when the task agent is developed
         logger.info(f"Routing to task agent: {query}")
-        return "Task automation will be implemented in the next phase"
+        return await self.route("task", query)
     
     async def route_to_assistant_agent(self, query: str) -> str:
         """
@@ -78,6 +193,41 @@ class AgentRouter:
         Returns:
             The personal assistant response
         """
-        # This is a placeholder - will be implemented when the assistant agent is developed
         logger.info(f"Routing to assistant agent: {query}")
-        return "Personal assistant will be implemented in the next phase"
+        return await self.route("assistant", query)
+    
+    async def close(self):
+        """Stop the task queue and the job queue client"""
+        await self.task_queue.stop()
+        if self.job_queue is not None:
+            await self.job_queue.close()
+    
+    async def _run_agent(self, agent, query: str, on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Run an agent, streaming its output to a callback when one is given
+        
+        Args:
+            agent: The agent to run
+            query: The query to process
+            on_delta: Optional callback receiving text deltas as they are generated
+            
+        Returns:
+            The complete response
+        """
+        parts = []
+        try:
+            if on_delta is None:
+                return await agent.process(query)
+            
+            # Cancelling the caller closes the stream, which aborts the upstream request
+            async for chunk in agent.process_stream(query):
+                # Progress notes add no text; artifacts add their URL
+                if chunk.text:
+                    parts.append(chunk.text)
+                    on_delta(chunk.text)
+            return "".join(parts)
+        except asyncio.CancelledError:
+            # Streamed chunks carry about one token each; the rest of the limit was never generated
+            self.cancellation_stats.record(getattr(agent, "max_tokens", 0), len(parts))
+            logger.info(f"{agent.name} call cancelled after {len(parts)} tokens")
+            raise
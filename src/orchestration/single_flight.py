@@ -0,0 +1,119 @@
+"""
+Single-Flight Coalescing for Multi-Skill Super-Agent
+
+This module collapses identical agent calls made at the same time into one
+upstream call. The first caller of a key starts the call; callers arriving
+while it runs wait on the same result, receive the same error, and are
+replayed everything it published so far before receiving what it publishes
+next. A caller going away only stops its own wait, unless it was the last
+one waiting, in which case the upstream call is cancelled.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from loguru import logger
+
+class SingleFlightStats:
+    """Counters for coalesced calls"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.calls = 0
+        self.upstream_calls = 0
+        self.collapsed = 0
+        self.abandoned = 0
+        self.max_waiters = 0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'calls': self.calls,
+            'upstream_calls': self.upstream_calls,
+            'collapsed': self.collapsed,
+            'abandoned': self.abandoned,
+            'max_waiters': self.max_waiters
+        }
+
+class _Flight:
+    """An upstream call and the callers waiting on it"""
+
+    __slots__ = ("task", "waiters", "listeners", "published")
+
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.listeners = []
+        self.published = []
+
+    def publish(self, item):
+        """Hand an intermediate item, like a text delta, to every waiting caller"""
+        self.published.append(item)
+        for listener in list(self.listeners):
+            try:
+                listener(item)
+            except Exception as e:
+                logger.error(f"Error in single-flight listener: {str(e)}")
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome"""
+
+    def __init__(self):
+        """Initialize the coalescing layer"""
+        self.stats = SingleFlightStats()
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def in_flight(self) -> int:
+        """Number of upstream calls running"""
+        return len(self._flights)
+
+    async def do(self, key: Hashable, factory: Callable[[Callable[[Any], None]], Awaitable[Any]],
+                 on_publish: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Run a call, or join the identical call already running
+
+        Args:
+            key: Identity of the call; calls with equal keys are coalesced
+            factory: Function creating the awaitable of the upstream call; it receives
+                a publish function handing intermediate items to all callers
+            on_publish: Optional callback receiving the items published by the call
+
+        Returns:
+            The result of the call
+        """
+        self.stats.calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.ensure_future(factory(flight.publish))
+            flight.task.add_done_callback(lambda task: self._finished(key, flight))
+            self.stats.upstream_calls += 1
+        else:
+            self.stats.collapsed += 1
+            if on_publish is not None:
+                for item in flight.published:
+                    on_publish(item)
+
+        if on_publish is not None:
+            flight.listeners.append(on_publish)
+        flight.waiters += 1
+        self.stats.max_waiters = max(self.stats.max_waiters, flight.waiters)
+        try:
+            # Shielded so one caller being cancelled doesn't cancel the call the others wait on
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if on_publish is not None:
+                flight.listeners.remove(on_publish)
+            if flight.waiters == 0 and not flight.task.done():
+                # Forgotten right away so a new caller doesn't join the cancelled call
+                self._finished(key, flight)
+                self.stats.abandoned += 1
+                flight.task.cancel()
+
+    def _finished(self, key: Hashable, flight: _Flight):
+        """Forget a finished call so later callers start a new one"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.task.done() and not flight.task.cancelled():
+            # Mark the error as retrieved when every caller went away before it was raised
+            flight.task.exception()
@@ -0,0 +1,286 @@
+"""
+Task Queue for Multi-Skill Super-Agent
+
+This module queues agent calls in front of per-agent worker pools. Each
+agent gets its own pool with its own number of workers and its own bounded
+priority queue, so slow image jobs cannot occupy the workers code jobs
+need, and a full queue rejects new jobs instead of growing without bound.
+Every pool records queue wait time, service time and depth.
+"""
+import asyncio
+import contextvars
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+# Job priorities, lower runs first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+class QueueFull(Exception):
+    """Raised when an agent's queue has no room for another job"""
+
+class PoolStats:
+    """Counters for one worker pool"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.depth = 0
+        self.max_depth = 0
+        self.busy = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_service = 0.0
+        self.max_service = 0.0
+
+    def record_start(self, wait: float):
+        """Record a job leaving the queue after waiting for the given seconds"""
+        self.started += 1
+        self.busy += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def record_finish(self, service: float):
+        """Record a job finishing after running for the given seconds"""
+        self.busy -= 1
+        self.total_service += service
+        self.max_service = max(self.max_service, service)
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        started = self.started
+        return {
+            'submitted': self.submitted,
+            'started': self.started,
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'rejected': self.rejected,
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'busy': self.busy,
+            'avg_wait': self.total_wait / started if started else 0.0,
+            'max_wait': self.max_wait,
+            'avg_service': self.total_service / started if started else 0.0,
+            'max_service': self.max_service
+        }
+
+class _Job:
+    """A queued call and the future its submitter waits on"""
+
+    __slots__ = ("factory", "context", "future", "enqueued_at", "task")
+
+    def __init__(self, factory: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.factory = factory
+        # Run the job with the submitter's context variables
+        self.context = contextvars.copy_context()
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.task = None
+
+class WorkerPool:
+    """A fixed number of workers serving one bounded priority queue"""
+
+    def __init__(self, name: str, workers: int, max_depth: int):
+        """
+        Initialize the pool
+
+        Args:
+            name: Name of the pool, used in logs and errors
+            workers: Number of jobs run at the same time
+            max_depth: Maximum number of jobs waiting for a worker
+        """
+        if workers < 1:
+            raise ValueError("workers must be a positive integer")
+        self.name = name
+        self.workers = workers
+        self.max_depth = max_depth
+        self.stats = PoolStats()
+        self._queue = None
+        self._workers = []
+        self._loop = None
+        self._sequence = itertools.count()
+
+    def _ensure_started(self):
+        """Start the workers on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self.stats.depth = 0
+        self._workers = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def submit(self, factory: Callable[[], Awaitable[Any]], priority: int = PRIORITY_NORMAL) -> Any:
+        """
+        Queue a call and wait for its result
+
+        Cancelling the caller removes a queued job, or cancels it if it is running.
+
+        Args:
+            factory: Function creating the awaitable to run
+            priority: Job priority, lower runs first
+
+        Returns:
+            The result of the call
+
+        Raises:
+            QueueFull: If the queue is at its maximum depth
+        """
+        self._ensure_started()
+        if self.stats.depth >= self.max_depth:
+            self.stats.rejected += 1
+            raise QueueFull(f"The {self.name} agent is busy, please try again in a moment")
+
+        job = _Job(factory, self._loop.create_future())
+        self._queue.put_nowait((priority, next(self._sequence), job))
+        self.stats.submitted += 1
+        self.stats.depth += 1
+        self.stats.max_depth = max(self.stats.max_depth, self.stats.depth)
+
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            if job.task is None:
+                # Still queued: the worker skips it
+                if not job.future.done():
+                    job.future.cancel()
+                    self.stats.depth -= 1
+                    self.stats.cancelled += 1
+            else:
+                job.task.cancel()
+            raise
+
+    async def _work(self):
+        """Run queued jobs one at a time"""
+        while True:
+            _, _, job = await self._queue.get()
+            if job.future.done():
+                continue
+            self.stats.depth -= 1
+            started = time.monotonic()
+            self.stats.record_start(started - job.enqueued_at)
+
+            job.task = job.context.run(asyncio.ensure_future, job.factory())
+            try:
+                # Waiting instead of awaiting keeps a cancelled job from stopping the worker
+                await asyncio.wait([job.task])
+            except asyncio.CancelledError:
+                job.task.cancel()
+                job.future.cancel()
+                raise
+            finally:
+                self.stats.record_finish(time.monotonic() - started)
+
+            if job.task.cancelled():
+                self.stats.cancelled += 1
+                job.future.cancel()
+            elif job.task.exception() is not None:
+                self.stats.failed += 1
+                job.future.set_exception(job.task.exception())
+            else:
+                self.stats.completed += 1
+                job.future.set_result(job.task.result())
+
+    async def stop(self):
+        """Stop the workers, cancelling running and queued jobs"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            job.future.cancel()
+        self._workers = []
+        self._loop = None
+
+def parse_pool_sizes(spec: str) -> Dict[str, int]:
+    """
+    Parse pool sizes of the form "code=8,research=4"
+
+    Args:
+        spec: Comma separated name=workers pairs
+
+    Returns:
+        Dictionary of agent name to number of workers
+    """
+    sizes = {}
+    for item in spec.split(","):
+        if item.strip():
+            name, _, workers = item.partition("=")
+            sizes[name.strip()] = int(workers)
+    return sizes
+
+class TaskQueue:
+    """Per-agent worker pools behind one submit call"""
+
+    def __init__(self, pool_sizes: Optional[Dict[str, int]] = None, max_depth: int = 50,
+                 default_workers: int = 4):
+        """
+        Initialize the task queue
+
+        Args:
+            pool_sizes: Number of workers per agent name
+            max_depth: Maximum number of waiting jobs per agent
+            default_workers: Number of workers of agents without a configured size
+        """
+        self.pool_sizes = dict(pool_sizes or {})
+        self.max_depth = max_depth
+        self.default_workers = default_workers
+        self.pools: Dict[str, WorkerPool] = {}
+
+    def pool(self, agent_name: str) -> WorkerPool:
+        """
+        Get the worker pool of an agent, creating it on first use
+
+        Args:
+            agent_name: The agent name
+
+        Returns:
+            The agent's worker pool
+        """
+        pool = self.pools.get(agent_name)
+        if pool is None:
+            workers = self.pool_sizes.get(agent_name, self.default_workers)
+            pool = self.pools[agent_name] = WorkerPool(agent_name, workers, self.max_depth)
+            logger.info(f"Started {workers} workers for the {agent_name} agent")
+        return pool
+
+    async def submit(self, agent_name: str, factory: Callable[[], Awaitable[Any]],
+                     priority: int = PRIORITY_NORMAL) -> Any:
+        """
+        Queue a call to an agent and wait for its result
+
+        Args:
+            agent_name: The agent whose pool runs the call
+            factory: Function creating the awaitable to run
+            priority: Job priority, lower runs first
+
+        Returns:
+            The result of the call
+
+        Raises:
+            QueueFull: If the agent's queue is at its maximum depth
+        """
+        return await self.pool(agent_name).submit(factory, priority)
+
+    def get_stats(self) -> dict:
+        """
+        Get the statistics of every pool
+
+        Returns:
+            Dictionary of agent name to pool statistics
+        """
+        return {name: pool.stats.to_dict() for name, pool in self.pools.items()}
+
+    async def stop(self):
+        """Stop all worker pools"""
+        await asyncio.gather(*(pool.stop() for pool in self.pools.values()))
@@ -0,0 +1,105 @@
+"""
+Request Usage Metering for Multi-Skill Super-Agent
+
+This module tallies the model calls made on behalf of the request being
+handled. Like the request deadline, the tally lives in a context variable,
+so the model router records every completion into it wherever the call is
+made: in the Telegram handler's task, on a task queue worker, or in a job
+queue worker process, whose tally travels back with the job's result.
+"""
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+_usage: ContextVar[Optional["RequestUsage"]] = ContextVar("usage", default=None)
+
+class RequestUsage:
+    """The model calls made on behalf of one request"""
+
+    def __init__(self):
+        """Initialize an empty tally"""
+        # One dictionary per call: agent, model, prompt_tokens, completion_tokens, cost_usd
+        self.calls: List[dict] = []
+
+    @property
+    def tokens(self) -> int:
+        """Prompt and completion tokens of all calls"""
+        return sum(call['prompt_tokens'] + call['completion_tokens'] for call in self.calls)
+
+    @property
+    def cost_usd(self) -> float:
+        """Cost of all calls in USD at catalog prices"""
+        return sum(call['cost_usd'] for call in self.calls)
+
+    def add(self, agent: str, model: str, prompt_tokens: int, completion_tokens: int, cost_usd: float):
+        """
+        Record a model call
+
+        Args:
+            agent: Name of the agent that made the call
+            model: "provider/model" that answered it
+            prompt_tokens: Tokens of the prompt
+            completion_tokens: Tokens of the completion
+            cost_usd: Cost of the call at catalog prices
+        """
+        self.calls.append({
+            'agent': agent,
+            'model': model,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cost_usd': cost_usd
+        })
+
+    def merge(self, encoded: Optional[str]):
+        """
+        Add the calls of a tally encoded by to_json, e.g. one made in a worker process
+
+        Args:
+            encoded: The encoded tally, or None
+        """
+        if encoded:
+            self.calls.extend(json.loads(encoded))
+
+    def to_json(self) -> str:
+        """Encode the tally to be sent to another process"""
+        return json.dumps(self.calls)
+
+def current_usage() -> Optional[RequestUsage]:
+    """
+    Get the tally of the current request
+
+    Returns:
+        The tally, or None outside of a usage scope
+    """
+    return _usage.get()
+
+def record_usage(agent: str, model: str, prompt_tokens: int, completion_tokens: int, cost_usd: float):
+    """
+    Record a model call in the tally of the current request, if it has one
+
+    Args:
+        agent: Name of the agent that made the call
+        model: "provider/model" that answered it
+        prompt_tokens: Tokens of the prompt
+        completion_tokens: Tokens of the completion
+        cost_usd: Cost of the call at catalog prices
+    """
+    usage = _usage.get()
+    if usage is not None:
+        usage.add(agent, model, prompt_tokens, completion_tokens, cost_usd)
+
+@contextmanager
+def usage_scope() -> Iterator[RequestUsage]:
+    """
+    Tally the model calls made in the scope
+
+    Yields:
+        The tally, complete once the scope is left
+    """
+    usage = RequestUsage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
@@ -5,8 +5,8 @@ This module handles database operations for storing task history and agent state
 """
 import os
 import json
-from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime
+from datetime import date, datetime
+from sqlalchemy import create_engine, inspect, text, func, Column, Integer, BigInteger, String, Text, Float, Date, DateTime, Index, or_, and_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from loguru import logger
@@ -26,7 +26,9 @@ class TaskRecord(Base):
     task_type = Column(String(50), nullable=False)  # code, image, research, etc.
     query = Column(Text, nullable=False)
     result = Column(Text, nullable=True)
-    status = Column(String(20), nullable=False)  # success, error, pending
+    status = Column(String(20), nullable=False)  # success, error, pending, running, cancelled
+    context = Column(Text, nullable=True)  # JSON serialized context needed to resume the task
+    parent_id = Column(Integer, nullable=True, index=True)  # Batch the task is an item of
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
     
@@ -38,6 +40,8 @@ class TaskRecord(Base):
             'query': self.query,
             'result': self.result,
             'status': self.status,
+            'context': json.loads(self.context) if self.context else None,
+            'parent_id': self.parent_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
@@ -60,6 +64,84 @@ class AgentState(Base):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class ProcessedUpdate(Base):
+    """Telegram update that has been handled, with the replies sent for it"""
+    __tablename__ = 'processed_updates'
+    __table_args__ = (Index('ix_processed_updates_chat_message', 'chat_id', 'message_id'),)
+    
+    id = Column(Integer, primary_key=True)
+    update_id = Column(BigInteger, nullable=False, index=True)
+    chat_id = Column(BigInteger, nullable=True)
+    message_id = Column(BigInteger, nullable=True)
+    replies = Column(Text, nullable=False)  # JSON serialized replies
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    def to_dict(self):
+        """Convert record to dictionary"""
+        return {
+            'id': self.id,
+            'update_id': self.update_id,
+            'chat_id': self.chat_id,
+            'message_id': self.message_id,
+            'replies': json.loads(self.replies),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+class CachedResponse(Base):
+    """LLM response cached under a hash of the request that produced it"""
+    __tablename__ = 'response_cache'
+    
+    key = Column(String(64), primary_key=True)
+    agent = Column(String(50), nullable=False)
+    response = Column(Text, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    def to_dict(self):
+        """Convert record to dictionary"""
+        return {
+            'key': self.key,
+            'agent': self.agent,
+            'response': self.response,
+            'size': self.size,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+class UsageRecord(Base):
+    """Model call made on behalf of a user; the table is only ever appended to"""
+    __tablename__ = 'usage_ledger'
+    __table_args__ = (Index('ix_usage_ledger_user_day', 'user_id', 'day'),)
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, nullable=False)
+    agent = Column(String(50), nullable=False)
+    model = Column(String(100), nullable=False)
+    prompt_tokens = Column(Integer, nullable=False)
+    completion_tokens = Column(Integer, nullable=False)
+    cost_usd = Column(Float, nullable=False)
+    day = Column(Date, nullable=False, index=True)  # UTC day of the call, for daily rollups
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert record to dictionary"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'agent': self.agent,
+            'model': self.model,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cost_usd': self.cost_usd,
+            'day': self.day.isoformat() if self.day else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 class DatabaseManager:
     """Manager for database operations"""
     
@@ -71,9 +153,17 @@ class DatabaseManager:
     def _create_tables(self):
         """Create database tables if they don't exist"""
         Base.metadata.create_all(engine)
+        
+        # Databases created before task_history had context and parent_id columns
+        columns = {column['name'] for column in inspect(engine).get_columns('task_history')}
+        for name, definition in (('context', "TEXT"), ('parent_id', "INTEGER")):
+            if name not in columns:
+                with engine.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE task_history ADD COLUMN {name} {definition}"))
+                logger.info(f"Added {name} column to task_history")
         logger.info("Database tables created")
     
-    def add_task_record(self, task_type, query, status='pending'):
+    def add_task_record(self, task_type, query, status='pending', context=None):
         """
         Add a new task record
         
@@ -81,6 +171,7 @@ class DatabaseManager:
             task_type: Type of task (code, image, research, etc.)
             query: The query or request
             status: Initial status (default: pending)
+            context: Context needed to resume the task (optional, will be JSON serialized)
             
         Returns:
             The created task record
@@ -90,7 +181,8 @@ class DatabaseManager:
             task_record = TaskRecord(
                 task_type=task_type,
                 query=query,
-                status=status
+                status=status,
+                context=json.dumps(context) if context is not None else None
             )
             session.add(task_record)
             session.commit()
@@ -103,7 +195,7 @@ class DatabaseManager:
         finally:
             session.close()
     
-    def update_task_record(self, task_id, result=None, status=None):
+    def update_task_record(self, task_id, result=None, status=None, context=None):
         """
         Update an existing task record
         
@@ -111,6 +203,7 @@ class DatabaseManager:
             task_id: ID of the task to update
             result: Task result (optional)
             status: New status (optional)
+            context: New context needed to resume the task (optional, will be JSON serialized)
             
         Returns:
             The updated task record
@@ -126,9 +219,12 @@ class DatabaseManager:
             if result is not None:
                 task_record.result = result
             
+            if context is not None:
+                task_record.context = json.dumps(context)
+            
             if status is not None:
                 task_record.status = status
-                if status in ['success', 'error']:
+                if status in ['success', 'error', 'cancelled']:
                     task_record.completed_at = datetime.utcnow()
             
             session.commit()
@@ -166,6 +262,74 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def get_pending_tasks(self, limit=100):
+        """
+        Get pending task records that can be resumed
+        
+        Args:
+            limit: Maximum number of records to retrieve
+            
+        Returns:
+            List of pending task records with a resume context, oldest first
+        """
+        try:
+            session = Session()
+            task_records = session.query(TaskRecord).filter(
+                TaskRecord.status == 'pending',
+                TaskRecord.context.isnot(None)
+            ).order_by(TaskRecord.created_at).limit(limit).all()
+            return [record.to_dict() for record in task_records]
+        except Exception as e:
+            logger.error(f"Error getting pending tasks: {str(e)}")
+            raise
+        finally:
+            session.close()
+    
+    def add_task_records(self, records):
+        """
+        Add finished task records in one transaction, such as the items of a batch
+        
+        Args:
+            records: Dictionaries with task_type, query, result, status, context (will be JSON serialized),
+                parent_id and completed_at
+        """
+        try:
+            session = Session()
+            session.bulk_insert_mappings(TaskRecord, [
+                {**record, 'context': json.dumps(record['context']) if record.get('context') is not None else None}
+                for record in records
+            ])
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error adding task records: {str(e)}")
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def get_child_tasks(self, parent_id, status=None):
+        """
+        Get the task records that are items of a batch
+        
+        Args:
+            parent_id: ID of the batch's task record
+            status: Only get items with this status (optional)
+            
+        Returns:
+            List of the item records in the order they were added
+        """
+        try:
+            session = Session()
+            query = session.query(TaskRecord).filter(TaskRecord.parent_id == parent_id)
+            if status is not None:
+                query = query.filter(TaskRecord.status == status)
+            return [record.to_dict() for record in query.order_by(TaskRecord.id).all()]
+        except Exception as e:
+            logger.error(f"Error getting child tasks: {str(e)}")
+            raise
+        finally:
+            session.close()
+    
     def get_recent_tasks(self, limit=10):
         """
         Get recent task records
@@ -174,11 +338,13 @@ class DatabaseManager:
             limit: Maximum number of records to retrieve
             
         Returns:
-            List of recent task records
+            List of recent task records; items of batches are left out
         """
         try:
             session = Session()
-            task_records = session.query(TaskRecord).order_by(TaskRecord.created_at.desc()).limit(limit).all()
+            task_records = session.query(TaskRecord).filter(
+                TaskRecord.parent_id.is_(None)
+            ).order_by(TaskRecord.created_at.desc()).limit(limit).all()
             return [record.to_dict() for record in task_records]
         except Exception as e:
             logger.error(f"Error getting recent tasks: {str(e)}")
@@ -245,3 +411,247 @@ class DatabaseManager:
             raise
         finally:
             session.close()
+    
+    def save_processed_update(self, update_id, replies, expires_at, chat_id=None, message_id=None):
+        """
+        Save a handled Telegram update and its replies
+        
+        Args:
+            update_id: Telegram update ID
+            replies: List of replies sent for the update (will be JSON serialized)
+            expires_at: When the record may be discarded
+            chat_id: Chat of the update's message (optional)
+            message_id: ID of the update's message (optional)
+            
+        Returns:
+            The saved record
+        """
+        try:
+            session = Session()
+            record = ProcessedUpdate(
+                update_id=update_id,
+                chat_id=chat_id,
+                message_id=message_id,
+                replies=json.dumps(replies),
+                expires_at=expires_at
+            )
+            session.add(record)
+            session.commit()
+            return record.to_dict()
+        except Exception as e:
+            logger.error(f"Error saving processed update: {str(e)}")
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def get_processed_update(self, update_id, chat_id=None, message_id=None):
+        """
+        Get an unexpired handled update by update ID or by chat and message ID
+        
+        Args:
+            update_id: Telegram update ID
+            chat_id: Chat of the update's message (optional)
+            message_id: ID of the update's message (optional)
+            
+        Returns:
+            The record or None if not found
+        """
+        try:
+            session = Session()
+            match = ProcessedUpdate.update_id == update_id
+            if chat_id is not None and message_id is not None:
+                match = or_(match, and_(ProcessedUpdate.chat_id == chat_id, ProcessedUpdate.message_id == message_id))
+            record = session.query(ProcessedUpdate).filter(
+                match,
+                ProcessedUpdate.expires_at > datetime.utcnow()
+            ).first()
+            return record.to_dict() if record else None
+        except Exception as e:
+            logger.error(f"Error getting processed update: {str(e)}")
+            raise
+        finally:
+            session.close()
+    
+    def purge_processed_updates(self):
+        """
+        Delete expired handled updates
+        
+        Returns:
+            Number of deleted records
+        """
+        try:
+            session = Session()
+            deleted = session.query(ProcessedUpdate).filter(ProcessedUpdate.expires_at <= datetime.utcnow()).delete()
+            session.commit()
+            if deleted:
+                logger.info(f"Purged {deleted} expired processed updates")
+            return deleted
+        except Exception as e:
+            logger.error(f"Error purging processed updates: {str(e)}")
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def save_cached_response(self, key, agent, response, expires_at):
+        """
+        Save an LLM response, replacing any response cached under the same key
+        
+        Args:
+            key: Hash of the request
+            agent: Name of the agent that made the request
+            response: The response text
+            expires_at: When the response may no longer be served
+        """
+        try:
+            session = Session()
+            session.merge(CachedResponse(
+                key=key,
+                agent=agent,
+                response=response,
+                size=len(response.encode("utf-8")),
+                last_used_at=datetime.utcnow(),
+                expires_at=expires_at
+            ))
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error saving cached response: {str(e)}")
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def get_cached_response(self, key, include_expired=False):
+        """
+        Get an unexpired cached LLM response, marking it as used
+        
+        Args:
+            key: Hash of the request
+            include_expired: Whether an expired response not yet evicted is returned too
+            
+        Returns:
+            The record or None if not found
+        """
+        try:
+            session = Session()
+            query = session.query(CachedResponse).filter(CachedResponse.key == key)
+            if not include_expired:
+                query = query.filter(CachedResponse.expires_at > datetime.utcnow())
+            record = query.first()
+            if record is None:
+                return None
+            record.last_used_at = datetime.utcnow()
+            session.commit()
+            return record.to_dict()
+        except Exception as e:
+            logger.error(f"Error getting cached response: {str(e)}")
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def evict_cached_responses(self, max_bytes):
+        """
+        Delete expired cached responses, then the least recently used ones
+        until the rest fit in the given size
+        
+        Args:
+            max_bytes: Maximum total size of the cached responses
+            
+        Returns:
+            Number of deleted records
+        """
+        try:
+            session = Session()
+            deleted = session.query(CachedResponse).filter(CachedResponse.expires_at <= datetime.utcnow()).delete()
+            excess = (session.query(func.sum(CachedResponse.size)).scalar() or 0) - max_bytes
+            if excess > 0:
+                keys = []
+                for key, size in session.query(CachedResponse.key, CachedResponse.size).order_by(
+                    CachedResponse.last_used_at
+                ).all():
+                    keys.append(key)
+                    excess -= size
+                    if excess <= 0:
+                        break
+                for start in range(0, len(keys), 500):
+                    deleted += session.query(CachedResponse).filter(
+                        CachedResponse.key.in_(keys[start:start + 500])
+                    ).delete(synchronize_session=False)
+            session.commit()
+            if deleted:
+                logger.info(f"Evicted {deleted} cached responses")
+            return deleted
+        except Exception as e:
+            logger.error(f"Error evicting cached responses: {str(e)}")
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def add_usage_records(self, records):
+        """
+        Append model calls to the usage ledger in one transaction
+        
+        Args:
+            records: Dictionaries with user_id, agent, model, prompt_tokens, completion_tokens,
+                cost_usd and created_at
+        """
+        try:
+            session = Session()
+            session.bulk_insert_mappings(UsageRecord, [
+                {**record, 'day': record['created_at'].date()} for record in records
+            ])
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error adding usage records: {str(e)}")
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def get_usage_rollup(self, group_by, user_id=None, since=None):
+        """
+        Sum the usage ledger per user, agent or day
+        
+        Args:
+            group_by: "user", "agent" or "day"
+            user_id: Only sum the calls made for this user
+            since: Only sum the calls made on or after this day
+            
+        Returns:
+            List of dictionaries with the group's key, calls, tokens and cost, largest cost first
+        """
+        columns = {'user': UsageRecord.user_id, 'agent': UsageRecord.agent, 'day': UsageRecord.day}
+        column = columns[group_by]
+        try:
+            session = Session()
+            cost = func.sum(UsageRecord.cost_usd)
+            query = session.query(
+                column,
+                func.count(UsageRecord.id),
+                func.sum(UsageRecord.prompt_tokens),
+                func.sum(UsageRecord.completion_tokens),
+                cost
+            )
+            if user_id is not None:
+                query = query.filter(UsageRecord.user_id == user_id)
+            if since is not None:
+                query = query.filter(UsageRecord.day >= since)
+            return [
+                {
+                    group_by: key.isoformat() if isinstance(key, date) else key,
+                    'calls': calls,
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'cost_usd': total_cost
+                }
+                for key, calls, prompt_tokens, completion_tokens, total_cost
+                in query.group_by(column).order_by(cost.desc()).all()
+            ]
+        except Exception as e:
+            logger.error(f"Error getting usage rollup: {str(e)}")
+            raise
+        finally:
+            session.close()
@@ -0,0 +1,264 @@
+"""
+LLM Response Cache for Multi-Skill Super-Agent
+
+This module caches chat completion responses under a canonical hash of the
+request (model, messages, temperature, max_tokens and any other parameter),
+so repeating a prompt doesn't pay for another completion. Lookups go to an
+in-memory LRU first and then to the response_cache table of the database.
+Both tiers are bounded in bytes and evict the least recently used responses.
+
+Responses are kept for a time configured per agent, and requests sampled
+at a temperature above a threshold are not cached, since repeating them is
+expected to give a different answer.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from loguru import logger
+
+from ..utils.config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PERSIST,
+    LLM_CACHE_MAX_MEMORY_BYTES,
+    LLM_CACHE_MAX_DISK_BYTES,
+    LLM_CACHE_TTLS,
+    LLM_CACHE_DEFAULT_TTL,
+    LLM_CACHE_MAX_TEMPERATURE,
+)
+
+# Stores between two size checks of the database tier
+EVICT_INTERVAL = 100
+
+def request_key(params: dict) -> str:
+    """
+    Hash a completion request canonically
+
+    Args:
+        params: The parameters of the chat completion request
+
+    Returns:
+        Hex digest identifying the request
+    """
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def parse_ttls(spec: str) -> Dict[str, int]:
+    """
+    Parse cache TTLs of the form "CodeGeneration=86400,WebResearch=3600"
+
+    Args:
+        spec: Comma separated agent=seconds pairs
+
+    Returns:
+        Dictionary of agent name to TTL in seconds
+    """
+    ttls = {}
+    for item in spec.split(","):
+        if item.strip():
+            name, _, seconds = item.partition("=")
+            ttls[name.strip()] = int(seconds)
+    return ttls
+
+class ResponseCacheStats:
+    """Counters for the response cache"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.lookups = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        hits = self.memory_hits + self.disk_hits
+        return {
+            'lookups': self.lookups,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'hit_rate': hits / self.lookups if self.lookups else 0.0,
+            'bytes_saved': self.bytes_saved
+        }
+
+class ResponseCache:
+    """Two-tier cache of LLM responses"""
+
+    def __init__(self, db_manager=None, max_memory_bytes: int = 16 * 1024 * 1024,
+                 max_disk_bytes: int = 256 * 1024 * 1024, ttls: Optional[Dict[str, int]] = None,
+                 default_ttl: int = 3600, max_temperature: float = 0.5):
+        """
+        Initialize the cache
+
+        Args:
+            db_manager: DatabaseManager of the persistent tier, memory only if not given
+            max_memory_bytes: Maximum size of the responses kept in memory
+            max_disk_bytes: Maximum size of the responses kept in the database
+            ttls: Seconds responses are kept per agent name; 0 disables caching for the agent
+            default_ttl: Seconds responses of agents without a configured TTL are kept
+            max_temperature: Requests with a higher temperature are not cached
+        """
+        self.db_manager = db_manager
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_temperature = max_temperature
+        self.stats = ResponseCacheStats()
+        # key -> (response, size, expires_at)
+        self._memory = OrderedDict()
+        self.memory_bytes = 0
+        self._stores_since_evict = 0
+
+    def cacheable(self, agent: str, params: dict) -> bool:
+        """
+        Check whether the response to a request may be cached
+
+        Args:
+            agent: Name of the agent making the request
+            params: The parameters of the request
+
+        Returns:
+            True if the response is cached
+        """
+        temperature = params.get("temperature")
+        if self.ttls.get(agent, self.default_ttl) <= 0 or (
+            temperature is not None and temperature > self.max_temperature
+        ):
+            self.stats.bypassed += 1
+            return False
+        return True
+
+    async def get(self, key: str, allow_expired: bool = False) -> Optional[str]:
+        """
+        Look up a response
+
+        Args:
+            key: Hash of the request
+            allow_expired: Whether an expired response not yet evicted may be returned,
+                e.g. while the provider is down
+
+        Returns:
+            The cached response or None
+        """
+        self.stats.lookups += 1
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[2] > time.time() or allow_expired:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                self.stats.bytes_saved += entry[1]
+                return entry[0]
+            # Expired responses stay until evicted, to stand in while the provider is unavailable
+
+        if self.db_manager is not None:
+            try:
+                record = await asyncio.to_thread(self.db_manager.get_cached_response, key, allow_expired)
+            except Exception as e:
+                logger.error(f"Error reading the response cache: {str(e)}")
+                record = None
+            if record is not None:
+                expires_at = datetime.fromisoformat(record['expires_at']).replace(tzinfo=timezone.utc)
+                self._remember(key, record['response'], expires_at.timestamp())
+                self.stats.disk_hits += 1
+                self.stats.bytes_saved += record['size']
+                return record['response']
+
+        self.stats.misses += 1
+        return None
+
+    async def put(self, agent: str, key: str, response: str):
+        """
+        Store a response
+
+        Args:
+            agent: Name of the agent that made the request
+            key: Hash of the request
+            response: The response text
+        """
+        ttl = self.ttls.get(agent, self.default_ttl)
+        if ttl <= 0 or not response:
+            return
+        expires_at = time.time() + ttl
+        self._remember(key, response, expires_at)
+        self.stats.stores += 1
+
+        if self.db_manager is None:
+            return
+        try:
+            await asyncio.to_thread(
+                self.db_manager.save_cached_response, key, agent, response,
+                datetime.utcnow() + timedelta(seconds=ttl)
+            )
+            self._stores_since_evict += 1
+            if self._stores_since_evict >= EVICT_INTERVAL:
+                self._stores_since_evict = 0
+                self.stats.evictions += await asyncio.to_thread(
+                    self.db_manager.evict_cached_responses, self.max_disk_bytes
+                )
+        except Exception as e:
+            logger.error(f"Error writing the response cache: {str(e)}")
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        """Keep a response in memory, evicting the least recently used ones to make room"""
+        size = len(response.encode("utf-8"))
+        if key in self._memory:
+            self._drop(key)
+        if size > self.max_memory_bytes:
+            return
+        self._memory[key] = (response, size, expires_at)
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_memory_bytes:
+            self._drop(next(iter(self._memory)))
+            self.stats.evictions += 1
+
+    def _drop(self, key: str):
+        """Remove a response from memory"""
+        _, size, _ = self._memory.pop(key)
+        self.memory_bytes -= size
+
+_shared_cache = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the response cache shared by all agents, creating it on first use
+
+    Returns:
+        The shared cache, or None if caching is disabled
+    """
+    global _shared_cache
+    if _shared_cache is None and LLM_CACHE_ENABLED:
+        db_manager = None
+        if LLM_CACHE_PERSIST:
+            from .database import DatabaseManager
+            db_manager = DatabaseManager()
+        _shared_cache = ResponseCache(
+            db_manager,
+            max_memory_bytes=LLM_CACHE_MAX_MEMORY_BYTES,
+            max_disk_bytes=LLM_CACHE_MAX_DISK_BYTES,
+            ttls=parse_ttls(LLM_CACHE_TTLS),
+            default_ttl=LLM_CACHE_DEFAULT_TTL,
+            max_temperature=LLM_CACHE_MAX_TEMPERATURE
+        )
+    return _shared_cache
+
+def response_cache_stats() -> Optional[dict]:
+    """
+    Get the statistics of the shared cache
+
+    Returns:
+        Dictionary of statistics, or None if no agent has used the cache yet
+    """
+    return _shared_cache.stats.to_dict() if _shared_cache is not None else None
@@ -0,0 +1,570 @@
+"""
+Semantic Response Cache for Multi-Skill Super-Agent
+
+This module answers queries that paraphrase an earlier one ("fibonacci
+function" and "function for fibonacci numbers") with the earlier answer.
+Queries are embedded as unit vectors and kept per agent in one contiguous
+float32 matrix, memory-mapped from disk when a directory is configured, so a
+lookup is a single matrix-vector product over all cached queries. A cached
+answer is used when its query's cosine similarity reaches the agent's
+threshold.
+
+Removed entries have their vector zeroed, so they never match, until enough
+of them accumulate to compact the matrix. Large indexes are searched off the
+event loop while stores go on; compaction renumbers the rows, so a match
+found across one is discarded.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from .response_cache import parse_ttls
+from ..orchestration.deadline import call_timeout
+from ..orchestration.provider_guard import get_provider_guards
+from ..utils.config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_EMBEDDER,
+    SEMANTIC_CACHE_DIR,
+    SEMANTIC_CACHE_DIMENSIONS,
+    SEMANTIC_CACHE_THRESHOLDS,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    LLM_CACHE_TTLS,
+    LLM_CACHE_DEFAULT_TTL,
+)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it me my of on or please that the this to what with".split()
+)
+
+# Lookups in indexes with more rows are run off the event loop
+THREAD_THRESHOLD = 50000
+# Compaction runs once this share of the rows is removed
+COMPACT_RATIO = 0.25
+
+def _best_match(matrix: np.ndarray, count: int, vector: np.ndarray) -> Tuple[int, float]:
+    """
+    Find the row of a matrix most similar to a vector
+
+    Args:
+        matrix: Unit vectors, one per row
+        count: Number of rows in use
+        vector: Unit vector of the query
+
+    Returns:
+        Row and cosine similarity of the best match
+    """
+    scores = matrix[:count] @ vector
+    row = int(np.argmax(scores))
+    return row, float(scores[row])
+
+def parse_thresholds(spec: str) -> Dict[str, float]:
+    """
+    Parse similarity thresholds of the form "CodeGeneration=0.92,WebResearch=0.9"
+
+    Args:
+        spec: Comma separated agent=threshold pairs
+
+    Returns:
+        Dictionary of agent name to threshold
+    """
+    thresholds = {}
+    for item in spec.split(","):
+        if item.strip():
+            name, _, threshold = item.partition("=")
+            thresholds[name.strip()] = float(threshold)
+    return thresholds
+
+class HashingEmbedder:
+    """Deterministic local embedder hashing the words of a query into a fixed number of dimensions"""
+
+    def __init__(self, dim: int = 256):
+        """
+        Initialize the embedder
+
+        Args:
+            dim: Number of dimensions of the vectors
+        """
+        self.dim = dim
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts as unit vectors
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            Matrix with one row per text
+        """
+        return np.stack([self.embed_one(text) for text in texts])
+
+    def embed_one(self, text: str) -> np.ndarray:
+        """Embed one text as a unit vector"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            if word in _STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+class OpenAIEmbedder:
+    """Embedder using the OpenAI embeddings API"""
+
+    def __init__(self, client, model: str = "text-embedding-3-small", dim: int = 256):
+        """
+        Initialize the embedder
+
+        Args:
+            client: AsyncOpenAI client
+            model: The embedding model
+            dim: Number of dimensions the model is asked for
+        """
+        self.client = client
+        self.model = model
+        self.dim = dim
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts as unit vectors
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            Matrix with one row per text
+        """
+        # The client's own timeout applies unless the request has a deadline
+        timeout = call_timeout()
+        options = {} if timeout is None else {"timeout": timeout}
+        async with get_provider_guards().get("openai", self.model).slot():
+            response = await self.client.embeddings.create(
+                model=self.model, input=texts, dimensions=self.dim, **options
+            )
+        vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+class SemanticIndex:
+    """Unit vectors of cached queries in one contiguous matrix, with their answers"""
+
+    def __init__(self, dim: int, path: Optional[str] = None, max_entries: int = 100000, capacity: int = 1024):
+        """
+        Initialize the index, loading it from disk when the path exists
+
+        Args:
+            dim: Number of dimensions of the vectors
+            path: Base path of the memory-mapped matrix (.f32) and its entries (.jsonl);
+                kept in memory if not given
+            max_entries: Maximum number of entries; the oldest are removed beyond it
+            capacity: Initial number of rows of the matrix
+        """
+        self.dim = dim
+        self.path = path
+        self.max_entries = max_entries
+        self.count = 0
+        self.size = 0
+        self.removed = 0
+        self.compactions = 0
+        # Changes whenever the rows are renumbered, so searches made meanwhile can be told apart
+        self.generation = 0
+        self.entries: List[Optional[dict]] = []
+        self.matrix = None
+        self._oldest = 0
+        self._log = None
+        if path is not None and os.path.exists(path + ".jsonl"):
+            self._load(capacity)
+        else:
+            self.matrix = self._allocate(capacity)
+            if path is not None:
+                self._log = open(path + ".jsonl", "a", encoding="utf-8")
+
+    @property
+    def capacity(self) -> int:
+        """Number of rows the matrix has room for"""
+        return self.matrix.shape[0]
+
+    def _allocate(self, capacity: int, path: Optional[str] = None) -> np.ndarray:
+        """Create a zeroed matrix, memory-mapped when the index has a path"""
+        path = path or (self.path + ".f32" if self.path is not None else None)
+        if path is None:
+            return np.zeros((capacity, self.dim), dtype=np.float32)
+        with open(path, "wb") as f:
+            f.truncate(capacity * self.dim * 4)
+        return np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _load(self, capacity: int):
+        """Load the entries and map the matrix written by an earlier process, starting empty if it is lost"""
+        with open(self.path + ".jsonl", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "remove" in record:
+                    row = record["remove"]
+                    if row < len(self.entries) and self.entries[row] is not None:
+                        self.entries[row] = None
+                        self.size -= 1
+                    continue
+                row = record.pop("row")
+                self.entries.extend([None] * (row + 1 - len(self.entries)))
+                self.entries[row] = record
+                self.size += 1
+        self.count = len(self.entries)
+        self.removed = self.count - self.size
+        rows = os.path.getsize(self.path + ".f32") // (self.dim * 4) if os.path.exists(self.path + ".f32") else 0
+        if rows < self.count:
+            # An interrupted first write or a deleted matrix leaves entries without their vectors
+            logger.warning(f"Semantic cache matrix {self.path}.f32 is missing or short, starting the index empty")
+            self.entries = []
+            self.count = self.size = self.removed = 0
+            self.matrix = self._allocate(capacity)
+            self._log = open(self.path + ".jsonl", "w", encoding="utf-8")
+            return
+        self.matrix = np.memmap(self.path + ".f32", dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        # Rows whose entry was lost never match
+        for row, entry in enumerate(self.entries):
+            if entry is None:
+                self.matrix[row] = 0.0
+        self._log = open(self.path + ".jsonl", "a", encoding="utf-8")
+
+    def _grow(self, needed: int):
+        """Double the capacity of the matrix until the needed rows fit"""
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        if self.path is None:
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            matrix[:self.count] = self.matrix[:self.count]
+            self.matrix = matrix
+            return
+        self.matrix.flush()
+        del self.matrix
+        with open(self.path + ".f32", "r+b") as f:
+            f.truncate(capacity * self.dim * 4)
+        self.matrix = np.memmap(self.path + ".f32", dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def add_many(self, vectors: np.ndarray, entries: List[dict]):
+        """
+        Append vectors and their entries
+
+        Args:
+            vectors: Unit vectors, one row per entry
+            entries: Dictionaries with the query, answer and expiry of each vector
+        """
+        if self.count + len(entries) > self.capacity:
+            self._grow(self.count + len(entries))
+        self.matrix[self.count:self.count + len(entries)] = vectors
+        if self._log is not None:
+            self._log.write("".join(
+                json.dumps({"row": self.count + offset, **entry}) + "\n" for offset, entry in enumerate(entries)
+            ))
+            self._log.flush()
+        self.entries.extend(entries)
+        self.count += len(entries)
+        self.size += len(entries)
+
+        while self.size > self.max_entries:
+            while self.entries[self._oldest] is None:
+                self._oldest += 1
+            self.remove(self._oldest)
+
+    def search(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        """
+        Find the most similar vector
+
+        Args:
+            vector: Unit vector of the query
+
+        Returns:
+            Row and cosine similarity of the best match, (None, 0.0) if the index is empty
+        """
+        if self.size == 0:
+            return None, 0.0
+        return _best_match(self.matrix, self.count, vector)
+
+    async def search_in_thread(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        """
+        Find the most similar vector off the event loop
+
+        The matrix and row count are taken before the search, so it reads a consistent matrix however the
+        index changes meanwhile; old matrices stay valid, as they are replaced rather than resized in place.
+
+        Args:
+            vector: Unit vector of the query
+
+        Returns:
+            Row and cosine similarity of the best match, (None, 0.0) if the index is empty or was compacted
+            during the search
+        """
+        if self.size == 0:
+            return None, 0.0
+        generation = self.generation
+        row, score = await asyncio.to_thread(_best_match, self.matrix, self.count, vector)
+        if self.generation != generation:
+            # The row may hold another entry now
+            return None, 0.0
+        return row, score
+
+    def remove(self, row: int):
+        """
+        Remove an entry, compacting the matrix once enough rows are removed
+
+        Args:
+            row: The row of the entry
+        """
+        if self.entries[row] is None:
+            return
+        self.entries[row] = None
+        self.matrix[row] = 0.0
+        self.size -= 1
+        self.removed += 1
+        if self._log is not None:
+            self._log.write(json.dumps({"remove": row}) + "\n")
+            self._log.flush()
+        if self.removed >= 64 and self.removed >= self.count * COMPACT_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the matrix and the entries without the removed rows"""
+        keep = [row for row in range(self.count) if self.entries[row] is not None]
+        vectors = np.array(self.matrix[keep])
+        entries = [self.entries[row] for row in keep]
+        capacity = max(1024, 1 << max(len(keep) - 1, 0).bit_length())
+
+        if self.path is None:
+            self.matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        else:
+            # Written next to the old files and swapped in, so a crash leaves one complete copy
+            matrix = self._allocate(capacity, self.path + ".f32.tmp")
+            matrix[:len(keep)] = vectors
+            matrix.flush()
+            del matrix
+            with open(self.path + ".jsonl.tmp", "w", encoding="utf-8") as f:
+                f.write("".join(json.dumps({"row": row, **entry}) + "\n" for row, entry in enumerate(entries)))
+            self._log.close()
+            del self.matrix
+            os.replace(self.path + ".f32.tmp", self.path + ".f32")
+            os.replace(self.path + ".jsonl.tmp", self.path + ".jsonl")
+            self.matrix = np.memmap(self.path + ".f32", dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+            self._log = open(self.path + ".jsonl", "a", encoding="utf-8")
+
+        self.matrix[:len(keep)] = vectors
+        self.entries = entries
+        self.count = self.size = len(entries)
+        self.removed = 0
+        self._oldest = 0
+        self.compactions += 1
+        self.generation += 1
+
+    def close(self):
+        """Flush the matrix and close the entry log"""
+        if isinstance(self.matrix, np.memmap):
+            self.matrix.flush()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+class SemanticCacheStats:
+    """Counters for the semantic cache"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self.errors = 0
+        self.total_search = 0.0
+        self.max_search = 0.0
+
+    def record_search(self, seconds: float):
+        """Record the time a similarity search took"""
+        self.total_search += seconds
+        self.max_search = max(self.max_search, seconds)
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'stores': self.stores,
+            'errors': self.errors,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+            'avg_search_ms': self.total_search / self.lookups * 1000 if self.lookups else 0.0,
+            'max_search_ms': self.max_search * 1000
+        }
+
+class SemanticCache:
+    """Answers queries from the answers to similar earlier queries of the same agent"""
+
+    def __init__(self, embedder, directory: Optional[str] = None, thresholds: Optional[Dict[str, float]] = None,
+                 ttls: Optional[Dict[str, int]] = None, default_ttl: int = 3600, max_entries: int = 100000):
+        """
+        Initialize the cache
+
+        Args:
+            embedder: Object with a dim attribute and an async embed(texts) method returning unit vectors
+            directory: Directory of the memory-mapped indexes, kept in memory if not given
+            thresholds: Minimum cosine similarity per agent name; agents without one are not cached
+            ttls: Seconds answers are kept per agent name
+            default_ttl: Seconds answers of agents without a configured TTL are kept
+            max_entries: Maximum number of answers kept per agent
+        """
+        self.embedder = embedder
+        self.directory = directory
+        self.thresholds = dict(thresholds or {})
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.stats = SemanticCacheStats()
+        self.indexes: Dict[str, SemanticIndex] = {}
+        self._embeddings = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def enabled_for(self, agent: str) -> bool:
+        """Check whether an agent's answers are cached"""
+        return agent in self.thresholds and self.ttls.get(agent, self.default_ttl) > 0
+
+    def index(self, agent: str) -> SemanticIndex:
+        """
+        Get the index of an agent, loading or creating it on first use
+
+        Args:
+            agent: The agent name
+
+        Returns:
+            The agent's index
+        """
+        index = self.indexes.get(agent)
+        if index is None:
+            path = os.path.join(self.directory, agent) if self.directory is not None else None
+            index = self.indexes[agent] = SemanticIndex(self.embedder.dim, path, max_entries=self.max_entries)
+        return index
+
+    async def _embed(self, query: str) -> np.ndarray:
+        """Embed a query, reusing the embeddings of recent queries"""
+        vector = self._embeddings.get(query)
+        if vector is None:
+            vector = (await self.embedder.embed([query]))[0]
+            self._embeddings[query] = vector
+            if len(self._embeddings) > 256:
+                self._embeddings.popitem(last=False)
+        else:
+            self._embeddings.move_to_end(query)
+        return vector
+
+    async def lookup(self, agent: str, query: str, threshold: Optional[float] = None,
+                     allow_expired: bool = False) -> Optional[str]:
+        """
+        Find the answer to a similar earlier query
+
+        Args:
+            agent: Name of the agent asked
+            query: The query
+            threshold: Minimum similarity overriding the agent's threshold
+            allow_expired: Whether an expired answer may be returned, e.g. while the provider is down
+
+        Returns:
+            The cached answer or None
+        """
+        if not self.enabled_for(agent):
+            return None
+        self.stats.lookups += 1
+        try:
+            vector = await self._embed(query)
+        except Exception as e:
+            self.stats.errors += 1
+            self.stats.misses += 1
+            logger.error(f"Error embedding query: {str(e)}")
+            return None
+
+        index = self.index(agent)
+        started = time.perf_counter()
+        if index.count >= THREAD_THRESHOLD:
+            row, score = await index.search_in_thread(vector)
+        else:
+            row, score = index.search(vector)
+        self.stats.record_search(time.perf_counter() - started)
+
+        if row is None or score < (self.thresholds[agent] if threshold is None else threshold):
+            self.stats.misses += 1
+            return None
+        entry = index.entries[row]
+        if entry is None or (entry["expires_at"] <= time.time() and not allow_expired):
+            self.stats.expired += 1
+            self.stats.misses += 1
+            index.remove(row)
+            return None
+        self.stats.hits += 1
+        logger.info(f"Answered {agent} query from the semantic cache (similarity {score:.3f})")
+        return entry["answer"]
+
+    async def store(self, agent: str, query: str, answer: str):
+        """
+        Cache the answer to a query
+
+        Args:
+            agent: Name of the agent that answered
+            query: The query
+            answer: The answer
+        """
+        if not self.enabled_for(agent) or not answer:
+            return
+        try:
+            vector = await self._embed(query)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.error(f"Error embedding query: {str(e)}")
+            return
+        expires_at = time.time() + self.ttls.get(agent, self.default_ttl)
+        self.index(agent).add_many(vector[None, :], [{"query": query, "answer": answer, "expires_at": expires_at}])
+        self.stats.stores += 1
+
+_shared_cache = None
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Get the semantic cache shared by all agents, creating it on first use
+
+    Returns:
+        The shared cache, or None if it is disabled
+    """
+    global _shared_cache
+    if _shared_cache is None and SEMANTIC_CACHE_ENABLED:
+        if SEMANTIC_CACHE_EMBEDDER == "hashing":
+            embedder = HashingEmbedder(SEMANTIC_CACHE_DIMENSIONS)
+        else:
+            from ..agents.clients import get_openai_client
+            embedder = OpenAIEmbedder(get_openai_client(), dim=SEMANTIC_CACHE_DIMENSIONS)
+        _shared_cache = SemanticCache(
+            embedder,
+            directory=SEMANTIC_CACHE_DIR or None,
+            thresholds=parse_thresholds(SEMANTIC_CACHE_THRESHOLDS),
+            ttls=parse_ttls(LLM_CACHE_TTLS),
+            default_ttl=LLM_CACHE_DEFAULT_TTL,
+            max_entries=SEMANTIC_CACHE_MAX_ENTRIES
+        )
+    return _shared_cache
+
+def semantic_cache_stats() -> Optional[dict]:
+    """
+    Get the statistics of the shared cache
+
+    Returns:
+        Dictionary of statistics, or None if no agent has used the cache yet
+    """
+    return _shared_cache.stats.to_dict() if _shared_cache is not None else None
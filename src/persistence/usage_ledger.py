@@ -0,0 +1,144 @@
+"""
+Usage Ledger for Multi-Skill Super-Agent
+
+This module keeps the append-only ledger of the model calls made on behalf
+of each user. Calls are recorded in memory, so recording costs nothing on
+the request path, and written to the database in batches: every flush
+interval, once enough calls are pending, and on shutdown. Rollups per user,
+agent or day are summed by the database over the ledger.
+"""
+import asyncio
+from datetime import date, datetime
+from typing import List, Optional
+
+from loguru import logger
+
+from ..orchestration.usage import RequestUsage
+
+class UsageLedgerStats:
+    """Counters for the usage ledger"""
+
+    def __init__(self):
+        """Initialize the counters"""
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def to_dict(self):
+        """Convert the counters to a dictionary"""
+        return {
+            'recorded': self.recorded,
+            'flushed': self.flushed,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'dropped': self.dropped
+        }
+
+class UsageLedger:
+    """Buffers model calls per user and appends them to the database in batches"""
+
+    def __init__(self, db_manager, flush_interval: float = 10.0, max_pending: int = 500,
+                 max_buffered: int = 50000):
+        """
+        Initialize the ledger
+
+        Args:
+            db_manager: Database manager the ledger is written to
+            flush_interval: Seconds between periodic flushes
+            max_pending: Pending calls that trigger a flush before the interval is up
+            max_buffered: Most calls kept pending while the database can't be written to
+        """
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered
+        self.stats = UsageLedgerStats()
+        self._pending: List[dict] = []
+        self._flusher = None
+        self._early_flush = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of calls not yet written to the database"""
+        return len(self._pending)
+
+    def record(self, user_id: int, usage: RequestUsage):
+        """
+        Record the model calls of a request
+
+        Args:
+            user_id: Telegram user the request was made by
+            usage: Tally of the request's model calls
+        """
+        now = datetime.utcnow()
+        for call in usage.calls:
+            self._pending.append({'user_id': user_id, 'created_at': now, **call})
+        self.stats.recorded += len(usage.calls)
+        self._ensure_started()
+        if len(self._pending) >= self.max_pending and (self._early_flush is None or self._early_flush.done()):
+            self._early_flush = asyncio.get_running_loop().create_task(self.flush())
+
+    def _ensure_started(self):
+        """Start the periodic flushes on the running event loop"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        """Flush the pending calls every flush interval"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write the pending calls to the database in one batch
+
+        Returns:
+            Number of calls written; calls that failed to be written stay pending, the oldest
+            dropped past max_buffered
+        """
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                await asyncio.to_thread(self.db_manager.add_usage_records, batch)
+            except Exception as e:
+                logger.error(f"Error flushing usage ledger: {str(e)}")
+                self.stats.failed_flushes += 1
+                self._pending[:0] = batch
+                dropped = len(self._pending) - self.max_buffered
+                if dropped > 0:
+                    # The database has been down for long; losing the oldest calls beats running out of memory
+                    del self._pending[:dropped]
+                    self.stats.dropped += dropped
+                    logger.error(f"Dropped the {dropped} oldest calls of the usage ledger past {self.max_buffered} pending")
+                return 0
+            self.stats.flushes += 1
+            self.stats.flushed += len(batch)
+            return len(batch)
+
+    async def rollup(self, group_by: str, user_id: Optional[int] = None, since: Optional[date] = None) -> List[dict]:
+        """
+        Sum the ledger per user, agent or day, including the calls not yet flushed
+
+        Args:
+            group_by: "user", "agent" or "day"
+            user_id: Only sum the calls made for this user
+            since: Only sum the calls made on or after this day
+
+        Returns:
+            List of dictionaries with the group's key, calls, tokens and cost, largest cost first
+        """
+        await self.flush()
+        return await asyncio.to_thread(self.db_manager.get_usage_rollup, group_by, user_id, since)
+
+    async def close(self):
+        """Stop the periodic flushes and write what is pending"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
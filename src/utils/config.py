@@ -10,11 +10,123 @@ load_dotenv()
 
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# Public base URL for webhook mode; long polling is used when this is unset
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+# Global cap on updates handled at once; updates from one chat are always handled in order
+TELEGRAM_MAX_CONCURRENT_UPDATES = int(os.getenv("TELEGRAM_MAX_CONCURRENT_UPDATES", 32))
+# Minimum seconds between two edits of a streamed reply
+TELEGRAM_STREAM_EDIT_INTERVAL = float(os.getenv("TELEGRAM_STREAM_EDIT_INTERVAL", 1.0))
+# Outbound message pacing (Telegram allows about 30 messages/s overall and 1 message/s per chat)
+TELEGRAM_GLOBAL_SEND_RATE = float(os.getenv("TELEGRAM_GLOBAL_SEND_RATE", 30))
+TELEGRAM_CHAT_SEND_RATE = float(os.getenv("TELEGRAM_CHAT_SEND_RATE", 1))
+TELEGRAM_CHAT_SEND_BURST = float(os.getenv("TELEGRAM_CHAT_SEND_BURST", 3))
+# Results longer than this many characters are sent as a file instead of several messages
+TELEGRAM_DOCUMENT_THRESHOLD = int(os.getenv("TELEGRAM_DOCUMENT_THRESHOLD", 12000))
+# Handled updates remembered so redelivered ones replay their replies; persisting survives restarts
+TELEGRAM_DEDUP_MAX_ENTRIES = int(os.getenv("TELEGRAM_DEDUP_MAX_ENTRIES", 10000))
+TELEGRAM_DEDUP_TTL = int(os.getenv("TELEGRAM_DEDUP_TTL", 86400))
+TELEGRAM_DEDUP_PERSIST = os.getenv("TELEGRAM_DEDUP_PERSIST", "false").lower() == "true"
+# Inline queries are answered from a cache of generated answers; misses are generated after the user pauses typing
+INLINE_CACHE_MAX_ENTRIES = int(os.getenv("INLINE_CACHE_MAX_ENTRIES", 1000))
+INLINE_CACHE_MAX_BYTES = int(os.getenv("INLINE_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+INLINE_GENERATION_DELAY = float(os.getenv("INLINE_GENERATION_DELAY", 1.5))
+# Workers per agent ("name=workers" pairs) and the number of calls each agent may queue before rejecting more
+AGENT_POOL_SIZES = os.getenv("AGENT_POOL_SIZES", "code=8,research=4,image=2,task=4,assistant=4")
+AGENT_QUEUE_DEPTH = int(os.getenv("AGENT_QUEUE_DEPTH", 50))
+# Seconds a request may take end to end, and per agent ("name=seconds" pairs); calls still running are cancelled
+TELEGRAM_REQUEST_TIMEOUT = float(os.getenv("TELEGRAM_REQUEST_TIMEOUT", 300))
+AGENT_TIMEOUTS = os.getenv("AGENT_TIMEOUTS", "code=180,research=180,image=120,task=60,assistant=60")
+# "local" runs agents in the bot process; "redis" enqueues them for worker processes started with worker.py
+AGENT_EXECUTION = os.getenv("AGENT_EXECUTION", "local").lower()
+JOB_QUEUE_PREFIX = os.getenv("JOB_QUEUE_PREFIX", "agent_jobs")
+# Seconds a job may go unrenewed before another worker runs it, and runs before it is given up
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", 300))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+# Seconds the bot waits for a job's result
+JOB_RESULT_TIMEOUT = float(os.getenv("JOB_RESULT_TIMEOUT", 900))
+# Cache of LLM responses in memory and in the database; TTLs in seconds per agent name, 0 disables caching
+# for the agent, and requests sampled above LLM_CACHE_MAX_TEMPERATURE are never cached
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "true").lower() == "true"
+LLM_CACHE_MAX_MEMORY_BYTES = int(os.getenv("LLM_CACHE_MAX_MEMORY_BYTES", 16 * 1024 * 1024))
+LLM_CACHE_MAX_DISK_BYTES = int(os.getenv("LLM_CACHE_MAX_DISK_BYTES", 256 * 1024 * 1024))
+LLM_CACHE_TTLS = os.getenv("LLM_CACHE_TTLS", "CodeGeneration=86400,WebResearch=3600,PersonalAssistant=3600")
+LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_DEFAULT_TTL", 3600))
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.5))
+# Answers to queries similar to earlier ones are reused by agents with a threshold (minimum cosine similarity);
+# the embedder is "openai" or the local "hashing" one, and an empty directory keeps the vectors in memory
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "openai").lower()
+SEMANTIC_CACHE_DIMENSIONS = int(os.getenv("SEMANTIC_CACHE_DIMENSIONS", 256))
+SEMANTIC_CACHE_DIR = os.getenv("SEMANTIC_CACHE_DIR", "data/semantic_cache")
+SEMANTIC_CACHE_THRESHOLDS = os.getenv("SEMANTIC_CACHE_THRESHOLDS", "CodeGeneration=0.92,WebResearch=0.9")
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 100000))
+# Concurrent calls allowed per provider model adapt to latency and 429/5xx responses between the min and max;
+# calls wait up to PROVIDER_MAX_WAIT seconds for a slot
+PROVIDER_INITIAL_CONCURRENCY = int(os.getenv("PROVIDER_INITIAL_CONCURRENCY", 8))
+PROVIDER_MIN_CONCURRENCY = int(os.getenv("PROVIDER_MIN_CONCURRENCY", 1))
+PROVIDER_MAX_CONCURRENCY = int(os.getenv("PROVIDER_MAX_CONCURRENCY", 64))
+PROVIDER_LATENCY_TOLERANCE = float(os.getenv("PROVIDER_LATENCY_TOLERANCE", 2.0))
+PROVIDER_MAX_WAIT = float(os.getenv("PROVIDER_MAX_WAIT", 30))
+# A model's circuit opens when this share of its recent calls failed, failing calls fast for the open seconds;
+# meanwhile agents answer from expired cache entries or, with a notice, from answers to looser matches
+PROVIDER_BREAKER_FAILURE_RATE = float(os.getenv("PROVIDER_BREAKER_FAILURE_RATE", 0.5))
+PROVIDER_BREAKER_MIN_CALLS = int(os.getenv("PROVIDER_BREAKER_MIN_CALLS", 10))
+PROVIDER_BREAKER_WINDOW = int(os.getenv("PROVIDER_BREAKER_WINDOW", 20))
+PROVIDER_BREAKER_OPEN_SECONDS = float(os.getenv("PROVIDER_BREAKER_OPEN_SECONDS", 30))
+PROVIDER_DEGRADED_SIMILARITY = float(os.getenv("PROVIDER_DEGRADED_SIMILARITY", 0.75))
+# Agents (by name, comma separated) whose completions are duplicated once slower than the model's p95 latency
+HEDGED_AGENTS = os.getenv("HEDGED_AGENTS", "")
+# Chat models requests are routed to, as provider/model=tier:input_cost:output_cost:context_window with costs in
+# USD per million tokens and tier 3 the most capable; models of providers without an API key are left out
+MODEL_CATALOG = os.getenv(
+    "MODEL_CATALOG",
+    "openai/gpt-4o=3:2.5:10:128000,openai/gpt-4o-mini=2:0.15:0.6:128000,"
+    "anthropic/claude-3-5-sonnet-latest=3:3:15:200000,anthropic/claude-3-5-haiku-latest=2:0.8:4:200000,"
+    "deepseek/deepseek-chat=2:0.27:1.1:64000"
+)
+# Lowest model tier each agent accepts, and the most (USD) one of its requests may cost at catalog prices
+AGENT_MODEL_TIERS = os.getenv("AGENT_MODEL_TIERS", "CodeGeneration=3,WebResearch=2,PersonalAssistant=2")
+AGENT_COST_CEILINGS = os.getenv("AGENT_COST_CEILINGS", "CodeGeneration=0.1,WebResearch=0.02,PersonalAssistant=0.02")
+# Most tokens one prompt of each agent may take; prompts are also kept within the context window of the
+# agent's models less the completion's max_tokens, trimming the least important parts first
+AGENT_PROMPT_BUDGETS = os.getenv("AGENT_PROMPT_BUDGETS", "WebResearch=12000,PersonalAssistant=16000")
+# Models are ranked by recent latency and error rate plus this many seconds per cent of expected cost;
+# this share of requests goes to another eligible model so its latency stays known
+MODEL_COST_WEIGHT = float(os.getenv("MODEL_COST_WEIGHT", 1.0))
+MODEL_EXPLORE_RATE = float(os.getenv("MODEL_EXPLORE_RATE", 0.05))
+# Connection pool each provider API is called through, shared by all agents: connections open at once, idle
+# keep-alive connections and the seconds they are kept, seconds to connect and to wait for a response.
+# MODEL_HTTP2 multiplexes requests over one connection and needs the h2 package
+MODEL_HTTP_MAX_CONNECTIONS = int(os.getenv("MODEL_HTTP_MAX_CONNECTIONS", 100))
+MODEL_HTTP_MAX_KEEPALIVE = int(os.getenv("MODEL_HTTP_MAX_KEEPALIVE", 20))
+MODEL_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("MODEL_HTTP_KEEPALIVE_EXPIRY", 30))
+MODEL_HTTP_CONNECT_TIMEOUT = float(os.getenv("MODEL_HTTP_CONNECT_TIMEOUT", 5))
+MODEL_HTTP_READ_TIMEOUT = float(os.getenv("MODEL_HTTP_READ_TIMEOUT", 120))
+MODEL_HTTP2 = os.getenv("MODEL_HTTP2", "false").lower() == "true"
+# Per-user limits: requests per minute (with a burst) and model tokens per hour (with a burst); 0 disables a limit.
+# The model calls of every request are kept in the usage ledger, written to the database in batches
+USER_REQUESTS_PER_MINUTE = float(os.getenv("USER_REQUESTS_PER_MINUTE", 20))
+USER_REQUEST_BURST = float(os.getenv("USER_REQUEST_BURST", 5))
+USER_TOKENS_PER_HOUR = float(os.getenv("USER_TOKENS_PER_HOUR", 200000))
+USER_TOKEN_BURST = float(os.getenv("USER_TOKEN_BURST", 50000))
+USAGE_LEDGER_FLUSH_INTERVAL = float(os.getenv("USAGE_LEDGER_FLUSH_INTERVAL", 10))
+# Seconds in-flight requests may take to finish on shutdown before they are saved and resumed after restart
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 25))
+# Offline batches: queries processed at once in live mode, and seconds between checks of a provider batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", 30))
 
 # AI Model API Keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Override for OpenAI-compatible endpoints, e.g. local stub servers used by the benchmarks
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
+CLAUDE_BASE_URL = os.getenv("CLAUDE_BASE_URL", "https://api.anthropic.com")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 
 # GitHub Configuration
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
@@ -80,6 +192,10 @@ def validate_config():
         logger.error("Please set these variables in your .env file")
         return False
     
+    if TELEGRAM_WEBHOOK_URL and not TELEGRAM_WEBHOOK_SECRET:
+        logger.error("TELEGRAM_WEBHOOK_SECRET must be set when TELEGRAM_WEBHOOK_URL is configured")
+        return False
+    
     return True
 
 # Get Render owner ID
@@ -0,0 +1,159 @@
+"""
+Intent classification for Multi-Skill Super-Agent
+
+This module builds intent classifiers from declarative keyword/pattern
+tables. Each table is compiled into a single regular expression alternation
+with shared keyword prefixes factored out, so a message is scanned once
+regardless of how many keywords there are. Every match adds the weight of
+its rule to that rule's intent; the highest score wins and ties go to the
+intent declared first.
+
+Each domain keeps its own table because the same word means different things
+in different places: "search" is a research request to the bot but a file
+search to the personal assistant.
+"""
+import re
+from typing import Dict, Iterable, List, Optional
+
+class IntentRule:
+    """A keyword/pattern rule contributing to one intent"""
+
+    __slots__ = ("intent", "keywords", "patterns", "weight")
+
+    def __init__(self, intent: str, keywords: Iterable[str] = (), patterns: Iterable[str] = (),
+                 weight: float = 1.0):
+        """
+        Initialize the rule
+
+        Args:
+            intent: The intent the rule votes for
+            keywords: Substrings matched case-insensitively, so "program"
+                also matches "programming"
+            patterns: Regular expressions matched against the lowercased text
+            weight: Score added to the intent for every match
+        """
+        self.intent = intent
+        self.keywords = tuple(keyword.lower() for keyword in keywords)
+        self.patterns = tuple(patterns)
+        self.weight = weight
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    Build a regular expression alternation with common prefixes factored out
+
+    The regex engine then decides on the first character which branch can
+    match, instead of trying every keyword at every position.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        alternation = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # A keyword ends here and longer keywords continue; prefer the longer match
+            return f"(?:{alternation})?" if len(branches) == 1 else alternation + "?"
+        return alternation
+
+    return build(trie)
+
+class IntentClassifier:
+    """Single-pass intent classifier compiled from a table of rules"""
+
+    def __init__(self, rules: List[IntentRule]):
+        """
+        Compile the rules into one alternation
+
+        Args:
+            rules: The rules, in tie-breaking priority order
+        """
+        self.intents = []
+        self._keyword_votes = {}
+        self._pattern_votes = {}
+        alternatives = []
+
+        for rule in rules:
+            if rule.intent not in self.intents:
+                self.intents.append(rule.intent)
+            for keyword in rule.keywords:
+                self._keyword_votes.setdefault(keyword, []).append((rule.intent, rule.weight))
+            for pattern in rule.patterns:
+                group = f"p{len(self._pattern_votes)}"
+                alternatives.append(f"(?P<{group}>{pattern})")
+                self._pattern_votes[group] = (rule.intent, rule.weight)
+
+        if self._keyword_votes:
+            alternatives.insert(0, _trie_pattern(self._keyword_votes))
+        self._priority = {intent: index for index, intent in enumerate(self.intents)}
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """
+        Score every intent that matches the text
+
+        Args:
+            text: The message text
+
+        Returns:
+            Dictionary of intent to score, only containing matched intents
+        """
+        scores = {}
+        if self._pattern is None:
+            return scores
+        if self._pattern_votes:
+            votes = [
+                (self._pattern_votes[match.lastgroup],) if match.lastgroup is not None
+                else self._keyword_votes[match.group()]
+                for match in self._pattern.finditer(text.lower())
+            ]
+        else:
+            # Without capturing groups findall returns the matched keywords directly
+            votes = [self._keyword_votes[keyword] for keyword in self._pattern.findall(text.lower())]
+        for match_votes in votes:
+            for intent, weight in match_votes:
+                scores[intent] = scores.get(intent, 0.0) + weight
+        return scores
+
+    def classify(self, text: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Classify a message
+
+        Args:
+            text: The message text
+            default: Intent returned when nothing matches
+
+        Returns:
+            The highest scoring intent, ties broken by declaration order
+        """
+        scores = self.scores(text)
+        if not scores:
+            return default
+        return max(scores, key=lambda intent: (scores[intent], -self._priority[intent]))
+
+# Intents of free-text messages sent to the Telegram bot
+BOT_INTENTS = IntentClassifier([
+    IntentRule("code", keywords=("code", "program", "script")),
+    IntentRule("image", keywords=("image", "picture", "draw")),
+    IntentRule("research", keywords=("research", "find", "search")),
+])
+
+# Request types handled by the personal assistant agent
+ASSISTANT_INTENTS = IntentClassifier([
+    IntentRule("calendar", keywords=("calendar", "schedule", "appointment")),
+    IntentRule("email", keywords=("email", "draft", "write")),
+    IntentRule("file", keywords=("file", "search", "find")),
+    IntentRule("summary", keywords=("summarize", "summary")),
+])
+
+# Actions handled by the task automation agent
+TASK_INTENTS = IntentClassifier([
+    IntentRule("schedule", keywords=("schedule", "remind")),
+    IntentRule("list", keywords=("list", "show")),
+    IntentRule("cancel", keywords=("cancel", "delete")),
+])
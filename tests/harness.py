@@ -0,0 +1,27 @@
+"""
+Helpers for running the test modules as scripts
+
+The tests are plain functions that assert, so pytest can collect them. Run
+as a script, each module's run_tests calls them through run_test, which
+records a failure and moves on to the next test instead of stopping.
+"""
+import asyncio
+
+from loguru import logger
+
+async def run_test(test) -> bool:
+    """
+    Run a test in a worker thread, since tests start event loops of their own
+
+    Args:
+        test: The test function
+
+    Returns:
+        Whether the test passed
+    """
+    try:
+        await asyncio.to_thread(test)
+    except Exception:
+        logger.exception(f"{test.__name__} failed")
+        return False
+    return True
@@ -6,20 +6,28 @@ This script tests the functionality of the multi-skill agent system.
 import asyncio
 import sys
 import os
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
 from loguru import logger
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from src.agents.chunks import Artifact, Progress, TextDelta
 from src.agents.code_agent import CodeGenerationAgent
 from src.agents.image_agent import ImageGenerationAgent
 from src.agents.research_agent import WebResearchAgent
 from src.agents.task_agent import TaskAutomationAgent
 from src.agents.assistant_agent import PersonalAssistantAgent
+from src.agents.model_router import ModelOption, ModelRouter
+from src.agents.providers import ChatProvider
+from src.orchestration.job_queue import JobQueueClient, JobWorker
 from src.orchestration.router import AgentRouter
 from src.utils.github_integration import GitHubIntegration
 from src.utils.render_deployment import RenderDeployment
 from src.utils.config import validate_config
+from tests.harness import run_test
 
 async def test_code_agent():
     """Test the Code Generation Agent"""
@@ -130,6 +138,96 @@ async def test_render_deployment():
         logger.error(f"Render Deployment Error: {str(e)}")
         return {"error": str(e)}
 
+def test_agent_streaming():
+    """Test that agents stream typed chunks, process() collects them and job queue workers forward the text"""
+    logger.info("Testing streaming agent API...")
+    import fakeredis
+    
+    class FakeProvider(ChatProvider):
+        name = "fake"
+        
+        def __init__(self):
+            self.failing = False
+        
+        async def complete(self, model, messages, temperature=1.0, max_tokens=1000, timeout=None):
+            return "whole answer"
+        
+        async def stream(self, model, messages, temperature=1.0, max_tokens=1000, timeout=None):
+            if self.failing:
+                raise ValueError("upstream broke")
+            for word in ("Short", " summary", "."):
+                await asyncio.sleep(0.01)
+                yield word
+    
+    class FakeImages:
+        async def generate(self, **params):
+            return SimpleNamespace(data=[SimpleNamespace(url="https://example.com/cat.png", revised_prompt="A cat")])
+    
+    provider = FakeProvider()
+    
+    def research_agent():
+        with patch("src.agents.research_agent.get_semantic_cache", return_value=None):
+            agent = WebResearchAgent()
+        agent.model_router = ModelRouter({"fake": provider}, [ModelOption("fake", "model", 3, 0, 0)])
+        agent.response_cache = None
+        return agent
+    
+    class FakeRegistry:
+        names = ["research"]
+        
+        def get(self, name):
+            return research_agent()
+    
+    async def scenario():
+        # Research streams its progress, then the summary as it is generated; process() returns the text
+        agent = research_agent()
+        query = f"solar power {uuid.uuid4().hex}"
+        chunks = [chunk async for chunk in agent.process_stream(query)]
+        assert chunks == [Progress("Searching the web"), Progress("Reading 3 sources"),
+                          TextDelta("Short"), TextDelta(" summary"), TextDelta(".")]
+        assert await agent.process(query) == "Short summary."
+        
+        # Hedged agents get their completion in one piece, as hedging races whole completions
+        agent.hedge = True
+        assert [chunk.text async for chunk in agent.process_stream(query)][2:] == ["whole answer"]
+        agent.hedge = False
+        
+        # Failures raise from the stream and become the agent's error response in process()
+        provider.failing = True
+        try:
+            [chunk async for chunk in agent.process_stream(query)]
+            raise AssertionError("failing stream finished")
+        except ValueError:
+            pass
+        assert await agent.process(query) == "Error performing research: upstream broke"
+        provider.failing = False
+        
+        # Images arrive as artifacts whose text is their URL
+        image_agent = ImageGenerationAgent(client=SimpleNamespace(images=FakeImages()))
+        assert [chunk async for chunk in image_agent.process_stream("a cat")] == [
+            Progress("Generating image"), Artifact("https://example.com/cat.png", "image", "A cat")
+        ]
+        assert await image_agent.process("a cat") == "https://example.com/cat.png"
+        
+        # Text streamed by a worker reaches the caller in batches ahead of the result
+        server = fakeredis.FakeServer()
+        client = JobQueueClient(fakeredis.FakeAsyncRedis(server=server, decode_responses=True), client_id="bot")
+        worker = JobWorker(fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+                           registry=FakeRegistry(), delta_interval=0.015)
+        running = asyncio.create_task(worker.run())
+        deltas = []
+        result = await asyncio.wait_for(client.call("research", query, deltas.append), timeout=5)
+        assert result == "Short summary." and "".join(deltas) == result
+        assert 1 <= worker.stats.deltas_sent < len(deltas) + 1 and len(deltas) > 1
+        assert await asyncio.wait_for(client.call("research", query), timeout=5) == result
+        worker.stop()
+        await running
+        await client.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Streaming agent API tests completed successfully")
+
 async def run_tests():
     """Run all tests"""
     logger.info("Starting tests for Multi-Skill Super-Agent...")
@@ -151,6 +249,7 @@ async def run_tests():
     test_results["research_agent"] = await test_research_agent()
     test_results["task_agent"] = await test_task_agent()
     test_results["assistant_agent"] = await test_assistant_agent()
+    test_results["agent_streaming"] = "Passed" if await run_test(test_agent_streaming) else "Failed"
     
     # Test router
     test_results["agent_router"] = await test_agent_router()
@@ -0,0 +1,94 @@
+"""
+Test script for inline answers
+
+This script tests the index of generated answers and the inline query
+handler that answers from it.
+"""
+import asyncio
+import sys
+import os
+from loguru import logger
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.interface.inline import InlineAnswers
+from src.orchestration.answer_index import AnswerIndex
+from tests.harness import run_test
+
+def test_inline_answers():
+    """Test inline queries are served from the answer index and misses are generated once typing pauses"""
+    logger.info("Testing inline answers...")
+    
+    class FakeRouter:
+        def __init__(self):
+            self.queries = []
+        
+        async def route_to_code_agent(self, query, on_delta=None, priority=None):
+            self.queries.append(query)
+            return f"# code for {query}"
+        
+        async def route_to_research_agent(self, query, on_delta=None, priority=None):
+            self.queries.append(query)
+            return f"Summary of {query}"
+    
+    class FakeInlineQuery:
+        def __init__(self, query):
+            self.query = query
+            self.from_user = type("FakeUser", (), {"id": 42})()
+            self.answers = []
+        
+        async def answer(self, results, cache_time=300, button=None):
+            self.answers.append((results, cache_time, button))
+    
+    async def ask(inline, text):
+        inline_query = FakeInlineQuery(text)
+        await inline.handle(type("FakeUpdate", (), {"inline_query": inline_query})(), None)
+        return inline_query.answers[0]
+    
+    async def scenario():
+        router = FakeRouter()
+        inline = InlineAnswers(router, AnswerIndex(max_entries=10), generation_delay=0.05)
+        inline.remember("research", "Quantum computing breakthroughs", "Qubits got better")
+        
+        # Answered by prefix and by words, without calling an agent
+        prefix = await ask(inline, "quantum comp")
+        words = await ask(inline, "breakthroughs quantum")
+        
+        # Typing a new query only generates the last version of it
+        await ask(inline, "python script to rename fi")
+        miss = await ask(inline, "python script to rename files")
+        await asyncio.sleep(0.2)
+        hit = await ask(inline, "python script to rename files")
+        return router, inline, prefix, words, miss, hit
+    
+    router, inline, prefix, words, miss, hit = asyncio.run(scenario())
+    assert [result.title for result in prefix[0]] == ["Research: Quantum computing breakthroughs"]
+    assert len(words[0]) == 1
+    assert miss[0] == [] and miss[1] == 0 and miss[2] is not None
+    assert router.queries == ["python script to rename files"]
+    assert hit[0][0].input_message_content.message_text == "# code for python script to rename files"
+    assert hit[1] == 300 and hit[2] is None
+    assert inline.stats.debounced == 1 and inline.index.stats.hits == 3
+    
+    logger.info("Inline answer tests completed successfully")
+
+async def run_tests():
+    """Run all inline answer tests"""
+    logger.info("Starting tests for inline answers...")
+    
+    # Create test results directory
+    os.makedirs("tests/results", exist_ok=True)
+    
+    # Run tests
+    inline_test_result = await run_test(test_inline_answers)
+    
+    # Save test results
+    with open("tests/results/answer_index_test_results.txt", "w") as f:
+        f.write("# Inline Answers Test Results\n\n")
+        f.write(f"Inline Answers Test: {'Passed' if inline_test_result else 'Failed'}\n\n")
+    
+    logger.info("Inline Answers tests completed. Results saved to tests/results/answer_index_test_results.txt")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,191 @@
+"""
+Test script for agent batches
+
+This script tests offline batches of agent queries, run live or through
+the provider's batch endpoint.
+"""
+import asyncio
+import sys
+import os
+import uuid
+from unittest.mock import AsyncMock, patch
+from loguru import logger
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents import clients
+from src.agents.batch import BatchFailed
+from src.agents.code_agent import CodeGenerationAgent
+from src.agents.model_router import ModelOption, ModelRouter
+from src.agents.providers import ChatProvider, OpenAIChatProvider
+from src.persistence.database import DatabaseManager
+from benchmarks.stub_openai_server import StubServer, StubSettings, create_stub_app
+from tests.harness import run_test
+
+def test_batch_processing():
+    """Test offline batches in live and provider mode, resumed from their progress in task history"""
+    logger.info("Testing batch processing...")
+    
+    def code_agent(client):
+        with patch("src.agents.code_agent.get_semantic_cache", return_value=None):
+            agent = CodeGenerationAgent()
+        agent.model_router = ModelRouter({"openai": OpenAIChatProvider(client)},
+                                         [ModelOption("openai", "stub-model", 3, 0, 0)])
+        agent.response_cache = None
+        return agent
+    
+    async def scenario():
+        app = create_stub_app(StubSettings(first_token_delay=0.02, token_delay=0, tokens=3, batch_delay=0.1))
+        db_manager = DatabaseManager()
+        queries = [f"function {index} {uuid.uuid4().hex}" for index in range(20)]
+        async with StubServer(app, 8935) as stub:
+            client = clients.create_openai_client("stub", stub.base_url)
+            agent = code_agent(client)
+            
+            # Live mode processes queries a bounded number at a time and records each in task history
+            run = agent.process_batch(queries, concurrency=4, db_manager=db_manager)
+            results = await run.collect()
+            assert [result.index for result in results] == list(range(20))
+            assert all(result.ok and result.result == "token0\ntoken1 token2 " for result in results)
+            assert run.stats.succeeded == 20 and run.stats.items_per_second > 0
+            assert len(db_manager.get_child_tasks(run.batch_id, 'success')) == 20
+            assert db_manager.get_task_record(run.batch_id)['status'] == 'success'
+            
+            # An interrupted batch resumes with the queries that had not finished
+            run = agent.process_batch(queries, concurrency=1, db_manager=db_manager)
+            results = aiter(run)
+            for _ in range(5):
+                await anext(results)
+            await results.aclose()
+            assert db_manager.get_task_record(run.batch_id)['status'] == 'running'
+            resumed = agent.process_batch(queries, concurrency=4, batch_id=run.batch_id, db_manager=db_manager)
+            results = await resumed.collect()
+            assert [result.index for result in results] == list(range(5, 20))
+            assert resumed.stats.resumed == 5 and resumed.stats.succeeded == 15
+            assert len(db_manager.get_child_tasks(run.batch_id, 'success')) == 20
+            
+            # Provider mode submits the requests as a JSONL file and reads the results once the batch completed
+            requests = app.state.requests
+            run = agent.process_batch(queries, mode="provider", db_manager=db_manager, poll_interval=0.02)
+            results = await run.collect()
+            assert len(results) == 20 and all(result.result == "token0\ntoken1 token2 " for result in results)
+            assert app.state.requests == requests and len(app.state.batches) == 1
+            assert run.stats.mode == "provider" and run.stats.succeeded == 20
+            assert 'provider_batch' not in db_manager.get_task_record(run.batch_id)['context']
+            
+            # Failed requests of a provider batch are failed results, and rerunning the batch retries only them
+            app.state.settings.error_rate = 1.0
+            run = agent.process_batch(queries[:3], mode="provider", db_manager=db_manager, poll_interval=0.02)
+            results = await run.collect()
+            assert [result.error for result in results] == ["Injected error"] * 3 and run.stats.failed == 3
+            app.state.settings.error_rate = 0.0
+            rerun = agent.process_batch(queries[:3], mode="provider", batch_id=run.batch_id, db_manager=db_manager,
+                                        poll_interval=0.02)
+            assert all(result.ok for result in await rerun.collect()) and rerun.stats.resumed == 0
+            assert len(db_manager.get_child_tasks(run.batch_id)) == 6
+            
+            # A provider batch that did not complete fails the run, leaving its queries to be submitted again
+            provider = agent.model_router.providers["openai"]
+            with patch.object(provider, "get_batch", AsyncMock(return_value={'id': "batch_x", 'status': "expired"})):
+                run = agent.process_batch(queries[:2], mode="provider", db_manager=db_manager, poll_interval=0.02)
+                try:
+                    await run.collect()
+                    raise AssertionError("expired batch succeeded")
+                except BatchFailed:
+                    pass
+            assert db_manager.get_task_record(run.batch_id)['status'] == 'error'
+            
+            # Batches don't show up in the recent history of users
+            assert all(task['parent_id'] is None for task in db_manager.get_recent_tasks(50))
+            await client.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Batch processing tests completed successfully")
+
+def test_batch_errors_recorded():
+    """Test that a batch ending with any error, or cancelled, is recorded as failed in task history"""
+    logger.info("Testing batch error records...")
+    
+    class FakeProvider(ChatProvider):
+        name = "fake"
+        
+        def __init__(self, supports_batch):
+            self.supports_batch = supports_batch
+        
+        async def stream(self, model, messages, temperature=1.0, max_tokens=1000, timeout=None):
+            await asyncio.sleep(10)
+            yield "never"
+        
+        def batch_request(self, custom_id, model, messages, temperature=1.0, max_tokens=1000):
+            return {'custom_id': custom_id}
+        
+        async def submit_batch(self, requests_path):
+            raise RuntimeError("upload failed")
+    
+    def code_agent(supports_batch):
+        with patch("src.agents.code_agent.get_semantic_cache", return_value=None):
+            agent = CodeGenerationAgent()
+        agent.model_router = ModelRouter({"fake": FakeProvider(supports_batch)},
+                                         [ModelOption("fake", "model", 3, 0, 0)])
+        agent.response_cache = None
+        return agent
+    
+    async def failed_status(run):
+        try:
+            await run.collect()
+            raise AssertionError("failing batch finished")
+        except (ValueError, RuntimeError):
+            pass
+        return db_manager.get_task_record(run.batch_id)
+    
+    async def scenario():
+        queries = [f"function {uuid.uuid4().hex}"]
+        
+        # Building the requests fails when no model has a batch endpoint
+        record = await failed_status(code_agent(False).process_batch(queries, mode="provider", db_manager=db_manager))
+        assert record['status'] == 'error' and "batch endpoint" in record['result']
+        
+        # Submitting the batch fails
+        record = await failed_status(code_agent(True).process_batch(queries, mode="provider", db_manager=db_manager))
+        assert record['status'] == 'error' and record['result'] == "upload failed"
+        
+        # The run is cancelled while queries are in flight
+        run = code_agent(False).process_batch(queries, db_manager=db_manager)
+        running = asyncio.create_task(run.collect())
+        await asyncio.sleep(0.1)
+        running.cancel()
+        try:
+            await running
+            raise AssertionError("cancelled batch finished")
+        except asyncio.CancelledError:
+            pass
+        assert db_manager.get_task_record(run.batch_id)['status'] == 'error'
+    
+    db_manager = DatabaseManager()
+    asyncio.run(scenario())
+    
+    logger.info("Batch error record tests completed successfully")
+
+async def run_tests():
+    """Run all batch processing tests"""
+    logger.info("Starting tests for batch processing...")
+    
+    # Create test results directory
+    os.makedirs("tests/results", exist_ok=True)
+    
+    # Run tests
+    batch_test_result = await run_test(test_batch_processing)
+    batch_errors_test_result = await run_test(test_batch_errors_recorded)
+    
+    # Save test results
+    with open("tests/results/batch_test_results.txt", "w") as f:
+        f.write("# Batch Processing Test Results\n\n")
+        f.write(f"Batch Processing Test: {'Passed' if batch_test_result else 'Failed'}\n\n")
+        f.write(f"Batch Error Records Test: {'Passed' if batch_errors_test_result else 'Failed'}\n\n")
+    
+    logger.info("Batch Processing tests completed. Results saved to tests/results/batch_test_results.txt")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
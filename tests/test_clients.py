@@ -0,0 +1,86 @@
+"""
+Test script for the shared model clients
+
+This script tests that agents share one pooled async client per provider.
+"""
+import asyncio
+import sys
+import os
+from unittest.mock import patch
+import openai
+from loguru import logger
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents import clients
+from src.agents.image_agent import ImageGenerationAgent
+from src.agents.providers import AnthropicChatProvider
+from benchmarks.stub_openai_server import StubServer, StubSettings, create_stub_app
+from tests.harness import run_test
+
+def test_shared_client():
+    """Test that agents share one pooled async client and that pooled clients reuse their connections"""
+    logger.info("Testing shared pooled model client...")
+    
+    messages = [{"role": "user", "content": "hello"}]
+    
+    # Agents get the shared client unless one is injected
+    with patch.dict(clients._shared_clients, clear=True), patch("src.agents.clients.OPENAI_API_KEY", "stub"):
+        first, second = ImageGenerationAgent(), ImageGenerationAgent()
+        assert isinstance(first.client, openai.AsyncOpenAI) and first.client is second.client
+        injected = openai.AsyncOpenAI(api_key="stub")
+        assert ImageGenerationAgent(client=injected).client is injected
+    
+    # HTTP/2 is only negotiated when the h2 package is installed; without it the client falls back to HTTP/1.1
+    assert clients.create_http_client(http2=True).timeout.connect == clients.MODEL_HTTP_CONNECT_TIMEOUT
+    
+    async def scenario():
+        app = create_stub_app(StubSettings(first_token_delay=0.05, token_delay=0, tokens=3))
+        async with StubServer(app, 8934) as stub:
+            # Concurrent calls share the pool's connections and later calls reuse them
+            client = clients.create_openai_client(
+                "stub", stub.base_url, clients.create_http_client(max_connections=4, max_keepalive=4)
+            )
+            await asyncio.gather(*(
+                client.chat.completions.create(model="stub", messages=messages) for _ in range(20)
+            ))
+            assert app.state.requests == 20 and 1 <= len(app.state.connections) <= 4
+            connections = set(app.state.connections)
+            for _ in range(5):
+                await client.chat.completions.create(model="stub", messages=messages)
+            assert app.state.connections == connections
+            
+            # The Anthropic provider can share a pooled HTTP client too
+            http_client = clients.create_http_client()
+            anthropic = AnthropicChatProvider("stub", stub.root_url, http_client=http_client)
+            for _ in range(3):
+                assert await anthropic.complete("claude", messages) == "token0\ntoken1 token2 "
+            assert len(app.state.connections) == len(connections) + 1
+            
+            await client.close()
+            await http_client.aclose()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Shared pooled model client tests completed successfully")
+
+async def run_tests():
+    """Run all shared model client tests"""
+    logger.info("Starting tests for shared model client...")
+    
+    # Create test results directory
+    os.makedirs("tests/results", exist_ok=True)
+    
+    # Run tests
+    shared_client_test_result = await run_test(test_shared_client)
+    
+    # Save test results
+    with open("tests/results/clients_test_results.txt", "w") as f:
+        f.write("# Shared Model Client Test Results\n\n")
+        f.write(f"Shared Model Client Test: {'Passed' if shared_client_test_result else 'Failed'}\n\n")
+    
+    logger.info("Shared Model Client tests completed. Results saved to tests/results/clients_test_results.txt")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,182 @@
+"""
+Test script for prompt context budgets
+
+This script tests fitting agent prompts to the context window of their
+models.
+"""
+import asyncio
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+from loguru import logger
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents import context_budget
+from src.agents.assistant_agent import PersonalAssistantAgent
+from src.agents.context_budget import (
+    MIN_LAST_MESSAGE_TOKENS, TRUNCATION_MARKER, ContextBudget, ContextBudgetStats, PromptTooLarge, TokenCounter,
+    context_budget_stats, get_token_counter
+)
+from src.agents.research_agent import WebResearchAgent
+from src.agents.model_router import DEFAULT_CONTEXT_WINDOW, ModelOption, ModelRouter, estimate_tokens, parse_catalog
+from src.agents.providers import ChatProvider, OpenAIChatProvider
+from tests.harness import run_test
+
+def test_context_budget():
+    """Test that prompts are fitted to the context window of the agent's models, lowest priority parts first"""
+    logger.info("Testing prompt context budgeting...")
+    
+    # Counts are cached by text, and truncated text fits the tokens it was cut to, marker included
+    counter = TokenCounter(max_entries=2)
+    page = "word " * 400
+    assert counter.count(page) == counter.count(page) and counter.hits == 1 and counter.misses == 1
+    truncated = counter.truncate(page, 50)
+    assert truncated.endswith(TRUNCATION_MARKER) and counter.count(truncated) <= 50
+    assert counter.truncate(page, 1) == "" and counter.truncate("short", 50) == "short"
+    
+    # Parts are kept in priority order: the first that doesn't fit is truncated and the rest dropped
+    stats = ContextBudgetStats()
+    budget = ContextBudget("WebResearch", 150, counter=counter, stats=stats)
+    kept = budget.fit_all(["a" * 400, "b" * 400, "c" * 400])
+    assert len(kept) == 2 and kept[0] == "a" * 400 and kept[1].startswith("b") and kept[1].endswith(TRUNCATION_MARKER)
+    assert budget.remaining >= 0 and stats.truncated == 2 and stats.tokens_trimmed == budget.trimmed > 100
+    
+    # The budget is the smallest context window of the agent's tier less max_tokens, or the agent's own ceiling
+    catalog = parse_catalog("openai/big=3:1:1:128000,openai/small=2:1:1:4000,deepseek/chat=3:1:1")
+    assert [option.context_window for option in catalog] == [128000, 4000, DEFAULT_CONTEXT_WINDOW]
+    router = ModelRouter({"openai": OpenAIChatProvider(None)}, catalog,
+                         tiers={"CodeGeneration": 3, "WebResearch": 2}, prompt_budgets={"CodeGeneration": 2000})
+    assert router.prompt_budget("WebResearch", 1000) == 3000
+    assert router.prompt_budget("CodeGeneration", 1000) == 2000
+    
+    class CapturingProvider(ChatProvider):
+        name = "fake"
+        
+        def __init__(self):
+            self.prompts = []
+        
+        async def stream(self, model, messages, temperature=1.0, max_tokens=1000, timeout=None):
+            self.prompts.append(messages)
+            yield "summary"
+    
+    provider = CapturingProvider()
+    
+    async def scenario():
+        # Research keeps the top-ranked sources whole and trims the lower-ranked ones to fit
+        with patch("src.agents.research_agent.get_semantic_cache", return_value=None):
+            agent = WebResearchAgent()
+        agent.model_router = ModelRouter({"fake": provider}, [ModelOption("fake", "model", 3, 0, 0, 3000)])
+        agent.response_cache = None
+        sources = [f"source {index} " + "fact " * 1000 for index in range(3)]
+        with patch.object(agent, "_scrape_content", AsyncMock(return_value=sources)):
+            assert await agent.process("solar power") == "summary"
+        user = provider.prompts[-1][1]['content']
+        assert sources[0] in user and "source 1" in user and "source 2" not in user and user.endswith(TRUNCATION_MARKER)
+        assert estimate_tokens(provider.prompts[-1]) <= 3000 - agent.max_tokens
+        assert context_budget_stats()['agents']['WebResearch']['tokens_trimmed'] > 0
+        
+        # Text to summarize is truncated past the budget, keeping the system message whole
+        assistant = PersonalAssistantAgent()
+        assistant.model_router = agent.model_router
+        assistant.response_cache = None
+        await assistant.process("summarize this: " + "long text " * 5000)
+        system, user = provider.prompts[-1]
+        assert "summarization assistant" in system['content'] and user['content'].endswith(TRUNCATION_MARKER)
+        assert estimate_tokens(provider.prompts[-1]) <= 3000 - 800
+    
+    asyncio.run(scenario())
+    
+    logger.info("Prompt context budgeting tests completed successfully")
+
+def test_fit_messages_keeps_query():
+    """Test that fitting a prompt never empties its last message, and refuses a prompt that can't fit at all"""
+    logger.info("Testing fitting prompts with their query...")
+    
+    system = {'role': "system", 'content': "a" * 800}
+    
+    # A long system message is truncated to leave the short query whole
+    fitted = ContextBudget("WebResearch", 120).fit_messages([system, {'role': "user", 'content': "b" * 40}])
+    assert fitted[0]['content'].endswith(TRUNCATION_MARKER) and fitted[1]['content'] == "b" * 40
+    
+    # A long query keeps its reserved share, truncated
+    fitted = ContextBudget("WebResearch", 300).fit_messages([system, {'role': "user", 'content': "b" * 4000}])
+    user = fitted[1]['content']
+    assert user.startswith("b") and user.endswith(TRUNCATION_MARKER)
+    assert TokenCounter().count(user) >= MIN_LAST_MESSAGE_TOKENS - 10
+    
+    # A budget too small for part of every message is refused instead of sending an empty message
+    try:
+        ContextBudget("WebResearch", 5).fit_messages([system, {'role': "user", 'content': "hi"}])
+        raise AssertionError("prompt over budget was fitted")
+    except PromptTooLarge as e:
+        assert "WebResearch" in str(e)
+    
+    class CountingProvider(ChatProvider):
+        name = "fake"
+        
+        def __init__(self):
+            self.calls = 0
+        
+        async def stream(self, model, messages, temperature=1.0, max_tokens=1000, timeout=None):
+            self.calls += 1
+            yield "summary"
+    
+    async def scenario():
+        # An agent whose models leave almost no room for the prompt answers with an error without calling them
+        provider = CountingProvider()
+        assistant = PersonalAssistantAgent()
+        assistant.model_router = ModelRouter({"fake": provider}, [ModelOption("fake", "model", 3, 0, 0, 810)])
+        assistant.response_cache = None
+        response = await assistant.process("summarize this: " + "long text " * 50)
+        assert "doesn't fit" in response and provider.calls == 0
+    
+    asyncio.run(scenario())
+    
+    logger.info("Prompt query fitting tests completed successfully")
+
+def test_tokenizer_load_failure():
+    """Test that counts are estimated when the tokenizer's encoding fails to load, without retrying the load"""
+    logger.info("Testing tokenizer load failures...")
+    
+    class OfflineTiktoken:
+        loads = 0
+        
+        @classmethod
+        def get_encoding(cls, name):
+            cls.loads += 1
+            raise ConnectionError("no route to host")
+    
+    with patch.dict(sys.modules, {"tiktoken": OfflineTiktoken}), patch.object(context_budget, "_counter", None):
+        counter = get_token_counter()
+        assert counter.encoding is None and counter.count("a" * 400) == 100
+        assert get_token_counter() is counter and OfflineTiktoken.loads == 1
+        fitted = ContextBudget("WebResearch", 120).fit_messages([{'role': "user", 'content': "b" * 40}])
+        assert fitted[0]['content'] == "b" * 40
+    
+    logger.info("Tokenizer load failure tests completed successfully")
+
+async def run_tests():
+    """Run all context budget tests"""
+    logger.info("Starting tests for context budget...")
+    
+    # Create test results directory
+    os.makedirs("tests/results", exist_ok=True)
+    
+    # Run tests
+    context_budget_test_result = await run_test(test_context_budget)
+    keeps_query_test_result = await run_test(test_fit_messages_keeps_query)
+    tokenizer_test_result = await run_test(test_tokenizer_load_failure)
+    
+    # Save test results
+    with open("tests/results/context_budget_test_results.txt", "w") as f:
+        f.write("# Context Budget Test Results\n\n")
+        f.write(f"Context Budget Test: {'Passed' if context_budget_test_result else 'Failed'}\n\n")
+        f.write(f"Fit Messages Keeps Query Test: {'Passed' if keeps_query_test_result else 'Failed'}\n\n")
+        f.write(f"Tokenizer Load Failure Test: {'Passed' if tokenizer_test_result else 'Failed'}\n\n")
+    
+    logger.info("Context Budget tests completed. Results saved to tests/results/context_budget_test_results.txt")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
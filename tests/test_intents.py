@@ -0,0 +1,66 @@
+"""
+Test script for intent classification
+
+This script tests the keyword classifiers shared by the Telegram bot and
+the agents.
+"""
+import asyncio
+import os
+import sys
+from loguru import logger
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.intents import ASSISTANT_INTENTS, BOT_INTENTS, TASK_INTENTS, IntentClassifier, IntentRule
+from tests.harness import run_test
+
+def test_intent_classifier():
+    """Test that intents are scored by keyword and pattern matches, ties going to the intent declared first"""
+    logger.info("Testing intent classification...")
+    
+    # Keywords match as case-insensitive substrings, and the longest keyword at a position wins
+    classifier = IntentClassifier([
+        IntentRule("short", keywords=("sum",)),
+        IntentRule("long", keywords=("Summary",)),
+        IntentRule("time", patterns=(r"\d+ ?(?:am|pm)",), weight=2.0),
+    ])
+    assert classifier.scores("SUMMARY of the sums") == {"long": 1.0, "short": 1.0}
+    assert classifier.scores("meet at 10am or 3 pm") == {"time": 4.0}
+    assert classifier.classify("a summary at 10am") == "time"
+    assert classifier.classify("nothing here") is None and classifier.classify("nothing", default="long") == "long"
+    
+    # Ties go to the intent declared first
+    tied = IntentClassifier([IntentRule("first", keywords=("word",)), IntentRule("second", keywords=("word",))])
+    assert tied.classify("word") == "first"
+    assert IntentClassifier([]).classify("anything", default="none") == "none"
+    
+    # Each domain reads the same words its own way
+    assert BOT_INTENTS.classify("Write a Python program") == "code"
+    assert BOT_INTENTS.classify("search for solar panels") == "research"
+    assert ASSISTANT_INTENTS.classify("search my files for the invoice") == "file"
+    assert ASSISTANT_INTENTS.classify("schedule a meeting tomorrow") == "calendar"
+    assert TASK_INTENTS.classify("schedule a reminder") == "schedule"
+    assert TASK_INTENTS.classify("delete task 3") == "cancel"
+    
+    logger.info("Intent classification tests completed successfully")
+
+async def run_tests():
+    """Run all intent classification tests"""
+    logger.info("Starting tests for intent classification...")
+    
+    # Create test results directory
+    os.makedirs("tests/results", exist_ok=True)
+    
+    # Run tests
+    classifier_test_result = await run_test(test_intent_classifier)
+    
+    # Save test results
+    with open("tests/results/intents_test_results.txt", "w") as f:
+        f.write("# Intent Classification Test Results\n\n")
+        f.write(f"Intent Classifier Test: {'Passed' if classifier_test_result else 'Failed'}\n\n")
+    
+    logger.info("Intent classification tests completed. Results saved to tests/results/intents_test_results.txt")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
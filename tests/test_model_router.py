@@ -0,0 +1,113 @@
+"""
+Test script for the model router
+
+This script tests routing chat completions across providers and models.
+"""
+import asyncio
+import sys
+import os
+import openai
+from loguru import logger
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.model_router import ModelOption, ModelRouter
+from src.agents.providers import AnthropicChatProvider, OpenAIChatProvider
+from src.orchestration.provider_guard import ProviderGuards, ProviderUnavailable
+from benchmarks.stub_openai_server import StubServer, StubSettings, create_stub_app
+from tests.harness import run_test
+
+def test_model_routing():
+    """Test that completions are routed by tier, cost and latency across providers and fall back on failure"""
+    logger.info("Testing model routing...")
+    
+    messages = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "hello"}]
+    
+    async def scenario():
+        openai_settings = StubSettings(first_token_delay=0.02, token_delay=0, tokens=3)
+        anthropic_settings = StubSettings(first_token_delay=0.02, token_delay=0, tokens=3)
+        openai_app, anthropic_app = create_stub_app(openai_settings), create_stub_app(anthropic_settings)
+        async with StubServer(openai_app, 8932) as openai_stub, StubServer(anthropic_app, 8933) as anthropic_stub:
+            client = openai.AsyncOpenAI(api_key="stub", base_url=openai_stub.base_url, max_retries=0)
+            anthropic = AnthropicChatProvider("stub", anthropic_stub.root_url)
+            providers = {"openai": OpenAIChatProvider(client), "anthropic": anthropic}
+            catalog = [
+                ModelOption("openai", "mini", 2, 0.15, 0.6),
+                ModelOption("anthropic", "claude", 3, 3, 15),
+                ModelOption("openai", "big", 3, 100, 200),
+                ModelOption("deepseek", "chat", 3, 0.1, 0.1)
+            ]
+            
+            def new_router():
+                return ModelRouter(providers, catalog, guards=ProviderGuards(min_calls=1000),
+                                   tiers={"Coder": 3, "Helper": 2}, cost_ceilings={"Coder": 0.01},
+                                   explore_rate=0)
+            
+            # Models of providers without a key, below the agent's tier or over its ceiling are left out
+            router = new_router()
+            assert [option.name for option in router.catalog] == ["openai/mini", "anthropic/claude", "openai/big"]
+            assert [option.name for option in router.candidates("Coder", 10, 100)] == ["anthropic/claude"]
+            assert [option.name for option in router.candidates("Helper", 10, 100)][0] == "openai/mini"
+            
+            # Both APIs answer, whole and streamed
+            expected = "token0\ntoken1 token2 "
+            assert await router.complete("Helper", messages, 0, 100) == expected
+            assert await router.complete("Coder", messages, 0, 100) == expected
+            assert "".join([delta async for delta in router.stream("Coder", messages, 0, 100)]) == expected
+            assert openai_app.state.requests == 1 and anthropic_app.state.requests == 2
+            
+            # A failing provider is fallen back from, and its error rate ranks it behind the healthy one
+            openai_settings.error_rate = 1.0
+            assert await router.complete("Helper", messages, 0, 100) == expected
+            assert router.stats.fallbacks == 1
+            assert router.candidates("Helper", 10, 100)[0].name == "anthropic/claude"
+            requests = openai_app.state.requests
+            assert await router.complete("Helper", messages, 0, 100) == expected
+            assert openai_app.state.requests == requests and router.stats.fallbacks == 1
+            
+            # A stream falls back while no delta was sent
+            openai_settings.error_rate, anthropic_settings.error_rate = 0.0, 1.0
+            router = new_router()
+            router.cost_ceilings = {}
+            streamed = [delta async for delta in router.stream("Coder", messages, 0, 100)]
+            assert "".join(streamed) == expected and router.stats.fallbacks == 1
+            assert router.guards.get("anthropic", "claude").stats.overloaded == 1
+            
+            # With every model down the router gives up, so agents can answer in degraded mode
+            openai_settings.error_rate = 1.0
+            try:
+                await router.complete("Helper", messages, 0, 100)
+                assert False, "Every model should have failed"
+            except ProviderUnavailable:
+                pass
+            stats = router.to_dict()
+            assert stats["requests"] == 2 and stats["failed"] == 1
+            assert stats["models"]["openai/big"]["requests"] == 1 and stats["cost_usd"] > 0
+            
+            await client.close()
+            await anthropic.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Model routing tests completed successfully")
+
+async def run_tests():
+    """Run all model router tests"""
+    logger.info("Starting tests for model router...")
+    
+    # Create test results directory
+    os.makedirs("tests/results", exist_ok=True)
+    
+    # Run tests
+    model_routing_test_result = await run_test(test_model_routing)
+    
+    # Save test results
+    with open("tests/results/model_router_test_results.txt", "w") as f:
+        f.write("# Model Router Test Results\n\n")
+        f.write(f"Model Routing Test: {'Passed' if model_routing_test_result else 'Failed'}\n\n")
+    
+    logger.info("Model Router tests completed. Results saved to tests/results/model_router_test_results.txt")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
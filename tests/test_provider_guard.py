@@ -0,0 +1,212 @@
+"""
+Test script for provider call guards
+
+This script tests the adaptive concurrency limits, circuit breakers and
+hedging that guard calls to model providers.
+"""
+import asyncio
+import sys
+import os
+import time
+import openai
+from loguru import logger
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.base_agent import Agent
+from src.agents.chunks import TextDelta
+from src.agents.model_router import ModelOption, ModelRouter
+from src.agents.providers import OpenAIChatProvider
+from src.persistence.response_cache import ResponseCache
+from src.persistence.semantic_cache import HashingEmbedder, SemanticCache
+from src.orchestration.provider_guard import (
+    COMPLETION, FIRST_CHUNK, HEDGE_MIN_SAMPLES, CircuitBreaker, ProviderGuards, ProviderUnavailable
+)
+from benchmarks.stub_openai_server import StubServer, StubSettings, create_stub_app
+from tests.harness import run_test
+
+def test_provider_guard():
+    """Test the adaptive limiter and circuit breaker against a stub provider injecting 429s, 5xx and latency"""
+    logger.info("Testing provider limiter and circuit breaker...")
+    
+    class StubAgent(Agent):
+        def __init__(self, client, guards):
+            super().__init__("StubAgent")
+            self.model_router = ModelRouter({"openai": OpenAIChatProvider(client)},
+                                            [ModelOption("openai", "stub-model", 1, 0, 0)], guards=guards)
+            self.response_cache = ResponseCache(ttls={"StubAgent": 1})
+            self.semantic_cache = SemanticCache(HashingEmbedder(64), thresholds={"StubAgent": 0.99},
+                                                ttls={"StubAgent": 1})
+        
+        async def process(self, query):
+            try:
+                return await self._complete(messages=[{"role": "user", "content": query}], temperature=0)
+            except ProviderUnavailable:
+                answer = await self._degraded_answer(query)
+                if answer is None:
+                    raise
+                return answer
+        
+        async def process_stream(self, query):
+            yield TextDelta(await self.process(query))
+    
+    async def scenario():
+        settings = StubSettings(first_token_delay=0.05, token_delay=0, tokens=3, max_concurrency=4)
+        app = create_stub_app(settings)
+        async with StubServer(app, 8931) as stub:
+            client = openai.AsyncOpenAI(api_key="stub", base_url=stub.base_url, max_retries=0)
+            
+            # 429s from a provider handling 4 requests at a time shrink the limit from 16
+            guards = ProviderGuards(initial_limit=16, max_limit=16, max_wait=5, min_calls=1000)
+            agent = StubAgent(client, guards)
+            guard = guards.get("openai", "stub-model")
+            rejected = []
+            for batch in range(4):
+                overloaded = guard.stats.overloaded
+                results = await asyncio.gather(*(agent.process(f"q{batch} {n}") for n in range(40)),
+                                               return_exceptions=True)
+                # With no other model to fall back to, the 429s surface as ProviderUnavailable
+                assert all(isinstance(r, (str, ProviderUnavailable)) for r in results), results
+                rejected.append(guard.stats.overloaded - overloaded)
+            assert rejected[0] > 0 and rejected[-1] < rejected[0], rejected
+            assert guard.limiter.limit < 16 and guard.limiter.decreases >= 1 and guard.limiter.in_flight == 0
+            
+            # A failing provider opens the circuit, after which calls fail fast without reaching it
+            guards = ProviderGuards(max_wait=5, min_calls=6, window=10, open_seconds=2)
+            agent = StubAgent(client, guards)
+            guard = guards.get("openai", "stub-model")
+            answer = await agent.process("cached question")
+            await agent.semantic_cache.store("StubAgent", "write a fibonacci function", "def fib(n): ...")
+            settings.error_rate, settings.error_status = 1.0, 500
+            # 5 failures in the 6 calls needed to judge
+            for number in range(5):
+                try:
+                    await agent.process(f"failing {number}")
+                    assert False, "The stub should have failed"
+                except ProviderUnavailable:
+                    pass
+            assert guard.breaker.state == CircuitBreaker.OPEN and guard.error_ewma > 0.5
+            
+            await asyncio.sleep(1.1)
+            requests = app.state.requests
+            started = time.perf_counter()
+            try:
+                await agent.process("sort a list of tuples")
+                assert False, "The open circuit should have failed the call"
+            except ProviderUnavailable as e:
+                assert 0 < e.retry_after <= 1
+            assert time.perf_counter() - started < 0.1
+            # Expired responses and loose matches of earlier answers stand in while the circuit is open
+            assert await agent.process("cached question") == answer
+            assert await agent.process("write a python fibonacci function") == "def fib(n): ..."
+            assert app.state.requests == requests
+            assert guard.stats.rejected == 3 and agent.model_router.stats.stale_answers == 1
+            
+            # Once the open time has passed, one successful probe call closes the circuit
+            settings.error_rate = 0.0
+            await asyncio.sleep(guard.breaker.retry_after + 0.05)
+            await agent.process("probe")
+            assert guard.breaker.state == CircuitBreaker.CLOSED and guard.breaker.opened == 1
+            assert guards.to_dict()["openai/stub-model"]["circuit"] == "closed"
+            await client.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Provider limiter and circuit breaker tests completed successfully")
+
+def test_hedge_delay_by_call_kind():
+    """Test that completions are hedged after the p95 of other completions, not of streams' first chunks"""
+    logger.info("Testing hedge delays by call kind...")
+    
+    guard = ProviderGuards(initial_limit=64, max_limit=64).get("fake", "model")
+    
+    async def streamed():
+        async with guard.slot(FIRST_CHUNK) as call:
+            call.responded()
+            await asyncio.sleep(0.03)
+    
+    async def completion(seconds):
+        await asyncio.sleep(seconds)
+        return "answer"
+    
+    async def scenario():
+        # Many quick first chunks do not make a completion look slow
+        await asyncio.gather(*(streamed() for _ in range(HEDGE_MIN_SAMPLES * 2)))
+        assert guard.hedge_delay(FIRST_CHUNK) < 0.02 and guard.hedge_delay() is None
+        answers = await asyncio.gather(*(guard.run(lambda: completion(0.03), hedge=True)
+                                         for _ in range(HEDGE_MIN_SAMPLES)))
+        assert answers == ["answer"] * HEDGE_MIN_SAMPLES and guard.stats.hedged == 0
+        
+        # Interleaved with more streams, the delay stays that of completions
+        await asyncio.gather(*(streamed() for _ in range(HEDGE_MIN_SAMPLES * 2)))
+        assert 0.03 <= guard.hedge_delay() < 0.1
+        assert await guard.run(lambda: completion(0.02), hedge=True) == "answer"
+        assert guard.stats.hedged == 0
+        
+        # A completion slower than the others is still hedged
+        assert await guard.run(lambda: completion(0.5), hedge=True) == "answer"
+        assert guard.stats.hedged == 1
+        stats = guard.to_dict()['p95_latency_s']
+        assert stats[FIRST_CHUNK] < 0.02 <= stats[COMPLETION]
+    
+    asyncio.run(scenario())
+    
+    logger.info("Hedge delay by call kind tests completed successfully")
+
+def test_limit_with_mixed_call_kinds():
+    """Test that interleaved streams and whole completions at their usual latencies don't shrink the limit"""
+    logger.info("Testing the concurrency limit with mixed call kinds...")
+    
+    guard = ProviderGuards(initial_limit=8, max_limit=64).get("fake", "model")
+    
+    async def streamed():
+        async with guard.slot(FIRST_CHUNK) as call:
+            await asyncio.sleep(0.002)
+            call.responded()
+            await asyncio.sleep(0.03)
+    
+    async def completion():
+        await asyncio.sleep(0.03)
+    
+    async def scenario():
+        for _ in range(20):
+            await asyncio.gather(streamed(), guard.run(completion), streamed(), guard.run(completion))
+        assert guard.limiter.decreases == 0 and guard.limiter.limit > 8
+        baselines = guard.to_dict()['baseline_latency_s']
+        assert baselines[FIRST_CHUNK] < 0.02 <= baselines[COMPLETION]
+        
+        # A completion much slower than other completions still shrinks it
+        async def slow():
+            await asyncio.sleep(0.2)
+        limit = guard.limiter.limit
+        await guard.run(slow)
+        assert guard.limiter.decreases == 1 and guard.limiter.limit < limit
+    
+    asyncio.run(scenario())
+    
+    logger.info("Concurrency limit with mixed call kinds tests completed successfully")
+
+async def run_tests():
+    """Run all provider guard tests"""
+    logger.info("Starting tests for provider guard...")
+    
+    # Create test results directory
+    os.makedirs("tests/results", exist_ok=True)
+    
+    # Run tests
+    provider_guard_test_result = await run_test(test_provider_guard)
+    hedge_kind_test_result = await run_test(test_hedge_delay_by_call_kind)
+    mixed_kinds_test_result = await run_test(test_limit_with_mixed_call_kinds)
+    
+    # Save test results
+    with open("tests/results/provider_guard_test_results.txt", "w") as f:
+        f.write("# Provider Guard Test Results\n\n")
+        f.write(f"Provider Guard Test: {'Passed' if provider_guard_test_result else 'Failed'}\n\n")
+        f.write(f"Hedge Delay by Call Kind Test: {'Passed' if hedge_kind_test_result else 'Failed'}\n\n")
+        f.write(f"Limit with Mixed Call Kinds Test: {'Passed' if mixed_kinds_test_result else 'Failed'}\n\n")
+    
+    logger.info("Provider Guard tests completed. Results saved to tests/results/provider_guard_test_results.txt")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,134 @@
+"""
+Test script for the LLM response cache
+
+This script tests caching of agent responses in memory and in the
+database.
+"""
+import asyncio
+import sys
+import os
+import uuid
+from types import SimpleNamespace
+from loguru import logger
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.base_agent import Agent
+from src.agents.model_router import ModelOption, ModelRouter
+from src.agents.providers import OpenAIChatProvider
+from src.persistence.database import DatabaseManager
+from src.persistence.response_cache import ResponseCache
+from tests.harness import run_test
+
+def test_response_cache():
+    """Test that completions are answered from memory, then from the database, within their bounds"""
+    logger.info("Testing LLM response cache...")
+    
+    class FakeStream:
+        async def __aenter__(self):
+            return self
+        
+        async def __aexit__(self, *exc_info):
+            return False
+        
+        async def __aiter__(self):
+            for part in ("def f():", " pass"):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+    
+    class FakeCompletions:
+        calls = 0
+        
+        async def create(self, stream=False, **params):
+            self.calls += 1
+            if stream:
+                return FakeStream()
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="def f(): pass"))])
+    
+    class CachedAgent(Agent):
+        def __init__(self, cache):
+            super().__init__("CodeGeneration")
+            self.response_cache = cache
+            self.completions = FakeCompletions()
+            client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+            self.model_router = ModelRouter({"openai": OpenAIChatProvider(client)},
+                                            [ModelOption("openai", "gpt-4", 3, 30, 60)])
+        
+        async def process(self, query, temperature=0.2):
+            return await self._complete(
+                messages=[{"role": "user", "content": query}], temperature=temperature, max_tokens=100
+            )
+        
+        async def process_stream(self, query):
+            async for delta in self._complete_stream(
+                messages=[{"role": "user", "content": query}], temperature=0.2, max_tokens=100
+            ):
+                yield delta
+    
+    async def scenario():
+        db_manager = DatabaseManager()
+        cache = ResponseCache(db_manager, max_memory_bytes=20, ttls={"CodeGeneration": 3600})
+        agent = CachedAgent(cache)
+        # Unique prompts so earlier runs' database entries don't answer them
+        query = f"fibonacci {uuid.uuid4().hex}"
+        
+        # Repeated requests are answered from memory
+        assert await agent.process(query) == await agent.process(query) == "def f(): pass"
+        assert agent.completions.calls == 1 and cache.stats.memory_hits == 1
+        
+        # A streamed completion is cached once read to the end and replayed at once
+        first = [delta async for delta in agent.process_stream(query + " stream")]
+        second = [delta async for delta in agent.process_stream(query + " stream")]
+        assert first == ["def f():", " pass"] and second == ["def f(): pass"]
+        assert agent.completions.calls == 2
+        
+        # The memory tier stays within its size, the database tier answers the evicted request
+        assert cache.memory_bytes <= 20 and cache.stats.evictions == 1
+        assert await agent.process(query) == "def f(): pass"
+        assert agent.completions.calls == 2 and cache.stats.disk_hits == 1
+        
+        # A new process finds the responses in the database
+        restarted = CachedAgent(ResponseCache(db_manager, ttls={"CodeGeneration": 3600}))
+        assert await restarted.process(query) == "def f(): pass" and restarted.completions.calls == 0
+        
+        # Sampled requests and agents with caching disabled always reach the model
+        await agent.process(query, temperature=0.9)
+        await agent.process(query, temperature=0.9)
+        disabled = CachedAgent(ResponseCache(db_manager, ttls={"CodeGeneration": 0}))
+        await disabled.process(query + " disabled")
+        await disabled.process(query + " disabled")
+        assert agent.completions.calls == 4 and disabled.completions.calls == 2
+        assert cache.stats.bypassed == 2
+        
+        stats = cache.stats.to_dict()
+        assert stats["lookups"] == 5 and stats["misses"] == 2 and stats["hit_rate"] == 0.6
+        assert stats["bytes_saved"] == 3 * len("def f(): pass")
+        
+        # The database tier evicts the least recently used responses beyond its size
+        key = next(iter(cache._memory))
+        assert db_manager.evict_cached_responses(0) >= 2
+        assert await ResponseCache(db_manager).get(key) is None
+    
+    asyncio.run(scenario())
+    
+    logger.info("LLM response cache tests completed successfully")
+
+async def run_tests():
+    """Run all LLM response cache tests"""
+    logger.info("Starting tests for LLM response cache...")
+    
+    # Create test results directory
+    os.makedirs("tests/results", exist_ok=True)
+    
+    # Run tests
+    response_cache_test_result = await run_test(test_response_cache)
+    
+    # Save test results
+    with open("tests/results/response_cache_test_results.txt", "w") as f:
+        f.write("# LLM Response Cache Test Results\n\n")
+        f.write(f"LLM Response Cache Test: {'Passed' if response_cache_test_result else 'Failed'}\n\n")
+    
+    logger.info("LLM Response Cache tests completed. Results saved to tests/results/response_cache_test_results.txt")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,167 @@
+"""
+Test script for the semantic cache
+
+This script tests answering paraphrased queries from the semantic cache.
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+from loguru import logger
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.persistence import semantic_cache
+from src.persistence.semantic_cache import HashingEmbedder, SemanticCache
+from tests.harness import run_test
+
+def test_semantic_cache():
+    """Test that paraphrased queries are answered from memory-mapped vectors that survive restarts and compaction"""
+    logger.info("Testing semantic cache...")
+    
+    async def scenario(directory):
+        def open_cache(max_entries=100):
+            return SemanticCache(
+                HashingEmbedder(64), directory=directory,
+                thresholds={"CodeGeneration": 0.8, "WebResearch": 0.99},
+                ttls={"CodeGeneration": 3600}, max_entries=max_entries
+            )
+        
+        cache = open_cache()
+        await cache.store("CodeGeneration", "fibonacci function", "def fib(n): ...")
+        await cache.store("WebResearch", "fibonacci function", "Fibonacci numbers are ...")
+        await cache.store("PersonalAssistant", "fibonacci function", "Sure!")
+        
+        # Paraphrases reach the code agent's threshold but not the research agent's stricter one
+        assert await cache.lookup("CodeGeneration", "function for fibonacci numbers") == "def fib(n): ..."
+        assert await cache.lookup("CodeGeneration", "sort a list of tuples") is None
+        assert await cache.lookup("WebResearch", "function for fibonacci numbers") is None
+        assert await cache.lookup("WebResearch", "Fibonacci function") == "Fibonacci numbers are ..."
+        assert await cache.lookup("PersonalAssistant", "fibonacci function") is None
+        assert "PersonalAssistant" not in cache.indexes
+        
+        # Older entries are removed beyond the maximum, and the matrix is compacted
+        for number in range(300):
+            await cache.store("CodeGeneration", f"task number{number} variant{number}", f"answer {number}")
+        index = cache.index("CodeGeneration")
+        assert index.size == 100 and index.compactions >= 1 and index.count < 300
+        assert await cache.lookup("CodeGeneration", "fibonacci function") is None
+        assert await cache.lookup("CodeGeneration", "task number299 variant299") == "answer 299"
+        
+        # Expired answers are not served
+        index.entries[index.count - 1]["expires_at"] = 0
+        assert await cache.lookup("CodeGeneration", "task number299 variant299") is None
+        assert cache.stats.expired == 1
+        for index in cache.indexes.values():
+            index.close()
+        
+        # Another process maps the same files
+        reopened = open_cache()
+        assert await reopened.lookup("CodeGeneration", "task number250 variant250") == "answer 250"
+        assert await reopened.lookup("CodeGeneration", "task number299 variant299") is None
+        assert await reopened.lookup("WebResearch", "fibonacci function") == "Fibonacci numbers are ..."
+        assert reopened.index("CodeGeneration").size == 99
+        
+        stats = cache.stats.to_dict()
+        assert stats["lookups"] == 7 and stats["hits"] == 3 and stats["stores"] == 302
+        for index in reopened.indexes.values():
+            index.close()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(directory))
+    
+    logger.info("Semantic cache tests completed successfully")
+
+def test_semantic_search_during_compaction():
+    """Test that a search run off the event loop is discarded if the index is compacted before it returns"""
+    logger.info("Testing semantic cache searches during compaction...")
+    
+    searching, resume = threading.Event(), threading.Event()
+    
+    def held_search(*args):
+        searching.set()
+        resume.wait(5)
+        return search(*args)
+    
+    async def scenario():
+        cache = SemanticCache(HashingEmbedder(64), thresholds={"CodeGeneration": 0.8})
+        for number in range(100):
+            await cache.store("CodeGeneration", f"task number{number} variant{number}", f"answer {number}")
+        index = cache.index("CodeGeneration")
+        
+        # The rows before the match are removed and compacted away while the search is held in its thread
+        with patch("src.persistence.semantic_cache.THREAD_THRESHOLD", 0), \
+                patch("src.persistence.semantic_cache._best_match", held_search):
+            lookup = asyncio.create_task(cache.lookup("CodeGeneration", "task number70 variant70"))
+            await asyncio.to_thread(searching.wait, 5)
+            for row in range(10):
+                index.remove(row)
+            index.compact()
+            resume.set()
+            assert await lookup is None
+        
+        # Neither another entry's answer was returned nor a live entry removed
+        assert index.size == 90 and index.generation == 1
+        assert await cache.lookup("CodeGeneration", "task number70 variant70") == "answer 70"
+        assert await cache.lookup("CodeGeneration", "task number60 variant60") == "answer 60"
+    
+    search = semantic_cache._best_match
+    asyncio.run(scenario())
+    
+    logger.info("Semantic cache search during compaction tests completed successfully")
+
+def test_semantic_cache_lost_matrix():
+    """Test that an index whose vector matrix is missing starts empty instead of failing to load"""
+    logger.info("Testing semantic cache with a lost matrix...")
+    
+    async def scenario(directory):
+        def open_cache():
+            return SemanticCache(HashingEmbedder(64), directory=directory, thresholds={"CodeGeneration": 0.8})
+        
+        cache = open_cache()
+        await cache.store("CodeGeneration", "fibonacci function", "def fib(n): ...")
+        cache.index("CodeGeneration").close()
+        os.remove(os.path.join(directory, "CodeGeneration.f32"))
+        
+        # The entries without their vectors are dropped, and the index works again from there
+        reopened = open_cache()
+        assert await reopened.lookup("CodeGeneration", "fibonacci function") is None
+        assert reopened.index("CodeGeneration").size == 0
+        await reopened.store("CodeGeneration", "sort a list", "sorted(items)")
+        reopened.index("CodeGeneration").close()
+        again = open_cache()
+        assert await again.lookup("CodeGeneration", "sort a list") == "sorted(items)"
+        assert again.index("CodeGeneration").size == 1
+        again.index("CodeGeneration").close()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(directory))
+    
+    logger.info("Semantic cache lost matrix tests completed successfully")
+
+async def run_tests():
+    """Run all semantic cache tests"""
+    logger.info("Starting tests for semantic cache...")
+    
+    # Create test results directory
+    os.makedirs("tests/results", exist_ok=True)
+    
+    # Run tests
+    semantic_cache_test_result = await run_test(test_semantic_cache)
+    compaction_test_result = await run_test(test_semantic_search_during_compaction)
+    lost_matrix_test_result = await run_test(test_semantic_cache_lost_matrix)
+    
+    # Save test results
+    with open("tests/results/semantic_cache_test_results.txt", "w") as f:
+        f.write("# Semantic Cache Test Results\n\n")
+        f.write(f"Semantic Cache Test: {'Passed' if semantic_cache_test_result else 'Failed'}\n\n")
+        f.write(f"Search During Compaction Test: {'Passed' if compaction_test_result else 'Failed'}\n\n")
+        f.write(f"Lost Matrix Test: {'Passed' if lost_matrix_test_result else 'Failed'}\n\n")
+    
+    logger.info("Semantic Cache tests completed. Results saved to tests/results/semantic_cache_test_results.txt")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
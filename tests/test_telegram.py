@@ -6,6 +6,10 @@ This script tests the functionality of the Telegram bot interface.
 import asyncio
 import sys
 import os
+import random
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, patch
 from loguru import logger
 
@@ -13,8 +17,29 @@ from loguru import logger
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.interface.telegram_bot import TelegramInterface
+from src.interface.webhook import SECRET_TOKEN_HEADER, WebhookServer, create_webhook_app
+from src.interface.dispatcher import ChatOrderedUpdateProcessor
+from src.interface.outbound import OutboundScheduler
+from src.interface.delivery import FENCE, split_message
+from src.interface.dedup import UpdateDeduplicator
+from src.interface.inflight import InFlightWork, WorkCancelled, WorkSuspended
+from src.interface.lifecycle import LifecycleManager
+from src.interface.user_limits import UserRateLimiter
+from src.agents.chunks import TextDelta, collect_text
+from src.agents.model_router import ModelOption, ModelRouter
+from src.agents.providers import ChatProvider
+from src.persistence.database import DatabaseManager
+from src.persistence.usage_ledger import UsageLedger
+from src.orchestration.job_queue import JobFailed, JobQueueClient, JobWorker
+from src.orchestration.registry import AGENT_REGISTRY, AgentRegistry, AgentSpec
+from src.orchestration.router import AgentRouter
+from src.orchestration.usage import record_usage, usage_scope
+from src.orchestration.task_queue import PRIORITY_HIGH, PRIORITY_LOW, QueueFull, TaskQueue, parse_pool_sizes
 from telegram import Update
+from telegram.error import RetryAfter
 from telegram.ext import ContextTypes
+from fastapi.testclient import TestClient
+from tests.harness import run_test
 
 async def test_telegram_commands():
     """Test the Telegram bot command handlers"""
@@ -87,6 +112,816 @@ async def test_telegram_commands():
         logger.info("Telegram Bot Command Handlers tests completed successfully")
         return True
 
+def test_webhook_ingestion():
+    """Test that the webhook validates the secret token and enqueues updates"""
+    logger.info("Testing webhook ingestion...")
+    
+    queue = asyncio.Queue()
+    client = TestClient(create_webhook_app(queue, secret_token="secret", path="/hook"))
+    payload = {
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": 42, "type": "private"},
+            "text": "/start"
+        }
+    }
+    
+    # Deliveries without the secret token are rejected
+    assert client.post("/hook", json=payload).status_code == 403
+    assert client.post("/hook", json=payload, headers={SECRET_TOKEN_HEADER: "wrong"}).status_code == 403
+    assert queue.empty()
+    
+    # Valid deliveries are decoded into updates
+    assert client.post("/hook", json=payload, headers={SECRET_TOKEN_HEADER: "secret"}).status_code == 200
+    update = queue.get_nowait()
+    assert isinstance(update, Update)
+    assert update.effective_chat.id == 42
+    
+    # Malformed payloads are acknowledged so Telegram does not retry them
+    assert client.post("/hook", content=b"not json", headers={SECRET_TOKEN_HEADER: "secret"}).status_code == 200
+    assert queue.empty()
+    assert client.get("/healthz").json()["webhook"]["accepted"] == 1
+    
+    # A webhook without a secret token would accept anyone's deliveries, so it refuses to start
+    application = SimpleNamespace(update_queue=queue, bot=None)
+    for start in (lambda: create_webhook_app(queue, path="/hook"),
+                  lambda: WebhookServer(application, "https://bot.example.com", secret_token="")):
+        try:
+            start()
+            raise AssertionError("webhook started without a secret token")
+        except ValueError as e:
+            assert "TELEGRAM_WEBHOOK_SECRET" in str(e)
+    
+    logger.info("Webhook ingestion tests completed successfully")
+
+def test_chat_ordered_dispatch():
+    """Test that updates run concurrently across chats but in order within a chat"""
+    logger.info("Testing chat-ordered update dispatch...")
+    
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_in_flight=2)
+        handled = []
+        active = 0
+        peak = 0
+        
+        async def handle(chat_id, message_id, delay):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(delay)
+            handled.append((chat_id, message_id))
+            active -= 1
+        
+        def make_update(chat_id, message_id):
+            return Update.de_json({
+                "update_id": message_id,
+                "message": {
+                    "message_id": message_id,
+                    "date": 0,
+                    "chat": {"id": chat_id, "type": "private"},
+                    "text": "hi"
+                }
+            }, None)
+        
+        # The first update of chat 1 is slow; chat 2 must not wait behind it
+        jobs = [(1, 1, 0.2), (1, 2, 0.0), (2, 3, 0.0), (3, 4, 0.0)]
+        await asyncio.gather(*(
+            processor.process_update(make_update(chat_id, message_id), handle(chat_id, message_id, delay))
+            for chat_id, message_id, delay in jobs
+        ))
+        return processor, handled, peak
+    
+    processor, handled, peak = asyncio.run(scenario())
+    assert handled.index((1, 1)) < handled.index((1, 2))
+    assert handled.index((2, 3)) < handled.index((1, 1))
+    assert peak <= 2
+    stats = processor.stats.to_dict()
+    assert stats['dispatched'] == 4 and stats['completed'] == 4
+    assert stats['waiting'] == 0 and stats['in_flight'] == 0
+    
+    logger.info("Chat-ordered update dispatch tests completed successfully")
+
+def test_outbound_scheduler():
+    """Test flood control retries and coalescing of superseded progress edits"""
+    logger.info("Testing outbound scheduler...")
+    
+    class FakeMessage:
+        chat_id = 7
+        message_id = 1
+        
+        def __init__(self):
+            self.edits = []
+            self.flood_errors = 1
+        
+        async def edit_text(self, text, **kwargs):
+            await asyncio.sleep(0.01)
+            if self.flood_errors:
+                self.flood_errors -= 1
+                raise RetryAfter(0)
+            self.edits.append(text)
+            return self
+    
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, chat_rate=1000, chat_burst=1000)
+        message = FakeMessage()
+        # The first edit hits flood control; the two progress edits queued behind it
+        # are superseded by the final edit and never sent
+        results = await asyncio.gather(
+            scheduler.edit_text(message, "first"),
+            scheduler.edit_text(message, "progress 1", progress=True),
+            scheduler.edit_text(message, "progress 2", progress=True),
+            scheduler.edit_text(message, "final")
+        )
+        return scheduler, message, results
+    
+    scheduler, message, results = asyncio.run(scenario())
+    assert message.edits == ["first", "final"]
+    assert results[1] is None and results[2] is None
+    stats = scheduler.stats.to_dict()
+    assert stats['retried'] == 1 and stats['superseded'] == 2 and stats['sent'] == 2
+    
+    logger.info("Outbound scheduler tests completed successfully")
+
+def test_split_message():
+    """Test that long results are split without breaking code blocks"""
+    logger.info("Testing message splitting...")
+    
+    code = "\n".join(f"def function_{i}():\n    return {i}" for i in range(1000))
+    chunks = split_message(f"```python\n{code}\n```")
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 4096 for chunk in chunks)
+    # Every chunk is a complete code block and nothing is lost between them
+    assert all(chunk.startswith("```python\n") and chunk.endswith("\n```") for chunk in chunks)
+    assert "\n".join(chunk[len("```python\n"):-len("\n```")] for chunk in chunks) == code
+    
+    # Long lines are split between words, outside inline entities
+    text = "plain words and `inline code` then *bold words* " * 200
+    chunks = split_message(text, limit=500)
+    assert all(len(chunk) <= 500 and chunk.count("`") % 2 == 0 and chunk.count("*") % 2 == 0 for chunk in chunks)
+    
+    # Markdown characters in code are literal, so they don't hold off the cuts after them
+    text = "multiply with `a*b` or `snake_case` names " + "plain words " * 200
+    chunks = split_message(text, limit=500)
+    assert len(chunks) > 1 and " ".join(chunks) == text
+    line = "total = a*b + c_d " * 100
+    chunks = split_message(f"```python\n{line}\n```", limit=500)
+    assert len(chunks) > 1 and all(chunk.startswith("```python\n") and chunk.endswith("\n```") for chunk in chunks)
+    assert " ".join(chunk[len("```python\n"):-len("\n```")] for chunk in chunks) == line
+    
+    # Fences and Markdown in long lines never make a chunk longer than the limit
+    rng = random.Random(7)
+    
+    def random_line():
+        if rng.random() < 0.2:
+            return FENCE + rng.choice(["", "python", "x" * 5000, "js " + "y " * 300])
+        text = "".join(rng.choice("ab *_[]()`") for _ in range(rng.choice([10, 80, 5000])))
+        return text if rng.random() < 0.5 else FENCE + text
+    
+    for _ in range(100):
+        text = "\n".join(random_line() for _ in range(rng.randint(1, 30)))
+        for limit in (4096, 500):
+            assert all(len(chunk) <= limit for chunk in split_message(text, limit))
+    
+    logger.info("Message splitting tests completed successfully")
+
+def test_update_dedup():
+    """Test that redelivered updates replay the final replies instead of being handled again"""
+    logger.info("Testing update de-duplication...")
+    
+    class FakeMessage:
+        chat_id = 7
+        
+        def __init__(self, message_id, sent):
+            self.message_id = message_id
+            self.sent = sent
+        
+        async def reply_text(self, text, **kwargs):
+            reply = FakeMessage(100 + len(self.sent), self.sent)
+            self.sent.append(("reply", text))
+            return reply
+        
+        async def edit_text(self, text, **kwargs):
+            self.sent.append(("edit", text))
+            return self
+    
+    def make_update(update_id, sent):
+        message = FakeMessage(1, sent)
+        return type("FakeUpdate", (), {"update_id": update_id, "message": message})()
+    
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, chat_rate=1000, chat_burst=1000)
+        dedup = UpdateDeduplicator(max_entries=10)
+        scheduler.listeners.append(dedup.record)
+        sent = []
+        
+        # First delivery: a status message is edited into the final result
+        update = make_update(1, sent)
+        assert await dedup.check(update) is None
+        status = await scheduler.reply_text(update.message, "Working...")
+        await scheduler.edit_text(status, "partial", progress=True)
+        await scheduler.edit_text(status, "result")
+        await scheduler.reply_text(update.message, "second part")
+        
+        # A redelivery while the first one is still handled is dropped
+        in_progress = await asyncio.create_task(dedup.check(make_update(1, [])))
+        assert in_progress is not None and not in_progress.completed
+        await dedup.complete(update)
+        
+        # A later redelivery, with a new update ID but the same message, replays the final replies
+        replayed = []
+        redelivered = make_update(2, replayed)
+        entry = await dedup.check(redelivered)
+        assert entry is not None and entry.completed
+        await dedup.replay(entry, redelivered.message, scheduler)
+        return dedup, replayed
+    
+    dedup, replayed = asyncio.run(scenario())
+    assert replayed == [("reply", "result"), ("reply", "second part")]
+    stats = dedup.stats.to_dict()
+    assert stats['misses'] == 1 and stats['hits'] == 1 and stats['in_progress_duplicates'] == 1
+    
+    logger.info("Update de-duplication tests completed successfully")
+
+def test_cancel_inflight_work():
+    """Test that cancelling a chat's work stops the agent stream and marks its task cancelled"""
+    logger.info("Testing cancellation of in-flight work...")
+    
+    class FakeDatabase:
+        def __init__(self):
+            self.statuses = {}
+        
+        def add_task_record(self, task_type, query, status='pending', context=None):
+            self.statuses[1] = status
+            return {'id': 1}
+        
+        def update_task_record(self, task_id, result=None, status=None):
+            self.statuses[task_id] = status
+            return {'id': task_id}
+    
+    class SlowAgent:
+        name = "Slow"
+        max_tokens = 100
+        
+        def __init__(self):
+            self.closed = False
+        
+        async def process_stream(self, query):
+            try:
+                for index in range(100):
+                    await asyncio.sleep(0.01)
+                    yield TextDelta(f"token{index} ")
+            finally:
+                # Where a real agent closes the upstream HTTP response
+                self.closed = True
+    
+    async def scenario():
+        database = FakeDatabase()
+        inflight = InFlightWork(database)
+        router = AgentRouter()
+        agent = SlowAgent()
+        deltas = []
+        
+        work = asyncio.create_task(
+            inflight.run(7, "research", "query", router._run_agent(agent, "query", deltas.append))
+        )
+        while len(deltas) < 5:
+            await asyncio.sleep(0.005)
+        assert inflight.cancel(7) == 1
+        try:
+            await work
+            raise AssertionError("cancelled work returned a result")
+        except WorkCancelled:
+            pass
+        
+        assert inflight.cancel(7) == 0 and inflight.running(7) == 0
+        return database, router, agent, len(deltas)
+    
+    database, router, agent, streamed = asyncio.run(scenario())
+    assert agent.closed
+    assert database.statuses[1] == 'cancelled'
+    stats = router.cancellation_stats.to_dict()
+    assert stats['cancelled_calls'] == 1 and stats['tokens_saved'] == 100 - streamed
+    
+    logger.info("Cancellation tests completed successfully")
+
+def test_shutdown_drain():
+    """Test that shutdown drains quick work, saves slow work as pending and resumes it on startup"""
+    logger.info("Testing shutdown drain and resume...")
+    
+    class FakeDatabase:
+        def __init__(self):
+            self.records = {}
+        
+        def add_task_record(self, task_type, query, status='pending', context=None):
+            record_id = len(self.records) + 1
+            self.records[record_id] = {'id': record_id, 'task_type': task_type, 'query': query,
+                                       'status': status, 'context': context}
+            return self.records[record_id]
+        
+        def update_task_record(self, task_id, result=None, status=None):
+            self.records[task_id]['status'] = status
+            return self.records[task_id]
+        
+        def get_pending_tasks(self, limit=100):
+            return [record for record in self.records.values() if record['status'] == 'pending']
+    
+    async def scenario():
+        database = FakeDatabase()
+        inflight = InFlightWork(database)
+        lifecycle = LifecycleManager(inflight, database, drain_timeout=0.1)
+        outcomes = {}
+        
+        async def handle(name, delay):
+            try:
+                outcomes[name] = await inflight.run(
+                    7, "research", name, asyncio.sleep(delay, result="done"),
+                    context={'chat_id': 7, 'message_id': 1}
+                )
+            except WorkSuspended:
+                outcomes[name] = "suspended"
+        
+        handlers = [asyncio.create_task(handle("quick", 0.01)), asyncio.create_task(handle("slow", 10))]
+        while inflight.running() < 2:
+            await asyncio.sleep(0.001)
+        await lifecycle.drain()
+        # Work arriving after the drain is saved without being started
+        handlers.append(asyncio.create_task(handle("late", 0.01)))
+        await asyncio.gather(*handlers)
+        
+        # After the restart the saved work is resumed in its task history rows
+        resumed = []
+        restarted = InFlightWork(database)
+        
+        async def resume(record):
+            await restarted.run(7, record['task_type'], record['query'], asyncio.sleep(0),
+                                record_id=record['id'])
+            resumed.append(record['query'])
+        
+        await LifecycleManager(restarted, database).resume_pending(resume)
+        return database, lifecycle, outcomes, resumed
+    
+    database, lifecycle, outcomes, resumed = asyncio.run(scenario())
+    assert outcomes == {"quick": "done", "slow": "suspended", "late": "suspended"}
+    assert sorted(resumed) == ["late", "slow"]
+    assert all(record['status'] == 'success' for record in database.records.values())
+    stats = lifecycle.stats.to_dict()
+    assert stats['drained'] == 1 and stats['suspended'] == 1
+    
+    logger.info("Shutdown drain tests completed successfully")
+
+def test_agent_registry():
+    """Test that agents are declared by module path and only constructed on first use"""
+    logger.info("Testing agent registry...")
+    
+    # Importing the bot and the router does not load any agent
+    assert not any(AGENT_REGISTRY.is_loaded(name) for name in AGENT_REGISTRY.names)
+    assert set(AGENT_REGISTRY.names) == {"code", "image", "research", "task", "assistant"}
+    
+    registry = AgentRegistry([AgentSpec("decoder", "json.decoder", "JSONDecoder")])
+    assert not registry.is_loaded("decoder")
+    decoder = registry.get("decoder")
+    assert registry.is_loaded("decoder") and registry.get("decoder") is decoder
+    assert "decoder" in registry.load_times
+    try:
+        registry.get("missing")
+        raise AssertionError("unknown agent was resolved")
+    except KeyError:
+        pass
+    
+    logger.info("Agent registry tests completed successfully")
+
+def test_task_queue():
+    """Test per-agent worker pools, priorities, backpressure and cancellation of queued jobs"""
+    logger.info("Testing task queue...")
+    
+    async def scenario():
+        queue = TaskQueue(parse_pool_sizes("code=1, image=1"), max_depth=3)
+        order = []
+        release = asyncio.Event()
+        
+        async def job(name, wait=None):
+            if wait is not None:
+                await wait.wait()
+            order.append(name)
+            return name
+        
+        # A single worker runs queued jobs by priority, then in submission order
+        blocker = asyncio.create_task(queue.submit("code", lambda: job("blocker", release)))
+        await asyncio.sleep(0)
+        low = asyncio.create_task(queue.submit("code", lambda: job("low"), PRIORITY_LOW))
+        normal = asyncio.create_task(queue.submit("code", lambda: job("normal")))
+        high = asyncio.create_task(queue.submit("code", lambda: job("high"), PRIORITY_HIGH))
+        await asyncio.sleep(0)
+        assert queue.pool("code").stats.depth == 3
+        
+        # The queue is full, so new jobs are rejected instead of waiting
+        try:
+            await queue.submit("code", lambda: job("rejected"))
+            raise AssertionError("job was queued past the maximum depth")
+        except QueueFull:
+            pass
+        
+        # A slow image job does not hold up the code pool
+        image = asyncio.create_task(queue.submit("image", lambda: job("image", asyncio.Event())))
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await asyncio.gather(blocker, low, normal, high) == ["blocker", "low", "normal", "high"]
+        assert order == ["blocker", "high", "normal", "low"]
+        assert not image.done()
+        
+        # Cancelling a queued job removes it without running it
+        queued = asyncio.create_task(queue.submit("image", lambda: job("never")))
+        await asyncio.sleep(0)
+        queued.cancel()
+        image.cancel()
+        await asyncio.gather(queued, image, return_exceptions=True)
+        # Let the worker see its running job end
+        await asyncio.sleep(0.01)
+        assert "never" not in order
+        
+        stats = queue.get_stats()
+        assert stats["code"]["completed"] == 4 and stats["code"]["rejected"] == 1
+        assert stats["code"]["max_depth"] == 3 and stats["code"]["depth"] == 0
+        assert stats["code"]["max_wait"] >= 0.01 and stats["code"]["max_service"] >= 0.01
+        assert stats["image"]["cancelled"] == 2 and stats["image"]["busy"] == 0
+        await queue.stop()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Task queue tests completed successfully")
+
+def test_redis_job_queue():
+    """Test that jobs run on workers, are reclaimed from dead workers and given up after too many attempts"""
+    logger.info("Testing Redis job queue...")
+    import fakeredis
+    
+    class EchoAgent:
+        async def process(self, query):
+            if query == "fail":
+                raise ValueError("agent failed")
+            await asyncio.sleep(0.01)
+            record_usage("Echo", "stub/model", len(query), 2, 0.0)
+            return f"done: {query}"
+    
+    class FakeRegistry:
+        names = ["code"]
+        
+        def get(self, name):
+            return EchoAgent()
+    
+    async def scenario():
+        server = fakeredis.FakeServer()
+        client = JobQueueClient(fakeredis.FakeAsyncRedis(server=server, decode_responses=True), client_id="bot")
+        
+        # A job enqueued while a worker that later dies held it is run again by a live worker
+        dead = JobWorker(fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+                         registry=FakeRegistry(), name="dead", visibility_timeout=0.2)
+        await dead.redis.xgroup_create("agent_jobs:jobs:code", "agent_workers", id="0", mkstream=True)
+        orphan = asyncio.create_task(client.call("code", "orphaned"))
+        await asyncio.sleep(0.05)
+        assert await dead._read("agent_jobs:jobs:code") is not None
+        
+        worker = JobWorker(fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+                           registry=FakeRegistry(), name="live", visibility_timeout=0.2,
+                           max_attempts=2, concurrency=2)
+        running = asyncio.create_task(worker.run())
+        results = await asyncio.wait_for(asyncio.gather(
+            orphan, *(client.call("code", f"query {number}") for number in range(5))
+        ), timeout=5)
+        assert results == ["done: orphaned"] + [f"done: query {number}" for number in range(5)]
+        assert worker.stats.reclaimed == 1 and worker.stats.processed == 6
+        
+        # The model calls a worker made travel back with the result to the caller's usage
+        with usage_scope() as usage:
+            assert await asyncio.wait_for(client.call("code", "metered"), timeout=5) == "done: metered"
+        assert usage.calls == [{'agent': "Echo", 'model': "stub/model", 'prompt_tokens': 7,
+                                'completion_tokens': 2, 'cost_usd': 0.0}]
+        
+        # Agent errors are reported to the caller without running the job again
+        try:
+            await asyncio.wait_for(client.call("code", "fail"), timeout=5)
+            raise AssertionError("failed job returned a result")
+        except JobFailed as e:
+            assert "agent failed" in str(e)
+        assert worker.stats.failed == 1
+        
+        # Jobs nobody waits for anymore are skipped
+        worker.stop()
+        await running
+        abandoned = asyncio.create_task(client.call("code", "abandoned"))
+        await asyncio.sleep(0.05)
+        abandoned.cancel()
+        await asyncio.gather(abandoned, return_exceptions=True)
+        running = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.2)
+        assert worker.stats.skipped == 1 and worker.stats.processed == 7
+        
+        # A job taken twice by a worker that died each time is answered with an error
+        worker.stop()
+        await running
+        poisoned = asyncio.create_task(client.call("code", "poisoned"))
+        await asyncio.sleep(0.05)
+        assert await dead._read("agent_jobs:jobs:code") is not None
+        await asyncio.sleep(0.25)
+        assert await dead._reclaim("agent_jobs:jobs:code") is not None
+        await asyncio.sleep(0.25)
+        running = asyncio.create_task(worker.run())
+        try:
+            await asyncio.wait_for(poisoned, timeout=5)
+            raise AssertionError("poisoned job returned a result")
+        except JobFailed:
+            pass
+        assert worker.stats.dead_lettered == 1
+        
+        stats = client.stats.to_dict()
+        assert stats["completed"] == 7 and stats["failed"] == 2 and stats["abandoned"] == 1
+        worker.stop()
+        await running
+        await client.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Redis job queue tests completed successfully")
+
+def test_job_worker_agent_load_failure():
+    """Test that a job whose agent fails to load is answered with an error and leaves the worker running"""
+    logger.info("Testing job worker agent load failures...")
+    import fakeredis
+    
+    async def scenario():
+        server = fakeredis.FakeServer()
+        client = JobQueueClient(fakeredis.FakeAsyncRedis(server=server, decode_responses=True), client_id="bot")
+        worker = JobWorker(fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+                           registry=AgentRegistry([AgentSpec("boom", "json", "NoSuchClass")]), name="live")
+        running = asyncio.create_task(worker.run())
+        
+        # Every job is answered, and the worker keeps serving after each failure
+        for _ in range(2):
+            try:
+                await asyncio.wait_for(client.call("boom", "query"), timeout=5)
+                raise AssertionError("job of an agent that can't load returned a result")
+            except JobFailed as e:
+                assert "did not answer" not in str(e)
+            assert not running.done()
+        assert worker.stats.failed == 2
+        
+        worker.stop()
+        await running
+        await client.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Job worker agent load failure tests completed successfully")
+
+def test_single_flight():
+    """Test that identical concurrent agent calls share one upstream call, its deltas and its errors"""
+    logger.info("Testing single-flight coalescing...")
+    
+    class StreamingAgent:
+        name = "Streaming"
+        max_tokens = 10
+        
+        def __init__(self):
+            self.model_params = {'model': 'gpt-4', 'temperature': 0.2}
+            self.calls = 0
+            self.cancelled = 0
+        
+        async def process_stream(self, query):
+            self.calls += 1
+            try:
+                if "broken" in query:
+                    await asyncio.sleep(0.02)
+                    raise RuntimeError("upstream failed")
+                for word in ("def", " solve", "():"):
+                    await asyncio.sleep(0.02)
+                    yield TextDelta(word)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+    
+    agent = StreamingAgent()
+    
+    class FakeRegistry:
+        names = ["code"]
+        
+        def get(self, name):
+            return agent
+    
+    async def scenario():
+        router = AgentRouter(registry=FakeRegistry())
+        first, late = [], []
+        
+        # A caller joining mid-stream is replayed the deltas it missed
+        leader = asyncio.create_task(router.route_to_code_agent("Sort a list", on_delta=first.append))
+        await asyncio.sleep(0.03)
+        joined = asyncio.create_task(router.route_to_code_agent("sort  a LIST", on_delta=late.append))
+        silent = asyncio.create_task(router.route_to_code_agent("sort a list"))
+        assert await asyncio.gather(leader, joined, silent) == ["def solve():"] * 3
+        assert agent.calls == 1 and first == late == ["def", " solve", "():"]
+        
+        # Different model settings are separate calls
+        other = asyncio.create_task(router.route_to_code_agent("sort a list", on_delta=first.append))
+        await asyncio.sleep(0)
+        agent.model_params = {'model': 'gpt-4', 'temperature': 0.9}
+        await asyncio.gather(other, router.route_to_code_agent("sort a list", on_delta=first.append))
+        assert agent.calls == 3
+        
+        # Every caller receives the error
+        results = await asyncio.gather(
+            *(router.route_to_code_agent("broken query", on_delta=first.append) for _ in range(3)),
+            return_exceptions=True
+        )
+        assert agent.calls == 4 and all(isinstance(result, RuntimeError) for result in results)
+        
+        # One caller going away leaves the call running for the others
+        staying = asyncio.create_task(router.route_to_code_agent("reverse a list", on_delta=first.append))
+        leaving = asyncio.create_task(router.route_to_code_agent("reverse a list", on_delta=first.append))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        assert await staying == "def solve():" and agent.cancelled == 0
+        
+        # The last caller going away cancels the upstream call
+        abandoned = [asyncio.create_task(router.route_to_code_agent("merge lists", on_delta=first.append)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for task in abandoned:
+            task.cancel()
+        await asyncio.gather(*abandoned, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert agent.cancelled == 1 and router.single_flight.in_flight() == 0
+        
+        stats = router.single_flight.stats.to_dict()
+        assert stats["upstream_calls"] == agent.calls == 6
+        assert stats["collapsed"] == 6 and stats["abandoned"] == 1 and stats["max_waiters"] == 3
+        await router.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Single-flight tests completed successfully")
+
+def test_single_flight_usage():
+    """Test that a coalesced call is charged to the caller that started it"""
+    logger.info("Testing single-flight usage...")
+    
+    class MeteredAgent:
+        name = "Metered"
+        max_tokens = 10
+        model_params = {}
+        
+        async def process_stream(self, query):
+            for word in ("def", " solve", "():"):
+                await asyncio.sleep(0.05)
+                record_usage("CodeGeneration", "fake/model", 10, 5, 0.001)
+                yield TextDelta(word)
+        
+        async def process(self, query):
+            return await collect_text(self.process_stream(query))
+    
+    class FakeRegistry:
+        names = ["code"]
+        
+        def get(self, name):
+            return MeteredAgent()
+    
+    async def scenario():
+        router = AgentRouter(registry=FakeRegistry())
+        limits = UserRateLimiter(requests_per_minute=60, request_burst=2, tokens_per_hour=3600, token_burst=1000)
+        
+        async def request(user, query):
+            with limits.metered(user) as usage:
+                await router.route_to_code_agent(query)
+            return usage
+        
+        # The call runs in the context of its first caller, who pays for all of it; callers joining it pay nothing
+        leader = asyncio.create_task(request("leader", "sort a list"))
+        await asyncio.sleep(0.01)
+        joined = asyncio.create_task(request("joined", "sort a list"))
+        leader_usage, joined_usage = await asyncio.gather(leader, joined)
+        assert len(leader_usage.calls) == 3 and joined_usage.calls == []
+        assert limits.stats.tokens_charged == 45
+        
+        # Once the first caller has gone, it has paid for the calls made so far and the rest are charged to nobody
+        leaving = asyncio.create_task(request("leaving", "reverse a list"))
+        await asyncio.sleep(0.01)
+        staying = asyncio.create_task(request("staying", "reverse a list"))
+        await asyncio.sleep(0.06)
+        leaving.cancel()
+        assert (await staying).calls == [] and limits.stats.tokens_charged == 60
+        await router.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Single-flight usage tests completed successfully")
+
+def test_user_limits():
+    """Test per-user request and token buckets and the batched usage ledger with its rollups"""
+    logger.info("Testing per-user rate limits and usage ledger...")
+    
+    class FakeProvider(ChatProvider):
+        name = "fake"
+        
+        async def complete(self, model, messages, temperature=1.0, max_tokens=1000, timeout=None):
+            return "x" * 400
+    
+    async def scenario():
+        ledger = UsageLedger(DatabaseManager(), flush_interval=60, max_pending=1000)
+        limits = UserRateLimiter(requests_per_minute=60, request_burst=2, tokens_per_hour=3600, token_burst=100,
+                                 ledger=ledger)
+        # Unique users so earlier runs' ledger rows don't count
+        heavy, light = uuid.uuid4().int % 10 ** 12, uuid.uuid4().int % 10 ** 12
+        
+        # A burst of requests is admitted, then the user waits for the bucket to refill; others are unaffected
+        assert limits.check(heavy) == 0 and limits.check(heavy) == 0
+        assert 0.9 < limits.check(heavy) <= 1.0
+        assert limits.check(light) == 0 and limits.stats.request_limited == 1
+        
+        # Model calls made in a metered scope are charged to the user, wherever they are recorded from
+        router = ModelRouter({"fake": FakeProvider()}, [ModelOption("fake", "model", 1, 1, 2)])
+        with limits.metered(heavy) as usage:
+            await router.complete("CodeGeneration", [{"role": "user", "content": "x" * 40}], max_tokens=200)
+            record_usage("WebResearch", "fake/model", 10, 50, 0.001)
+        assert usage.calls[0] == {'agent': "CodeGeneration", 'model': "fake/model", 'prompt_tokens': 14,
+                                  'completion_tokens': 100, 'cost_usd': (14 * 1 + 100 * 2) / 1_000_000}
+        assert usage.tokens == 174 and limits.stats.tokens_charged == 174
+        
+        # Overdrawing the token bucket blocks the user's next requests until the debt is paid off
+        await asyncio.sleep(1.0)
+        assert limits.check(heavy) > 60 and limits.stats.token_limited == 1
+        assert limits.check(light) == 0
+        
+        # Calls reach the database in one batch, and rollups sum them per user, agent and day
+        assert ledger.pending == 2 and ledger.stats.flushes == 0
+        by_agent = await ledger.rollup("agent", user_id=heavy)
+        assert ledger.pending == 0 and ledger.stats.flushes == 1 and ledger.stats.flushed == 2
+        assert [(row["agent"], row["calls"], row["completion_tokens"]) for row in by_agent] == [
+            ("WebResearch", 1, 50), ("CodeGeneration", 1, 100)
+        ]
+        [by_user] = [row for row in await ledger.rollup("user") if row["user"] == heavy]
+        assert by_user["calls"] == 2 and by_user["prompt_tokens"] == 24
+        [by_day] = await ledger.rollup("day", user_id=heavy)
+        assert by_day["day"] == datetime.utcnow().date().isoformat() and by_day["cost_usd"] > 0.001
+        assert await ledger.rollup("user", user_id=light) == []
+        await ledger.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Per-user rate limits and usage ledger tests completed successfully")
+
+def test_usage_cut_short():
+    """Test that requests cut short are charged for what they streamed, and that a failing ledger stays bounded"""
+    logger.info("Testing usage of requests cut short...")
+    
+    class StreamingProvider(ChatProvider):
+        name = "fake"
+        
+        async def stream(self, model, messages, temperature=1.0, max_tokens=1000, timeout=None):
+            for _ in range(10):
+                yield "x" * 40
+            await asyncio.sleep(10)
+            yield "never"
+    
+    class FailingDatabase:
+        def add_usage_records(self, records):
+            raise RuntimeError("database down")
+    
+    async def scenario():
+        limits = UserRateLimiter(requests_per_minute=60, request_burst=2, tokens_per_hour=3600, token_burst=1000)
+        router = ModelRouter({"fake": StreamingProvider()}, [ModelOption("fake", "model", 1, 1, 2)])
+        
+        async def read_stream():
+            async for _ in router.stream("CodeGeneration", [{"role": "user", "content": "x" * 40}]):
+                pass
+        
+        # A request cancelled mid-stream pays for the prompt and the deltas it received
+        user = uuid.uuid4().int % 10 ** 12
+        with limits.metered(user) as usage:
+            reading = asyncio.create_task(read_stream())
+            await asyncio.sleep(0.1)
+            reading.cancel()
+            try:
+                await reading
+                raise AssertionError("cancelled stream finished")
+            except asyncio.CancelledError:
+                pass
+        assert [(call['prompt_tokens'], call['completion_tokens']) for call in usage.calls] == [(14, 100)]
+        assert limits.stats.tokens_charged == 114 and router.stats.to_dict()['requests'] == 1
+        
+        # While the database is down, the oldest pending calls are dropped past the buffer's cap
+        ledger = UsageLedger(FailingDatabase(), flush_interval=60, max_pending=1000, max_buffered=5)
+        for number in range(8):
+            with usage_scope() as usage:
+                record_usage("CodeGeneration", "fake/model", number, 0, 0.0)
+            ledger.record(user, usage)
+        assert await ledger.flush() == 0
+        assert ledger.pending == 5 and ledger.stats.dropped == 3 and ledger.stats.failed_flushes == 1
+        assert [call['prompt_tokens'] for call in ledger._pending] == [3, 4, 5, 6, 7]
+        await ledger.close()
+    
+    asyncio.run(scenario())
+    
+    logger.info("Usage of requests cut short tests completed successfully")
+
 async def run_tests():
     """Run all Telegram bot interface tests"""
     logger.info("Starting tests for Telegram Bot Interface...")
@@ -96,11 +931,41 @@ async def run_tests():
     
     # Run tests
     telegram_test_result = await test_telegram_commands()
+    webhook_test_result = await run_test(test_webhook_ingestion)
+    dispatch_test_result = await run_test(test_chat_ordered_dispatch)
+    outbound_test_result = await run_test(test_outbound_scheduler)
+    split_test_result = await run_test(test_split_message)
+    dedup_test_result = await run_test(test_update_dedup)
+    cancel_test_result = await run_test(test_cancel_inflight_work)
+    drain_test_result = await run_test(test_shutdown_drain)
+    registry_test_result = await run_test(test_agent_registry)
+    task_queue_test_result = await run_test(test_task_queue)
+    job_queue_test_result = await run_test(test_redis_job_queue)
+    agent_load_test_result = await run_test(test_job_worker_agent_load_failure)
+    single_flight_test_result = await run_test(test_single_flight)
+    single_flight_usage_test_result = await run_test(test_single_flight_usage)
+    user_limits_test_result = await run_test(test_user_limits)
+    cut_short_test_result = await run_test(test_usage_cut_short)
     
     # Save test results
     with open("tests/results/telegram_test_results.txt", "w") as f:
         f.write("# Telegram Bot Interface Test Results\n\n")
         f.write(f"Command Handlers Test: {'Passed' if telegram_test_result else 'Failed'}\n\n")
+        f.write(f"Webhook Ingestion Test: {'Passed' if webhook_test_result else 'Failed'}\n\n")
+        f.write(f"Chat-Ordered Dispatch Test: {'Passed' if dispatch_test_result else 'Failed'}\n\n")
+        f.write(f"Outbound Scheduler Test: {'Passed' if outbound_test_result else 'Failed'}\n\n")
+        f.write(f"Message Splitting Test: {'Passed' if split_test_result else 'Failed'}\n\n")
+        f.write(f"Update De-duplication Test: {'Passed' if dedup_test_result else 'Failed'}\n\n")
+        f.write(f"Cancellation Test: {'Passed' if cancel_test_result else 'Failed'}\n\n")
+        f.write(f"Shutdown Drain Test: {'Passed' if drain_test_result else 'Failed'}\n\n")
+        f.write(f"Agent Registry Test: {'Passed' if registry_test_result else 'Failed'}\n\n")
+        f.write(f"Task Queue Test: {'Passed' if task_queue_test_result else 'Failed'}\n\n")
+        f.write(f"Redis Job Queue Test: {'Passed' if job_queue_test_result else 'Failed'}\n\n")
+        f.write(f"Agent Load Failure Test: {'Passed' if agent_load_test_result else 'Failed'}\n\n")
+        f.write(f"Single-Flight Test: {'Passed' if single_flight_test_result else 'Failed'}\n\n")
+        f.write(f"Single-Flight Usage Test: {'Passed' if single_flight_usage_test_result else 'Failed'}\n\n")
+        f.write(f"User Rate Limits Test: {'Passed' if user_limits_test_result else 'Failed'}\n\n")
+        f.write(f"Usage Cut Short Test: {'Passed' if cut_short_test_result else 'Failed'}\n\n")
     
     logger.info("Telegram Bot Interface tests completed. Results saved to tests/results/telegram_test_results.txt")
 
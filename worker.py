@@ -0,0 +1,49 @@
+"""
+Agent worker entry point for Multi-Skill Super-Agent
+
+Runs agent jobs enqueued by a bot started with AGENT_EXECUTION=redis. Start
+as many workers as needed, on any host that can reach the Redis server.
+"""
+import argparse
+import asyncio
+import signal
+from loguru import logger
+
+from src.orchestration.job_queue import JobWorker, connect_redis
+from src.utils.config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    REDIS_PASSWORD,
+    JOB_QUEUE_PREFIX,
+    JOB_VISIBILITY_TIMEOUT,
+    JOB_MAX_ATTEMPTS,
+)
+
+async def run_worker(agents, concurrency: int):
+    """Run jobs until SIGINT or SIGTERM, then finish the running ones"""
+    worker = JobWorker(
+        connect_redis(REDIS_HOST, REDIS_PORT, REDIS_PASSWORD),
+        agents=agents,
+        prefix=JOB_QUEUE_PREFIX,
+        visibility_timeout=JOB_VISIBILITY_TIMEOUT,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        concurrency=concurrency
+    )
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+    await worker.run()
+    logger.info(f"Worker stopped: {worker.stats.to_dict()}")
+
+def main():
+    """Main entry point for an agent worker"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", default=None, help="Comma separated agents to serve (default: all)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Jobs run at the same time per agent")
+    args = parser.parse_args()
+
+    agents = [name.strip() for name in args.agents.split(",")] if args.agents else None
+    asyncio.run(run_worker(agents, args.concurrency))
+
+if __name__ == "__main__":
+    main()